@@ -0,0 +1,11 @@
+"""
+벤치마크 스위트
+
+- synthetic: 합성 퇴원 요약 생성기 + 합성 벡터 DB 빌드 (10k / 100k / 1M 케이스)
+- micro: VectorDBManager.search 단계별, EpisodicMemoryStore.search_similar_episodes, critic 전처리 도구
+- macro: 카세트 재생(src/llm/cassette.py) 하에서 전체 파이프라인 실행
+- startup: 진입점별 import 시간 / cold start 예산 검사 (-X importtime)
+- results / compare: 공통 JSON 결과 포맷, 커밋 간 비교
+
+실행은 프로젝트 루트에서 `python -m benchmarks.<module>`.
+"""
@@ -0,0 +1,47 @@
+"""
+벤치마크 결과 비교 (커밋 간 회귀 탐지)
+
+실행:
+    python -m benchmarks.compare benchmarks/results/base.json benchmarks/results/new.json --threshold 0.10
+
+같은 name + params 결과끼리 median_s 비교, threshold 이상 느려지면 regression → 종료 코드 1
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.results import compare_results, load_results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.10, help="회귀 판정 비율 (기본 10%%)")
+    parser.add_argument("--metric", default="median_s", choices=["median_s", "mean_s", "p95_s", "min_s"])
+    args = parser.parse_args()
+
+    baseline = load_results(args.baseline)
+    current = load_results(args.current)
+    rows = compare_results(baseline, current, threshold=args.threshold, metric=args.metric)
+
+    print(f"baseline: {baseline['env'].get('commit')}  current: {current['env'].get('commit')}  metric={args.metric}")
+    print("=" * 60)
+    for row in rows:
+        params = " ".join(f"{k}={v}" for k, v in row["params"].items())
+        base_ms = f"{row['baseline'] * 1000:9.2f}ms" if row["baseline"] is not None else "        -"
+        cur_ms = f"{row['current'] * 1000:9.2f}ms" if row["current"] is not None else "        -"
+        ratio = f"x{row['ratio']:.3f}" if row["ratio"] is not None else "-"
+        print(f"  {row['status']:<12} {row['name']:<36} {params:<28} {base_ms} → {cur_ms}  {ratio}")
+
+    regressions = [r for r in rows if r["status"] == "regression"]
+    print(f"\n{len(regressions)} regression(s), threshold={args.threshold:.0%}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+매크로 벤치마크: 전체 파이프라인(run_agent_critique_pipeline) 실행을 카세트 재생 하에서 반복 측정
+
+- 먼저 실제 API로 1회 기록 (--record), 이후 재생은 OpenAI / NCBI / 임베딩·리랭커 모델 없이 실행
+- --latency-scale: 기록된 외부 호출 지연 × 배수 (0 = 오케스트레이션·검색·critic 코드만, 1 = 기록 당시 지연 재현)
+- 실행 모드(sequential / parallel)별 end-to-end 시간 + 카세트 hit/miss (miss가 있으면 입력이 기록과 달라진 것)
+- 에피소딕 메모리는 임시 디렉터리 + freeze_search → 반복 실행이 서로 영향을 주지 않음
+  (case profile 등 프로세스 내 캐시는 유지되므로 첫 반복이 느림 → median 비교)
+
+실행:
+    python -m benchmarks.macro --patient data/patient.json --cassette benchmarks/cassettes/patient.json --record
+    python -m benchmarks.macro --patient data/patient.json --cassette benchmarks/cassettes/patient.json \\
+        --modes sequential,parallel --latency-scale 0,1 --repeats 3 --output benchmarks/results/macro.json
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from benchmarks.results import BenchResult, print_table, write_results
+from src.critic.router import hybrid_router_stats, reset_hybrid_router
+from src.llm.cassette import use_cassette
+from src.llm.usage import track_usage
+
+
+def _resources(db_path: str, episodic_dir: str):
+    from scripts.run_agent_critique import load_shared_resources
+    from src.memory.episodic_store import EpisodicMemoryStore
+
+    rag, _ = load_shared_resources(db_path, episodic_autosave=False)
+    shared_embedder = rag.vector_db if rag is not None else None
+    episodic = EpisodicMemoryStore(db_path=episodic_dir, shared_embedder=shared_embedder, autosave=False)
+    episodic.load()
+    episodic.freeze_search()
+    return rag, episodic
+
+
+def run_once(patient_data: dict, mode: str, max_workers: int, resources) -> dict:
+    from scripts.run_agent_critique import run_agent_critique_pipeline
+
+    started = time.perf_counter()
+    with track_usage() as tracker:
+        run_agent_critique_pipeline(
+            patient_data=patient_data,
+            execution_mode=mode,
+            max_workers=max_workers,
+            resources=resources,
+            verbose=False,
+        )
+    return {"wall_s": time.perf_counter() - started, "usage": tracker.to_dict()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full pipeline benchmark under cassette replay")
+    parser.add_argument("--patient", default="data/patient.json")
+    parser.add_argument("--cassette", required=True, help="외부 호출 카세트 경로")
+    parser.add_argument("--record", action="store_true", help="실제 API로 1회 실행해 카세트 기록")
+    parser.add_argument("--modes", default="sequential,parallel")
+    parser.add_argument("--latency-scale", default="0", help="재생 지연 배수 목록 (예: 0,1)")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--max-workers", type=int, default=4)
+    parser.add_argument("--db-path", default="vector_db")
+    parser.add_argument("--output", default=None, help="결과 JSON 경로 (benchmarks/results.py 포맷)")
+    args = parser.parse_args()
+
+    from scripts.run_agent_critique import load_patient_case
+
+    patient_data = load_patient_case(args.patient)
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    episodic_dir = tempfile.mkdtemp(prefix="bench_macro_episodic_")
+
+    if args.record:
+        # 기록 실행은 첫 번째 모드로 1회 (다른 모드도 같은 요청을 만들므로 같은 카세트로 재생 가능)
+        with use_cassette(args.cassette, mode="record") as cassette:
+            resources = _resources(args.db_path, episodic_dir)
+            run = run_once(patient_data, modes[0], args.max_workers, resources)
+        print(f"[Benchmark] recorded in {run['wall_s']:.1f}s: {cassette.summary()['stats']}")
+        return
+
+    results: List[BenchResult] = []
+    for scale in (float(x) for x in args.latency_scale.split(",") if x.strip()):
+        with use_cassette(args.cassette, mode="replay", latency_scale=scale) as cassette:
+            resources = _resources(args.db_path, episodic_dir)
+            for mode in modes:
+                samples, usage = [], None
+                reset_hybrid_router()
+                for i in range(args.repeats):
+                    print(f"\n[Benchmark] pipeline mode={mode} latency_scale={scale} run {i + 1}/{args.repeats}")
+                    run = run_once(patient_data, mode, args.max_workers, resources)
+                    samples.append(run["wall_s"])
+                    usage = run["usage"]
+                results.append(BenchResult(
+                    "pipeline.run",
+                    {"mode": mode, "latency_scale": scale, "max_workers": args.max_workers},
+                    samples,
+                    extra={"llm_calls": usage["calls"] if usage else 0, "cost_usd": usage["cost_usd"] if usage else 0,
+                           "critic_routing": hybrid_router_stats()},
+                ))
+            stats = cassette.summary()["stats"]
+        misses = sum(v.get("miss", 0) for v in stats.values())
+        print(f"[Benchmark] cassette stats (latency x{scale}): {stats}")
+        if misses:
+            print(f"[Warning] {misses} cassette misses → 입력이 기록과 다름 (해당 호출은 에이전트 폴백 경로로 측정됨)")
+        for r in results:
+            if r.params["latency_scale"] == scale:
+                r.extra["cassette"] = stats
+
+    print_table(results)
+    if args.output:
+        write_results(args.output, "macro", results, config=vars(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""
+마이크로 벤치마크
+
+- vector_search.*: VectorDBManager.search 단계별 (쿼리 임베딩 / FAISS top-k / stage1 전체 / 진단 필터 / 리랭커)
+  합성 DB(--db-sizes로 메모리 내 생성 또는 --db로 synthetic.py 출력 로드) + SyntheticEmbedder
+  진단 필터(LLM)·리랭커(cross-encoder)는 --stages에 넣었을 때만. 외부 호출은 --cassette 재생 권장
+- episodic.search: EpisodicMemoryStore.search_similar_episodes (합성 에피소드 N건, 임시 디렉터리)
+- critic.preprocess.*: timeline / evidence / record_gaps 도구 (short ~ xl 길이 노트, xl ≈ 50k자)
+  도구별 수치는 공용 문서 분석(doc_analysis) 캐시를 비운 cold 실행. critic.preprocess.all은 케이스 1건의 전처리 3종 + 휴리스틱 lens
+  critic.document.scan: 문서 전체 문장 분할 + 키워드 스캔 (조기 종료 없는 상한)
+  critic.critique.payload: CritiqueBuilder 입력 압축 (extra에 압축 전/후 토큰 수)
+
+실행:
+    python -m benchmarks.micro --db-sizes 10000,100000 --output benchmarks/results/micro.json
+    python -m benchmarks.micro --db data/synth_1m --stages embed,faiss,stage1 --repeats 20
+    python -m benchmarks.micro --only critic --lengths short,medium,long,xl
+"""
+from __future__ import annotations
+
+import argparse
+import pickle
+import random
+import sys
+import tempfile
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Callable, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.results import BenchResult, print_table, time_calls, write_results
+from benchmarks.synthetic import DIAGNOSES, LENGTH_TARGETS, SyntheticEmbedder, build_index, generate_case
+
+DEFAULT_STAGES = ("embed", "faiss", "stage1")
+ALL_STAGES = ("embed", "faiss", "stage1", "filter", "rerank")
+
+
+def _query_texts(n: int, seed: int) -> List[str]:
+    # DB에 없는 케이스 번호로 쿼리 생성 (자기 자신 매칭 방지)
+    return [generate_case(10_000_000 + k, seed=seed + 1, length="medium")["text"] for k in range(n)]
+
+
+def _cycle(items: List) -> Callable[[], object]:
+    state = {"i": 0}
+
+    def nxt():
+        item = items[state["i"] % len(items)]
+        state["i"] += 1
+        return item
+    return nxt
+
+
+# ──────────────────────────────────────────────
+# VectorDBManager.search
+# ──────────────────────────────────────────────
+
+def _vector_db(index, metadata, embedder: SyntheticEmbedder):
+    from src.retrieval.rag_retriever import VectorDBManager
+
+    vdb = VectorDBManager()
+    vdb.index = index
+    vdb.metadata = metadata
+    # 쿼리 임베딩 모델 대신 합성 임베더 (DB와 같은 공간)
+    vdb.embed_text = embedder.embed_text
+    return vdb
+
+
+def _load_db(path: str):
+    import faiss
+
+    db = Path(path)
+    index = faiss.read_index(str(db / "faiss_index.idx"))
+    with open(db / "metadata.pkl", "rb") as f:
+        metadata = pickle.load(f)
+    return index, metadata
+
+
+def bench_vector_search(vdb, db_size: int, stages: List[str], repeats: int, queries: List[str],
+                        top_k: int = 3, rerank_top_n: int = 10) -> List[BenchResult]:
+    import faiss
+
+    results = []
+    params = {"db_size": db_size, "top_k": top_k, "rerank_top_n": rerank_top_n}
+    next_query = _cycle(queries)
+    vectors = []
+    for q in queries:
+        v = vdb.embed_text(q)
+        faiss.normalize_L2(v)
+        vectors.append(v)
+    next_vector = _cycle(vectors)
+
+    if "embed" in stages:
+        results.append(BenchResult("vector_search.embed", params,
+                                   time_calls(lambda: vdb.embed_text(next_query()), repeats)))
+    if "faiss" in stages:
+        results.append(BenchResult("vector_search.faiss", params,
+                                   time_calls(lambda: vdb.index.search(next_vector(), rerank_top_n), repeats)))
+    if "stage1" in stages:
+        results.append(BenchResult("vector_search.stage1", params, time_calls(
+            lambda: vdb.search(next_query(), top_k=top_k, use_reranker=False, use_diagnosis_filter=False,
+                               rerank_top_n=rerank_top_n),
+            repeats,
+        )))
+    if "filter" in stages or "rerank" in stages:
+        # 후보는 stage1 결과 고정 → 필터/리랭커 단계만 측정
+        candidates = {}
+        for q in queries:
+            candidates[q] = vdb.search(q, top_k=rerank_top_n, use_reranker=False, use_diagnosis_filter=False,
+                                       rerank_top_n=rerank_top_n)
+        if "filter" in stages:
+            results.append(BenchResult("vector_search.diagnosis_filter", params, time_calls(
+                lambda: (lambda q: vdb._filter_by_diagnosis(q, list(candidates[q])))(next_query()), repeats,
+            )))
+        if "rerank" in stages:
+            results.append(BenchResult("vector_search.rerank", params, time_calls(
+                lambda: (lambda q: vdb._rerank(q, [dict(c) for c in candidates[q]], top_k))(next_query()), repeats,
+            )))
+    return results
+
+
+# ──────────────────────────────────────────────
+# EpisodicMemoryStore.search_similar_episodes
+# ──────────────────────────────────────────────
+
+def bench_episodic(n_episodes: int, repeats: int, queries: List[str], embedder: SyntheticEmbedder,
+                   seed: int) -> BenchResult:
+    import faiss
+    from src.memory.episodic_store import EpisodicMemoryStore
+
+    tmp = tempfile.mkdtemp(prefix="bench_episodic_")
+    store = EpisodicMemoryStore(db_path=tmp, shared_embedder=embedder, autosave=False)
+    store.load()
+    rng = random.Random(seed)
+    vectors = []
+    for i in range(n_episodes):
+        case = generate_case(20_000_000 + i, seed=seed, length="short")
+        v = embedder.embed_text(case["text"])
+        faiss.normalize_L2(v)
+        vectors.append(v)
+        store.episodes.append({
+            "patient_id": case["id"],
+            "diagnosis": case["diagnosis"],
+            "secondary_diagnoses": rng.sample(DIAGNOSES, k=1)[0]["pmh"],
+            "outcome": case["status"],
+            "confidence": round(rng.uniform(0.4, 0.95), 2),
+            "lessons_learned": ["synthetic lesson"],
+            "critique_summary": [],
+        })
+    if vectors:
+        import numpy as np
+        store.index.add(np.vstack(vectors))
+
+    next_query = _cycle(queries)
+    dxs = [d["dx"] for d in DIAGNOSES]
+    next_dx = _cycle(dxs)
+    samples = time_calls(
+        lambda: store.search_similar_episodes(next_query(), top_k=3, min_similarity=0.0, diagnosis=next_dx()),
+        repeats,
+    )
+    return BenchResult("episodic.search", {"episodes": n_episodes}, samples)
+
+
+# ──────────────────────────────────────────────
+# Critic 전처리 도구
+# ──────────────────────────────────────────────
+
+def bench_critic_preprocess(lengths: List[str], repeats: int, seed: int) -> List[BenchResult]:
+    from src.critic.critique_builder import CritiqueBuilder
+    from src.critic.doc_analysis import DocumentAnalysis, analyze_document, clear_document_cache
+    from src.critic.prompt_payload import compile_critique_payload
+    from src.critic.tools.lens_monitoring_response import LensMonitoringResponseTool
+    from src.critic.tools.lens_severity_risk import LensSeverityRiskTool
+    from src.critic.tools.preprocess_evidence import PreprocessEvidenceTool
+    from src.critic.tools.preprocess_gaps import PreprocessRecordGapTool
+    from src.critic.tools.preprocess_timeline import PreprocessTimelineTool
+    from src.critic.types import AgentState
+
+    tools = [PreprocessTimelineTool(), PreprocessEvidenceTool(), PreprocessRecordGapTool()]
+    severity, monitoring = LensSeverityRiskTool(), LensMonitoringResponseTool()
+
+    def cold(fn):
+        def run():
+            clear_document_cache()
+            return fn()
+        return run
+
+    def run_all(state):
+        state.preprocessing = {tool.name: tool.run(state) for tool in tools}
+        severity.run(state)
+        evidence = state.preprocessing["evidence"]
+        monitoring._run_heuristic(
+            events=state.preprocessing["timeline"]["events"],
+            evidence_spans=evidence["evidence_spans"],
+            doc=analyze_document(state.patient["text"]),
+            keyword_index=evidence["keyword_index"],
+        )
+
+    results = []
+    for length in lengths:
+        case = generate_case(30_000_000, seed=seed, length=length)
+        state = AgentState(patient={"text": case["text"]}, cohort_data={})
+        extra = {"chars": len(case["text"])}
+        for tool in tools:
+            results.append(BenchResult(
+                f"critic.preprocess.{tool.name}",
+                {"length": length},
+                time_calls(cold(lambda: tool.run(state)), repeats),
+                extra=extra,
+            ))
+        results.append(BenchResult("critic.preprocess.all", {"length": length},
+                                   time_calls(cold(lambda: run_all(state)), repeats), extra=extra))
+        results.append(BenchResult(
+            "critic.document.scan", {"length": length},
+            time_calls(lambda: sum(1 for _ in DocumentAnalysis(case["text"]).iter_sentences()), repeats),
+            extra=extra,
+        ))
+        # 휴리스틱 lens 결과까지 채운 state로 CritiqueBuilder 입력 압축
+        state.lens_results = {t.name: t.run(state) for t in (severity, monitoring)}
+        payload, _, shared = CritiqueBuilder()._payload(state)
+        _, stats = compile_critique_payload(payload, shared_evidence=shared)
+        results.append(BenchResult(
+            "critic.critique.payload", {"length": length},
+            time_calls(lambda: compile_critique_payload(payload, shared_evidence=shared), repeats),
+            extra={**extra, **stats},
+        ))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro benchmarks (retrieval / episodic memory / critic preprocess)")
+    parser.add_argument("--only", default="vector,episodic,critic", help="실행할 그룹 (comma)")
+    parser.add_argument("--db", default=None, help="synthetic.py로 만든 벡터 DB 디렉터리 (없으면 --db-sizes로 생성)")
+    parser.add_argument("--db-sizes", default="10000", help="메모리 내 합성 DB 크기 목록 (예: 10000,100000,1000000)")
+    parser.add_argument("--db-length", default="short", choices=["mixed", *LENGTH_TARGETS])
+    parser.add_argument("--stages", default=",".join(DEFAULT_STAGES), help=f"vector search 단계 ({','.join(ALL_STAGES)})")
+    parser.add_argument("--episodes", default="100,1000", help="에피소딕 메모리 에피소드 수 목록")
+    parser.add_argument("--lengths", default="short,medium,long,xl", help="critic 전처리 노트 길이")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cassette", default=None, help="진단 필터/리랭커 외부 호출 재생용 카세트")
+    parser.add_argument("--output", default=None, help="결과 JSON 경로 (benchmarks/results.py 포맷)")
+    args = parser.parse_args()
+
+    groups = {g.strip() for g in args.only.split(",") if g.strip()}
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    embedder = SyntheticEmbedder(seed=args.seed)
+    queries = _query_texts(args.queries, args.seed)
+    results: List[BenchResult] = []
+
+    cassette_ctx = nullcontext()
+    if args.cassette:
+        from src.llm.cassette import use_cassette
+        cassette_ctx = use_cassette(args.cassette, mode="replay")
+
+    with cassette_ctx:
+        if "vector" in groups:
+            if args.db:
+                index, metadata = _load_db(args.db)
+                dbs = [(index, metadata)]
+            else:
+                dbs = (build_index(int(n), seed=args.seed, length=args.db_length, embedder=embedder)
+                       for n in args.db_sizes.split(",") if n.strip())
+            for index, metadata in dbs:
+                print(f"\n[Benchmark] vector_search db_size={index.ntotal}")
+                vdb = _vector_db(index, metadata, embedder)
+                results.extend(bench_vector_search(vdb, index.ntotal, stages, args.repeats, queries))
+        if "episodic" in groups:
+            for n in (int(x) for x in args.episodes.split(",") if x.strip()):
+                print(f"\n[Benchmark] episodic.search episodes={n}")
+                results.append(bench_episodic(n, args.repeats, queries, embedder, args.seed))
+        if "critic" in groups:
+            lengths = [x.strip() for x in args.lengths.split(",") if x.strip()]
+            print(f"\n[Benchmark] critic preprocess lengths={lengths}")
+            results.extend(bench_critic_preprocess(lengths, args.repeats, args.seed))
+
+    print_table(results)
+    if args.output:
+        write_results(args.output, "micro", results, config=vars(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+벤치마크 결과 JSON 포맷 (커밋 간 비교용)
+
+{
+  "schema_version": 1,
+  "suite": "micro" | "macro",
+  "env": {"commit", "dirty", "timestamp", "python", "platform", "cpu_count"},
+  "results": [
+    {"name": "vector_search.faiss", "params": {"db_size": 100000},
+     "stats": {"n", "mean_s", "median_s", "p95_s", "min_s", "max_s", "stdev_s"},
+     "samples_s": [...], "extra": {...}}
+  ]
+}
+
+결과 식별자는 name + params (compare.py가 같은 식별자끼리 median_s 비교).
+"""
+from __future__ import annotations
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from statistics import mean, median, pstdev
+from typing import Any, Callable, Dict, List, Optional
+
+SCHEMA_VERSION = 1
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def _percentile(xs: List[float], q: float) -> float:
+    ordered = sorted(xs)
+    if not ordered:
+        return 0.0
+    idx = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+@dataclass
+class BenchResult:
+    name: str
+    params: Dict[str, Any] = field(default_factory=dict)
+    samples_s: List[float] = field(default_factory=list)
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def key(self) -> str:
+        return result_key(self.name, self.params)
+
+    def stats(self) -> Dict[str, Any]:
+        xs = self.samples_s
+        if not xs:
+            return {"n": 0}
+        return {
+            "n": len(xs),
+            "mean_s": round(mean(xs), 6),
+            "median_s": round(median(xs), 6),
+            "p95_s": round(_percentile(xs, 0.95), 6),
+            "min_s": round(min(xs), 6),
+            "max_s": round(max(xs), 6),
+            "stdev_s": round(pstdev(xs), 6),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "params": self.params,
+            "stats": self.stats(),
+            "samples_s": [round(x, 6) for x in self.samples_s],
+            "extra": self.extra,
+        }
+
+
+def result_key(name: str, params: Dict[str, Any]) -> str:
+    return name + json.dumps(params, sort_keys=True, ensure_ascii=False)
+
+
+def time_calls(fn: Callable[[], Any], repeats: int = 5, warmup: int = 1) -> List[float]:
+    """fn()을 warmup회 버린 뒤 repeats회 실행한 소요 시간 (초)."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        out = subprocess.run(["git", *args], cwd=REPO_ROOT, capture_output=True, text=True, timeout=10)
+    except Exception:
+        return None
+    return out.stdout.strip() if out.returncode == 0 else None
+
+
+def run_env() -> Dict[str, Any]:
+    return {
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def write_results(path: str, suite: str, results: List[BenchResult], config: Optional[Dict[str, Any]] = None) -> Path:
+    out = Path(path)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    payload = {
+        "schema_version": SCHEMA_VERSION,
+        "suite": suite,
+        "env": run_env(),
+        "config": config or {},
+        "results": [r.to_dict() for r in results],
+    }
+    out.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"[OK] Saved: {out}")
+    return out
+
+
+def load_results(path: str) -> Dict[str, Any]:
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    if data.get("schema_version") != SCHEMA_VERSION:
+        print(f"[Warning] {path}: schema_version={data.get('schema_version')} (expected {SCHEMA_VERSION})")
+    return data
+
+
+def compare_results(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    threshold: float = 0.10,
+    metric: str = "median_s",
+) -> List[Dict[str, Any]]:
+    """같은 name+params 결과끼리 metric 비교. ratio = current / baseline."""
+    base = {result_key(r["name"], r.get("params", {})): r for r in baseline.get("results", [])}
+    rows = []
+    for r in current.get("results", []):
+        key = result_key(r["name"], r.get("params", {}))
+        b = base.get(key)
+        cur_v = (r.get("stats") or {}).get(metric)
+        base_v = (b.get("stats") or {}).get(metric) if b else None
+        ratio = (cur_v / base_v) if (cur_v is not None and base_v) else None
+        if ratio is None:
+            status = "new"
+        elif ratio > 1 + threshold:
+            status = "regression"
+        elif ratio < 1 - threshold:
+            status = "improvement"
+        else:
+            status = "same"
+        rows.append({
+            "name": r["name"],
+            "params": r.get("params", {}),
+            "baseline": base_v,
+            "current": cur_v,
+            "ratio": round(ratio, 4) if ratio is not None else None,
+            "status": status,
+        })
+    return rows
+
+
+def print_table(results: List[BenchResult]) -> None:
+    print("\n" + "=" * 60)
+    for r in results:
+        s = r.stats()
+        params = " ".join(f"{k}={v}" for k, v in r.params.items())
+        if not s.get("n"):
+            print(f"  {r.name:<36} {params:<28} skipped {r.extra.get('skipped', '')}")
+            continue
+        print(f"  {r.name:<36} {params:<28} median={s['median_s'] * 1000:9.2f}ms  "
+              f"p95={s['p95_s'] * 1000:9.2f}ms  n={s['n']}")
@@ -0,0 +1,174 @@
+"""
+시작(cold start) / import 시간 벤치마크
+
+- 대상마다 새 인터프리터로 `python -X importtime -c "import ..."` 실행 → 벽시계 시간 + import 누적 시간
+- 무거운 의존성(torch / transformers / faiss / numpy / Bio / openai / langgraph)은 첫 사용 시 import가 원칙
+  → 대상별로 허용되지 않은 무거운 모듈이 import되면 위반 (머신 속도와 무관하게 재현되는 검사)
+- 대상별 import 예산(ms) 초과도 위반. --check면 위반 시 종료 코드 1
+- 결과는 results.py 포맷 → compare.py로 커밋 간 cold start 추적
+
+실행:
+    python -m benchmarks.startup --repeats 5 --output benchmarks/results/startup.json
+    python -m benchmarks.startup --check --budget-scale 2.0   # 느린 CI 머신이면 예산 배수
+    python -m benchmarks.startup --only src.critic.verifier --top 15
+"""
+from __future__ import annotations
+
+import argparse
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.results import REPO_ROOT, BenchResult, print_table, write_results
+
+HEAVY_MODULES = (
+    "torch", "transformers", "faiss", "numpy", "Bio", "openai",
+    "langgraph", "FlagEmbedding", "sentence_transformers",
+)
+
+
+@dataclass
+class StartupTarget:
+    name: str
+    code: str
+    budget_ms: float
+    allowed_heavy: Tuple[str, ...] = field(default_factory=tuple)
+
+
+# 예산은 -X importtime 최상위 누적 시간 기준 (인터프리터 기동 제외, site 등 기본 import 포함)
+TARGETS = [
+    StartupTarget("python", "pass", 50),
+    StartupTarget("src.llm", "import src.llm.gateway, src.llm.model_router, src.llm.cassette", 300),
+    StartupTarget("src.critic.verifier", "import src.critic.verifier", 400),
+    StartupTarget("src.critic.critic_graph", "import src.critic.critic_graph", 500),
+    StartupTarget("src.agents", "import src.agents", 600),
+    StartupTarget("src.pipeline.state", "from src.pipeline import AgentState, clean_state_to_agent_state", 400),
+    StartupTarget("src.retrieval", "import src.retrieval", 400),
+    StartupTarget("src.memory", "import src.memory", 300),
+    # CLI / 백엔드 잡 서브프로세스(scripts/main.py) 진입점
+    StartupTarget("cli.run_agent_critique", "import scripts.run_agent_critique", 700),
+    StartupTarget("cli.main", "import scripts.main", 700),
+    # 그래프는 langgraph가 필요 (에이전트/critic 그래프 빌드)
+    StartupTarget("src.pipeline.graph", "from src.pipeline import MedicalCritiqueGraph", 3000, ("langgraph",)),
+    StartupTarget("backend.app", "import backend.app", 1500),
+]
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """-X importtime 출력 → [(module, depth, self_us, cumulative_us)]"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            self_us, cum_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            continue  # 헤더 줄
+        name = parts[2]
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), depth, self_us, cum_us))
+    return rows
+
+
+def run_target(target: StartupTarget, python: str = sys.executable) -> Dict:
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [python, "-X", "importtime", "-c", target.code],
+        cwd=REPO_ROOT, capture_output=True, text=True,
+    )
+    wall_s = time.perf_counter() - started
+    rows = parse_importtime(proc.stderr)
+    modules = {name for name, _, _, _ in rows}
+    # 인터프리터 기동 시 import(site 등)는 "python" 대상에서도 동일 → 최상위 누적 합으로 비교
+    import_ms = sum(cum for _, depth, _, cum in rows if depth == 0) / 1000
+    heavy = sorted({h for h in HEAVY_MODULES for m in modules if m == h or m.startswith(h + ".")})
+    error = None
+    if proc.returncode != 0:
+        error = (proc.stderr.strip().splitlines() or ["?"])[-1]
+    return {
+        "wall_s": wall_s,
+        "import_ms": round(import_ms, 1),
+        "heavy": heavy,
+        "top": sorted(rows, key=lambda r: -r[2]),
+        "error": error,
+    }
+
+
+def check_violations(target: StartupTarget, run: Dict, budget_scale: float) -> List[str]:
+    violations = []
+    unexpected = [h for h in run["heavy"] if h not in target.allowed_heavy]
+    if unexpected:
+        violations.append(f"heavy import: {', '.join(unexpected)}")
+    if run["import_ms"] > target.budget_ms * budget_scale:
+        violations.append(f"import {run['import_ms']:.0f}ms > budget {target.budget_ms * budget_scale:.0f}ms")
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start / import time benchmark")
+    parser.add_argument("--only", default=None, help="대상 이름 (comma)")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--budget-scale", type=float, default=1.0, help="예산 배수 (느린 머신용)")
+    parser.add_argument("--top", type=int, default=0, help="대상별 self 시간 상위 N개 모듈 출력")
+    parser.add_argument("--check", action="store_true", help="위반 시 종료 코드 1")
+    parser.add_argument("--output", default=None, help="결과 JSON 경로 (benchmarks/results.py 포맷)")
+    args = parser.parse_args()
+
+    only = {x.strip() for x in args.only.split(",")} if args.only else None
+    results: List[BenchResult] = []
+    failures: Dict[str, List[str]] = {}
+
+    for target in TARGETS:
+        if only and target.name not in only:
+            continue
+        runs = [run_target(target) for _ in range(max(1, args.repeats))]
+        last = runs[-1]
+        if last["error"]:
+            # 선택 의존성(langgraph, fastapi 등) 미설치 환경 → 측정 생략
+            print(f"[Skip] {target.name}: {last['error']}")
+            results.append(BenchResult("startup.import", {"target": target.name}, [],
+                                       extra={"skipped": last["error"]}))
+            continue
+        import_ms = sorted(r["import_ms"] for r in runs)[len(runs) // 2]
+        run = dict(last, import_ms=import_ms)
+        violations = check_violations(target, run, args.budget_scale)
+        if violations:
+            failures[target.name] = violations
+        results.append(BenchResult(
+            "startup.import",
+            {"target": target.name},
+            [r["wall_s"] for r in runs],
+            extra={"import_ms": import_ms, "budget_ms": target.budget_ms, "heavy": run["heavy"],
+                   "violations": violations},
+        ))
+        if args.top:
+            print(f"\n[{target.name}] import {import_ms:.0f}ms (budget {target.budget_ms:.0f}ms)")
+            for name, _, self_us, cum_us in run["top"][:args.top]:
+                print(f"    {self_us / 1000:8.1f}ms self  {cum_us / 1000:8.1f}ms cum  {name}")
+
+    print_table(results)
+    for r in results:
+        if "import_ms" in r.extra:
+            print(f"  {r.params['target']:<30} import={r.extra['import_ms']:8.1f}ms  budget={r.extra['budget_ms']:6.0f}ms  "
+                  f"heavy={','.join(r.extra['heavy']) or '-'}")
+    if failures:
+        print("\n[Warning] startup budget violations:")
+        for name, violations in failures.items():
+            for v in violations:
+                print(f"  - {name}: {v}")
+    if args.output:
+        write_results(args.output, "startup", results, config=vars(args))
+    if args.check and failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+합성 퇴원 요약(discharge summary) 코퍼스 생성기 + 합성 벡터 DB 빌드
+
+- generate_case(i, seed, length): processed_data.json 레코드 형식 (id, status, sex, age, ..., text)
+  케이스별 독립 시드 → 1M건도 메모리에 모으지 않고 스트리밍 생성, 같은 (i, seed)는 항상 같은 텍스트
+- 길이(short ~2k / medium ~6k / long ~15k / xl ~50k chars), 시술(안전 수식어 / blind), 결과(생존/사망) 변화
+- SyntheticEmbedder: 진단별 중심 벡터 + 텍스트 해시 노이즈 (768차원). 임베딩 모델 없이 클러스터 구조가 있는
+  인덱스를 만들고, 같은 객체로 쿼리 임베딩 (VectorDBManager.embed_text / EpisodicMemoryStore shared_embedder 대체)
+- build_vector_db(): VectorDBManager.load()가 읽는 형식 그대로 저장 (faiss_index.idx + metadata.pkl)
+
+실행:
+    python -m benchmarks.synthetic --n 10000 --out data/synth_10k --length mixed
+    python -m benchmarks.synthetic --n 1000000 --out data/synth_1m --length short   # metadata.pkl에 text 포함 → 짧게
+    python -m benchmarks.synthetic --n 100 --jsonl data/synth_cases.jsonl           # 텍스트만 저장
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import pickle
+import random
+import re
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+EMBEDDING_DIM = 768
+
+LENGTH_TARGETS = {"short": 2000, "medium": 6000, "long": 15000, "xl": 50000}
+MIXED_WEIGHTS = {"short": 0.35, "medium": 0.45, "long": 0.17, "xl": 0.03}
+
+DIAGNOSES: List[Dict] = [
+    {"dx": "Hepatic encephalopathy", "cc": "Altered mental status", "service": "MEDICINE",
+     "pmh": ["Cirrhosis", "Ascites", "Esophageal varices"], "meds": ["lactulose", "rifaximin", "lorazepam"],
+     "labs": ["ammonia 112", "INR 2.1", "total bilirubin 4.3"], "death": "hemoperitoneum after paracentesis"},
+    {"dx": "Septic shock", "cc": "Fever and hypotension", "service": "MEDICINE",
+     "pmh": ["Diabetes mellitus", "Chronic kidney disease"], "meds": ["vancomycin", "piperacillin-tazobactam", "norepinephrine"],
+     "labs": ["lactate 4.8", "WBC 22.4", "creatinine 2.6"], "death": "refractory septic shock with multiorgan failure"},
+    {"dx": "COPD exacerbation", "cc": "Shortness of breath", "service": "MEDICINE",
+     "pmh": ["COPD", "Atrial fibrillation", "Hypertension"], "meds": ["prednisone", "azithromycin", "albuterol"],
+     "labs": ["pCO2 68", "pH 7.28", "BNP 240"], "death": "hypercapnic respiratory failure"},
+    {"dx": "Acute pulmonary embolism", "cc": "Chest pain and dyspnea", "service": "MEDICINE",
+     "pmh": ["Recent hip surgery", "Obesity"], "meds": ["heparin", "apixaban"],
+     "labs": ["troponin 0.21", "D-dimer 4200", "BNP 510"], "death": "massive pulmonary embolism with RV failure"},
+    {"dx": "Upper GI bleed", "cc": "Hematemesis", "service": "SURGERY",
+     "pmh": ["Peptic ulcer disease", "Alcohol use disorder"], "meds": ["pantoprazole", "octreotide", "ceftriaxone"],
+     "labs": ["Hgb 6.2", "BUN 58", "platelets 88"], "death": "hemorrhagic shock"},
+    {"dx": "Acute decompensated heart failure", "cc": "Leg swelling and orthopnea", "service": "CARDIOLOGY",
+     "pmh": ["Ischemic cardiomyopathy", "CAD", "Hypertension"], "meds": ["furosemide", "metoprolol", "lisinopril"],
+     "labs": ["BNP 2400", "sodium 128", "creatinine 1.9"], "death": "cardiogenic shock"},
+    {"dx": "Diabetic ketoacidosis", "cc": "Nausea and abdominal pain", "service": "MEDICINE",
+     "pmh": ["Type 1 diabetes mellitus", "Depression"], "meds": ["insulin infusion", "potassium chloride"],
+     "labs": ["glucose 612", "anion gap 28", "beta-hydroxybutyrate 7.1"], "death": "cerebral edema"},
+    {"dx": "Community acquired pneumonia", "cc": "Cough and fever", "service": "MEDICINE",
+     "pmh": ["Hypertension", "Dementia"], "meds": ["ceftriaxone", "azithromycin"],
+     "labs": ["WBC 17.1", "procalcitonin 3.2", "SpO2 88% RA"], "death": "ARDS"},
+    {"dx": "Acute ischemic stroke", "cc": "Right sided weakness", "service": "NEUROLOGY",
+     "pmh": ["Atrial fibrillation", "Hyperlipidemia"], "meds": ["aspirin", "atorvastatin"],
+     "labs": ["LDL 162", "INR 1.1", "glucose 188"], "death": "malignant cerebral edema"},
+    {"dx": "Small bowel obstruction", "cc": "Abdominal distension and vomiting", "service": "SURGERY",
+     "pmh": ["Prior laparotomy", "Hypertension"], "meds": ["ondansetron", "morphine"],
+     "labs": ["lactate 2.9", "potassium 3.1", "WBC 13.5"], "death": "bowel perforation with peritonitis"},
+]
+
+PROCEDURES = [
+    ("paracentesis", ["ultrasound-guided paracentesis", "paracentesis performed blindly at bedside", "paracentesis"]),
+    ("central line", ["ultrasound-guided right IJ central line under sterile technique", "landmark-based femoral central line", "central line placement"]),
+    ("thoracentesis", ["ultrasound-guided thoracentesis", "thoracentesis without imaging guidance", "thoracentesis"]),
+    ("intubation", ["intubation for hypoxemic respiratory failure", "emergent intubation", "intubation"]),
+    ("EGD", ["upper endoscopy with banding", "EGD", "EGD with clip placement"]),
+    ("chest tube", ["chest tube placement with sterile technique", "chest tube thoracostomy", "chest tube"]),
+    ("arterial line", ["arterial line placement", "a-line"]),
+]
+
+COURSE_TEMPLATES = [
+    "On HD {day} at {time}, patient became {state} with BP {sbp}/{dbp}, HR {hr}, RR {rr}, SpO2 {spo2}% on {o2}.",
+    "{med} was started at {time} for {reason}; repeat labs showed {lab}.",
+    "Overnight the patient was {state}. Vitals notable for HR {hr} and BP {sbp}/{dbp}. Plan to continue {med}.",
+    "Hospital day {day}: {lab}. Assessment: {dx} with {trend} course. {med} dose adjusted.",
+    "Rapid response called at {time} for {event}. Transferred to ICU for closer monitoring.",
+    "Imaging: CT {site} showed {finding}. Discussed with {team}, who recommended {rec}.",
+    "Patient was given {med} at {time}. Unable to confirm home dose; family reports limited history.",
+    "Repeat ABG at {time}: pH {ph}, pCO2 {pco2}. {o2} titrated to SpO2 goal 92-96%.",
+]
+
+STATES = ["lethargic", "agitated", "more somnolent", "hypotensive", "tachypneic", "stable", "confused"]
+REASONS = ["suspected infection", "volume overload", "agitation", "hyperkalemia", "pain", "rate control"]
+EVENTS = ["acute desaturation", "hypotension to 70s systolic", "new confusion", "chest pain", "Hct drop from 31 to 22"]
+SITES = ["abdomen/pelvis", "chest", "head", "chest PE protocol"]
+FINDINGS = ["large volume ascites", "new hemoperitoneum", "bilateral infiltrates", "no acute process", "segmental filling defects"]
+TEAMS = ["surgery", "IR", "GI", "cardiology", "pulmonary"]
+RECS = ["conservative management", "repeat imaging in AM", "urgent intervention", "serial Hct checks"]
+O2 = ["RA", "2L NC", "4L NC", "NRB", "BiPAP", "ventilator"]
+
+
+def _case_rng(i: int, seed: int) -> random.Random:
+    return random.Random(seed * 1_000_003 + i)
+
+
+def _course_line(rng: random.Random, case: Dict, day: int) -> str:
+    return rng.choice(COURSE_TEMPLATES).format(
+        day=day,
+        time=f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}",
+        state=rng.choice(STATES),
+        sbp=rng.randint(70, 160), dbp=rng.randint(40, 95), hr=rng.randint(55, 140),
+        rr=rng.randint(12, 34), spo2=rng.randint(82, 100), o2=rng.choice(O2),
+        med=rng.choice(case["meds"]), reason=rng.choice(REASONS), lab=rng.choice(case["labs"]),
+        dx=case["dx"], trend=rng.choice(["worsening", "improving", "stable"]),
+        event=rng.choice(EVENTS), site=rng.choice(SITES), finding=rng.choice(FINDINGS),
+        team=rng.choice(TEAMS), rec=rng.choice(RECS),
+        ph=round(rng.uniform(7.10, 7.48), 2), pco2=rng.randint(28, 80),
+    )
+
+
+def pick_length(rng: random.Random, length: str) -> str:
+    if length != "mixed":
+        return length
+    names = list(MIXED_WEIGHTS)
+    return rng.choices(names, weights=[MIXED_WEIGHTS[n] for n in names])[0]
+
+
+def generate_case(i: int, seed: int = 0, length: str = "mixed") -> Dict:
+    """i번째 합성 케이스 (processed_data.json 레코드 형식)."""
+    rng = _case_rng(i, seed)
+    case = DIAGNOSES[rng.randrange(len(DIAGNOSES))]
+    size = pick_length(rng, length)
+    target = LENGTH_TARGETS[size]
+    dead = rng.random() < 0.3
+    sex = rng.choice(["F", "M"])
+    age = rng.randint(25, 92)
+
+    procedures = []
+    for _, variants in rng.sample(PROCEDURES, k=rng.randint(0, 3)):
+        procedures.append(rng.choice(variants))
+
+    parts = [
+        " \nName:  ___                  Unit No:   ___\n \nAdmission Date:  ___              Discharge Date:   ___\n",
+        f" \nDate of Birth:  ___             Sex:   {sex}\n \nService: {case['service']}\n",
+        f" \nAllergies: \n{rng.choice(['No Known Allergies / Adverse Drug Reactions', 'aspirin / iodine', 'Penicillins'])}\n",
+        f" \nChief Complaint:\n{case['cc']}\n",
+        " \nMajor Surgical or Invasive Procedure:\n" + ("\n".join(f"{p} - ___" for p in procedures) or "None") + "\n",
+        f" \nHistory of Present Illness:\n___ y/o {sex} with PMH of {', '.join(case['pmh'])} who presents with "
+        f"{case['cc'].lower()}. In the ED, initial vs were: T {round(rng.uniform(36.2, 39.4), 1)} "
+        f"HR {rng.randint(60, 135)} BP {rng.randint(80, 170)}/{rng.randint(45, 95)} RR {rng.randint(14, 30)} "
+        f"SpO2 {rng.randint(85, 100)}% {rng.choice(O2)}. {rng.choice(case['labs'])}.\n",
+        " \nPast Medical History:\n" + "\n".join(f"- {p}" for p in case["pmh"]) + "\n",
+        " \nPertinent Results:\n" + "\n".join(
+            f"___ {rng.randint(1, 12):02d}:{rng.randint(0, 59):02d}{rng.choice(['AM', 'PM'])} BLOOD {lab}" for lab in case["labs"]
+        ) + "\n",
+        " \nBrief Hospital Course:\n",
+    ]
+    text = "".join(parts)
+    tail = (
+        f" \nDischarge Disposition:\n{'Expired' if dead else rng.choice(['Home', 'Extended Care', 'Home With Service'])}\n"
+        f" \nDischarge Diagnosis:\n{case['dx']}\n"
+        + (f" \nCause of death: {case['death']}\n" if dead else " \nDischarge Condition:\nMental Status: Clear and coherent.\n")
+    )
+    course: List[str] = []
+    day = 1
+    size_now = len(text) + len(tail)
+    while size_now < target:
+        para = " ".join(_course_line(rng, case, day) for _ in range(rng.randint(3, 6)))
+        para = f"# {case['dx'] if rng.random() < 0.5 else rng.choice(case['pmh'])}: {para}\n"
+        course.append(para)
+        size_now += len(para)
+        day += rng.randint(0, 1)
+    text = text + "".join(course) + tail
+
+    return {
+        "id": str(90_000_000 + i),
+        "status": "dead" if dead else "alive",
+        "sex": sex,
+        "age": age,
+        "admission_type": rng.choice(["EW EMER.", "URGENT", "OBSERVATION ADMIT"]),
+        "admission_location": rng.choice(["EMERGENCY ROOM", "TRANSFER FROM HOSPITAL", "PHYSICIAN REFERRAL"]),
+        "discharge_location": "DIED" if dead else rng.choice(["HOME", "SKILLED NURSING FACILITY", "HOME HEALTH CARE"]),
+        "arrival_transport": rng.choice(["AMBULANCE", "WALK IN"]),
+        "diagnosis": case["dx"],
+        "length_class": size,
+        "text": text,
+    }
+
+
+def iter_cases(n: int, seed: int = 0, length: str = "mixed", start: int = 0) -> Iterator[Dict]:
+    for i in range(start, start + n):
+        yield generate_case(i, seed=seed, length=length)
+
+
+# ──────────────────────────────────────────────
+# 합성 임베딩
+# ──────────────────────────────────────────────
+
+_DX_PATTERN = re.compile(r"Discharge Diagnosis:\s*\n([^\n]+)")
+
+
+class SyntheticEmbedder:
+    """
+    진단 클러스터 중심 + 텍스트 해시 노이즈. 같은 텍스트 → 같은 벡터, 같은 진단 → 가까운 벡터.
+    VectorDBManager.embed_text와 같은 (1, dim) float32 반환.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM, seed: int = 0, noise: float = 0.6):
+        self.dim = dim
+        self.noise = noise
+        rng = np.random.default_rng(seed)
+        self.centroids = rng.standard_normal((len(DIAGNOSES) + 1, dim)).astype(np.float32)
+        self._dx_index = {d["dx"].lower(): k for k, d in enumerate(DIAGNOSES)}
+
+    def _cluster(self, text: str) -> int:
+        m = _DX_PATTERN.search(text or "")
+        if m:
+            return self._dx_index.get(m.group(1).strip().lower(), len(DIAGNOSES))
+        lowered = (text or "").lower()
+        for name, k in self._dx_index.items():
+            if name in lowered:
+                return k
+        return len(DIAGNOSES)
+
+    def embed_text(self, text: str, max_length: int = 512) -> np.ndarray:
+        digest = hashlib.blake2b((text or " ").encode("utf-8"), digest_size=8).digest()
+        rng = np.random.default_rng(int.from_bytes(digest, "little"))
+        vec = self.centroids[self._cluster(text)] + self.noise * rng.standard_normal(self.dim).astype(np.float32)
+        return vec.reshape(1, -1).astype(np.float32)
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        return np.vstack([self.embed_text(t) for t in texts])
+
+
+# ──────────────────────────────────────────────
+# 합성 벡터 DB
+# ──────────────────────────────────────────────
+
+def build_index(n: int, seed: int = 0, length: str = "mixed", embedder: Optional[SyntheticEmbedder] = None,
+                batch_size: int = 10_000):
+    """메모리 내 (faiss 인덱스, metadata 리스트). VectorDBManager.index / .metadata에 그대로 넣어 사용."""
+    import faiss
+
+    embedder = embedder or SyntheticEmbedder(seed=seed)
+    index = faiss.IndexFlatIP(embedder.dim)
+    metadata: List[Dict] = []
+    started = time.perf_counter()
+    for offset in range(0, n, batch_size):
+        batch = list(iter_cases(min(batch_size, n - offset), seed=seed, length=length, start=offset))
+        vectors = embedder.embed_batch([c["text"] for c in batch])
+        faiss.normalize_L2(vectors)
+        index.add(vectors)
+        metadata.extend(batch)
+        done = offset + len(batch)
+        if done == n or (done // batch_size) % 10 == 0:
+            print(f"  [Synthetic] {done}/{n} cases indexed ({time.perf_counter() - started:.1f}s)")
+    return index, metadata
+
+
+def build_vector_db(out_dir: str, n: int, seed: int = 0, length: str = "mixed", batch_size: int = 10_000) -> Path:
+    """VectorDBManager.load()와 같은 파일 형식으로 저장."""
+    import faiss
+
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    index, metadata = build_index(n, seed=seed, length=length, batch_size=batch_size)
+    faiss.write_index(index, str(out / "faiss_index.idx"))
+    with open(out / "metadata.pkl", "wb") as f:
+        pickle.dump(metadata, f)
+    (out / "synthetic.json").write_text(json.dumps(
+        {"n": n, "seed": seed, "length": length, "dim": index.d, "embedder": "synthetic"}, indent=2
+    ), encoding="utf-8")
+    print(f"[OK] Synthetic vector DB: {out} ({index.ntotal} vectors)")
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="합성 퇴원 요약 코퍼스 / 벡터 DB 생성")
+    parser.add_argument("--n", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--length", default="mixed", choices=["mixed", *LENGTH_TARGETS])
+    parser.add_argument("--out", default=None, help="벡터 DB 출력 디렉터리 (faiss_index.idx + metadata.pkl)")
+    parser.add_argument("--jsonl", default=None, help="케이스 텍스트를 JSONL로 저장 (임베딩 없이)")
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    args = parser.parse_args()
+
+    if not args.out and not args.jsonl:
+        parser.error("--out 또는 --jsonl 중 하나는 필요")
+    if args.jsonl:
+        path = Path(args.jsonl)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            for case in iter_cases(args.n, seed=args.seed, length=args.length):
+                f.write(json.dumps(case, ensure_ascii=False) + "\n")
+        print(f"[OK] Saved {args.n} cases: {path}")
+    if args.out:
+        build_vector_db(args.out, args.n, seed=args.seed, length=args.length, batch_size=args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+그래프 실행 모드 벤치마크: sequential vs parallel 종단 지연 시간 비교
+
+실행:
+    python scripts/benchmark_graph_modes.py --repeats 2 --max-workers 4
+
+- 같은 patient_case / similar_cases로 두 모드를 번갈아 실행 (에피소딕 메모리 저장 없음)
+- run_agent_critique와 같은 자원(RAG + 에피소딕 메모리)과 유사 케이스 검색 → Verifier / top-k 비교 /
+  verifier ‖ 대안 해석 합류까지 실제 DAG 전체를 측정
+- critic 결과 메모(memo.py)는 끔: 첫 실행이 채운 메모를 다음 실행이 읽으면 speedup이 부풀려짐
+- 각 실행의 end-to-end 지연(초)과 평균/최소, speedup을 출력
+- --output 지정 시 결과를 JSON으로 저장
+- 재현 가능한 측정: 1회 기록 후 오프라인 재생 (OpenAI/NCBI/임베딩 모델 호출 없음)
+    python scripts/benchmark_graph_modes.py --cassette runs/case.cassette.json --cassette-mode record --repeats 1
+    python scripts/benchmark_graph_modes.py --cassette runs/case.cassette.json --replay-latency 1.0
+  --replay-latency: 기록된 호출 지연 × 배수만큼 대기 (0이면 순수 오케스트레이션 비용만 측정)
+"""
+
+import sys
+import json
+import time
+import argparse
+from contextlib import nullcontext
+from pathlib import Path
+from statistics import mean
+
+# 프로젝트 루트 추가
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from src.critic.memo import CriticMemo, get_critic_memo, set_critic_memo
+from src.llm.cassette import use_cassette
+from src.pipeline import MedicalCritiqueGraph
+from scripts.run_agent_critique import (
+    build_patient_case,
+    extract_case_diagnosis,
+    load_patient_case,
+    load_shared_resources,
+    retrieve_similar_cases,
+)
+
+
+class _ReadOnlyEpisodicStore:
+    """에피소드 검색만 허용 (실행마다 결과를 저장하면 다음 실행의 episodic_lessons가 달라짐)."""
+
+    def __init__(self, store):
+        self._store = store
+
+    def __getattr__(self, name):
+        return getattr(self._store, name)
+
+    def add_episode(self, *args, **kwargs):
+        return None
+
+
+def time_run(graph: MedicalCritiqueGraph, patient_case: dict, similar_cases: list) -> float:
+    start = time.perf_counter()
+    graph.run(patient_case=patient_case, similar_cases=similar_cases)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MedicalCritiqueGraph sequential vs parallel latency")
+    parser.add_argument("--patient", default="data/patient.json")
+    parser.add_argument("--repeats", type=int, default=2)
+    parser.add_argument("--max-workers", type=int, default=4)
+    parser.add_argument("--db-path", default="vector_db")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--similarity-threshold", type=float, default=0.7)
+    parser.add_argument("--output", default=None, help="결과 JSON 저장 경로 (선택)")
+    parser.add_argument("--cassette", default=None, help="외부 호출 기록/재생 파일 (src/llm/cassette.py)")
+    parser.add_argument("--cassette-mode", choices=["record", "replay"], default="replay")
+    parser.add_argument("--replay-latency", type=float, default=0.0,
+                        help="재생 시 기록된 지연 배수 (0=지연 없음, 1=기록 당시와 동일)")
+    args = parser.parse_args()
+
+    cassette_ctx = (
+        use_cassette(args.cassette, mode=args.cassette_mode, latency_scale=args.replay_latency)
+        if args.cassette else nullcontext()
+    )
+    # 모든 실행이 lens/behavior 도구와 CritiqueBuilder를 실제로 호출하도록 메모 끔
+    set_critic_memo(CriticMemo(root=None))
+    with cassette_ctx as cassette:
+        rag, episodic = load_shared_resources(args.db_path, episodic_autosave=False)
+        episodic = _ReadOnlyEpisodicStore(episodic) if episodic is not None else None
+        patient_data = load_patient_case(args.patient)
+        # 진단 추출 / 유사 케이스 검색은 1회만 (두 모드가 같은 입력으로 실행)
+        patient_case = build_patient_case(patient_data, extract_case_diagnosis(patient_data.get("text", "")))
+        similar_cases = retrieve_similar_cases(rag, patient_case, args.top_k, args.similarity_threshold)
+
+        graphs = {
+            mode: MedicalCritiqueGraph(
+                rag_retriever=rag,
+                episodic_store=episodic,
+                execution_mode=mode,
+                max_workers=args.max_workers,
+            )
+            for mode in ("sequential", "parallel")
+        }
+        latencies = {mode: [] for mode in graphs}
+
+        # 모드를 번갈아 실행해 API 지연 변동이 한쪽에 몰리지 않도록 함
+        for i in range(args.repeats):
+            for mode, graph in graphs.items():
+                print(f"\n[Benchmark] run {i + 1}/{args.repeats} mode={mode}")
+                latencies[mode].append(time_run(graph, patient_case, similar_cases))
+                print(f"[Benchmark] mode={mode} latency={latencies[mode][-1]:.2f}s")
+
+    summary = {
+        mode: {
+            "runs": [round(x, 3) for x in xs],
+            "mean_s": round(mean(xs), 3),
+            "min_s": round(min(xs), 3),
+        }
+        for mode, xs in latencies.items()
+    }
+    seq_mean = summary["sequential"]["mean_s"]
+    par_mean = summary["parallel"]["mean_s"]
+    summary["speedup"] = round(seq_mean / par_mean, 3) if par_mean else None
+    summary["max_workers"] = args.max_workers
+    summary["similar_cases"] = len(similar_cases)
+    summary["critic_memo"] = get_critic_memo().snapshot()
+    if cassette is not None:
+        summary["cassette"] = cassette.summary()
+
+    print("\n" + "=" * 60)
+    print("End-to-end latency (s)")
+    for mode in graphs:
+        s = summary[mode]
+        print(f"  {mode:<10} mean={s['mean_s']:.2f}  min={s['min_s']:.2f}  runs={s['runs']}")
+    print(f"  speedup (sequential / parallel): {summary['speedup']}")
+    print(f"  similar cases: {summary['similar_cases']}  critic memo: {summary['critic_memo']}")
+    if cassette is not None:
+        print(f"  cassette: {summary['cassette']['mode']} {summary['cassette']['stats']}")
+
+    if args.output:
+        out = Path(args.output)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"[OK] Saved: {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,12 @@ def main():
     from src.pipeline import AgentState, clean_state_to_agent_state, agent_state_to_clean_updates
     print("pipeline state/adapter: OK")
 
+    # 무거운 의존성은 첫 사용 시 import (import 시간 예산은 benchmarks/startup.py)
+    heavy = [m for m in ("torch", "transformers", "faiss", "numpy", "Bio", "openai", "langgraph") if m in sys.modules]
+    if heavy:
+        raise RuntimeError(f"critic/pipeline import만으로 무거운 모듈 로드됨: {heavy}")
+    print("lazy imports (torch/transformers/faiss/numpy/Bio/openai/langgraph 미로드): OK")
+
     # 3) pipeline.graph -> src.agents + src.critic (agents 로드 시 evidence_agent는 Bio 사용)
     try:
         from src.pipeline import MedicalCritiqueGraph
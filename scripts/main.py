@@ -2,6 +2,8 @@ import json
 from pathlib import Path
 from datetime import datetime
 from scripts.run_agent_critique import run_agent_critique_pipeline
+from src.llm.rate_limit import job_deadline
+from src.critic.memo import force_refresh
 
 
 def run_pipeline(input_json: dict) -> dict:
@@ -18,15 +20,26 @@ def run_pipeline(input_json: dict) -> dict:
     top_k = int(input_json.get("top_k", 3))
     similarity_threshold = float(input_json.get("similarity_threshold", 0.7))
     max_iterations = int(input_json.get("max_iterations", 3))
+    execution_mode = input_json.get("execution_mode", "sequential")
+    max_workers = int(input_json.get("max_workers", 4))
+    prefetch = bool(input_json.get("prefetch", True))
+    # 잡 마감(초): critic 도구 선택이 남은 시간에 맞춰 비싼 도구부터 제외
+    deadline_s = input_json.get("deadline_s")
+    # critic 메모 무시 후 재계산 (같은 케이스를 다시 돌려도 새 비판을 받고 싶을 때)
+    refresh_cache = bool(input_json.get("refresh_cache", False))
 
     # 3) 파이프라인 실행
-    result = run_agent_critique_pipeline(
-        patient_data=patient_data,
-        db_path=db_path,
-        top_k=top_k,
-        similarity_threshold=similarity_threshold,
-        max_iterations=max_iterations,
-    )
+    with job_deadline(float(deadline_s) if deadline_s else None), force_refresh(refresh_cache):
+        result = run_agent_critique_pipeline(
+            patient_data=patient_data,
+            db_path=db_path,
+            top_k=top_k,
+            similarity_threshold=similarity_threshold,
+            max_iterations=max_iterations,
+            execution_mode=execution_mode,
+            max_workers=max_workers,
+            prefetch=prefetch,
+        )
     return result
 
 
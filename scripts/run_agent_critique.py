@@ -5,6 +5,7 @@ import json
 from pathlib import Path
 from datetime import datetime
 import re
+from typing import TYPE_CHECKING
 
 # 프로젝트 루트 추가
 sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -12,9 +13,15 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from dotenv import load_dotenv
 load_dotenv()
 
-from src.pipeline import MedicalCritiqueGraph
+from src.pipeline.prefetch import start_prefetch, submit_clinical_analysis
+from src.agents.case_profile import extract_case_profile, profile_to_diagnosis_result
 from src.retrieval.rag_retriever import RAGRetriever
 from src.memory import EpisodicMemoryStore
+from src.llm.openai_chat import OpenAIChatConfig, call_openai_chat_completions
+
+if TYPE_CHECKING:
+    # 그래프(langgraph + 전체 에이전트)는 실행 시점에 import → 헬퍼만 쓰는 스크립트는 import 비용 없음
+    from src.pipeline import MedicalCritiqueGraph
 
 
 def load_patient_case(path: str) -> dict:
@@ -50,7 +57,6 @@ def extract_diagnosis_from_text(clinical_text: str) -> dict:
             "reasoning": str
         }
     """
-    from openai import OpenAI
     import os
     
     # 1단계: 정규표현식으로 진단 섹션 우선 추출 (토큰 절약)
@@ -71,8 +77,6 @@ def extract_diagnosis_from_text(clinical_text: str) -> dict:
     
     # 2단계: GPT-4o로 진단 추출 (Primary + Secondary)
     try:
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        
         prompt = f"""Extract diagnoses from the clinical text.
 
 Clinical Text:
@@ -104,15 +108,13 @@ Text:
 {text_to_analyze}
 """
         
-        response = client.chat.completions.create(
-            model=os.getenv("LLM_MODEL", "gpt-4o"),
-            max_tokens=800,
-            temperature=0,
-            messages=[{"role": "user", "content": prompt}]
+        response_text = call_openai_chat_completions(
+            messages=[{"role": "user", "content": prompt}],
+            config=OpenAIChatConfig(model=os.getenv("LLM_MODEL", "gpt-4o"), temperature=0.0, max_tokens=800, max_retries=2),
         )
         
         # JSON 파싱
-        response_text = response.choices[0].message.content.strip()
+        response_text = response_text.strip()
         # JSON 코드 블록 제거
         response_text = re.sub(r'```json\s*|\s*```', '', response_text).strip()
         
@@ -152,16 +154,24 @@ Text:
         }
 
 
-def run_agent_critique_pipeline( #main에 있던 코드를 함수로 묶
-    patient_data: dict,
-    db_path: str = "vector_db",
-    top_k: int = 3,
-    similarity_threshold: float = 0.7,
-    max_iterations: int = 3,
-    ) -> dict:
-    
-    # 1. RAG Retriever + Episodic Memory 로드
-    print("\n[1/5] Loading RAG retriever + Episodic Memory...")
+def extract_case_diagnosis(clinical_text: str, case_profile: dict = None) -> dict:
+    """
+    case profile(진단 + 차트 구조화 1회 호출, 캐시) 기반 진단.
+    프로파일 추출 실패 시 extract_diagnosis_from_text로 폴백.
+    """
+    profile = case_profile or extract_case_profile(clinical_text)
+    if profile:
+        return profile_to_diagnosis_result(profile)
+    return extract_diagnosis_from_text(clinical_text)
+
+
+def load_shared_resources(db_path: str = "vector_db", episodic_autosave: bool = True) -> tuple:
+    """
+    RAG Retriever + Episodic Memory 로드 (배치 실행에서는 1회만 호출해 모든 케이스가 공유).
+
+    Returns:
+        (rag, episodic) - 로드 실패 시 각각 None
+    """
     try:
         rag = RAGRetriever(db_path=db_path)
     except Exception as e:
@@ -172,81 +182,155 @@ def run_agent_critique_pipeline( #main에 있던 코드를 함수로 묶
     episodic = None
     try:
         shared_embedder = rag.vector_db if rag and hasattr(rag, 'vector_db') else None
-        episodic = EpisodicMemoryStore(shared_embedder=shared_embedder)
+        episodic = EpisodicMemoryStore(shared_embedder=shared_embedder, autosave=episodic_autosave)
         episodic.load()
         print(f"  [EpisodicMemory] {episodic.episode_count}건의 과거 경험 로드됨")
     except Exception as e:
         print(f"  Warning: Episodic Memory not loaded ({e})")
         episodic = None
-    
+    return rag, episodic
 
-    # LLM 기반 진단 추출
-    clinical_text = patient_data.get("text", "")
-    print(f"  Clinical text length: {len(clinical_text)} chars")
-    print(f"  Extracting diagnosis with LLM...")
-    
-    diagnosis_result = extract_diagnosis_from_text(clinical_text)
-    
-    patient_case = {
+
+def patient_metadata(patient_data: dict) -> dict:
+    """원문 + 메타데이터 (진단 추출 전). prefetch(critic router)와 patient_case가 같은 값을 쓰도록 공용."""
+    return {
         "patient_id": patient_data.get("id"),
+        "clinical_text": patient_data.get("text", ""),
+        "outcome": patient_data.get("status"),
+        "age": patient_data.get("age"),
+        "sex": patient_data.get("sex"),
+        "admission_type": patient_data.get("admission_type"),
+        "admission_location": patient_data.get("admission_location"),
+    }
+
+
+def build_patient_case(patient_data: dict, diagnosis_result: dict) -> dict:
+    return {
+        **patient_metadata(patient_data),
         "diagnosis": diagnosis_result["diagnosis"],
         "secondary_diagnoses": diagnosis_result.get("secondary_diagnoses", []),
         "key_conditions": diagnosis_result.get("key_conditions", []),
+        "chief_complaint": diagnosis_result.get("chief_complaint", []),
+        "comorbidities": diagnosis_result.get("comorbidities", []),
         "diagnosis_confidence": diagnosis_result["confidence"],
         "diagnosis_reasoning": diagnosis_result["reasoning"],
-        "clinical_text": clinical_text,
-        "outcome": patient_data.get("status"),
-        "age": patient_data.get("age"),
-        "sex": patient_data.get("sex")
     }
-    
-    print(f"  Patient ID: {patient_case['patient_id']}")
-    print(f"  Primary Diagnosis: {diagnosis_result['diagnosis']}")
-    print(f"  Secondary Diagnoses: {diagnosis_result.get('secondary_diagnoses', [])}")
-    print(f"  Key Conditions: {diagnosis_result.get('key_conditions', [])}")
-    print(f"  Confidence: {diagnosis_result['confidence']}")
-    print(f"  Reasoning: {diagnosis_result['reasoning']}")
-    print(f"  Outcome: {patient_case['outcome']}")
-    
 
 
-    # 3. Top-K 유사 케이스 검색 (근거용) + 품질 검증
-    print("\n[3/5] Retrieving similar cases (top_k=3)...")
-    similar_cases = []
-    if rag:
-        try:
-            cohort_data = rag.retrieve_with_patient(patient_case, top_k=3)
-            raw_cases = cohort_data.get("similar_cases", [])
-            
-            # 유사도 품질 검증
-            valid_cases = []
-            for case in raw_cases:
-                similarity = case.get("similarity", 0)
-                if similarity >= 0.7:
-                    valid_cases.append(case)
-                    print(f"  OKAY Case {case.get('id')}: similarity={similarity:.3f} [VALID]")
-                else:
-                    print(f"  BAD Case {case.get('id')}: similarity={similarity:.3f} [REJECTED - below 0.7]")
-            
-            similar_cases = valid_cases
-            
-            if len(valid_cases) == 0:
-                print(f"  (Warning!!!) No valid similar cases (all below 0.7 threshold)")
-                print(f"  → CRAG will use external PubMed only")
+def retrieve_similar_cases(rag, patient_case: dict, top_k: int = 3, similarity_threshold: float = 0.7) -> list:
+    """Top-K 유사 케이스 검색 (근거용) + 유사도 품질 검증"""
+    if not rag:
+        return []
+    try:
+        cohort_data = rag.retrieve_with_patient(patient_case, top_k=top_k)
+        raw_cases = cohort_data.get("similar_cases", [])
+        
+        # 유사도 품질 검증
+        valid_cases = []
+        for case in raw_cases:
+            similarity = case.get("similarity", 0)
+            if similarity >= similarity_threshold:
+                valid_cases.append(case)
+                print(f"  OKAY Case {case.get('id')}: similarity={similarity:.3f} [VALID]")
             else:
-                print(f"  Found {len(valid_cases)} valid similar cases")
-                
-        except Exception as e:
-            print(f"  Warning: Similar case retrieval failed ({e})")
+                print(f"  BAD Case {case.get('id')}: similarity={similarity:.3f} [REJECTED - below {similarity_threshold}]")
+        
+        if len(valid_cases) == 0:
+            print(f"  (Warning!!!) No valid similar cases (all below {similarity_threshold} threshold)")
+            print(f"  → CRAG will use external PubMed only")
+        else:
+            print(f"  Found {len(valid_cases)} valid similar cases")
+        return valid_cases
+            
+    except Exception as e:
+        print(f"  Warning: Similar case retrieval failed ({e})")
+        return []
+
+
+def run_agent_critique_pipeline( #main에 있던 코드를 함수로 묶
+    patient_data: dict,
+    db_path: str = "vector_db",
+    top_k: int = 3,
+    similarity_threshold: float = 0.7,
+    max_iterations: int = 3,
+    execution_mode: str = "sequential",
+    max_workers: int = 4,
+    prefetch: bool = True,
+    resources: tuple = None,
+    graph: "MedicalCritiqueGraph" = None,
+    verbose: bool = True,
+    ) -> dict:
+    """
+    Args:
+        resources: load_shared_resources()의 (rag, episodic). 주면 로딩을 건너뜀 (배치 실행)
+        graph: 재사용할 MedicalCritiqueGraph (없으면 resources로 생성). 그래프는 실행 간 상태가 없어 공유 가능
+        verbose: False면 [5/5] 결과 출력 생략
+    """
     
-    # 4. 그래프 생성 및 실행
-    print("\n[4/5] Running agent graph...")
-    graph = MedicalCritiqueGraph(rag_retriever=rag, episodic_store=episodic)
+    # 0. Prefetch: 원문만 필요한 LLM 호출(case profile = 진단 + 차트 구조화, critic router)을 RAG 로딩과 겹쳐 시작
+    clinical_text = patient_data.get("text", "")
+    prefetch_handle = None
+    if prefetch:
+        # critic router 휴리스틱이 outcome(status)을 읽으므로 그래프 안과 같은 메타데이터 전달
+        prefetch_handle = start_prefetch(patient_metadata(patient_data), max_workers=max_workers)
+        # structured_chart 작업과 같은 텍스트 → case profile LLM 호출은 1회만 발생 (캐시 공유)
+        prefetch_handle.submit("case_profile", extract_case_profile, clinical_text)
+
+    try:
+        # 1. RAG Retriever + Episodic Memory 로드
+        if resources is None:
+            print("\n[1/5] Loading RAG retriever + Episodic Memory...")
+            rag, episodic = load_shared_resources(db_path)
+        else:
+            rag, episodic = resources
+
+        # LLM 기반 진단 추출
+        print(f"  Clinical text length: {len(clinical_text)} chars")
+        print(f"  Extracting diagnosis with LLM...")
+        
+        case_profile = prefetch_handle.get("case_profile") if prefetch_handle else None
+        diagnosis_result = extract_case_diagnosis(clinical_text, case_profile)
+        patient_case = build_patient_case(patient_data, diagnosis_result)
+        
+        print(f"  Patient ID: {patient_case['patient_id']}")
+        print(f"  Primary Diagnosis: {diagnosis_result['diagnosis']}")
+        print(f"  Secondary Diagnoses: {diagnosis_result.get('secondary_diagnoses', [])}")
+        print(f"  Key Conditions: {diagnosis_result.get('key_conditions', [])}")
+        print(f"  Confidence: {diagnosis_result['confidence']}")
+        print(f"  Reasoning: {diagnosis_result['reasoning']}")
+        print(f"  Outcome: {patient_case['outcome']}")
+        
+        if prefetch_handle:
+            # evidence 1st의 임상 맥락 분석은 진단명이 필요 → 진단 추출 직후 시작 (유사 케이스 검색과 겹침)
+            submit_clinical_analysis(prefetch_handle, patient_case)
+
+        # 3. Top-K 유사 케이스 검색 (근거용) + 품질 검증
+        print(f"\n[3/5] Retrieving similar cases (top_k={top_k})...")
+        similar_cases = retrieve_similar_cases(rag, patient_case, top_k, similarity_threshold)
+        
+        # 4. 그래프 생성 및 실행
+        print(f"\n[4/5] Running agent graph (mode={execution_mode}, max_workers={max_workers})...")
+        if graph is None:
+            from src.pipeline import MedicalCritiqueGraph
+            graph = MedicalCritiqueGraph(
+                rag_retriever=rag,
+                episodic_store=episodic,
+                execution_mode=execution_mode,
+                max_workers=max_workers,
+            )
+        
+        result = graph.run(
+            patient_case=patient_case,
+            similar_cases=similar_cases,  # top-k=3 유사 케이스 전달
+            prefetch=prefetch_handle,
+            max_iterations=max_iterations,  # CritiqueBuilder 반복 개선 상한
+        )
+    finally:
+        if prefetch_handle:
+            prefetch_handle.close()
     
-    result = graph.run(
-        patient_case=patient_case,
-        similar_cases=similar_cases  # top-k=3 유사 케이스 전달
-    )
+    if not verbose:
+        return result
     
     # 5. 결과 출력
     print("\n[5/5] Results:")
@@ -260,7 +344,7 @@ def run_agent_critique_pipeline( #main에 있던 코드를 함수로 묶
     if patient_case.get('key_conditions'):
         print(f"  Key Conditions: {', '.join(patient_case['key_conditions'])}")
     print(f"  Confidence: {patient_case.get('diagnosis_confidence', 'N/A')}")
-    print(f"  Method: GPT-4o extraction")
+    print(f"  Method: GPT-4o case profile extraction")
     
     # 검색 품질
     evidence = result.get("evidence", {})
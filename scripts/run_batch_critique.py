@@ -0,0 +1,399 @@
+"""
+배치 코호트 실행: 여러 케이스(예: 전체 사망 입원)를 한 프로세스에서 critique
+
+실행:
+    python scripts/run_batch_critique.py --input data/processed_data.json --status dead --limit 500 --concurrency 4
+    python scripts/run_batch_critique.py --input cases.jsonl --output-dir outputs/batch/nightly   # 재실행 시 이어서
+
+- 입력: JSONL(한 줄 = 한 케이스), CSV(id,status,text,... 컬럼), JSON(processed_data.json 형식 리스트 또는 단일 케이스)
+- RAG / 임베딩 모델 / 에피소딕 메모리 / 그래프는 1회만 로드해 모든 케이스가 공유
+- --concurrency개 케이스를 동시에 파이프라인 (각 케이스 내부 노드 병렬도는 --execution-mode/--max-workers)
+- 완료 케이스는 즉시 results.jsonl에 한 줄씩 추가 (체크포인트). 재실행 시 status=ok인 case_id는 건너뜀
+- 케이스별 예외는 error 레코드로 남기고 배치는 계속 진행
+- 종료 시 summary.json: 처리량, 지연(p50/p90/mean/max), LLM 토큰/추정 비용
+- --llm-mode batch: 모든 LLM 요청을 Batch API로 모아 제출 (지연 대신 비용/레이트리밋 우선, src/llm/batch.py)
+    python scripts/run_batch_critique.py --input cases.jsonl --llm-mode batch --batch-backend openai --poll-interval 300
+    python scripts/run_batch_critique.py --input cases.jsonl --llm-mode batch --batch-backend local --local-responder live
+- --llm-backend local: 로컬 OpenAI 호환 서버(llama.cpp / vLLM)로 실행 (CI, 대량 코호트, src/llm/backend.py)
+    python scripts/run_batch_critique.py --input cases.jsonl --llm-backend local --llm-base-url http://localhost:8080/v1 \
+        --local-model qwen2.5-7b-instruct --local-concurrency 4 --concurrency 4
+"""
+
+import os
+import sys
+import csv
+import math
+import json
+import time
+import argparse
+import threading
+import traceback
+from pathlib import Path
+from datetime import datetime
+from statistics import mean
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# 프로젝트 루트 추가
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from src.pipeline import MedicalCritiqueGraph
+from src.llm.usage import UsageTracker, track_usage
+from src.llm.rate_limit import get_rate_limiter, job_deadline, retry_budget
+from src.critic.memo import force_refresh, get_critic_memo
+from src.critic.refine import summarize_refinement
+from src.llm.model_router import router_stats
+from src.critic.router import hybrid_router_stats
+from src.llm.backend import get_backend, set_backend
+from src.llm.batch import (
+    BATCH_PRICE_MULTIPLIER,
+    LocalFileBatchBackend,
+    OpenAIBatchBackend,
+    ResponseStore,
+    live_responder,
+    run_offline_rounds,
+)
+from scripts.run_agent_critique import load_shared_resources, run_agent_critique_pipeline
+
+
+# ──────────────────────────────────────────────
+# 입력 로드
+# ──────────────────────────────────────────────
+
+def load_cases(path: str) -> list:
+    """JSONL / CSV / JSON(리스트 또는 단일 케이스) → 케이스 dict 리스트"""
+    p = Path(path)
+    suffix = p.suffix.lower()
+    if suffix == ".jsonl":
+        with open(p, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    if suffix == ".csv":
+        # 임상 텍스트 컬럼은 매우 길 수 있음
+        csv.field_size_limit(min(sys.maxsize, 2**31 - 1))
+        with open(p, "r", encoding="utf-8", newline="") as f:
+            return [dict(row) for row in csv.DictReader(f)]
+    with open(p, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return data if isinstance(data, list) else [data]
+
+
+def case_id_of(case: dict, index: int) -> str:
+    cid = case.get("id") or case.get("patient_id") or case.get("hadm_id")
+    return str(cid) if cid not in (None, "") else f"row-{index}"
+
+
+def select_cases(cases: list, statuses: list = None, offset: int = 0, limit: int = None) -> list:
+    """status 필터 → offset/limit 슬라이스. (case_id, case) 리스트 반환"""
+    wanted = {s.strip().lower() for s in statuses or [] if s.strip()}
+    selected = [
+        (case_id_of(c, i), c)
+        for i, c in enumerate(cases)
+        if not wanted or str(c.get("status", "")).lower() in wanted
+    ]
+    selected = selected[offset:]
+    return selected[:limit] if limit is not None else selected
+
+
+# ──────────────────────────────────────────────
+# 체크포인트 (results.jsonl)
+# ──────────────────────────────────────────────
+
+def load_completed_ids(results_path: Path) -> set:
+    """이미 status=ok로 끝난 case_id (실패 케이스는 재실행 대상)"""
+    done = set()
+    if not results_path.exists():
+        return done
+    with open(results_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # 중단 시 잘린 마지막 줄
+            if rec.get("status") == "ok":
+                done.add(str(rec.get("case_id")))
+    return done
+
+
+class ResultWriter:
+    """케이스 완료 즉시 한 줄 추가 + flush (여러 워커 스레드에서 호출)"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, record: dict) -> None:
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+
+
+# ──────────────────────────────────────────────
+# 케이스 실행
+# ──────────────────────────────────────────────
+
+def run_case(case_id: str, case: dict, resources: tuple, graph: MedicalCritiqueGraph, args) -> tuple:
+    """한 케이스 실행. 예외는 error 레코드로 변환 (배치 중단 없음). (record, UsageTracker) 반환"""
+    tracker = UsageTracker()
+    started = time.perf_counter()
+    record = {"case_id": case_id, "started_at": datetime.now().isoformat()}
+    try:
+        # 케이스별 재시도 상한 (429 폭주 시 한 케이스가 재시도를 독점하지 않도록)
+        # 케이스별 마감: critic 도구 선택이 남은 시간에 맞춰 비싼 도구부터 제외
+        # --refresh-critic-cache: critic 메모를 읽지 않고 새로 계산해 덮어씀
+        with track_usage(tracker), retry_budget(args.retry_budget), job_deadline(args.deadline_s), \
+                force_refresh(args.refresh_critic_cache):
+            result = run_agent_critique_pipeline(
+                patient_data=case,
+                top_k=args.top_k,
+                similarity_threshold=args.similarity_threshold,
+                execution_mode=args.execution_mode,
+                max_workers=args.max_workers,
+                prefetch=not args.no_prefetch,
+                max_iterations=args.max_iterations,
+                resources=resources,
+                graph=graph,
+                verbose=False,
+            )
+        record.update({"status": "ok", "result": result})
+    except Exception as e:
+        record.update({
+            "status": "error",
+            "error": f"{type(e).__name__}: {e}",
+            "traceback": traceback.format_exc(limit=5),
+        })
+    record["latency_s"] = round(time.perf_counter() - started, 3)
+    record["usage"] = tracker.to_dict()
+    return record, tracker
+
+
+def percentile(values: list, q: float) -> float:
+    """nearest-rank 백분위수"""
+    if not values:
+        return None
+    xs = sorted(values)
+    k = max(0, min(len(xs) - 1, math.ceil(q / 100 * len(xs)) - 1))
+    return xs[k]
+
+
+def build_summary(records: list, skipped: int, wall_s: float, usage: UsageTracker, args) -> dict:
+    ok = [r for r in records if r["status"] == "ok"]
+    latencies = [r["latency_s"] for r in ok]
+    usage_dict = usage.to_dict()
+    return {
+        "input": args.input,
+        "finished_at": datetime.now().isoformat(),
+        "cases_run": len(records),
+        "cases_ok": len(ok),
+        "cases_failed": len(records) - len(ok),
+        "cases_skipped_resume": skipped,
+        "failed_case_ids": [r["case_id"] for r in records if r["status"] != "ok"],
+        "wall_time_s": round(wall_s, 3),
+        "throughput_cases_per_min": round(len(records) / wall_s * 60, 3) if wall_s > 0 else None,
+        "latency_s": {
+            "p50": percentile(latencies, 50),
+            "p90": percentile(latencies, 90),
+            "mean": round(mean(latencies), 3) if latencies else None,
+            "max": max(latencies) if latencies else None,
+        },
+        "llm_usage": usage_dict,
+        "rate_limit": get_rate_limiter().snapshot(),
+        # 호출 지점별 모델 티어 통계 (승격률/지연/비용) → 라우팅 정책 튜닝용
+        "model_routing": router_stats(),
+        # critic 도구 라우터: 휴리스틱/LLM/캐시 결정 비율, LLM-휴리스틱 일치율, 생략한 LLM 호출 지연 추정
+        "critic_routing": hybrid_router_stats(),
+        # critic 결과 메모 (도구/CritiqueBuilder hit/miss/쓰기/삭제)
+        "critic_memo": get_critic_memo().snapshot(),
+        # CritiqueBuilder 반복 횟수 대비 품질(남은 문제 수, Verifier 일치율)/지연 → max_iterations 튜닝용
+        "critic_refinement": summarize_refinement((r.get("result") or {}).get("critic_refinement") for r in ok),
+        "cost_per_case_usd": round(usage_dict["cost_usd"] / len(records), 6) if records else None,
+        "config": {
+            "concurrency": args.concurrency,
+            "max_iterations": args.max_iterations,
+            "execution_mode": args.execution_mode,
+            "max_workers": args.max_workers,
+            "prefetch": not args.no_prefetch,
+            "llm_mode": args.llm_mode,
+            "llm_backend": get_backend().kind,
+        },
+    }
+
+
+def build_batch_backend(args):
+    if args.batch_backend == "openai":
+        return OpenAIBatchBackend()
+    responder = live_responder if args.local_responder == "live" else None
+    return LocalFileBatchBackend(Path(args.batch_dir) / "local_backend", responder=responder)
+
+
+def run_online(pending: list, resources: tuple, graph: MedicalCritiqueGraph, args, on_record) -> None:
+    """케이스 단위 스레드 풀로 즉시 호출 (기본 모드)"""
+    executor = ThreadPoolExecutor(max_workers=max(1, args.concurrency), thread_name_prefix="batch-case")
+    try:
+        futures = [executor.submit(run_case, cid, c, resources, graph, args) for cid, c in pending]
+        for future in as_completed(futures):
+            on_record(*future.result())
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def run_offline(pending: list, resources: tuple, graph: MedicalCritiqueGraph, args, on_record) -> dict:
+    """
+    Batch API 모드: 라운드마다 전체 케이스를 replay → 새 LLM 요청을 배치로 제출 → 완료 후 다음 라운드.
+    """
+    rag, episodic = resources
+    if episodic is not None:
+        # 라운드 사이에 다른 케이스 에피소드가 검색되면 프롬프트가 바뀌어 replay가 진행되지 않음
+        episodic.freeze_search()
+    cases = dict(pending)
+    return run_offline_rounds(
+        case_ids=list(cases),
+        run_case=lambda cid: run_case(cid, cases[cid], resources, graph, args),
+        backend=build_batch_backend(args),
+        store=ResponseStore(args.batch_dir),
+        on_done=lambda cid, out: on_record(*out),
+        concurrency=args.concurrency,
+        poll_interval_s=args.poll_interval,
+        max_rounds=args.max_rounds,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch M&M critique over a cohort")
+    parser.add_argument("--input", required=True, help="JSONL / CSV / processed_data.json")
+    parser.add_argument("--output-dir", default="outputs/batch", help="results.jsonl, summary.json 저장 위치")
+    parser.add_argument("--status", default=None, help="포함할 status (쉼표 구분, 예: dead,expired)")
+    parser.add_argument("--offset", type=int, default=0)
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--concurrency", type=int, default=2, help="동시에 실행할 케이스 수")
+    parser.add_argument("--execution-mode", default="sequential", choices=["sequential", "parallel"])
+    parser.add_argument("--max-workers", type=int, default=4, help="케이스 내부 노드/prefetch 스레드 수")
+    parser.add_argument("--db-path", default="vector_db")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--similarity-threshold", type=float, default=0.7)
+    parser.add_argument("--no-prefetch", action="store_true")
+    parser.add_argument("--checkpoint-every", type=int, default=10, help="에피소딕 메모리 디스크 저장 주기 (케이스 수)")
+    parser.add_argument("--retry-budget", type=int, default=20, help="케이스당 LLM 재시도 총 횟수 상한")
+    parser.add_argument("--deadline-s", type=float, default=None, help="케이스당 마감 시간(초). critic 도구 예산에 반영")
+    parser.add_argument("--max-iterations", type=int, default=3,
+                        help="CritiqueBuilder 최대 회차 (첫 생성 포함, 일관성 검사 통과 시 조기 종료)")
+    parser.add_argument("--refresh-critic-cache", action="store_true",
+                        help="critic 도구/CritiqueBuilder 메모를 무시하고 새로 계산 (결과로 메모 갱신)")
+    parser.add_argument("--llm-mode", default="online", choices=["online", "batch"],
+                        help="online: 즉시 호출 / batch: Batch API로 모아 제출 (라운드 replay)")
+    parser.add_argument("--batch-backend", default="local", choices=["local", "openai"])
+    parser.add_argument("--batch-dir", default=None, help="응답 저장소/로컬 백엔드 경로 (기본: <output-dir>/batch_api)")
+    parser.add_argument("--local-responder", default="none", choices=["none", "live"],
+                        help="local 백엔드 응답 생성: none(외부에서 output.jsonl 작성) / live(동기 API로 처리)")
+    parser.add_argument("--poll-interval", type=float, default=30.0, help="배치 완료 polling 간격(초)")
+    parser.add_argument("--max-rounds", type=int, default=50)
+    parser.add_argument("--llm-backend", default=None, choices=["openai", "local"],
+                        help="LLM 백엔드 (기본: LLM_BACKEND 환경변수, 없으면 openai)")
+    parser.add_argument("--llm-base-url", default=None, help="OpenAI 호환 서버 base URL (예: http://localhost:8080/v1)")
+    parser.add_argument("--local-model", default=None, help="로컬 서버 모델명 (LLM_LOCAL_MODEL)")
+    parser.add_argument("--local-concurrency", type=int, default=None, help="로컬 서버 동시 요청 슬롯 (LLM_LOCAL_CONCURRENCY)")
+    args = parser.parse_args()
+
+    # 백엔드 설정은 환경변수로 넘겨 모든 LLM 호출 경로(REST/SDK/배치 responder)가 같은 설정을 사용
+    for env, value in (
+        ("LLM_BACKEND", args.llm_backend),
+        ("LLM_BASE_URL", args.llm_base_url),
+        ("LLM_LOCAL_MODEL", args.local_model),
+        ("LLM_LOCAL_CONCURRENCY", args.local_concurrency),
+    ):
+        if value is not None:
+            os.environ[env] = str(value)
+    set_backend(None)
+    backend = get_backend()
+
+    out_dir = Path(args.output_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    results_path = out_dir / "results.jsonl"
+    args.batch_dir = args.batch_dir or str(out_dir / "batch_api")
+
+    statuses = args.status.split(",") if args.status else None
+    selected = select_cases(load_cases(args.input), statuses, args.offset, args.limit)
+    completed = load_completed_ids(results_path)
+    pending = [(cid, c) for cid, c in selected if cid not in completed]
+    skipped = len(selected) - len(pending)
+
+    print("=" * 60)
+    print("Batch Medical Critique")
+    print("=" * 60)
+    print(f"  Selected: {len(selected)} cases  (resume skip: {skipped}, to run: {len(pending)})")
+    print(f"  Concurrency: {args.concurrency}  mode={args.execution_mode}  max_workers={args.max_workers}"
+          f"  llm_mode={args.llm_mode}")
+    print(f"  LLM backend: {backend.kind} {backend.base_url}"
+          + (f"  model={backend.model_override or '(as requested)'} slots={backend.concurrency}"
+             f" json={backend.json_strategy}" if backend.is_local else ""))
+    if not pending:
+        print("  Nothing to do.")
+        return
+
+    # 모델/인덱스/그래프 1회 로드
+    print("\n[Batch] Loading shared resources...")
+    rag, episodic = load_shared_resources(args.db_path, episodic_autosave=False)
+    graph = MedicalCritiqueGraph(
+        rag_retriever=rag,
+        episodic_store=episodic,
+        execution_mode=args.execution_mode,
+        max_workers=args.max_workers,
+    )
+
+    writer = ResultWriter(results_path)
+    batch_usage = UsageTracker()
+    records = []
+    batch_stats = None
+
+    def on_record(record: dict, case_usage: UsageTracker) -> None:
+        writer.write(record)
+        records.append(record)
+        batch_usage.merge(case_usage)
+        print(f"[Batch] {len(records)}/{len(pending)} case={record['case_id']} "
+              f"status={record['status']} latency={record['latency_s']:.1f}s")
+        if episodic is not None and len(records) % max(1, args.checkpoint_every) == 0:
+            episodic.save()
+
+    started = time.perf_counter()
+    try:
+        if args.llm_mode == "batch":
+            batch_stats = run_offline(pending, (rag, episodic), graph, args, on_record)
+        else:
+            run_online(pending, (rag, episodic), graph, args, on_record)
+    except KeyboardInterrupt:
+        print("\n[Batch] Interrupted → 완료된 케이스는 results.jsonl에 저장됨 (재실행 시 이어서 진행)")
+    finally:
+        if episodic is not None:
+            episodic.save()
+
+    summary = build_summary(records, skipped, time.perf_counter() - started, batch_usage, args)
+    if batch_stats is not None:
+        summary["batch_api"] = {
+            **batch_stats,
+            "cost_usd_batch_price": round(summary["llm_usage"]["cost_usd"] * BATCH_PRICE_MULTIPLIER, 6),
+        }
+    summary_path = out_dir / "summary.json"
+    summary_path.write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    print("\n" + "=" * 60)
+    print(f"  Ran {summary['cases_run']} cases: ok={summary['cases_ok']} failed={summary['cases_failed']}")
+    print(f"  Throughput: {summary['throughput_cases_per_min']} cases/min  wall={summary['wall_time_s']}s")
+    lat = summary["latency_s"]
+    print(f"  Latency p50={lat['p50']} p90={lat['p90']} mean={lat['mean']} max={lat['max']}")
+    usage = summary["llm_usage"]
+    print(f"  LLM: {usage['calls']} calls, {usage['prompt_tokens']}+{usage['completion_tokens']} tokens, "
+          f"~${usage['cost_usd']:.4f}")
+    print(f"  Rate limit: throttle={usage['timing']['throttle_s']}s backoff={usage['timing']['backoff_s']}s "
+          f"request={usage['timing']['request_s']}s (throttle_ratio={usage['throttle_ratio']})")
+    for site, st in summary["model_routing"].items():
+        print(f"  [{site}] {st['calls']} calls, escalation={st['escalation_rate']:.0%}, "
+              f"avg={st['avg_latency_s']}s, ~${st['cost_usd']:.4f}")
+    print(f"[OK] Results: {results_path}")
+    print(f"[OK] Summary: {summary_path}")
+
+
+if __name__ == "__main__":
+    main()
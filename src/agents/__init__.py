@@ -1,5 +1,6 @@
 """에이전트 노드: Chart Structurer, Evidence, Diagnosis, Treatment, Router, 조건부 에이전트 등."""
 
+from .case_profile import extract_case_profile
 from .chart_structurer import run_chart_structurer
 from .diagnosis_agent import run_diagnosis_agent
 from .treatment_agent import run_treatment_agent
@@ -8,6 +9,7 @@ from .evidence_agent import (
     run_evidence_agent_2nd_pass,
     format_evidence_summary,
     format_clinical_analysis,
+    build_evidence_prefix,
 )
 from .intervention_checker import check_intervention_coverage
 from .agent_router import run_agent_router
@@ -15,6 +17,7 @@ from .run_conditional_agents import run_conditional_agents
 from .alternative_explanation_agent import run_alternative_explanation_agent
 
 __all__ = [
+    "extract_case_profile",
     "run_chart_structurer",
     "run_diagnosis_agent",
     "run_treatment_agent",
@@ -22,6 +25,7 @@ __all__ = [
     "run_evidence_agent_2nd_pass",
     "format_evidence_summary",
     "format_clinical_analysis",
+    "build_evidence_prefix",
     "check_intervention_coverage",
     "run_agent_router",
     "run_conditional_agents",
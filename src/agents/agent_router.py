@@ -6,10 +6,11 @@ OpenAI LLM 사용. 선택된 에이전트만 이후 run_conditional_agents / run
 from __future__ import annotations
 
 import json
-import os
 from typing import Dict, List, Any
 
 from .llm import get_llm
+from ..llm.backend import llm_available
+from ..llm.model_router import routed_call
 
 
 AGENT_DOCUMENT = """
@@ -34,7 +35,7 @@ def run_agent_router(state: Dict[str, Any]) -> Dict[str, Any]:
     state와 에이전트 문서를 보고, 실행할 에이전트 목록(selected_agents)을 LLM으로 선택.
     API 키 없으면 기본값: risk_factor, process_contributor는 조건 만족 시에만 나중에 실행되므로 [] 가능.
     """
-    if not os.environ.get("OPENAI_API_KEY", "").strip():
+    if not llm_available():
         return {"selected_agents": []}
 
     patient_case = state.get("patient_case") or {}
@@ -85,11 +86,19 @@ Output JSON:
 {{"selected_agents": ["risk_factor", ...], "reason": "one short sentence"}}
 """
 
-    try:
+    def call(model: str) -> Dict:
         llm = get_llm()
-        response = llm.gpt4o(prompt=prompt, temperature=0.1, max_tokens=400, json_mode=True, timeout=30)
+        response = llm.gpt4o(prompt=prompt, temperature=0.1, max_tokens=400, json_mode=True, timeout=30, model=model)
         response = response.strip().replace("```json", "").replace("```", "").strip()
-        obj = json.loads(response)
+        return json.loads(response)
+
+    try:
+        # 라우팅은 small 티어, JSON 파싱 실패/selected_agents 형식 오류면 large 모델로 승격
+        obj = routed_call(
+            "routing", call,
+            validate=lambda o: isinstance(o, dict) and isinstance(o.get("selected_agents"), list),
+            call_site="agent_router",
+        )
         selected = obj.get("selected_agents")
         if not isinstance(selected, list):
             selected = []
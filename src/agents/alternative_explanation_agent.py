@@ -4,16 +4,19 @@ Alternative Explanation Agent: Critic 실행 후 항상 대안 해석·불확실
 
 from __future__ import annotations
 
-import json
-import os
 from typing import Dict, Any
 
 from .llm import get_llm
+from .schemas import AlternativeExplanationAnalysis
+from ..llm.backend import llm_available
+from ..llm.prompt_budget import get_token_budget
+from .evidence_agent import compress_clinical_text
+from ..llm.structured import complete_structured, response_schema
 
 
 def run_alternative_explanation_agent(state: Dict[str, Any]) -> Dict[str, Any]:
     """Critic 이후 항상 LLM으로 대안 해석·불확실성 정리 시도. API 키 없으면 None 반환."""
-    if not os.environ.get("OPENAI_API_KEY", "").strip():
+    if not llm_available():
         return {"alternative_explanations": None}
 
     patient_case = state.get("patient_case") or {}
@@ -22,7 +25,10 @@ def run_alternative_explanation_agent(state: Dict[str, Any]) -> Dict[str, Any]:
     confidence = state.get("confidence", 0.5)
     diagnosis_analysis = state.get("diagnosis_analysis") or {}
     treatment_analysis = state.get("treatment_analysis") or {}
-    text = (patient_case.get("clinical_text") or patient_case.get("text") or "")[:3000]
+    text = compress_clinical_text(
+        patient_case.get("clinical_text") or patient_case.get("text") or "",
+        get_token_budget("alternative_explanation_text"),
+    )
 
     critique_summary = "\n".join(
         f"- {c.get('issue', c.get('point', ''))[:120]}" for c in critique[:8] if isinstance(c, dict)
@@ -48,9 +54,18 @@ Output JSON only:
 
     try:
         llm = get_llm()
-        response = llm.gpt4o(prompt=prompt, temperature=0.2, max_tokens=600, json_mode=True, timeout=45)
-        response = response.strip().replace("```json", "").replace("```", "").strip()
-        analysis = json.loads(response)
+        response = llm.gpt4o(
+            prompt=prompt, temperature=0.2, max_tokens=600, json_mode=True, timeout=45,
+            response_schema=response_schema(AlternativeExplanationAnalysis),
+        )
+        result = complete_structured(
+            AlternativeExplanationAnalysis, response,
+            reask=lambda followup: llm.gpt4o(prompt=f"{prompt}\n\n{followup}", temperature=0.0, max_tokens=300, json_mode=True, timeout=45),
+            label="Alternative Explanation Agent",
+        )
+        if result.parse_failed:
+            raise ValueError("unparseable JSON response")
+        analysis = result.data
         analysis["active"] = True
         print("  [Alternative Explanation Agent] ran")
         return {"alternative_explanations": analysis}
@@ -0,0 +1,290 @@
+"""
+Case Profile - 진단 추출 + 차트 구조화를 1회 LLM 호출로 통합 (텍스트 해시 기준 캐시)
+
+한 케이스를 읽는 세 가지 호출을 대체:
+  - scripts/run_agent_critique.extract_diagnosis_from_text (primary/secondary/key conditions)
+  - retrieval DiagnosisExtractor.extract (쿼리 환자의 chief complaint / primary / comorbidities)
+  - chart_structurer (structured_chart)
+
+같은 텍스트에 대한 동시 호출은 키별 lock으로 1회만 LLM을 부르고 나머지는 캐시를 읽는다.
+캐시는 최근 _CACHE_MAX개만 유지 (배치에서 수천 케이스가 한 프로세스를 지나감), 반환값은 사본.
+"""
+
+import copy
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from .llm import get_llm
+from ..llm.model_router import routed_call
+
+
+CASE_PROFILE_PROMPT = """
+의료 차트에서 진단 프로파일과 핵심 정보를 **구조화된 JSON**으로 한 번에 추출하세요.
+
+규칙:
+- 출력은 **반드시 JSON만** (추가 설명/마크다운 금지)
+- 차트에 **명시된 내용만** 추출 (추론 금지)
+- 정보가 없으면 `null` 또는 `[]` 사용
+- 치료/검사가 시행되었으면 반드시 `interventions_given`에 포함
+
+입력 차트:
+{clinical_text}
+
+{{
+    "diagnosis_profile": {{
+        "primary_diagnosis": "이번 입원/치료의 주 원인 (가장 급성/중증)",
+        "secondary_diagnoses": ["치료에 영향을 주는 활성 동반 질환 (예: Hypertension, Diabetes, CKD)"],
+        "key_conditions": ["결정에 영향을 주는 관련 과거력 (예: prior stroke, GI bleeding)"],
+        "chief_complaint": ["내원 주 증상"],
+        "comorbidities": ["기존 질환 (이번 입원의 주 원인이 아닌 것)"],
+        "confidence": "high/medium/low",
+        "reasoning": "한 문장"
+    }},
+    "demographics": {{
+        "age": 숫자,
+        "sex": "M/F",
+        "chief_complaint": "주 호소"
+    }},
+    "vitals": {{
+        "temperature": 숫자 (°C),
+        "blood_pressure": "수축기/이완기",
+        "heart_rate": 숫자,
+        "respiratory_rate": 숫자,
+        "oxygen_saturation": 숫자 (%),
+        "oxygen_requirement": "room air / O2 via NC / NIV / intubated"
+    }},
+    "symptoms": {{
+        "respiratory": ["dyspnea", "cough", "wheeze", "chest_pain"],
+        "cardiovascular": ["edema", "JVD", "orthopnea"],
+        "systemic": ["fever", "fatigue", "confusion"],
+        "duration": "발현 기간"
+    }},
+    "red_flags": [
+        "명시된 위험 징후들 (예: fever, severe hypoxia, altered mental status)"
+    ],
+    "physical_exam": {{
+        "lung_sounds": "clear / crackles / wheeze / diminished",
+        "heart_sounds": "regular / irregular / murmur",
+        "extremities": "no edema / pitting edema / cyanosis",
+        "jvd_present": true/false
+    }},
+    "laboratory": {{
+        "wbc": 숫자,
+        "procalcitonin": 숫자,
+        "bnp": 숫자,
+        "lactate": 숫자,
+        "abg": {{"ph": 숫자, "pco2": 숫자, "po2": 숫자}}
+    }},
+    "imaging": {{
+        "chest_xray": "소견 (infiltrate, cardiomegaly, clear 등)",
+        "ct_chest": "소견"
+    }},
+    "procedures_performed": [
+        {{
+            "name": "시술명 (Paracentesis, Central Line, Thoracentesis, Chest Tube, LP, Intubation 등)",
+            "technique": "시술 기법 (ultrasound-guided / blind / landmark-based / sterile / not documented)",
+            "timing": "시점",
+            "complications": "합병증 (bleeding, pneumothorax, infection, organ injury 등, 없으면 null)",
+            "safety_flags": ["발견된 안전 문제 (예: 'blind technique', 'no sterile documented', 'puncture site bleeding')"]
+        }}
+    ],
+    "interventions_given": {{
+        "medications": [
+            {{"name": "약물명", "timing": "시점/시간", "route": "경로"}}
+        ],
+        "oxygen_therapy": [
+            {{"type": "NC/NIV/intubation", "timing": "시점"}}
+        ],
+        "fluids": "수액 투여 여부 및 양"
+    }},
+    "clinical_course": {{
+        "improvement": true/false,
+        "deterioration": true/false,
+        "events": ["주요 경과 사건들"],
+        "oxygen_trend": "increasing / stable / decreasing",
+        "symptom_resolution": ["호전된 증상들"]
+    }},
+    "outcome": {{
+        "status": "alive/expired/transferred",
+        "discharge_condition": "텍스트 원문 그대로 (예: 'Expired', 'Improved', 'Stable')",
+        "discharge_location": "HOME/DIED/ICU/등 원문 그대로",
+        "disposition": "ADMITTED/DISCHARGED/TRANSFERRED",
+        "cause_of_death": "사망한 경우, 직접 사망 원인 (예: Iatrogenic Hemoperitoneum, 없으면 null)",
+        "critical_events_leading_to_outcome": [
+            "시간 순서대로 중요 사건 (예: 'Blind paracentesis performed', 'Puncture site bleeding', 'Hct dropped to 9')"
+        ],
+        "length_of_stay": 숫자 (일)
+    }},
+    "evidence_spans": [
+        {{
+            "field": "해당 필드명",
+            "text_span": "원문에서 발췌한 근거 문장"
+        }}
+    ]
+}}
+
+CRITICAL (Expired):
+- 사망이면 `outcome.status="expired"`로 설정
+- `discharge_condition`, `discharge_location`은 차트 원문 그대로
+- `cause_of_death`와 `critical_events_leading_to_outcome`(타임라인)을 최우선 추출
+- `cause_of_death`에 iatrogenic(의인성) 원인이면 반드시 명시 (예: "Iatrogenic hemoperitoneum from paracentesis")
+
+CRITICAL (Procedures):
+- 모든 시술(paracentesis, central line, thoracentesis, chest tube, LP, intubation)을 `procedures_performed`에 기록
+- technique 필드: "ultrasound-guided", "US-guided", "sterile" 등 수식어가 있으면 기록. 없으면 "not documented"
+- "blind", "blindly", "without guidance" 표현이 있으면 technique에 "blind"로 기록하고 safety_flags에 추가
+- 시술 후 합병증(bleeding, puncture site bleeding, pneumothorax 등)이 있으면 complications에 기록
+
+CRITICAL (Diagnosis profile):
+- rule-out 진단은 확진된 경우만 포함, 해결된 과거 질환은 제외
+- 해당 없으면 빈 배열 사용
+"""
+
+
+_cache: "OrderedDict[str, Dict]" = OrderedDict()
+_CACHE_MAX = 256
+# 진행 중인 키만: key → [lock, 대기/실행 중인 호출 수] (0이 되면 삭제)
+_key_locks: Dict[str, list] = {}
+_key_locks_guard = threading.Lock()
+
+
+def _cache_get(key: str) -> Optional[Dict]:
+    with _key_locks_guard:
+        profile = _cache.get(key)
+        if profile is not None:
+            _cache.move_to_end(key)
+    return copy.deepcopy(profile) if profile is not None else None
+
+
+def _cache_put(key: str, profile: Dict) -> None:
+    with _key_locks_guard:
+        _cache[key] = copy.deepcopy(profile)
+        _cache.move_to_end(key)
+        while len(_cache) > _CACHE_MAX:
+            _cache.popitem(last=False)
+
+
+def _cache_key(clinical_text: str) -> str:
+    return hashlib.sha256((clinical_text or "").encode("utf-8")).hexdigest()
+
+
+def _call_llm(clinical_text: str) -> Optional[Dict]:
+    """LLM 1회 호출 → {"diagnosis": {...}, "structured_chart": {...}}. 실패 시 None."""
+    llm = get_llm()
+    prompt = CASE_PROFILE_PROMPT.format(clinical_text=clinical_text)
+    response_clean = ""
+    try:
+        # large 티어 (model_router) - 호출 지점별 비용/지연 집계
+        response = routed_call(
+            "chart_structuring",
+            lambda model: llm.gpt4o(prompt=prompt, temperature=0.1, max_tokens=4000, json_mode=True, model=model),
+            call_site="case_profile",
+        )
+        response_clean = re.sub(r'```json\s*|\s*```', '', response).strip()
+
+        # 잘린 JSON 감지 (마지막이 } 또는 ] 로 끝나지 않으면 잘린 것)
+        if not response_clean.endswith('}') and not response_clean.endswith(']'):
+            print(f"  [Case Profile] [WARN] JSON appears truncated, retrying with more tokens...")
+            response = routed_call(
+                "chart_structuring",
+                lambda model: llm.gpt4o(prompt=prompt, temperature=0.1, max_tokens=6000, json_mode=True, model=model),
+                call_site="case_profile.retry",
+            )
+            response_clean = re.sub(r'```json\s*|\s*```', '', response).strip()
+
+        structured = json.loads(response_clean)
+    except json.JSONDecodeError as e:
+        print(f"  [Case Profile] [ERROR] JSON parsing failed: {e}")
+        print(f"  [Case Profile] Response sample: {response_clean[:500]}...")
+        return None
+    except Exception as e:
+        print(f"  [Case Profile] [ERROR] Extraction failed: {e}")
+        return None
+
+    if not isinstance(structured, dict):
+        return None
+    diagnosis = structured.pop("diagnosis_profile", None)
+    return {
+        "diagnosis": diagnosis if isinstance(diagnosis, dict) else {},
+        "structured_chart": structured,
+    }
+
+
+def extract_case_profile(clinical_text: str, use_cache: bool = True) -> Optional[Dict]:
+    """
+    케이스 프로파일 추출 (캐시)
+
+    Returns:
+        {
+            "diagnosis": {"primary_diagnosis", "secondary_diagnoses", "key_conditions",
+                          "chief_complaint", "comorbidities", "confidence", "reasoning"},
+            "structured_chart": {...}  # chart_structurer 출력과 같은 스키마
+        }
+        텍스트가 너무 짧거나 LLM/파싱 실패 시 None (호출 측이 기존 폴백 사용)
+    """
+    if not clinical_text or len(clinical_text) < 50:
+        return None
+
+    key = _cache_key(clinical_text)
+    with _key_locks_guard:
+        entry = _key_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            if use_cache:
+                cached = _cache_get(key)
+                if cached is not None:
+                    return cached
+            profile = _call_llm(clinical_text)
+            if profile is not None and use_cache:
+                _cache_put(key, profile)
+            return profile
+    finally:
+        with _key_locks_guard:
+            entry[1] -= 1
+            if entry[1] == 0:
+                _key_locks.pop(key, None)
+
+
+def get_cached_case_profile(clinical_text: str) -> Optional[Dict]:
+    """이미 추출된 프로파일만 반환 (LLM 호출 없음)."""
+    return _cache_get(_cache_key(clinical_text))
+
+
+def _as_list(value) -> List[str]:
+    if isinstance(value, list):
+        return [str(v).strip() for v in value if isinstance(v, str) and v.strip()]
+    if isinstance(value, str) and value.strip():
+        return [value.strip()]
+    return []
+
+
+def profile_to_diagnosis_result(profile: Dict) -> Dict:
+    """extract_diagnosis_from_text() 반환 형식으로 변환 (patient_case 구성용)."""
+    dx = (profile or {}).get("diagnosis") or {}
+    primary = dx.get("primary_diagnosis")
+    if isinstance(primary, list):
+        primary = primary[0] if primary else None
+    return {
+        "diagnosis": primary or "Unknown",
+        "secondary_diagnoses": _as_list(dx.get("secondary_diagnoses")),
+        "key_conditions": _as_list(dx.get("key_conditions")),
+        "chief_complaint": _as_list(dx.get("chief_complaint")),
+        "comorbidities": _as_list(dx.get("comorbidities")),
+        "confidence": dx.get("confidence", "low"),
+        "reasoning": dx.get("reasoning", "N/A"),
+    }
+
+
+def profile_to_extracted_diagnoses(profile: Dict) -> Dict[str, List[str]]:
+    """DiagnosisExtractor.extract() 반환 형식으로 변환 (retrieval 진단 필터용, 대문자)."""
+    dx = (profile or {}).get("diagnosis") or {}
+    return {
+        "chief_complaint": [d.upper() for d in _as_list(dx.get("chief_complaint"))],
+        "primary_diagnosis": [d.upper() for d in _as_list(dx.get("primary_diagnosis"))],
+        "comorbidities": [d.upper() for d in _as_list(dx.get("comorbidities"))],
+    }
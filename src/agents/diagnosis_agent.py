@@ -9,7 +9,17 @@
 import re
 from typing import Dict, List, Optional
 from .llm import get_llm
-from .evidence_agent import format_evidence_summary, format_clinical_analysis
+from .evidence_agent import build_evidence_prefix, compress_clinical_text, SHARED_EVIDENCE_REF
+from .schemas import DiagnosisAnalysis
+from ..llm.model_router import routed_call
+from ..llm.streaming import IncrementalJSONParser, preview
+from ..llm.structured import REASK_MAX_TOKENS, complete_structured, response_schema
+from ..llm.prompt_budget import (
+    PromptSection,
+    count_tokens,
+    fit_sections,
+    get_token_budget,
+)
 
 
 # ──────────────────────────────────────────────
@@ -354,15 +364,17 @@ def run_diagnosis_agent(state: Dict) -> Dict:
     print(f"  [Diagnosis Agent] clinical_text length: {len(patient.get('clinical_text', ''))} chars")
     print(f"  [Diagnosis Agent] Using structured data")
     
-    evidence_summary = format_evidence_summary(evidence)
-    clinical_analysis_summary = format_clinical_analysis(evidence)
+    # 근거/임상 분석은 에이전트 공통 prefix 블록으로 맨 앞에 배치 (프롬프트 본문에는 참조만)
+    evidence_prefix = build_evidence_prefix(evidence)
     
     # 구조화 데이터 사용 (무조건)
     summaries = format_structured_summary(structured)
     
-    # 케이스 텍스트 발췌 (전체 맥락 파악용)
+    # 케이스 텍스트 (전체 맥락 파악용) - 예산 초과 시 핵심 이벤트/근거 span 문장 위주로 압축
     clinical_text = patient.get("clinical_text", "") or patient.get("text", "")
-    clinical_text_excerpt = clinical_text[:3000] if clinical_text else "N/A"
+    evidence_quotes = [
+        sp.get("text_span", "") for sp in ((structured or {}).get("evidence_spans") or []) if isinstance(sp, dict)
+    ]
     
     # Outcome 정보
     outcome_info = structured.get("outcome", {}) if structured else {}
@@ -423,7 +435,7 @@ def run_diagnosis_agent(state: Dict) -> Dict:
     else:
         procedures_info = "구조화 데이터에 시술 정보 없음"
     
-    prompt = ANALYSIS_PROMPT.format(
+    prompt_fields = dict(
         diagnosis=patient.get("diagnosis", "Unknown"),
         vitals_summary=summaries["vitals_summary"],
         symptoms_summary=summaries["symptoms_summary"],
@@ -434,38 +446,65 @@ def run_diagnosis_agent(state: Dict) -> Dict:
         procedures_info=procedures_info,
         death_alignment_info=death_alignment_info,
         procedural_safety_findings=procedural_safety_findings,
-        clinical_text_excerpt=clinical_text_excerpt,
-        clinical_analysis_summary=clinical_analysis_summary,
-        evidence_summary=evidence_summary,
-        episodic_lessons=episodic_lessons,
     )
     
+    # ── 토큰 예산: 공통 근거 prefix는 고정(overhead, 자체 상한 PROMPT_BUDGET_EVIDENCE_PREFIX),
+    #    예산 초과 시 교훈부터 축소하고 차트 원문은 최후 (하한 PROMPT_BUDGET_DIAGNOSIS_TEXT_MIN) ──
+    sections = [
+        PromptSection(
+            "clinical_text_excerpt", clinical_text or "N/A", priority=0,
+            max_tokens=get_token_budget("diagnosis_text"),
+            min_tokens=get_token_budget("diagnosis_text_min"),
+            compress=lambda t, n: compress_clinical_text(t, n, evidence_quotes),
+        ),
+        PromptSection("episodic_lessons", episodic_lessons, priority=2),
+    ]
+    prompt_fields["clinical_analysis_summary"] = SHARED_EVIDENCE_REF if evidence_prefix else "임상 분석 결과 없음"
+    prompt_fields["evidence_summary"] = SHARED_EVIDENCE_REF if evidence_prefix else "검색된 근거 없음"
+    overhead = count_tokens(evidence_prefix) + count_tokens(SYSTEM_PROMPT) + count_tokens(
+        ANALYSIS_PROMPT.format(**prompt_fields, **{sec.name: "" for sec in sections})
+    )
+    prompt_fields.update(
+        fit_sections(sections, get_token_budget("diagnosis_prompt"), overhead, label="Diagnosis Agent")
+    )
+    prompt = ANALYSIS_PROMPT.format(**prompt_fields)
+    
     try:
         llm = get_llm()
-        response = llm.gpt4o(prompt, system=SYSTEM_PROMPT, json_mode=True, timeout=60)
+
+        def call(model: str):
+            # 스트리밍: 항목이 완결되는 즉시 로그로 출력 (파싱/복구는 complete_structured)
+            parser = IncrementalJSONParser(("issues", "missed_diagnoses"), on_item=lambda key, item: print(
+                f"  [Diagnosis Agent] {key}: {preview(item)}"
+            ))
+            return llm.gpt4o(
+                prompt, system=SYSTEM_PROMPT, json_mode=True, timeout=60, prefix=evidence_prefix,
+                on_delta=parser.feed, model=model, response_schema=response_schema(DiagnosisAnalysis),
+            )
+
+        def reask(followup: str) -> str:
+            # 원 프롬프트 뒤에 누락 필드 질문만 덧붙임 (같은 prefix → prompt caching, 출력은 누락 필드만)
+            return routed_call("diagnosis", lambda model: llm.gpt4o(
+                f"{prompt}\n\n{followup}", system=SYSTEM_PROMPT, json_mode=True, timeout=60, prefix=evidence_prefix,
+                max_tokens=REASK_MAX_TOKENS, model=model,
+            ), call_site="diagnosis_agent.reask")
+
+        # large 티어 (model_router) - 호출 지점별 비용/지연 집계
+        response = routed_call("diagnosis", call, call_site="diagnosis_agent")
         
-        import json
-        try:
-            analysis = json.loads(response)
-            
-            # 필수 필드 검증
-            if "diagnosis_evaluation" not in analysis:
-                analysis["diagnosis_evaluation"] = "근거부족"
-            if "issues" not in analysis:
-                analysis["issues"] = []
-            if "missed_diagnoses" not in analysis:
-                analysis["missed_diagnoses"] = []
-            
-            # ── Severity Hierarchy 후처리: iatrogenic > death_alignment > medication ──
-            analysis["issues"] = _rerank_issues_by_severity_hierarchy(analysis.get("issues", []))
-        except json.JSONDecodeError as e:
-            print(f"  [Diagnosis Agent] JSON parsing failed: {e}")
+        result = complete_structured(DiagnosisAnalysis, response, reask=reask, label="Diagnosis Agent")
+        if result.parse_failed:
+            print("  [Diagnosis Agent] JSON parsing failed")
             analysis = {
                 "diagnosis_evaluation": "파싱 실패",
                 "issues": [],
                 "missed_diagnoses": [],
                 "raw_response": response[:500]
             }
+        else:
+            analysis = result.data
+            # ── Severity Hierarchy 후처리: iatrogenic > death_alignment > medication ──
+            analysis["issues"] = _rerank_issues_by_severity_hierarchy(analysis.get("issues", []))
         
         return {"diagnosis_analysis": analysis}
         
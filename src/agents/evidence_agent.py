@@ -8,16 +8,32 @@
   5. Evidence Agent 2차 (비판 기반 타겟 검색)
 """
 
-from Bio import Entrez
-from typing import Dict, List
-from openai import OpenAI
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+import hashlib
 import os
 import json
 import re
+import threading
 
-# PubMed 설정
-Entrez.email = os.getenv("PUBMED_EMAIL", "researcher@example.com")
-Entrez.api_key = os.getenv("NCBI_API_KEY")  # API key → 10 req/s + 응답 속도 개선
+from ..llm.cassette import cassette_call
+from ..llm.prompt_budget import compress_text, count_tokens, get_token_budget, truncate_to_tokens
+from ..llm.model_router import routed_call
+from ..llm.openai_chat import OpenAIChatConfig, call_openai_chat_completions, safe_json_loads
+
+_entrez = None
+
+
+def _get_entrez():
+    """Bio.Entrez lazy import (Biopython은 첫 PubMed 검색 때 로드)"""
+    global _entrez
+    if _entrez is None:
+        from Bio import Entrez
+        # PubMed 설정
+        Entrez.email = os.getenv("PUBMED_EMAIL", "researcher@example.com")
+        Entrez.api_key = os.getenv("NCBI_API_KEY")  # API key → 10 req/s + 응답 속도 개선
+        _entrez = Entrez
+    return _entrez
 
 # CRAG 임계치
 SIMILARITY_THRESHOLD = 0.7
@@ -48,8 +64,17 @@ def search_pubmed(query: str, max_results: int = 5, use_mesh: bool = True) -> Li
     """
     # 안전장치: 쿼리가 5단어 이상이면 4단어로 자름 (PubMed AND 폭발 방지)
     query = _truncate_query(query, max_words=4)
-    
+    # Entrez esearch/efetch 묶음을 카세트로 기록/재생 (벤치마크용, 카세트 없으면 그대로 호출)
+    return cassette_call(
+        "pubmed",
+        {"query": query, "max_results": max_results, "use_mesh": use_mesh},
+        lambda: _search_pubmed_live(query, max_results, use_mesh),
+    )
+
+
+def _search_pubmed_live(query: str, max_results: int, use_mesh: bool) -> List[Dict]:
     try:
+        Entrez = _get_entrez()
         # M&M 목적: 오류/합병증/예방/해결책 특화 필터
         if use_mesh:
             search_query = f"({query}) AND (guideline[pt] OR systematic review[pt] OR meta-analysis[pt] OR clinical trial[pt])"
@@ -125,6 +150,46 @@ def search_internal_rag(query: str, rag_retriever, top_k: int = 3) -> List[Dict]
 # 2. LLM 임상 분석 및 쿼리 생성
 # ---------------------------------------------------------------------------
 
+def _chat_completion(
+    prompt: str,
+    task: str,
+    call_site: str,
+    max_tokens: Optional[int] = None,
+    json_mode: bool = False,
+    validate=None,
+) -> str:
+    """
+    Evidence Agent LLM 호출 (공통 요청 경로 → 오프라인 배치 모드에서도 동일하게 동작)
+
+    모델은 task 티어로 결정 (model_router). small 티어 응답이 validate를 통과 못 하면 large 모델로 승격.
+    """
+    def call(model: str) -> str:
+        cfg = OpenAIChatConfig(
+            model=model,
+            temperature=0.0,
+            max_tokens=max_tokens,
+            timeout_s=30,
+            max_retries=2,
+            json_mode=json_mode,
+        )
+        return call_openai_chat_completions(messages=[{"role": "user", "content": prompt}], config=cfg)
+
+    return routed_call(task, call, validate=validate, call_site=call_site)
+
+
+def _is_short_query(text: str, max_words: int = 8) -> bool:
+    """쿼리 생성 응답 검증: 한 줄, 1~max_words 단어 (설명문/빈 응답이면 승격)."""
+    query = (text or "").strip().strip('"').strip("'")
+    return bool(query) and "\n" not in query and len(query.split()) <= max_words
+
+
+def _has_json_fields(*fields: str):
+    def validate(text: str) -> bool:
+        obj = safe_json_loads(text)
+        return isinstance(obj, dict) and all(f in obj for f in fields)
+    return validate
+
+
 def analyze_clinical_context_with_llm(patient: Dict, structured_chart: Dict = None) -> Dict:
     """
     🎯 LLM으로 임상 맥락 분석 및 검색 전략 생성
@@ -151,9 +216,10 @@ def analyze_clinical_context_with_llm(patient: Dict, structured_chart: Dict = No
     }
     
     try:
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        
-        clinical_text = (patient.get("clinical_text", "") or patient.get("text", ""))[:2000]
+        clinical_text = compress_clinical_text(
+            patient.get("clinical_text", "") or patient.get("text", ""),
+            get_token_budget("clinical_analysis_text"),
+        )
         
         # Structured chart 정보 추가
         vitals_info = ""
@@ -183,16 +249,12 @@ Rules:
 - Priorities must be DISEASES/complications (e.g., PE/ACS/sepsis), not symptoms.
 - Prefer commonly missed diagnoses and time-sensitive conditions."""
 
-        response = client.chat.completions.create(
-            model=os.getenv("LLM_MODEL", "gpt-4o"),
-            max_tokens=1000,
-            temperature=0,
-            messages=[{"role": "user", "content": prompt}],
-            timeout=30
+        response_text = _chat_completion(
+            prompt, "clinical_analysis", "evidence.clinical_analysis", max_tokens=1000,
+            validate=_has_json_fields("clinical_priorities", "key_findings"),
         )
         
         # JSON 파싱
-        response_text = response.choices[0].message.content.strip()
         response_text = re.sub(r'```json\s*|\s*```', '', response_text).strip()
         
         result = json.loads(response_text)
@@ -236,8 +298,6 @@ def generate_search_query_with_llm(patient: Dict, clinical_analysis: Dict = None
     default_query = f"{diagnosis} complications diagnostic error"
     
     try:
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        
         # Clinical analysis 정보 포함
         analysis_info = ""
         if clinical_analysis:
@@ -261,15 +321,11 @@ Goal: Find similar cases or solutions about the Primary Diagnosis with diagnosti
 
 Return ONLY the query string (no quotes, no explanation)."""
 
-        response = client.chat.completions.create(
-            model=os.getenv("LLM_MODEL", "gpt-4o"),
-            max_tokens=100,
-            temperature=0,
-            messages=[{"role": "user", "content": prompt}],
-            timeout=30
+        response_text = _chat_completion(
+            prompt, "query_generation", "evidence.search_query", max_tokens=100, validate=_is_short_query,
         )
         
-        query = response.choices[0].message.content.strip().strip('"').strip("'")
+        query = response_text.strip().strip('"').strip("'")
         
         # 빈 쿼리 방지
         if not query or len(query.strip()) == 0:
@@ -300,8 +356,6 @@ def generate_pubmed_query_with_llm(patient: Dict, clinical_analysis: Dict = None
     default_query = f"{diagnosis} complication prevention guideline"
     
     try:
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        
         secondary = patient.get("secondary_diagnoses", [])
         key_conditions = patient.get("key_conditions", [])
         
@@ -351,15 +405,13 @@ Bad examples (TOO LONG, will return 0):
 
 Return ONLY the query string (2-4 keywords), nothing else."""
 
-        response = client.chat.completions.create(
-            model=os.getenv("LLM_MODEL", "gpt-4o"),
-            max_tokens=100,
-            temperature=0,
-            messages=[{"role": "user", "content": prompt}],
-            timeout=30
+        # PubMed 쿼리는 2-4 키워드 → 단어 수가 넘치면 (0건 위험) 큰 모델로 재생성
+        response_text = _chat_completion(
+            prompt, "query_generation", "evidence.pubmed_query", max_tokens=100,
+            validate=lambda text: _is_short_query(text, max_words=6),
         )
         
-        query = response.choices[0].message.content.strip().strip('"').strip("'")
+        query = response_text.strip().strip('"').strip("'")
         
         # 빈 쿼리 방지
         if not query or len(query.strip()) == 0:
@@ -504,6 +556,27 @@ def extract_key_events(text: str) -> Dict:
     return events
 
 
+_DEATH_KEYWORDS = ("expired", "died", "death", "cause of death", "comfort measures", "cmo")
+
+
+def clinical_keywords(text: str) -> List[str]:
+    """압축 시 보존할 임상 키워드: extract_key_events()의 시술/합병증 + 사망 케이스면 사망 표현."""
+    events = extract_key_events(text)
+    keywords: List[str] = list(events.get("procedures") or []) + list(events.get("complications") or [])
+    if events.get("outcome") == "death":
+        keywords += list(_DEATH_KEYWORDS)
+    return keywords
+
+
+def compress_clinical_text(text: str, max_tokens: int, evidence_quotes: Sequence[str] = ()) -> str:
+    """
+    임상 텍스트 압축: clinical_keywords() 문장과 evidence span 인용 문장을 보존 (prompt_budget.compress_text에 전달).
+    """
+    if not text or count_tokens(text) <= max_tokens:
+        return text or ""
+    return compress_text(text, max_tokens, keywords=clinical_keywords(text), priority_snippets=evidence_quotes)
+
+
 def validate_internal_evidence_with_llm(internal_results: List[Dict], patient: Dict) -> Dict:
     """
     LLM으로 내부 근거 검증 (M&M 비판/해결에 유용한지)
@@ -522,8 +595,6 @@ def validate_internal_evidence_with_llm(internal_results: List[Dict], patient: D
         }
     
     try:
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        
         # 인덱스 케이스 핵심 이벤트 추출
         index_text = patient.get('clinical_text', '') or patient.get('text', '')
         index_events = extract_key_events(index_text)
@@ -573,15 +644,16 @@ Return JSON:
 
 Be GENEROUS with is_valid=true if the outcome/complication pattern matches."""
 
-        response = client.chat.completions.create(
-            model=os.getenv("LLM_MODEL", "gpt-4o"),
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0,
-            response_format={"type": "json_object"},
-            timeout=30
+        # 낮은 confidence(< 0.5)면 큰 모델로 재검증
+        def _confident(text: str) -> bool:
+            obj = safe_json_loads(text)
+            return isinstance(obj, dict) and float(obj.get("confidence", 0.0) or 0.0) >= 0.5
+
+        response_text = _chat_completion(
+            prompt, "validation", "evidence.internal_validation", json_mode=True, validate=_confident,
         )
         
-        result = json.loads(response.choices[0].message.content)
+        result = json.loads(response_text)
         
         # 필수 필드 검증
         is_valid = result.get("is_valid", False)
@@ -627,18 +699,101 @@ Be GENEROUS with is_valid=true if the outcome/complication pattern matches."""
 # 3.5 Evidence 포맷팅 (공유 함수 - Diagnosis/Treatment/Critic 공용)
 # ---------------------------------------------------------------------------
 
-def format_evidence_summary(evidence: Dict, include_abstract: bool = True) -> str:
+# 렌더링 결과는 evidence 버전(내용 해시)별로 memoize. 같은 evidence면 같은 문자열을 반환.
+_RENDER_CACHE: "OrderedDict[tuple, str]" = OrderedDict()
+_RENDER_CACHE_MAX = 64
+_render_lock = threading.Lock()
+
+
+def evidence_version(evidence: Dict) -> str:
+    """evidence 내용 해시 (2차 검색 등으로 내용이 바뀌면 버전도 바뀜)."""
+    raw = json.dumps(evidence or {}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:12]
+
+
+def _memoized_render(kind: str, evidence: Dict, args: tuple, render) -> str:
+    key = (kind, evidence_version(evidence), args)
+    with _render_lock:
+        if key in _RENDER_CACHE:
+            _RENDER_CACHE.move_to_end(key)
+            return _RENDER_CACHE[key]
+    text = render()
+    with _render_lock:
+        _RENDER_CACHE[key] = text
+        while len(_RENDER_CACHE) > _RENDER_CACHE_MAX:
+            _RENDER_CACHE.popitem(last=False)
+    return text
+
+
+SHARED_EVIDENCE_REF = "(맨 앞 [SHARED EVIDENCE CONTEXT] 블록 참조)"
+_MIN_PREFIX_ITEM_TOKENS = 60
+
+
+def build_evidence_prefix(evidence: Dict) -> str:
+    """
+    에이전트 공통 근거 블록. 같은 evidence면 바이트 단위로 동일한 문자열을 반환하므로
+    각 LLM 호출의 맨 앞(system 메시지)에 두면 provider 측 prompt caching이 적용된다.
+
+    블록 전체는 PROMPT_BUDGET_EVIDENCE_PREFIX 토큰 이내 (에이전트 프롬프트 예산에서 고정 overhead로 잡히므로
+    차트 원문 대신 근거 쪽이 줄어야 함): 초과 시 항목당 상한을 줄여 다시 렌더, 그래도 넘으면 문헌 목록 뒤쪽을 자름.
     """
-    Evidence 검색 결과를 에이전트 프롬프트용 문자열로 포맷팅.
+    if not evidence:
+        return ""
+    budget = get_token_budget("evidence_prefix")
+
+    def render() -> str:
+        head = (
+            f"[SHARED EVIDENCE CONTEXT v={evidence_version(evidence)}]\n"
+            f"### Evidence Agent 임상 맥락 분석\n{format_clinical_analysis(evidence)}\n\n"
+        )
+        tail = "\n[/SHARED EVIDENCE CONTEXT]"
+        item_max_tokens = get_token_budget("evidence_item")
+        summary = format_evidence_summary(evidence, item_max_tokens=item_max_tokens)
+        while count_tokens(head + summary + tail) > budget and item_max_tokens > _MIN_PREFIX_ITEM_TOKENS:
+            item_max_tokens = max(_MIN_PREFIX_ITEM_TOKENS, item_max_tokens * 2 // 3)
+            summary = format_evidence_summary(evidence, item_max_tokens=item_max_tokens)
+        room = budget - count_tokens(head + tail)
+        if count_tokens(summary) > room:
+            summary = truncate_to_tokens(summary, max(0, room))
+        return head + summary + tail
+
+    return _memoized_render("prefix", evidence, (budget,), render)
+
+
+def format_evidence_summary(
+    evidence: Dict,
+    include_abstract: bool = True,
+    item_max_tokens: Optional[int] = None,
+) -> str:
+    """
+    Evidence 검색 결과를 에이전트 프롬프트용 문자열로 포맷팅 (evidence 버전별 캐시).
     Diagnosis/Treatment/Critic 등 모든 에이전트가 공유.
 
     Args:
         evidence: run_evidence_agent() 반환 dict 전체
         include_abstract: PubMed abstract 포함 여부 (기본: True)
+        item_max_tokens: 유사 케이스 content / abstract 1건당 토큰 상한
+            (기본: PROMPT_BUDGET_EVIDENCE_ITEM). 초과 시 핵심 이벤트 문장 위주로 추출 압축
     """
     if not evidence:
         return "검색된 근거 없음"
 
+    if item_max_tokens is None:
+        item_max_tokens = get_token_budget("evidence_item")
+    return _memoized_render(
+        "summary", evidence, (include_abstract, item_max_tokens),
+        lambda: _render_evidence_summary(evidence, include_abstract, item_max_tokens),
+    )
+
+
+def _render_evidence_summary(evidence: Dict, include_abstract: bool, item_max_tokens: int) -> str:
+    def _case(content) -> str:
+        return compress_clinical_text(str(content or ""), item_max_tokens)
+
+    def _abstract(abstract) -> str:
+        # 배경(앞) + 결론(뒤) 문장 보존
+        return compress_text(str(abstract or ""), item_max_tokens)
+
     lines: List[str] = []
 
     internal = evidence.get("internal", {})
@@ -656,7 +811,7 @@ def format_evidence_summary(evidence: Dict, include_abstract: bool = True) -> st
         for c in internal_results[:3]:
             score = c.get("score", c.get("similarity", 0))
             status = c.get("status", "unknown")
-            content = c.get("content", c.get("text", ""))
+            content = _case(c.get("content", c.get("text", "")))
             lines.append(f"- [유사도 {score:.2f}] [{status}] {content}...")
     else:
         lines.append("### 내부 유사 케이스: 없음 (유사도 < 0.7)")
@@ -667,7 +822,7 @@ def format_evidence_summary(evidence: Dict, include_abstract: bool = True) -> st
         for e in external_results[:5]:
             lines.append(f"- [PMID: {e.get('pmid')}] {e.get('title', '')}")
             if include_abstract and e.get("abstract"):
-                lines.append(f"  Abstract: {str(e['abstract'])}...")
+                lines.append(f"  Abstract: {_abstract(e['abstract'])}...")
     else:
         lines.append("\n### 외부 문헌: 없음")
 
@@ -682,22 +837,26 @@ def format_evidence_summary(evidence: Dict, include_abstract: bool = True) -> st
             lines.append(f"  2차 내부 유사 케이스: {len(critique_int)}건")
             for c in critique_int[:2]:
                 score = c.get("score", 0)
-                content = c.get("content", c.get("text", ""))
+                content = _case(c.get("content", c.get("text", "")))
                 lines.append(f"  - [유사도 {score:.2f}] {content}...")
         for e in critique_ext[:3]:
             lines.append(f"- [PMID: {e.get('pmid')}] {e.get('title', '')}")
             if include_abstract and e.get("abstract"):
-                lines.append(f"  Abstract: {str(e['abstract'])}...")
+                lines.append(f"  Abstract: {_abstract(e['abstract'])}...")
 
     return "\n".join(lines)
 
 
 def format_clinical_analysis(evidence: Dict) -> str:
     """
-    Evidence Agent의 LLM 임상 분석 결과를 프롬프트용 문자열로 포맷팅.
+    Evidence Agent의 LLM 임상 분석 결과를 프롬프트용 문자열로 포맷팅 (evidence 버전별 캐시).
     """
     if not evidence:
         return "임상 분석 결과 없음"
+    return _memoized_render("clinical_analysis", evidence, (), lambda: _render_clinical_analysis(evidence))
+
+
+def _render_clinical_analysis(evidence: Dict) -> str:
 
     analysis = evidence.get("clinical_analysis", {})
     if not analysis:
@@ -735,10 +894,13 @@ def format_clinical_analysis(evidence: Dict) -> str:
 def run_evidence_agent(
     state: Dict,
     rag_retriever=None,
-    similarity_threshold: float = SIMILARITY_THRESHOLD
+    similarity_threshold: float = SIMILARITY_THRESHOLD,
+    clinical_analysis: Dict = None,
 ) -> Dict:
     """
     Evidence Agent 실행 (하이브리드 검증 기반 CRAG)
+
+    clinical_analysis: prefetch로 미리 받은 analyze_clinical_context_with_llm() 결과 (있으면 Step 1 생략)
     
     핵심 전략:
     1. 내부 RAG 검색 (유사도 >= 0.7 필터링)
@@ -766,8 +928,11 @@ def run_evidence_agent(
     print(f"  [Evidence Agent] Similar cases provided: {len(similar_cases)}")
     
     # 1. LLM으로 임상 맥락 분석
-    print(f"  [Step 1/4] Analyzing clinical context with LLM...")
-    clinical_analysis = analyze_clinical_context_with_llm(patient, structured_chart)
+    if clinical_analysis:
+        print(f"  [Step 1/4] Using prefetched clinical context analysis")
+    else:
+        print(f"  [Step 1/4] Analyzing clinical context with LLM...")
+        clinical_analysis = analyze_clinical_context_with_llm(patient, structured_chart)
     
     # 2. 내부 근거 수집 (유사도 필터링 적용)
     print(f"  [Step 2/4] Searching internal evidence...")
@@ -889,8 +1054,6 @@ def generate_critique_based_query(patient: Dict, preliminary_issues: List[Dict])
         return default_query
     
     try:
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        
         # 이슈 요약
         issues_text = "\n".join([
             f"- [{issue.get('category', 'unknown')}] {issue.get('issue', '')}"
@@ -927,15 +1090,12 @@ Bad examples (TOO LONG, will return 0):
 
 Return ONLY the query string (2-4 keywords), nothing else."""
 
-        response = client.chat.completions.create(
-            model=os.getenv("LLM_MODEL", "gpt-4o-mini"),
-            max_tokens=100,
-            temperature=0,
-            messages=[{"role": "user", "content": prompt}],
-            timeout=30
+        response_text = _chat_completion(
+            prompt, "query_generation", "evidence.critique_query", max_tokens=100,
+            validate=lambda text: _is_short_query(text, max_words=6),
         )
         
-        query = response.choices[0].message.content.strip().strip('"').strip("'")
+        query = response_text.strip().strip('"').strip("'")
         
         if not query or len(query.strip()) == 0:
             return default_query
@@ -1,8 +1,11 @@
 """LLM Wrapper - OpenAI API 호출을 위한 래퍼 클래스"""
 
 import os
-from openai import OpenAI
-from typing import Optional
+from typing import Callable, Optional
+from ..llm.backend import get_backend
+from ..llm.gateway import ChatRequest, complete
+from ..llm.rate_limit import RetryableLLMError, parse_retry_after
+from ..llm.usage import usage_from_response
 
 
 class LLMWrapper:
@@ -11,12 +14,16 @@ class LLMWrapper:
     def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None):
         """
         Args:
-            api_key: OpenAI API 키 (없으면 환경변수에서 가져옴)
+            api_key: OpenAI API 키 (없으면 LLM 백엔드 설정 / 환경변수에서 가져옴)
             model: 사용할 모델명 (없으면 환경변수에서 가져옴)
         """
-        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self.backend = get_backend()
+        self.api_key = api_key or self.backend.key()
         self.model = model or os.getenv("LLM_MODEL", "gpt-4o")
-        self.client = OpenAI(api_key=self.api_key)
+        # 재시도는 공통 경로(rate_limit.call_with_limits)가 전역 리미터/잡 예산과 함께 처리
+        # base_url: OpenAI 또는 로컬 OpenAI 호환 서버 (LLM_BACKEND / LLM_BASE_URL)
+        from openai import OpenAI  # SDK import는 첫 LLMWrapper 생성 시
+        self.client = OpenAI(api_key=self.api_key, base_url=self.backend.base_url, max_retries=0)
     
     def gpt4o(
         self, 
@@ -25,7 +32,11 @@ class LLMWrapper:
         temperature: float = 0.0,
         max_tokens: int = 2000,
         json_mode: bool = False,
-        timeout: int = 60
+        timeout: int = 60,
+        prefix: Optional[str] = None,
+        on_delta: Optional[Callable[[str], None]] = None,
+        model: Optional[str] = None,
+        response_schema: Optional[dict] = None
     ) -> str:
         """
         GPT-4o 모델 호출
@@ -37,36 +48,101 @@ class LLMWrapper:
             max_tokens: 최대 토큰 수
             json_mode: JSON 모드 활성화 여부
             timeout: 타임아웃 (초)
+            prefix: 에이전트 공통 고정 블록 (예: build_evidence_prefix). 맨 앞 system 메시지로
+                넣어 같은 케이스의 여러 호출이 동일한 prefix를 갖도록 함 (prompt caching)
+            on_delta: 지정하면 스트리밍으로 호출하고 content 조각마다 호출
+                (예: streaming.IncrementalJSONParser.feed)
+            model: 이번 호출만 다른 모델 사용 (model_router.routed_call이 티어별 모델을 넘김)
+            response_schema: Structured Outputs 스키마 (structured.response_schema(출력 dataclass))
         
         Returns:
             str: 모델 응답
         """
         messages = []
         
+        if prefix:
+            messages.append({"role": "system", "content": prefix})
+        
         if system:
             messages.append({"role": "system", "content": system})
         
         messages.append({"role": "user", "content": prompt})
         
-        # JSON 모드 설정
-        response_format = {"type": "json_object"} if json_mode else {"type": "text"}
-        
+        request = ChatRequest(
+            model=model or self.model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            json_mode=json_mode,
+            response_schema=response_schema,
+            timeout_s=timeout,
+        )
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens,
-                response_format=response_format,
-                timeout=timeout
-            )
-            
-            return response.choices[0].message.content
-            
+            # 공통 요청 경로 (오프라인 배치 모드에서는 배치로 적재/응답 재사용)
+            if on_delta is not None:
+                return complete(request, lambda req: self._stream_live(req, on_delta), on_delta)
+            return complete(request, self._call_live)
         except Exception as e:
             raise RuntimeError(f"LLM API call failed: {e}")
     
-    
+    def _create_kwargs(self, request: ChatRequest) -> dict:
+        """백엔드에 맞춘 SDK 인자 (모델명 매핑, JSON 모드: response_format / grammar / repair 지시)."""
+        kwargs = dict(
+            model=self.backend.model_name(request.model),
+            messages=self.backend.messages(request.messages, request.wants_json),
+            temperature=request.temperature,
+            max_tokens=request.max_tokens,
+            timeout=self.backend.timeout(request.timeout_s),
+        )
+        extras = self.backend.json_extras(request.json_mode, request.response_schema)
+        if "response_format" in extras:
+            kwargs["response_format"] = extras.pop("response_format")
+        if extras:
+            kwargs["extra_body"] = extras
+        return kwargs
+
+    def _call_live(self, request: ChatRequest):
+        try:
+            response = self.client.chat.completions.create(**self._create_kwargs(request))
+        except Exception as e:
+            raise _classify_sdk_error(e)
+        content = self.backend.finalize(response.choices[0].message.content, request.wants_json)
+        return content, usage_from_response(response)
+
+    def _stream_live(self, request: ChatRequest, on_delta: Callable[[str], None]):
+        """스트리밍 1회 시도. 일부를 받은 뒤 끊기면 재요청하지 않고 받은 부분 반환 (호출 측이 salvage)."""
+        parts = []
+        usage = None
+        try:
+            stream = self.client.chat.completions.create(
+                **self._create_kwargs(request),
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+            for chunk in stream:
+                usage = usage_from_response(chunk) or usage
+                for choice in chunk.choices or []:
+                    delta = getattr(choice.delta, "content", None)
+                    if delta:
+                        parts.append(delta)
+                        on_delta(delta)
+                    if choice.finish_reason == "length":
+                        print(f"  [Streaming] {request.model} hit max_tokens={request.max_tokens} → truncated output")
+        except Exception as e:
+            if not parts:
+                raise _classify_sdk_error(e)
+            print(f"  [Streaming] stream interrupted after {sum(map(len, parts))} chars ({type(e).__name__}) → partial")
+        return self.backend.finalize("".join(parts), request.wants_json), usage
+
+
+def _classify_sdk_error(e: Exception) -> Exception:
+    """OpenAI SDK 예외 중 429/5xx/타임아웃/연결 오류는 재시도 대상으로 변환."""
+    status = getattr(e, "status_code", None)
+    name = type(e).__name__
+    if status in (429, 500, 502, 503, 504) or name in ("APITimeoutError", "APIConnectionError"):
+        headers = getattr(getattr(e, "response", None), "headers", None)
+        return RetryableLLMError(f"{name}: {e}", retry_after=parse_retry_after(headers), status_code=status)
+    return e
 
 
 # 싱글톤 인스턴스
@@ -4,11 +4,14 @@ Process Contributor Agent: Router가 선택했을 때만 프로세스·이상치
 
 from __future__ import annotations
 
-import json
-import os
 from typing import Dict, Any
 
 from .llm import get_llm
+from .schemas import ProcessContributorAnalysis
+from ..llm.backend import llm_available
+from ..llm.prompt_budget import get_token_budget
+from .evidence_agent import compress_clinical_text
+from ..llm.structured import complete_structured, response_schema
 
 
 def run_process_contributor_agent(state: Dict[str, Any]) -> Dict[str, Any]:
@@ -16,14 +19,17 @@ def run_process_contributor_agent(state: Dict[str, Any]) -> Dict[str, Any]:
     selected = state.get("selected_agents") or []
     if "process_contributor" not in selected:
         return {"process_contributor_analysis": None}
-    if not os.environ.get("OPENAI_API_KEY", "").strip():
+    if not llm_available():
         return {"process_contributor_analysis": None}
 
     patient_case = state.get("patient_case") or {}
     structured = state.get("structured_chart") or {}
     similar_cases = state.get("similar_cases") or []
     intervention_coverage = state.get("intervention_coverage") or {}
-    text = (patient_case.get("clinical_text") or patient_case.get("text") or "")[:4000]
+    text = compress_clinical_text(
+        patient_case.get("clinical_text") or patient_case.get("text") or "",
+        get_token_budget("process_contributor_text"),
+    )
 
     prompt = f"""You are a process contributor / outlier analyst for a clinical critique. This case may show treatment delay/missed care or outcome opposite to similar cases. Analyze and summarize for the report.
 
@@ -41,9 +47,18 @@ Output JSON only:
 
     try:
         llm = get_llm()
-        response = llm.gpt4o(prompt=prompt, temperature=0.2, max_tokens=600, json_mode=True, timeout=45)
-        response = response.strip().replace("```json", "").replace("```", "").strip()
-        analysis = json.loads(response)
+        response = llm.gpt4o(
+            prompt=prompt, temperature=0.2, max_tokens=600, json_mode=True, timeout=45,
+            response_schema=response_schema(ProcessContributorAnalysis),
+        )
+        result = complete_structured(
+            ProcessContributorAnalysis, response,
+            reask=lambda followup: llm.gpt4o(prompt=f"{prompt}\n\n{followup}", temperature=0.0, max_tokens=300, json_mode=True, timeout=45),
+            label="Process Contributor Agent",
+        )
+        if result.parse_failed:
+            raise ValueError("unparseable JSON response")
+        analysis = result.data
         analysis["active"] = True
         print("  [Process Contributor Agent] ran")
         return {"process_contributor_analysis": analysis}
@@ -4,11 +4,14 @@ Risk Factor Agent: Router가 선택했을 때만 위험 인자·동반질환 집
 
 from __future__ import annotations
 
-import json
-import os
 from typing import Dict, Any
 
 from .llm import get_llm
+from .schemas import RiskFactorAnalysis
+from ..llm.backend import llm_available
+from ..llm.prompt_budget import get_token_budget
+from .evidence_agent import compress_clinical_text
+from ..llm.structured import complete_structured, response_schema
 
 
 def run_risk_factor_agent(state: Dict[str, Any]) -> Dict[str, Any]:
@@ -16,7 +19,7 @@ def run_risk_factor_agent(state: Dict[str, Any]) -> Dict[str, Any]:
     selected = state.get("selected_agents") or []
     if "risk_factor" not in selected:
         return {"risk_factor_analysis": None}
-    if not os.environ.get("OPENAI_API_KEY", "").strip():
+    if not llm_available():
         return {"risk_factor_analysis": None}
 
     patient_case = state.get("patient_case") or {}
@@ -28,7 +31,10 @@ def run_risk_factor_agent(state: Dict[str, Any]) -> Dict[str, Any]:
 
     secondary = patient_case.get("secondary_diagnoses") or []
     key_conditions = patient_case.get("key_conditions") or []
-    text = (patient_case.get("clinical_text") or patient_case.get("text") or "")[:4000]
+    text = compress_clinical_text(
+        patient_case.get("clinical_text") or patient_case.get("text") or "",
+        get_token_budget("risk_factor_text"),
+    )
 
     prompt = f"""You are a risk factor analyst for a clinical critique. This case has multiple comorbidities and/or high cohort mortality. Analyze risk factors and summarize for the report.
 
@@ -48,9 +54,18 @@ Output JSON only:
 
     try:
         llm = get_llm()
-        response = llm.gpt4o(prompt=prompt, temperature=0.2, max_tokens=600, json_mode=True, timeout=45)
-        response = response.strip().replace("```json", "").replace("```", "").strip()
-        analysis = json.loads(response)
+        response = llm.gpt4o(
+            prompt=prompt, temperature=0.2, max_tokens=600, json_mode=True, timeout=45,
+            response_schema=response_schema(RiskFactorAnalysis),
+        )
+        result = complete_structured(
+            RiskFactorAnalysis, response,
+            reask=lambda followup: llm.gpt4o(prompt=f"{prompt}\n\n{followup}", temperature=0.0, max_tokens=300, json_mode=True, timeout=45),
+            label="Risk Factor Agent",
+        )
+        if result.parse_failed:
+            raise ValueError("unparseable JSON response")
+        analysis = result.data
         analysis["active"] = True
         print("  [Risk Factor Agent] ran")
         return {"risk_factor_analysis": analysis}
@@ -1,13 +1,115 @@
 """
-Router가 선택한 에이전트 중 risk_factor, process_contributor를 순차 실행하고 state에 반영.
+Router가 선택한 에이전트 중 risk_factor, process_contributor를 실행하고 state에 반영.
+
+각 조건부 에이전트는 읽는 state 키(reads)를 명시한다. 다른 조건부 에이전트의 출력 키를
+읽지 않는 에이전트끼리는 독립으로 보고 동시에 실행한다 (에이전트별 timeout).
+timeout은 에이전트 스레드의 job_deadline으로도 걸려 있어, 초과 후에는 새 LLM 호출/재시도를 시작하지 않는다
+(이미 실행 중인 스레드는 강제 종료할 수 없으므로 결과만 폐기).
 """
 
 from __future__ import annotations
 
-from typing import Dict, Any
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Tuple
 
 from .risk_factor_agent import run_risk_factor_agent
 from .process_contributor_agent import run_process_contributor_agent
+from ..llm.rate_limit import job_deadline
+
+
+DEFAULT_AGENT_TIMEOUT_S = float(os.getenv("CONDITIONAL_AGENT_TIMEOUT_S", "60"))
+
+
+@dataclass(frozen=True)
+class ConditionalAgentSpec:
+    """조건부 에이전트 선언: 이름, 출력 키, 실행 함수, 입력 의존성, timeout."""
+
+    name: str
+    output_key: str
+    run: Callable[[Dict[str, Any]], Dict[str, Any]]
+    reads: Tuple[str, ...] = ()
+    timeout_s: float = DEFAULT_AGENT_TIMEOUT_S
+
+
+CONDITIONAL_AGENTS: List[ConditionalAgentSpec] = [
+    ConditionalAgentSpec(
+        name="risk_factor",
+        output_key="risk_factor_analysis",
+        run=run_risk_factor_agent,
+        reads=(
+            "selected_agents", "patient_case", "structured_chart", "diagnosis_analysis",
+            "treatment_analysis", "similar_cases", "evidence",
+        ),
+    ),
+    ConditionalAgentSpec(
+        name="process_contributor",
+        output_key="process_contributor_analysis",
+        run=run_process_contributor_agent,
+        reads=(
+            "selected_agents", "patient_case", "structured_chart", "similar_cases",
+            "intervention_coverage",
+        ),
+    ),
+]
+
+
+def _plan_waves(specs: List[ConditionalAgentSpec]) -> List[List[ConditionalAgentSpec]]:
+    """
+    reads에 다른 에이전트의 output_key가 있으면 그 에이전트 뒤 wave에 배치.
+    같은 wave의 에이전트는 서로 독립 → 동시 실행.
+    """
+    output_owner = {s.output_key: s.name for s in specs}
+    deps = {
+        s.name: {output_owner[k] for k in s.reads if k in output_owner and output_owner[k] != s.name}
+        for s in specs
+    }
+    waves: List[List[ConditionalAgentSpec]] = []
+    done: set = set()
+    remaining = list(specs)
+    while remaining:
+        wave = [s for s in remaining if deps[s.name] <= done]
+        if not wave:
+            raise ValueError(f"조건부 에이전트 의존성 순환: {[s.name for s in remaining]}")
+        waves.append(wave)
+        done.update(s.name for s in wave)
+        remaining = [s for s in remaining if s.name not in done]
+    return waves
+
+
+def _run_with_deadline(spec: ConditionalAgentSpec, state: Dict[str, Any]) -> Dict[str, Any]:
+    with job_deadline(spec.timeout_s):
+        return spec.run(state)
+
+
+def _run_wave(wave: List[ConditionalAgentSpec], state: Dict[str, Any]) -> Dict[str, Any]:
+    """한 wave를 동시 실행. timeout 초과 에이전트는 결과를 폐기하고 출력은 None."""
+    updates: Dict[str, Any] = {}
+    executor = ThreadPoolExecutor(max_workers=len(wave), thread_name_prefix="conditional-agent")
+    try:
+        started = time.monotonic()
+        # 컨텍스트(케이스별 LLM 사용량 tracker 등)는 에이전트마다 복사해 전달
+        futures = [
+            (spec, executor.submit(contextvars.copy_context().run, _run_with_deadline, spec, state)) for spec in wave
+        ]
+        for spec, future in futures:
+            # timeout은 wave 시작 기준 (앞 에이전트 대기 시간만큼 늘어나지 않도록)
+            remaining = max(0.0, spec.timeout_s - (time.monotonic() - started))
+            try:
+                updates.update(future.result(timeout=remaining) or {})
+            except FutureTimeoutError:
+                print(f"  [Conditional Agents] {spec.name} timed out after {spec.timeout_s:.0f}s (result discarded)")
+                updates[spec.output_key] = None
+            except Exception as e:
+                print(f"  [Conditional Agents] {spec.name} failed: {e}")
+                updates[spec.output_key] = None
+    finally:
+        # timeout으로 남은 스레드를 기다리지 않음 (결과는 폐기됨)
+        executor.shutdown(wait=False, cancel_futures=True)
+    return updates
 
 
 def run_conditional_agents(state: Dict[str, Any]) -> Dict[str, Any]:
@@ -18,15 +120,15 @@ def run_conditional_agents(state: Dict[str, Any]) -> Dict[str, Any]:
     updates: Dict[str, Any] = {}
     selected = state.get("selected_agents") or []
 
-    if "risk_factor" in selected:
-        updates.update(run_risk_factor_agent(state))
-    else:
-        updates["risk_factor_analysis"] = None
+    active = [s for s in CONDITIONAL_AGENTS if s.name in selected]
+    for spec in CONDITIONAL_AGENTS:
+        if spec not in active:
+            updates[spec.output_key] = None
 
-    state_after = {**state, **updates}
-    if "process_contributor" in selected:
-        updates.update(run_process_contributor_agent(state_after))
-    else:
-        updates["process_contributor_analysis"] = None
+    for wave in _plan_waves(active):
+        state_for_wave = {**state, **updates}
+        if len(wave) > 1:
+            print(f"  [Conditional Agents] running concurrently: {[s.name for s in wave]}")
+        updates.update(_run_wave(wave, state_for_wave))
 
     return updates
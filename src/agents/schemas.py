@@ -0,0 +1,73 @@
+"""
+에이전트 LLM 출력 스키마 (src/llm/structured.py)
+
+각 dataclass가 해당 에이전트 프롬프트의 "출력은 JSON만" 형식과 1:1로 대응.
+required(): 빠지면 그 필드만 re-ask, 그래도 없으면 default (기존 "필수 필드 검증" 기본값과 동일)
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+from ..llm.structured import optional, required
+
+
+@dataclass
+class DiagnosisAnalysis:
+    diagnosis_evaluation: str = required("근거부족", description="적절/부적절/부분적절/근거부족")
+    issues: List[Dict[str, Any]] = required(
+        default_factory=list, description="issue, evidence_in_text, severity(critical/medium/low), category"
+    )
+    missed_diagnoses: List[Dict[str, Any]] = required(
+        default_factory=list, description="condition, rationale, relevance"
+    )
+    procedural_safety_assessment: Dict[str, Any] = optional(default_factory=dict)
+    death_cause_alignment: Dict[str, Any] = optional(default_factory=dict)
+    timing_assessment: str = optional("")
+    actual_outcome_analysis: str = optional("")
+    comparison_with_similar: str = optional("")
+    literature_support: str = optional("")
+
+
+@dataclass
+class DispositionEvaluation:
+    # expired 케이스는 "N/A" → bool로 강제하지 않음
+    is_appropriate: Any = optional(True)
+    risk_level: str = optional("low", description="low/medium/high/critical")
+    concern: str = optional("평가 불가")
+    recommendation: str = optional("N/A")
+
+
+@dataclass
+class TreatmentAnalysis:
+    treatment_evaluation: str = required("근거부족", description="적절/부적절/부분적절/근거부족")
+    medication_issues: List[str] = required(default_factory=list)
+    timing_issues: List[str] = optional(default_factory=list)
+    guideline_adherence: str = optional("")
+    disposition_evaluation: DispositionEvaluation = required(default_factory=DispositionEvaluation)
+    recommendations: List[str] = optional(default_factory=list)
+
+
+@dataclass
+class RiskFactorAnalysis:
+    summary: str = required("", description="2-4 sentences on risk factors and high-risk context")
+    key_risk_factors: List[str] = required(default_factory=list)
+    recommendations: List[str] = optional(default_factory=list)
+    active: bool = optional(True)
+
+
+@dataclass
+class ProcessContributorAnalysis:
+    summary: str = required("", description="2-4 sentences on process/outlier suspicion")
+    delay_or_missed_findings: List[str] = required(default_factory=list)
+    outcome_vs_cohort: str = optional("")
+    recommendations: List[str] = optional(default_factory=list)
+    active: bool = optional(True)
+
+
+@dataclass
+class AlternativeExplanationAnalysis:
+    summary: str = required("", description="2-4 sentences on interpretation ambiguity")
+    alternative_explanations: List[str] = required(default_factory=list)
+    uncertainty_notes: List[str] = optional(default_factory=list)
+    caveats: List[str] = optional(default_factory=list)
+    active: bool = optional(True)
@@ -2,7 +2,12 @@
 
 from typing import Dict, List
 from .llm import get_llm
-from .evidence_agent import format_evidence_summary, format_clinical_analysis
+from .evidence_agent import build_evidence_prefix, SHARED_EVIDENCE_REF
+from .schemas import TreatmentAnalysis
+from ..llm.model_router import routed_call
+from ..llm.streaming import IncrementalJSONParser, preview
+from ..llm.structured import REASK_MAX_TOKENS, complete_structured, response_schema
+from ..llm.prompt_budget import PromptSection, count_tokens, fit_sections, get_token_budget
 
 SYSTEM_PROMPT = """당신은 중환자실 치료 전문의입니다. 시행된 치료를 확인한 뒤 치료/처치의 적절성(선택·용량·타이밍)과 disposition을 근거 기반으로 평가하세요."""
 
@@ -114,8 +119,8 @@ def run_treatment_agent(state: Dict) -> Dict:
     
     print(f"  [Treatment Agent] Using structured data")
     
-    evidence_summary = format_evidence_summary(evidence)
-    clinical_analysis_summary = format_clinical_analysis(evidence)
+    # 근거/임상 분석은 에이전트 공통 prefix 블록으로 맨 앞에 배치 (프롬프트 본문에는 참조만)
+    evidence_prefix = build_evidence_prefix(evidence)
     
     # 구조화 데이터 사용 (무조건)
     vitals = structured.get("vitals", {})
@@ -135,43 +140,62 @@ def run_treatment_agent(state: Dict) -> Dict:
     # 에피소딕 메모리 교훈 (과거 유사 케이스 경험)
     episodic_lessons = state.get("episodic_lessons", "") or "없음"
     
-    prompt = ANALYSIS_PROMPT.format(
+    prompt_fields = dict(
         diagnosis=patient.get("diagnosis", "Unknown"),
         disposition=disposition,
         vitals_summary=vitals_summary,
         clinical_course=clinical_course,
         interventions_given=interventions_given,
-        clinical_analysis_summary=clinical_analysis_summary,
-        evidence_summary=evidence_summary,
-        episodic_lessons=episodic_lessons,
     )
     
+    # 토큰 예산: 공통 근거 prefix는 고정(overhead, 자체 상한 PROMPT_BUDGET_EVIDENCE_PREFIX), 교훈만 축소 (시행된 치료 목록은 축소하지 않음)
+    sections = [
+        PromptSection("episodic_lessons", episodic_lessons, priority=2),
+    ]
+    prompt_fields["clinical_analysis_summary"] = SHARED_EVIDENCE_REF if evidence_prefix else "임상 분석 결과 없음"
+    prompt_fields["evidence_summary"] = SHARED_EVIDENCE_REF if evidence_prefix else "검색된 근거 없음"
+    overhead = count_tokens(evidence_prefix) + count_tokens(SYSTEM_PROMPT) + count_tokens(
+        ANALYSIS_PROMPT.format(**prompt_fields, **{sec.name: "" for sec in sections})
+    )
+    prompt_fields.update(
+        fit_sections(sections, get_token_budget("treatment_prompt"), overhead, label="Treatment Agent")
+    )
+    prompt = ANALYSIS_PROMPT.format(**prompt_fields)
+    
     try:
         llm = get_llm()
-        response = llm.gpt4o(prompt, system=SYSTEM_PROMPT, json_mode=True, timeout=60)
+
+        def call(model: str):
+            # 스트리밍: 항목이 완결되는 즉시 로그로 출력 (파싱/복구는 complete_structured)
+            parser = IncrementalJSONParser(("medication_issues", "timing_issues"), on_item=lambda key, item: print(
+                f"  [Treatment Agent] {key}: {preview(item)}"
+            ))
+            return llm.gpt4o(
+                prompt, system=SYSTEM_PROMPT, json_mode=True, timeout=60, prefix=evidence_prefix,
+                on_delta=parser.feed, model=model, response_schema=response_schema(TreatmentAnalysis),
+            )
+
+        def reask(followup: str) -> str:
+            # 원 프롬프트 뒤에 누락 필드 질문만 덧붙임 (같은 prefix → prompt caching, 출력은 누락 필드만)
+            return routed_call("treatment", lambda model: llm.gpt4o(
+                f"{prompt}\n\n{followup}", system=SYSTEM_PROMPT, json_mode=True, timeout=60, prefix=evidence_prefix,
+                max_tokens=REASK_MAX_TOKENS, model=model,
+            ), call_site="treatment_agent.reask")
+
+        # large 티어 (model_router) - 호출 지점별 비용/지연 집계
+        response = routed_call("treatment", call, call_site="treatment_agent")
         
-        import json
-        try:
-            analysis = json.loads(response)
-            
-            # 필수 필드 검증
-            if "treatment_evaluation" not in analysis:
-                analysis["treatment_evaluation"] = "근거부족"
-            if "disposition_evaluation" not in analysis:
-                analysis["disposition_evaluation"] = {
-                    "is_appropriate": True,
-                    "risk_level": "low",
-                    "concern": "평가 불가",
-                    "recommendation": "N/A"
-                }
-        except json.JSONDecodeError as e:
-            print(f"  [Treatment Agent] JSON parsing failed: {e}")
+        result = complete_structured(TreatmentAnalysis, response, reask=reask, label="Treatment Agent")
+        if result.parse_failed:
+            print("  [Treatment Agent] JSON parsing failed")
             analysis = {
                 "treatment_evaluation": "파싱 실패",
                 "medication_issues": [],
                 "timing_issues": [],
                 "raw_response": response[:500]
             }
+        else:
+            analysis = result.data
         
         return {"treatment_analysis": analysis}
         
@@ -1,20 +1,24 @@
 """
 Critic 파이프라인을 LangGraph 서브그래프로 구현.
 
-흐름: preprocess → router → run_tools → critique_builder → END (단일 패스)
+흐름: preprocess → router → run_tools → critique_builder ⇄ critique_refine → END
+critique_refine: 일관성 검사에 문제가 남아 있으면 patch 프롬프트로 수정 (max_iterations 회차까지, refine.py)
 """
 
 from __future__ import annotations
 
+import time
 from typing import Any, Dict, List, Optional, TypedDict
 
-from langgraph.graph import StateGraph, END
-
 from .critique_builder import CritiqueBuilder
+from .doc_analysis import build_keyword_index
+from .refine import critique_issues, format_patch_instructions, new_refinement, record_iteration, stop_reason
 from .registry import build_default_registry
-from .router import LLMRouter
-from .runner import AgentConfig, ToolRegistry
+from .router import heuristic_features, make_router
+from .runner import AgentConfig, ToolRegistry, fit_tool_budget, run_tools
 from .types import AgentState
+from ..llm.backend import llm_available
+from ..llm.rate_limit import deadline_remaining_s
 
 
 # ---------------------------------------------------------------------------
@@ -29,11 +33,15 @@ class CriticGraphState(TypedDict, total=False):
     lens_results: Dict[str, Any]
     behavior_results: Dict[str, Any]
     router: Dict[str, Any]
+    prefetched_router: Dict[str, Any]
     trace: List[Dict[str, Any]]
     critique: Dict[str, Any]
     patch_instructions: str
     executed_tools: List[str]
     executed_budget: int
+    # 반복 개선: 입력 max_iterations (없으면 AgentConfig.max_iterations), 회차 기록
+    max_iterations: int
+    refinement: Dict[str, Any]
 
 
 def _dict_to_agent_state(d: Dict[str, Any]) -> AgentState:
@@ -119,7 +127,7 @@ def _structured_chart_to_timeline_and_evidence(structured_chart: Dict[str, Any])
                 field = sp.get("field") or "other"
                 quote = sp.get("text_span") or str(sp)[:500]
                 evidence_spans[f"E{i}"] = {"category": field, "quote": quote, "start": 0, "end": 0}
-    evidence_out = {"evidence_spans": evidence_spans} if evidence_spans else {"evidence_spans": {}}
+    evidence_out = {"evidence_spans": evidence_spans, "keyword_index": build_keyword_index(evidence_spans)}
     return timeline_out, evidence_out
 
 
@@ -138,26 +146,24 @@ def _make_preprocess_node(registry: ToolRegistry, config: AgentConfig):
             s.preprocessing["timeline"] = timeline_out
             s.preprocessing["evidence"] = evidence_out
             executed.extend(["timeline", "evidence"])
-        else:
-            for tool_name in ["timeline", "evidence"]:
-                tool = registry.get(tool_name)
-                out = tool.safe_run(s)
-                s.preprocessing[tool_name] = out
-                executed.append(tool_name)
+        to_run = [] if executed else ["timeline", "evidence"]
         # record_gaps는 항상 실행
-        tool = registry.get("record_gaps")
-        out = tool.safe_run(s)
-        s.preprocessing["record_gaps"] = out
-        executed.append("record_gaps")
+        to_run.append("record_gaps")
         budget = 0
         if "behavior_topk_direct_compare" in registry.available_tool_names:
             similar = (s.cohort_data.get("similar_cases") or []) if isinstance(s.cohort_data.get("similar_cases"), list) else []
             if similar and budget < config.max_tools:
-                tool = registry.get("behavior_topk_direct_compare")
-                out = tool.safe_run(s)
-                s.behavior_results["behavior_topk_direct_compare"] = out
-                executed.append("behavior_topk_direct_compare")
-                budget += 1
+                # 가장 비싼 도구 → 시간/토큰 예산(잡 마감 포함)을 넘으면 건너뜀
+                tool_budget = config.tool_budget()
+                _, dropped = fit_tool_budget(["behavior_topk_direct_compare"], registry.cards, tool_budget)
+                if dropped:
+                    s.add_trace(tool="runner", status="budget_drop", detail={"dropped": dropped, "budget": tool_budget.to_dict()})
+                else:
+                    to_run.append("behavior_topk_direct_compare")
+                    budget += 1
+        # timeline / evidence / record_gaps는 서로 독립 → 동시 실행, top-k 비교는 evidence 이후
+        run_tools(registry, s, to_run, config)
+        executed.extend(to_run)
         return {
             **_agent_state_to_updates(s),
             "executed_tools": executed,
@@ -169,16 +175,35 @@ def _make_preprocess_node(registry: ToolRegistry, config: AgentConfig):
 def _make_router_node(registry: ToolRegistry, config: AgentConfig):
     def router_node(state: CriticGraphState) -> Dict[str, Any]:
         s = _dict_to_agent_state(state)
-        selection = LLMRouter(model=config.router_llm_model).select(
-            state=s,
-            available_tools=registry.available_tool_names,
-            tool_cards=registry.cards,
-        )
-        s.router = {
-            "selected_tools": selection.tools,
-            "reason": selection.reason,
-            "retrieved_cards": selection.retrieved_cards,
-        }
+        # 메인 그래프 prefetch에서 이미 선택했으면 재사용 (router는 원문/메타데이터 + tool card만 읽음)
+        # prefetch 때 patient 특징(status 등)이 달랐으면 선택이 달라질 수 있으므로 버림
+        prefetched = state.get("prefetched_router")
+        if prefetched and prefetched.get("features") != heuristic_features(s):
+            print("  [Critic Router] prefetched selection dropped (patient features differ)")
+            prefetched = None
+        # 예산은 노드 실행 시점 기준 (잡 마감까지 남은 시간이 prefetch 때보다 줄었을 수 있음)
+        tool_budget = config.tool_budget()
+        if prefetched and prefetched.get("selected_tools"):
+            s.router = {k: v for k, v in prefetched.items() if k != "features"}
+            kept, dropped = fit_tool_budget(s.router["selected_tools"], registry.cards, tool_budget)
+            s.router["selected_tools"] = kept
+        else:
+            selection = make_router(config).select(
+                state=s,
+                available_tools=registry.available_tool_names,
+                tool_cards=registry.cards,
+                budget=tool_budget,
+            )
+            s.router = {
+                "selected_tools": selection.tools,
+                "reason": selection.reason,
+                "retrieved_cards": selection.retrieved_cards,
+                "decision": selection.decision,
+            }
+            dropped = selection.dropped
+        if dropped:
+            s.router["dropped_tools"] = dropped
+            s.add_trace(tool="router", status="budget_drop", detail={"dropped": dropped, "budget": tool_budget.to_dict()})
         return {"router": s.router, "trace": s.trace}
     return router_node
 
@@ -189,38 +214,98 @@ def _make_run_tools_node(registry: ToolRegistry, config: AgentConfig):
         executed_set = set(state.get("executed_tools") or [])
         budget = state.get("executed_budget", 0)
         selected = (state.get("router") or {}).get("selected_tools") or []
+        to_run: List[str] = []
         for tool_name in selected:
-            if tool_name in executed_set:
+            if tool_name in executed_set or tool_name in to_run:
                 continue
-            if budget >= config.max_tools:
+            if budget + len(to_run) >= config.max_tools:
                 s.add_trace(tool="runner", status="budget_stop", detail={"max_tools": config.max_tools})
                 break
-            tool = registry.get(tool_name)
-            out = tool.safe_run(s)
-            if tool_name.startswith("lens_"):
-                s.lens_results[tool_name] = out
-            else:
-                s.behavior_results[tool_name] = out
-            executed_set.add(tool_name)
-            budget += 1
+            to_run.append(tool_name)
+        # 독립 도구는 동시 실행, 결과/trace는 선택 순서대로 병합
+        run_tools(registry, s, to_run, config)
+        budget += len(to_run)
         return {
             **_agent_state_to_updates(s),
-            "executed_tools": list(executed_set),
+            "executed_tools": list(state.get("executed_tools") or []) + to_run,
             "executed_budget": budget,
         }
     return run_tools_node
 
 
+def _evidence_spans(s: AgentState) -> Dict[str, Any]:
+    evidence = s.preprocessing.get("evidence") or {}
+    return (evidence.get("evidence_spans") or {}) if isinstance(evidence, dict) else {}
+
+
+def _finish_iteration(s: AgentState, refinement: Dict[str, Any], config: AgentConfig) -> None:
+    """회차 종료 판단. 멈추면 stop_reason / converged / final_issues 기록."""
+    remaining = deadline_remaining_s()
+    reason = stop_reason(
+        refinement,
+        llm=llm_available(),
+        remaining_ms=None if remaining is None else remaining * 1000,
+        reserve_ms=config.deadline_reserve_ms,
+    )
+    if reason is None:
+        return
+    its = refinement["iterations"]
+    refinement["stop_reason"] = reason
+    refinement["converged"] = reason == "converged"
+    # stalled면 직전 회차 critique를 유지 → 그 회차 문제 목록이 최종
+    refinement["final_issues"] = its[-2]["issues"] if reason == "stalled" else its[-1]["issues"]
+    print(f"  [CritiqueBuilder] refinement stop after {len(its)} iteration(s): {reason}")
+
+
 def _make_critique_builder_node(registry: ToolRegistry, config: AgentConfig):
     builder = CritiqueBuilder(model=config.critique_model)
 
     def critique_builder_node(state: CriticGraphState) -> Dict[str, Any]:
         s = _dict_to_agent_state(state)
+        started = time.perf_counter()
         critique = builder.build(s, previous_critique=None, patch_instructions="")
-        return {"critique": critique, "trace": s.trace}
+        refinement = new_refinement(state.get("max_iterations") or config.max_iterations)
+        issues = critique_issues(critique, _evidence_spans(s))
+        record_iteration(refinement, critique, issues, (time.perf_counter() - started) * 1000)
+        _finish_iteration(s, refinement, config)
+        return {
+            "critique": critique,
+            "trace": s.trace,
+            "refinement": refinement,
+            "patch_instructions": format_patch_instructions(issues),
+        }
     return critique_builder_node
 
 
+def _make_critique_refine_node(registry: ToolRegistry, config: AgentConfig):
+    builder = CritiqueBuilder(model=config.critique_model)
+
+    def critique_refine_node(state: CriticGraphState) -> Dict[str, Any]:
+        s = _dict_to_agent_state(state)
+        refinement = dict(state.get("refinement") or {})
+        refinement["iterations"] = list(refinement.get("iterations") or [])
+        previous = state.get("critique") or {}
+        started = time.perf_counter()
+        # 전체 payload 대신 patch 프롬프트 (문제 목록 + 현재 critique + 관련 span)
+        critique = builder.refine(s, previous_critique=previous, patch_instructions=state.get("patch_instructions") or "")
+        issues = critique_issues(critique, _evidence_spans(s))
+        record_iteration(refinement, critique, issues, (time.perf_counter() - started) * 1000, patch=True)
+        _finish_iteration(s, refinement, config)
+        if refinement.get("stop_reason") == "stalled":
+            critique = previous
+        return {
+            "critique": critique,
+            "trace": s.trace,
+            "refinement": refinement,
+            "patch_instructions": format_patch_instructions(issues),
+        }
+    return critique_refine_node
+
+
+def _route_after_critique(state: CriticGraphState) -> str:
+    return "end" if (state.get("refinement") or {}).get("stop_reason") else "refine"
+
+
 # ---------------------------------------------------------------------------
 # 그래프 빌드 및 컴파일
 # ---------------------------------------------------------------------------
@@ -229,6 +314,8 @@ def build_critic_graph(
     registry: Optional[ToolRegistry] = None,
     config: Optional[AgentConfig] = None,
 ):
+    from langgraph.graph import StateGraph, END  # 그래프 빌드 시에만 필요
+
     registry = registry or build_default_registry()
     config = config or AgentConfig()
     graph = StateGraph(CriticGraphState)
@@ -237,12 +324,15 @@ def build_critic_graph(
     graph.add_node("router", _make_router_node(registry, config))
     graph.add_node("run_tools", _make_run_tools_node(registry, config))
     graph.add_node("critique_builder", _make_critique_builder_node(registry, config))
+    graph.add_node("critique_refine", _make_critique_refine_node(registry, config))
 
     graph.set_entry_point("preprocess")
     graph.add_edge("preprocess", "router")
     graph.add_edge("router", "run_tools")
     graph.add_edge("run_tools", "critique_builder")
-    graph.add_edge("critique_builder", END)
+    # 일관성 검사 통과 / 개선 없음 / max_iterations / 마감 임박이면 종료, 아니면 patch 회차
+    graph.add_conditional_edges("critique_builder", _route_after_critique, {"refine": "critique_refine", "end": END})
+    graph.add_conditional_edges("critique_refine", _route_after_critique, {"refine": "critique_refine", "end": END})
 
     return graph.compile()
 
@@ -1,13 +1,20 @@
 from __future__ import annotations
 
-import os
+import json
 import re
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from .types import AgentState, JsonDict
-from ..llm.openai_chat import OpenAIChatConfig, call_openai_chat_completions, safe_json_loads
-from ..agents.evidence_agent import format_evidence_summary
+from .memo import builder_key, get_critic_memo
+from .prompt_payload import compile_critique_payload
+from .refine import cited_span_ids
+from ..llm.backend import llm_available
+from ..llm.openai_chat import OpenAIChatConfig, call_openai_chat_completions
+from ..llm.model_router import routed_call
+from ..llm.prompt_budget import count_tokens
+from ..llm.streaming import IncrementalJSONParser, preview
+from ..agents.evidence_agent import build_evidence_prefix
 
 
 def _as_json(x: Any) -> Any:
@@ -16,6 +23,15 @@ def _as_json(x: Any) -> Any:
     return str(x)
 
 
+def _prompt_preprocessing(preprocessing: Dict[str, Any]) -> Dict[str, Any]:
+    # keyword_index는 lens 도구 조회용 → 프롬프트에서는 제외 (evidence_spans와 중복)
+    evidence = preprocessing.get("evidence")
+    if isinstance(evidence, dict) and "keyword_index" in evidence:
+        evidence = {k: v for k, v in evidence.items() if k != "keyword_index"}
+        return {**preprocessing, "evidence": evidence}
+    return preprocessing
+
+
 # ──────────────────────────────────────────────
 # Severity Hierarchy 재정렬 (CritiqueBuilder 후처리)
 # ──────────────────────────────────────────────
@@ -35,6 +51,11 @@ _DEATH_ALIGNMENT_PATTERNS = [
 ]
 
 
+def _log_critique_point(key: str, item: Any) -> None:
+    if isinstance(item, dict):
+        print(f"  [CritiqueBuilder] critique point ({item.get('severity', '?')}): {preview(item)}")
+
+
 def _rerank_critique_points(pts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
     Severity Hierarchy에 따라 critique_points를 재정렬.
@@ -73,11 +94,13 @@ class CritiqueBuilder:
     """
     Merge preprocessing + lens + behavior into a single critique object.
 
-    If OPENAI_API_KEY is set, uses LLM to generate structured critique points with evidence_span ids.
+    If an LLM backend is available (OPENAI_API_KEY or LLM_BACKEND=local), uses LLM to generate structured critique points with evidence_span ids.
     Otherwise, falls back to a lightweight heuristic summary.
+
+    model: None이면 model_router "critique" 티어 모델. critique_points가 비면 large 모델로 승격.
     """
 
-    model: str = "gpt-4o-mini"
+    model: Optional[str] = None
 
     def build(
         self,
@@ -87,7 +110,7 @@ class CritiqueBuilder:
         patch_instructions: str = "",
     ) -> JsonDict:
         # LLM path (preferred)
-        if os.environ.get("OPENAI_API_KEY", ""):
+        if llm_available():
             return self._build_with_llm(state, previous_critique=previous_critique, patch_instructions=patch_instructions)
         return self._build_heuristic(state)
 
@@ -138,13 +161,16 @@ class CritiqueBuilder:
             "agent_mode": True,
         }
 
-    def _build_with_llm(
+    def _payload(
         self,
         state: AgentState,
         *,
         previous_critique: Optional[JsonDict] = None,
         patch_instructions: str = "",
-    ) -> JsonDict:
+    ) -> Tuple[JsonDict, str, Any]:
+        """프롬프트 입력 dict (압축 전) + 공통 evidence prefix + prefix에 넣은 cohort evidence."""
+        evidence_prefix = ""
+        shared_evidence = None
         payload = {
             "patient": {
                 "id": state.patient.get("id"),
@@ -154,7 +180,7 @@ class CritiqueBuilder:
                 "admission_type": state.patient.get("admission_type"),
                 "admission_location": state.patient.get("admission_location"),
             },
-            "preprocessing": _as_json(state.preprocessing),
+            "preprocessing": _as_json(_prompt_preprocessing(state.preprocessing)),
             "lens_results": _as_json(state.lens_results),
             "behavior_results": _as_json(state.behavior_results),
             "cohort_patterns": _as_json(state.similar_case_patterns),
@@ -176,7 +202,26 @@ class CritiqueBuilder:
             # Evidence (문헌 근거)는 적극 활용 대상 → 별도 키로 분리
             evidence_data = cohort.get("evidence")
             if evidence_data:
-                payload["literature_evidence"] = format_evidence_summary(evidence_data)
+                # 본문은 공통 prefix 블록으로 맨 앞에 배치 (에이전트 간 prompt caching)
+                evidence_prefix = build_evidence_prefix(evidence_data)
+                shared_evidence = evidence_data
+                payload["literature_evidence"] = "See the [SHARED EVIDENCE CONTEXT] block at the beginning."
+        return payload, evidence_prefix, shared_evidence
+
+    def _build_with_llm(
+        self,
+        state: AgentState,
+        *,
+        previous_critique: Optional[JsonDict] = None,
+        patch_instructions: str = "",
+    ) -> JsonDict:
+        payload, evidence_prefix, shared_evidence = self._payload(
+            state, previous_critique=previous_critique, patch_instructions=patch_instructions,
+        )
+        # 압축 JSON (raw/사본 제거, 문장 본문은 evidence span 1번) → 토큰 수 전/후 기록
+        payload_json, payload_stats = compile_critique_payload(payload, shared_evidence=shared_evidence)
+        print(f"  [CritiqueBuilder] payload tokens {payload_stats['payload_tokens_before']} → "
+              f"{payload_stats['payload_tokens']}")
 
         mode_line = "Revise the previous critique using patch_instructions." if previous_critique else "Generate a critique report."
 
@@ -186,8 +231,8 @@ Use ONLY the provided structured evidence. Do not invent unobserved facts.
 If "reference_only_prior_results" is present in Input JSON, use it only as reference; do not depend on it. Base your critique on preprocessing, lens_results, behavior_results.
 If "literature_evidence" is present, use it to support or challenge your critique points ONLY when directly relevant to the patient's specific issues. Cite PMIDs when applicable. Do NOT force-fit literature that does not match the patient's clinical context; ignore irrelevant articles.
 
-Input JSON:
-{payload}
+Input JSON (compact): timeline events with "span" have the same text as that evidence span; {{"$ref": "path"}} repeats the object first given at that path.
+{payload_json}
 
 You MUST return 3-5 critique points depending on case complexity. Include ALL clinically significant issues — do not omit important findings just to keep the list short.
 
@@ -228,10 +273,77 @@ Rules:
 Do NOT let medication errors overshadow iatrogenic procedural complications in the ranking.
 """
 
-        cfg = OpenAIChatConfig(model=self.model, temperature=0.2, max_tokens=2500)
-        content = call_openai_chat_completions(messages=[{"role": "user", "content": prompt}], config=cfg)
-        obj = safe_json_loads(content) or {}
+        messages = [{"role": "system", "content": evidence_prefix}] if evidence_prefix else []
+        messages.append({"role": "user", "content": prompt})
+        content, obj = self._complete(state, messages, tool="critique_builder", detail=payload_stats)
+        return self._to_output(state, content, obj)
+
+    def refine(self, state: AgentState, *, previous_critique: JsonDict, patch_instructions: str) -> JsonDict:
+        """
+        patch 프롬프트로 critique 수정 (refine.py 반복 루프). 전체 payload 대신 수정 지시 + 현재 critique +
+        인용/후보 evidence span만 보냄. LLM이 없거나 critique_points가 비면 previous_critique 그대로 반환.
+        """
+        if not llm_available():
+            return previous_critique
+        evidence = state.preprocessing.get("evidence") or {}
+        spans = (evidence.get("evidence_spans") or {}) if isinstance(evidence, dict) else {}
+        cited = [sid for sid in cited_span_ids(previous_critique) if sid in spans]
+        # span 인용 문제가 있으면 후보 span 전체(짧게), 아니면 인용한 span만
+        if "span_id" in patch_instructions:
+            span_block = {sid: str(sp.get("quote", ""))[:160] for sid, sp in spans.items() if isinstance(sp, dict)}
+        else:
+            span_block = {sid: spans[sid].get("quote") for sid in cited if isinstance(spans[sid], dict)}
+        current = {k: previous_critique.get(k) for k in ("analysis", "critique_points", "risk_factors", "recommendations")}
+        prompt = f"""You are revising a medical process critique. Apply ONLY the fixes listed below and keep everything else unchanged.
+Do not invent unobserved facts. Keep the same JSON format and the severity hierarchy (iatrogenic/procedural complications first).
+
+Fixes required:
+{patch_instructions}
+
+Evidence spans (id → quote):
+{json.dumps(span_block, ensure_ascii=False, separators=(",", ":"))}
+
+Current critique JSON:
+{json.dumps(current, ensure_ascii=False, separators=(",", ":"))}
+
+Return the full revised critique JSON only:
+{{"analysis": "...", "critique_points": [{{"point": "...", "span_id": "E1 | ... | record_uncertainty", "severity": "high|medium|low", "cohort_comparison": "..."}}], "risk_factors": ["..."], "recommendations": ["..."]}}
+"""
+        messages = [{"role": "user", "content": prompt}]
+        content, obj = self._complete(state, messages, tool="critique_refine", detail={"patch_tokens": count_tokens(prompt)})
+        if not obj.get("critique_points"):
+            return previous_critique
+        return self._to_output(state, content, obj)
+
+    def _complete(self, state: AgentState, messages: List[JsonDict], *, tool: str, detail: JsonDict) -> Tuple[str, JsonDict]:
+        def call(model: str):
+            cfg = OpenAIChatConfig(model=model, temperature=0.2, max_tokens=2500)
+            # 스트리밍: critique point가 완결되는 즉시 로그로 출력, 잘린 꼬리는 복구
+            parser = IncrementalJSONParser(("critique_points",), on_item=_log_critique_point)
+            content = call_openai_chat_completions(messages=messages, config=cfg, on_delta=parser.feed)
+            return content, parser.result() or {}
+
+        # 같은 프롬프트(입력 전체)로 이전에 생성한 결과가 있으면 LLM 호출 생략 (memo.py)
+        memo = get_critic_memo()
+        key = builder_key(messages, self.model) if memo.enabled else None
+        hit = memo.get(key) if key else None
+        if isinstance(hit, dict) and hit.get("obj"):
+            print("  [CritiqueBuilder] memo hit → LLM call skipped")
+            state.add_trace(tool=tool, status="cached", detail={"memo_key": key, **detail})
+            content, obj = hit.get("content", ""), hit["obj"]
+        else:
+            content, obj = routed_call(
+                "critique", call,
+                validate=lambda res: bool(res[1].get("critique_points")),
+                call_site=f"critic.{tool}",
+                model=self.model,
+            )
+            if key and obj.get("critique_points"):
+                memo.put(key, {"content": content, "obj": obj})
+            state.add_trace(tool=tool, status="ok", detail=detail)
+        return content, obj
 
+    def _to_output(self, state: AgentState, content: str, obj: JsonDict) -> JsonDict:
         # Severity Hierarchy 후처리: rerank critique_points
         critique_pts = obj.get("critique_points", [])
         critique_pts = _rerank_critique_points(critique_pts)
@@ -0,0 +1,338 @@
+"""
+Critic 전처리 공용 문서 분석 (문장 분할 1회 + 키워드 일괄 매칭)
+
+- 문장 분할: 줄(\\n+) → 문장부호(. ? !) 뒤 공백 기준. 오프셋은 매치 위치에서 바로 계산 (str.find 재탐색 없음)
+- 키워드 매칭: KEYWORD_GROUPS의 모든 키워드를 접두사 트라이 정규식 1개로 합쳐 소문자 본문을 한 번만 스캔
+  (겹치는 매치까지 수집 → 도구별 `k in s` 반복과 같은 부분 문자열 의미)
+  r"\\bbp\\b" 형태 키워드는 단어 경계 매칭 (별도 정규식 1개)
+- 문장 단위 매치는 문장 안에 완전히 들어간 것만. 분할/스캔은 앞에서부터 SCAN_BLOCK 문장씩 필요한 만큼만 진행
+  (timeline 120 이벤트, evidence 60 span 상한 → 긴 노트도 앞부분만 처리하던 기존 조기 종료 특성 유지)
+- 문서 단위 포함 여부(record_gaps)는 공유 소문자 본문에서 키워드별 1회 판정 후 캐시
+- analyze_document(text): 같은 텍스트면 결과 재사용 → timeline / evidence / record_gaps / lens 도구가 공유
+  (같은 wave에서 병렬 실행돼도 분할/스캔은 1번)
+"""
+from __future__ import annotations
+
+import re
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+# 도구별 키워드 (그룹 내 순서 = 도구의 우선순위). 매처는 전체 그룹의 합집합으로 1개만 만든다.
+KEYWORD_GROUPS: Dict[str, List[str]] = {
+    # preprocess_timeline: 이벤트 타입 (TIMELINE_TYPES 순서로 판정)
+    "timeline.respiratory": ["intub", "vent", "cpap", "bipap", "o2", "oxygen", "desat", "spo2"],
+    "timeline.hemodynamic": ["bp", "hypotens", "press", "shock", "tachy", "brady", "hr "],
+    "timeline.imaging": ["ct", "x-ray", "mri", "ultrasound", "imaging"],
+    "timeline.lab": ["lab", "wbc", "cr", "creatin", "lactate", "troponin", "abg"],
+    "timeline.medication": ["antibi", "heparin", "warfarin", "insulin", "steroid", "vasopress"],
+    "timeline.procedure": ["procedure", "line", "catheter", "dialysis", "surgery"],
+    "timeline.level_of_care": ["icu", "ward", "transfer", "stepdown", "discharge"],
+    "timeline.deterioration": ["worsen", "deterior", "declin", "arrest", "code blue", "rapid response"],
+    # preprocess_evidence: 카테고리 / 근거 후보 판정
+    "evidence.vital_signs": [r"\bbp\b", r"\bhr\b", r"\brr\b", r"\bspo2\b", r"\bsat\b", r"\btemp\b"],
+    "evidence.labs": [r"\bwbc\b", r"\bhgb\b", r"\bplt\b", r"\bcr\b", r"\bcreatin\b", r"\bbun\b", r"\blactate\b",
+                      r"\bna\b", r"\bk\b", r"\bast\b", r"\balt\b", r"\bbilir\b", r"\babg\b"],
+    "evidence.imaging": ["ct", "x-ray", "mri", "ultrasound", "echo"],
+    "evidence.assessment": ["diagnosis", "impression", "assessment", "a/p", "problem", "plan"],
+    "evidence.therapy": ["antibi", "heparin", "warfarin", "insulin", "steroid", "vasopress", "fluid"],
+    "evidence.claimable": ["diagnosis", "impression", "assessment", "plan", "started", "given", "administered",
+                           "intub", "icu", "transfer", "worsen", "deterior"],
+    # preprocess_gaps: 활력징후 언급 / 불확실성 표기 (문서 단위)
+    "gaps.vitals.bp": [r"\bbp\b", "blood pressure", "mmhg", "hypotension"],
+    "gaps.vitals.hr": [r"\bhr\b", "heart rate", "tachy", "brady"],
+    "gaps.vitals.rr": [r"\brr\b", "resp rate", "respiratory rate"],
+    "gaps.vitals.spo2": ["spo2", "o2 sat", "sat%"],
+    "gaps.vitals.temp": ["temp", "temperature", "febrile"],
+    "gaps.uncertainty": ["not documented", "unknown", "unable to", "limited history", "poor historian", "unclear",
+                         "cannot confirm"],
+    # lens_severity_risk
+    "severity.shock_or_hypotension": ["shock", "hypotension", "map", "pressors", "vasopress"],
+    "severity.resp_failure": ["intub", "vent", "respiratory failure", "bipap", "cpap", "desat", "spo2"],
+    "severity.sepsis": ["sepsis", "septic", "lactate", "broad spectrum", "abx", "antibiotic"],
+    "severity.cardiac_instability": ["vtach", "vfib", "arrest", "troponin", "stemi", "nstemi"],
+    # lens_monitoring_response
+    "monitoring.deterioration": ["worsen", "deterior", "declin", "hypotens", "desat", "arrest", "code blue",
+                                 "rapid response"],
+    "monitoring.response": ["intub", "vent", "pressor", "vasopress", "fluid", "antibi", "icu", "transfer", "dialysis"],
+}
+
+DOC_CACHE_SIZE = 8
+SCAN_BLOCK = 32  # 한 번에 분할/스캔하는 문장 수
+
+_WORD_KW = re.compile(r"^\\b(.+)\\b$")
+_LINE_RE = re.compile(r"[^\n]+")
+_SENT_BREAK_RE = re.compile(r"(?<=[\.\?!])\s+")
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """키워드 목록 → 접두사를 공유하는 정규식 (같은 위치에서는 가장 긴 키워드 매치)."""
+    root: Dict = {}
+    for w in words:
+        node = root
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node: Dict) -> str:
+        alts = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return emit(root)
+
+
+class KeywordMatcher:
+    """
+    여러 키워드를 한 번의 스캔으로 찾는 매처.
+    - 부분 문자열 키워드: 트라이 정규식으로 위치마다 가장 긴 매치 1개 → 그 접두사 키워드는 같은 위치에서 함께 매치
+    - 단어 경계 키워드(r"\\bxx\\b"): 단어끼리는 겹치지 않으므로 finditer 1회
+    scan()은 (start, end, keyword) 목록 반환. keyword는 KEYWORD_GROUPS 표기 그대로(단어 경계면 r"\\bxx\\b").
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        subs: Set[str] = set()
+        self._word_keys: Dict[str, str] = {}
+        for kw in keywords:
+            m = _WORD_KW.match(kw)
+            if m:
+                self._word_keys[m.group(1)] = kw
+            elif kw:
+                subs.add(kw)
+        self.keywords: Set[str] = subs | set(self._word_keys.values())
+        # 가장 긴 매치 → 같은 위치에서 함께 매치되는 (자기 자신 포함) 접두사 키워드
+        self._prefixes = {w: [k for k in subs if w.startswith(k)] for w in subs}
+        self._sub_re = re.compile(_trie_pattern(subs)) if subs else None
+        first = "".join(sorted({re.escape(w[0]) for w in self._word_keys}))
+        self._word_re = (re.compile(rf"(?=[{first}])\b(" + _trie_pattern(self._word_keys) + r")\b")
+                         if self._word_keys else None)
+        self._word_search: Dict[str, Callable] = {}
+
+    def scan(self, lower: str, pos: int = 0, endpos: Optional[int] = None) -> List[Tuple[int, int, str]]:
+        endpos = len(lower) if endpos is None else endpos
+        out: List[Tuple[int, int, str]] = []
+        if self._sub_re is not None:
+            # 매치 시작 다음 글자부터 다시 검색 → 다른 키워드 안에서 시작하는 키워드도 수집 (vasopress ⊃ press)
+            search, prefixes = self._sub_re.search, self._prefixes
+            m = search(lower, pos, endpos)
+            while m is not None:
+                start = m.start()
+                for kw in prefixes[m.group(0)]:
+                    out.append((start, start + len(kw), kw))
+                m = search(lower, start + 1, endpos)
+        if self._word_re is not None:
+            keys = self._word_keys
+            for m in self._word_re.finditer(lower, pos, endpos):
+                out.append((m.start(), m.end(), keys[m.group(1)]))
+        return out
+
+    def contains(self, lower: str, keyword: str) -> bool:
+        """키워드 1개의 전체 텍스트 포함 여부 (문서 단위 판정용)."""
+        m = _WORD_KW.match(keyword)
+        if not m:
+            return keyword in lower
+        search = self._word_search.get(keyword)
+        if search is None:
+            search = self._word_search[keyword] = re.compile(r"\b" + re.escape(m.group(1)) + r"\b").search
+        return search(lower) is not None
+
+
+_matcher: Optional[KeywordMatcher] = None
+
+
+def get_keyword_matcher() -> KeywordMatcher:
+    global _matcher
+    if _matcher is None:
+        _matcher = KeywordMatcher(kw for kws in KEYWORD_GROUPS.values() for kw in kws)
+    return _matcher
+
+
+def iter_sentence_bounds(text: str) -> Iterator[Tuple[int, int]]:
+    """줄(\\n+) → 문장부호 뒤 공백으로 분할. 앞뒤 공백 제외한 (start, end)."""
+    for m in _LINE_RE.finditer(text or ""):
+        line = m.group(0)
+        stripped = line.strip()
+        if not stripped:
+            continue
+        base = m.start() + (len(line) - len(line.lstrip()))
+        cursor = 0
+        for b in _SENT_BREAK_RE.finditer(stripped):
+            yield base + cursor, base + b.start()
+            cursor = b.end()
+        yield base + cursor, base + len(stripped)
+
+
+@dataclass
+class Sentence:
+    index: int
+    start: int
+    end: int
+    text: str
+    # keyword → 문장 안 첫 매치의 끝 위치(문장 기준). limit(앞 N자) 판정용
+    hits: Dict[str, int] = field(default_factory=dict)
+    # lower()로 길이가 바뀌는 문자가 있으면 hits 위치는 소문자 텍스트 기준
+    lower_shifted: bool = False
+
+    def _limit(self, limit: Optional[int]) -> Optional[int]:
+        if limit is None or not self.lower_shifted:
+            return limit
+        return len(self.text[:limit].lower())
+
+    def found(self, keywords: Iterable[str], limit: Optional[int] = None) -> List[str]:
+        """keywords 중 문장(limit이면 앞 limit자)에 있는 것, 주어진 순서대로."""
+        hits, limit = self.hits, self._limit(limit)
+        return [k for k in keywords if k in hits and (limit is None or hits[k] <= limit)]
+
+    def found_all(self, limit: Optional[int] = None) -> List[str]:
+        """매처의 모든 키워드 중 문장(limit이면 앞 limit자)에 있는 것."""
+        hits, limit = self.hits, self._limit(limit)
+        return [k for k, end in hits.items() if limit is None or end <= limit]
+
+    def has_any(self, keywords: Iterable[str], limit: Optional[int] = None) -> bool:
+        hits, limit = self.hits, self._limit(limit)
+        return any(k in hits and (limit is None or hits[k] <= limit) for k in keywords)
+
+
+class DocumentAnalysis:
+    """
+    텍스트 1개의 문장 분할 + 키워드 매치.
+    문장은 iter_sentences() / sentence_at()으로만 꺼낸다 (그 시점까지 분할·스캔을 진행하고 hits를 채움).
+    """
+
+    def __init__(self, text: str, matcher: Optional[KeywordMatcher] = None):
+        self.text = text or ""
+        self.lower = self.text.lower()
+        self._matcher = matcher or get_keyword_matcher()
+        # lower()로 길이가 바뀌는 문자(예: 'İ')가 있으면 문서 오프셋이 어긋남 → 문장별로 스캔
+        self._shifted = len(self.lower) != len(self.text)
+        self._bounds = iter_sentence_bounds(self.text)
+        self._exhausted = False
+        self._sentences: List[Sentence] = []
+        self._by_start: Dict[int, Sentence] = {}
+        self._contains: Dict[str, bool] = {}
+        self._lock = threading.Lock()
+
+    def _advance(self) -> bool:
+        """다음 SCAN_BLOCK 문장 분할 + 키워드 스캔. 더 없으면 False."""
+        with self._lock:
+            if self._exhausted:
+                return False
+            n0 = len(self._sentences)
+            block = [Sentence(n0 + k, s, e, self.text[s:e]) for k, (s, e) in zip(range(SCAN_BLOCK), self._bounds)]
+            if len(block) < SCAN_BLOCK:
+                self._exhausted = True
+            if not block:
+                return False
+            if self._shifted:
+                for sent in block:
+                    sent_lower = sent.text.lower()
+                    sent.lower_shifted = len(sent_lower) != len(sent.text)
+                    for _, me, kw in self._matcher.scan(sent_lower):
+                        sent.hits.setdefault(kw, me)
+            else:
+                starts = [sent.start for sent in block]
+                for ms, me, kw in self._matcher.scan(self.lower, block[0].start, block[-1].end):
+                    sent = block[bisect_right(starts, ms) - 1]
+                    if me <= sent.end:
+                        sent.hits.setdefault(kw, me - sent.start)
+            # hits를 채운 뒤에 공개 (다른 스레드가 스캔 전 문장을 보지 않도록)
+            for sent in block:
+                self._by_start[sent.start] = sent
+            self._sentences.extend(block)
+            return True
+
+    def iter_sentences(self) -> Iterator[Sentence]:
+        i = 0
+        while i < len(self._sentences) or self._advance():
+            while i < len(self._sentences):
+                yield self._sentences[i]
+                i += 1
+
+    def contains(self, keywords: Iterable[str]) -> List[str]:
+        """keywords 중 문서 전체 텍스트에 있는 것, 주어진 순서대로."""
+        out = []
+        for k in keywords:
+            hit = self._contains.get(k)
+            if hit is None:
+                hit = self._contains[k] = self._matcher.contains(self.lower, k)
+            if hit:
+                out.append(k)
+        return out
+
+    def sentence_at(self, start: int, text: str) -> Optional[Sentence]:
+        """timeline event / evidence span(start, text)에 해당하는 문장. 구조화 차트 등 이 문서 밖 span이면 None."""
+        if not isinstance(start, int) or not text:
+            return None
+        while not (self._sentences and self._sentences[-1].start >= start) and self._advance():
+            pass
+        sent = self._by_start.get(start)
+        if sent is not None and sent.text.startswith(text):
+            return sent
+        return None
+
+    def found_in(self, start: int, text: str, keywords: Iterable[str]) -> List[str]:
+        """span/event 텍스트(잘린 quote 포함)에 있는 keywords. 문서 문장과 맞으면 분석 결과 재사용, 아니면 직접 스캔."""
+        sent = self.sentence_at(start, text)
+        if sent is not None:
+            return sent.found(keywords, limit=len(text))
+        hits = {kw for _, _, kw in self._matcher.scan((text or "").lower())}
+        return [k for k in keywords if k in hits]
+
+
+def build_keyword_index(evidence_spans: Dict[str, Dict], doc: Optional[DocumentAnalysis] = None) -> Dict[str, List[str]]:
+    """
+    keyword → quote에 그 키워드가 있는 span_id 목록 (span 순서).
+    evidence 전처리에서 1번 만들어 preprocessing["evidence"]["keyword_index"]로 저장 → lens 도구는 키워드별 조회만.
+    doc 문장과 맞는 span은 문장 분석 결과 재사용, 아니면(구조화 차트 span 등) quote 직접 스캔.
+    """
+    doc = doc or analyze_document("")
+    index: Dict[str, List[str]] = {}
+    for sid, sp in (evidence_spans or {}).items():
+        if not isinstance(sp, dict):
+            continue
+        quote = str(sp.get("quote", ""))
+        sent = doc.sentence_at(sp.get("start"), quote)
+        if sent is not None:
+            found = sent.found_all(limit=len(quote))
+        else:
+            found = {kw for _, _, kw in get_keyword_matcher().scan(quote.lower())}
+        for kw in found:
+            index.setdefault(kw, []).append(sid)
+    return index
+
+
+def first_span(index: Dict[str, List[str]], keywords: Iterable[str], span_order: Iterable[str]) -> Optional[str]:
+    """keywords 중 하나라도 있는 첫 span (span 순서 기준)."""
+    candidates = {ids[0] for ids in (index.get(k) for k in keywords) if ids}
+    if len(candidates) <= 1:
+        return next(iter(candidates), None)
+    # 후보 중 가장 앞 span까지만 훑음
+    return next((sid for sid in span_order if sid in candidates), None)
+
+
+_doc_cache: "OrderedDict[str, DocumentAnalysis]" = OrderedDict()
+_doc_lock = threading.Lock()
+
+
+def analyze_document(text: str) -> DocumentAnalysis:
+    """텍스트별 분석 객체 재사용 (최근 DOC_CACHE_SIZE개). 분할/스캔 자체는 객체 안에서 필요할 때 진행."""
+    text = text or ""
+    with _doc_lock:
+        doc = _doc_cache.get(text)
+        if doc is not None:
+            _doc_cache.move_to_end(text)
+            return doc
+        doc = DocumentAnalysis(text)
+        _doc_cache[text] = doc
+        while len(_doc_cache) > DOC_CACHE_SIZE:
+            _doc_cache.popitem(last=False)
+        return doc
+
+
+def clear_document_cache() -> None:
+    with _doc_lock:
+        _doc_cache.clear()
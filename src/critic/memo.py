@@ -0,0 +1,215 @@
+"""
+Critic 결과 메모 (디스크, 입력 지문 기준)
+
+같은 케이스 재실행(재업로드, Verifier 실패 후 재시도, 배치 재생)에서 lens/behavior 도구와 CritiqueBuilder LLM 호출을 건너뛴다.
+
+- 도구 키: 도구 이름 + ToolCard.reads의 preprocessing 값 + patient + cohort_data + similar_case_patterns
+  + LLM 경로(사용 여부, "critic_tool" 모델). preprocessing을 쓰는 전처리 도구(휴리스틱, 수 ms)는 메모하지 않음
+- CritiqueBuilder 키: 최종 messages + 모델 → preprocessing / lens / behavior / 참고 결과 / patch 중 하나라도 바뀌면 miss
+- 저장: CRITIC_MEMO_DIR(기본 <project root>/data/critic_memo)/<hash[:2]>/<key>.json
+  최대 CRITIC_MEMO_MAX_ENTRIES개(기본 2000), 넘으면 가장 오래 안 쓴 항목부터 90%까지 삭제 (조회 시 mtime 갱신)
+- 에러/timeout/빈 결과는 저장하지 않음. hit는 trace에 status "cached" (비용 추정 EWMA에는 반영 안 됨)
+- 끄기: CRITIC_MEMO=0. 카세트 record/replay 중에는 자동으로 끔 (기록/재생 경로를 그대로 실행)
+- 강제 재계산: force_refresh() 컨텍스트(잡 단위) 또는 CRITIC_MEMO_REFRESH=1 → 읽지 않고 새 결과로 덮어씀
+"""
+from __future__ import annotations
+
+import contextvars
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+from .types import AgentState, JsonDict
+from .tool_base import Tool
+from ..llm.backend import llm_available
+from ..llm.cassette import get_cassette
+from ..llm.model_router import model_for
+
+# 도구/프롬프트 의미가 바뀌면 올려서 이전 메모 무효화
+# 2: behavior_topk_direct_compare 프롬프트가 공통 유사 케이스/근거 블록 참조로 바뀜
+MEMO_VERSION = 2
+BASE_DIR = Path(__file__).resolve().parents[2]  # project root
+DEFAULT_MEMO_DIR = BASE_DIR / "data" / "critic_memo"
+
+_refresh: contextvars.ContextVar[bool] = contextvars.ContextVar("critic_memo_refresh", default=False)
+
+
+@contextmanager
+def force_refresh(enabled: bool = True) -> Iterator[None]:
+    """with 블록(한 잡/케이스) 동안 메모를 읽지 않고 새로 계산한 결과로 덮어씀."""
+    token = _refresh.set(bool(enabled))
+    try:
+        yield
+    finally:
+        _refresh.reset(token)
+
+
+def refresh_requested() -> bool:
+    return _refresh.get() or os.getenv("CRITIC_MEMO_REFRESH", "0").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _fingerprint(obj: Any) -> str:
+    raw = json.dumps(obj, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _llm_signature(task: str) -> JsonDict:
+    available = llm_available()
+    return {"available": available, "model": model_for(task) if available else None}
+
+
+def memoizable_output(out: Any) -> bool:
+    """저장할 만한 결과인지 (에러/빈 결과/원문만 있는 LLM 응답 제외)."""
+    if not isinstance(out, dict) or "error" in out:
+        return False
+    return any(k != "raw" and not k.startswith("reference_") for k in out)
+
+
+@dataclass
+class CriticMemo:
+    root: Optional[Path]
+    max_entries: int = 2000
+    stats: Dict[str, int] = field(default_factory=lambda: {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "refreshed": 0})
+    _count: Optional[int] = field(default=None, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    @property
+    def enabled(self) -> bool:
+        return self.root is not None and get_cassette() is None
+
+    # ── 키 ──────────────────────────────────────
+
+    def key(self, kind: str, inputs: Any) -> str:
+        return f"{kind}-" + _fingerprint({"v": MEMO_VERSION, "kind": kind, "inputs": inputs})[:40]
+
+    def tool_key(self, tool: Tool, state: AgentState) -> str:
+        return self.key(tool.name, {
+            "reads": {k: state.preprocessing.get(k) for k in tool.card.reads},
+            "patient": state.patient,
+            "cohort": state.cohort_data,
+            "patterns": state.similar_case_patterns,
+            "llm": _llm_signature("critic_tool"),
+        })
+
+    def _path(self, key: str) -> Path:
+        digest = key.rsplit("-", 1)[-1]
+        return self.root / digest[:2] / f"{key}.json"
+
+    # ── 조회 / 저장 ─────────────────────────────
+
+    def get(self, key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        if refresh_requested():
+            with self._lock:
+                self.stats["refreshed"] += 1
+            return None
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+            os.utime(path, None)  # LRU 기준
+        except FileNotFoundError:
+            entry = None
+        except Exception as e:
+            print(f"  [CriticMemo] read failed ({path.name}): {e}")
+            entry = None
+        with self._lock:
+            self.stats["hits" if entry is not None else "misses"] += 1
+        return entry.get("value") if isinstance(entry, dict) else None
+
+    def put(self, key: str, value: Any) -> None:
+        if not self.enabled:
+            return
+        path = self._path(key)
+        try:
+            payload = json.dumps({"key": key, "created_at": time.time(), "value": value}, ensure_ascii=False, default=str)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            existed = path.exists()
+            tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+            tmp.write_text(payload, encoding="utf-8")
+            tmp.replace(path)
+        except Exception as e:
+            print(f"  [CriticMemo] write failed ({path.name}): {e}")
+            return
+        with self._lock:
+            self.stats["writes"] += 1
+            if self._count is None:
+                self._count = sum(1 for _ in self.root.glob("*/*.json"))
+            elif not existed:
+                self._count += 1
+            over = self._count > self.max_entries
+        if over:
+            self.evict()
+
+    def evict(self) -> int:
+        """가장 오래 안 쓴(mtime) 항목부터 max_entries의 90%까지 삭제 (저장마다 디렉터리를 훑지 않도록 여유를 둠)."""
+        if self.root is None:
+            return 0
+        with self._lock:
+            files = []
+            for p in self.root.glob("*/*.json"):
+                try:
+                    files.append((p.stat().st_mtime, p))
+                except FileNotFoundError:
+                    continue
+            excess = len(files) - int(self.max_entries * 0.9) if len(files) > self.max_entries else 0
+            removed = 0
+            for _, p in sorted(files)[:excess]:
+                try:
+                    p.unlink()
+                    removed += 1
+                except FileNotFoundError:
+                    continue
+            self._count = len(files) - removed
+            self.stats["evictions"] += removed
+        return removed
+
+    def clear(self) -> None:
+        if self.root is None:
+            return
+        with self._lock:
+            for p in self.root.glob("*/*.json"):
+                try:
+                    p.unlink()
+                except FileNotFoundError:
+                    continue
+            self._count = 0
+
+    def snapshot(self) -> JsonDict:
+        with self._lock:
+            return {"root": str(self.root) if self.root else None, "entries": self._count, **self.stats}
+
+
+_memo: Optional[CriticMemo] = None
+_memo_lock = threading.Lock()
+
+
+def get_critic_memo() -> CriticMemo:
+    global _memo
+    if _memo is None:
+        with _memo_lock:
+            if _memo is None:
+                off = os.getenv("CRITIC_MEMO", "1").strip().lower() in ("0", "false", "no", "off")
+                root = None if off else Path(os.getenv("CRITIC_MEMO_DIR") or DEFAULT_MEMO_DIR)
+                _memo = CriticMemo(root=root, max_entries=int(os.getenv("CRITIC_MEMO_MAX_ENTRIES", "2000")))
+    return _memo
+
+
+def set_critic_memo(memo: Optional[CriticMemo]) -> None:
+    global _memo
+    with _memo_lock:
+        _memo = memo
+
+
+def builder_key(messages: Any, model: Optional[str]) -> str:
+    """CritiqueBuilder LLM 호출 키 (프롬프트가 곧 입력 전체)."""
+    return get_critic_memo().key("critique_builder", {
+        "messages": messages,
+        "model": model or model_for("critique"),
+    })
@@ -0,0 +1,202 @@
+"""
+CritiqueBuilder 입력 payload 컴파일 (압축 + 중복 제거)
+
+기존에는 payload dict의 파이썬 repr을 그대로 프롬프트에 넣어 같은 내용이 여러 번 들어갔다
+(timeline 이벤트와 evidence span의 같은 문장, lens 출력의 이벤트 인용, LLM 도구의 raw 원문,
+도구마다 붙는 reference_* 사본, 맨 앞 SHARED EVIDENCE CONTEXT와 같은 cohort evidence 사본).
+
+- 문장 본문은 evidence_spans(E#)에만 1번. 같은 문장의 timeline 이벤트는 "span": "E#", start/end 오프셋 제거
+- lens/behavior 출력: event_id가 있는 이벤트 인용(text)은 제거, span 인용(quote)은 span_id로 대체
+- raw(LLM 원문), keyword_index 제거
+- reference_* 사본은 reference_only_prior_results로 모아 1번만. cohort evidence는 SHARED EVIDENCE CONTEXT 참조 문자열
+- 이미 넣은 객체(같은 참조)가 다시 나오면 {"$ref": "<처음 경로>"}
+- 빈 값(None, "", [], {})인 최상위 항목 생략, 공백 없는 JSON 출력
+- 압축 전(repr) / 후 토큰 수를 stats로 반환 (CritiqueBuilder trace detail)
+"""
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, Tuple
+
+from .types import JsonDict
+from ..agents.evidence_agent import SHARED_EVIDENCE_REF
+from ..llm.prompt_budget import count_tokens
+
+_DROP_KEYS = frozenset({"raw", "keyword_index"})
+_REF_PREFIX = "reference_"
+# span 인용으로 보고 span_id로 바꿀 키 (짧은 문자열은 우연 일치 가능 → 길이 하한)
+_QUOTE_KEYS = ("quote", "text", "evidence")
+_MIN_QUOTE_CHARS = 20
+
+
+class _Compiler:
+    def __init__(self, preprocessing: JsonDict, shared_evidence: Any = None):
+        self.seen: Dict[int, str] = {}
+        self.refs: Dict[str, Any] = {}
+        self.shared_evidence = shared_evidence
+        evidence = preprocessing.get("evidence") if isinstance(preprocessing, dict) else None
+        spans = evidence.get("evidence_spans") if isinstance(evidence, dict) else None
+        self.spans: Dict[str, JsonDict] = spans if isinstance(spans, dict) else {}
+        self.span_by_range: Dict[Tuple[Any, Any], str] = {}
+        self.span_by_quote: Dict[str, str] = {}
+        for sid, sp in self.spans.items():
+            if not isinstance(sp, dict):
+                continue
+            self.span_by_range.setdefault((sp.get("start"), sp.get("end")), sid)
+            quote = str(sp.get("quote", "")).strip()
+            if quote:
+                self.span_by_quote.setdefault(quote, sid)
+        timeline = preprocessing.get("timeline") if isinstance(preprocessing, dict) else None
+        events = timeline.get("events") if isinstance(timeline, dict) else None
+        self.event_text: Dict[str, str] = {
+            str(ev.get("event_id")): str(ev.get("text", ""))
+            for ev in (events if isinstance(events, list) else [])
+            if isinstance(ev, dict) and ev.get("event_id")
+        }
+
+    # ── preprocessing ───────────────────────────
+
+    def preprocessing(self, pre: Any) -> Any:
+        if not isinstance(pre, dict):
+            return self.value(pre, "preprocessing")
+        out: JsonDict = {}
+        for key, val in pre.items():
+            path = f"preprocessing.{key}"
+            if key == "evidence" and isinstance(val, dict):
+                out[key] = self._evidence(val, path)
+            elif key == "timeline" and isinstance(val, dict):
+                out[key] = self._timeline(val, path)
+            else:
+                out[key] = self.value(val, path)
+        return out
+
+    def _evidence(self, evidence: JsonDict, path: str) -> JsonDict:
+        out: JsonDict = {}
+        for key, val in evidence.items():
+            if key in _DROP_KEYS:
+                continue
+            if key == "evidence_spans" and isinstance(val, dict):
+                out[key] = {
+                    sid: {"category": sp.get("category"), "quote": sp.get("quote")} if isinstance(sp, dict) else sp
+                    for sid, sp in val.items()
+                }
+            else:
+                out[key] = self.value(val, f"{path}.{key}")
+        return out
+
+    def _timeline(self, timeline: JsonDict, path: str) -> JsonDict:
+        out: JsonDict = {}
+        for key, val in timeline.items():
+            if key != "events" or not isinstance(val, list):
+                out[key] = self.value(val, f"{path}.{key}")
+                continue
+            events = []
+            for ev in val:
+                if not isinstance(ev, dict):
+                    events.append(ev)
+                    continue
+                item = {k: ev[k] for k in ("event_id", "type", "time_hint") if ev.get(k) is not None}
+                sid = self.span_by_range.get((ev.get("start"), ev.get("end")))
+                if sid is not None:
+                    item["span"] = sid
+                else:
+                    item["text"] = ev.get("text")
+                events.append(item)
+            out[key] = events
+        return out
+
+    # ── 일반 값 (lens / behavior / 이전 critique 등) ──
+
+    def value(self, obj: Any, path: str) -> Any:
+        if isinstance(obj, (dict, list)) and obj:
+            first = self.seen.get(id(obj))
+            if first is not None:
+                return {"$ref": first}
+            self.seen[id(obj)] = path
+        if isinstance(obj, dict):
+            return self._dict(obj, path)
+        if isinstance(obj, (list, tuple)):
+            return [self.value(v, f"{path}[{i}]") for i, v in enumerate(obj)]
+        if obj is None or isinstance(obj, (str, int, float, bool)):
+            return obj
+        return str(obj)
+
+    def _dict(self, obj: JsonDict, path: str) -> JsonDict:
+        out: JsonDict = {}
+        event_text = self.event_text.get(str(obj.get("event_id"))) if obj.get("event_id") else None
+        for key, val in obj.items():
+            if key in _DROP_KEYS:
+                continue
+            if key.startswith(_REF_PREFIX) and val is not None:
+                self.hoist(key[len(_REF_PREFIX):], val)
+                continue
+            if key in _QUOTE_KEYS and isinstance(val, str):
+                quote = val.strip()
+                # timeline 이벤트 인용 (lens 출력은 이벤트 text를 잘라서 씀)
+                if event_text is not None and quote and event_text.startswith(quote):
+                    continue
+                sid = self.span_by_quote.get(quote) if len(quote) >= _MIN_QUOTE_CHARS else None
+                if sid is not None:
+                    if "span_id" not in obj:
+                        out["span_id"] = sid
+                    continue
+            out[key] = self.value(val, f"{path}.{key}")
+        return out
+
+    # ── reference_* 사본 ────────────────────────
+
+    def hoist(self, name: str, val: Any) -> None:
+        if self.shared_evidence is not None and (val is self.shared_evidence or val == self.shared_evidence):
+            val = SHARED_EVIDENCE_REF
+        cur = self.refs.get(name)
+        if cur is None:
+            self.refs[name] = val
+        elif cur is not val and cur != val:
+            # 이름이 같고 내용이 다르면 둘 다 유지
+            i = 2
+            while f"{name}_{i}" in self.refs and self.refs[f"{name}_{i}"] != val:
+                i += 1
+            self.refs[f"{name}_{i}"] = val
+
+
+def _empty(v: Any) -> bool:
+    return v is None or v == "" or v == [] or v == {}
+
+
+def compile_critique_payload(payload: JsonDict, *, shared_evidence: Any = None) -> Tuple[str, JsonDict]:
+    """
+    CritiqueBuilder payload dict → (압축 JSON 문자열, stats).
+
+    payload 키: patient / preprocessing / lens_results / behavior_results / cohort_patterns /
+    previous_critique / patch_instructions / reference_only_prior_results / literature_evidence.
+    shared_evidence: SHARED EVIDENCE CONTEXT 블록으로 이미 넣은 cohort evidence (사본은 참조 문자열로 대체).
+    """
+    preprocessing = payload.get("preprocessing") or {}
+    comp = _Compiler(preprocessing, shared_evidence=shared_evidence)
+    prior = payload.get("reference_only_prior_results")
+    if isinstance(prior, dict):
+        for name, val in prior.items():
+            comp.hoist(name, val)
+
+    out: JsonDict = {}
+    for key, val in payload.items():
+        if key == "reference_only_prior_results":
+            continue
+        if key == "preprocessing":
+            out[key] = comp.preprocessing(val)
+        else:
+            out[key] = comp.value(val, key)
+    if comp.refs:
+        out["reference_only_prior_results"] = comp.value(comp.refs, "reference_only_prior_results")
+    out = {k: v for k, v in out.items() if not _empty(v)}
+
+    text = json.dumps(out, ensure_ascii=False, separators=(",", ":"), default=str)
+    # 압축 전: 기존 프롬프트가 넣던 repr 그대로
+    before = str(payload)
+    stats = {
+        "payload_chars_before": len(before),
+        "payload_chars": len(text),
+        "payload_tokens_before": count_tokens(before),
+        "payload_tokens": count_tokens(text),
+    }
+    return text, stats
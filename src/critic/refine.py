@@ -0,0 +1,166 @@
+"""
+Critique 반복 개선 (bounded refinement)
+
+- critique_issues: LLM 호출 없는 일관성 검사 (critique point 3-5개, span_id 존재/유효, severity 값, 중복 point)
+- 문제가 없으면 1회로 종료. 있으면 CritiqueBuilder.refine (patch 프롬프트: 문제 목록 + 현재 critique + 인용 span만) 반복
+- 종료(stop_reason): converged(문제 없음) / stalled(문제 수가 줄지 않음 → 이전 critique 유지) /
+  max_iterations / deadline(잡 마감까지 다음 회차 + Verifier 몫이 안 남음) / no_llm
+- 회차 기록(refinement): 회차별 문제 목록, point 수, 지연 → 파이프라인 결과 critic_refinement, 배치 summary.json
+- max_iterations: 첫 생성 포함 총 CritiqueBuilder 회차 (scripts/main.py 입력 / 배치 --max-iterations, 기본 CRITIC_MAX_ITERATIONS=3)
+"""
+from __future__ import annotations
+
+import re
+from collections import Counter
+from statistics import mean
+from typing import Any, Dict, Iterable, List, Optional
+
+from .types import JsonDict
+
+MIN_POINTS = 3
+MAX_POINTS = 5
+VALID_SEVERITIES = ("high", "critical", "medium", "low")
+UNCERTAINTY_SPAN = "record_uncertainty"
+
+_WORD = re.compile(r"[a-z0-9가-힣]{3,}")
+
+
+def _words(text: Any) -> set:
+    return set(_WORD.findall(str(text or "").lower()))
+
+
+def critique_issues(critique: Optional[JsonDict], evidence_spans: Optional[Dict[str, Any]]) -> List[str]:
+    """critique 일관성 문제 목록 (비어 있으면 수렴). 문구는 그대로 patch 프롬프트에 들어감."""
+    points = (critique or {}).get("critique_points") or []
+    if not isinstance(points, list) or not points:
+        return ["critique_points is empty: generate 3-5 critique points."]
+    issues: List[str] = []
+    if len(points) < MIN_POINTS:
+        issues.append(f"only {len(points)} critique point(s): add clinically meaningful points to reach {MIN_POINTS}-{MAX_POINTS}.")
+    elif len(points) > MAX_POINTS:
+        issues.append(f"{len(points)} critique points: merge or drop the least important to keep at most {MAX_POINTS}.")
+    spans = evidence_spans if isinstance(evidence_spans, dict) else {}
+    seen: List[set] = []
+    for i, pt in enumerate(points, 1):
+        if not isinstance(pt, dict):
+            issues.append(f"point {i} is not an object with point/span_id/severity.")
+            continue
+        sid = str(pt.get("span_id") or "").strip()
+        if not sid:
+            issues.append(f"point {i} has no span_id: cite an evidence span id or {UNCERTAINTY_SPAN}.")
+        else:
+            # "E1, E3" 같은 복수 인용 허용
+            bad = [s for s in re.split(r"[\s,|/]+", sid) if s and s != UNCERTAINTY_SPAN and s not in spans]
+            if bad and spans:
+                issues.append(f"point {i} cites unknown span_id {', '.join(bad)}: use an existing evidence span id or {UNCERTAINTY_SPAN}.")
+        if str(pt.get("severity", "")).lower() not in VALID_SEVERITIES:
+            issues.append(f"point {i} severity {pt.get('severity')!r} is invalid: use high, medium or low.")
+        words = _words(pt.get("point"))
+        if not words:
+            issues.append(f"point {i} has empty text.")
+            continue
+        for j, prev in enumerate(seen, 1):
+            if prev and len(words & prev) / len(words | prev) >= 0.8:
+                issues.append(f"point {i} duplicates point {j}: merge them or replace one with a distinct issue.")
+                break
+        seen.append(words)
+    return issues
+
+
+def format_patch_instructions(issues: Iterable[str]) -> str:
+    return "\n".join(f"- {x}" for x in issues)
+
+
+def cited_span_ids(critique: Optional[JsonDict]) -> List[str]:
+    ids: List[str] = []
+    for pt in (critique or {}).get("critique_points") or []:
+        if isinstance(pt, dict):
+            for s in re.split(r"[\s,|/]+", str(pt.get("span_id") or "")):
+                if s and s != UNCERTAINTY_SPAN and s not in ids:
+                    ids.append(s)
+    return ids
+
+
+def new_refinement(max_iterations: int) -> JsonDict:
+    return {"max_iterations": max(1, int(max_iterations)), "iterations": [], "stop_reason": None, "converged": False}
+
+
+def record_iteration(refinement: JsonDict, critique: JsonDict, issues: List[str], latency_ms: float,
+                     **extra: Any) -> JsonDict:
+    it = {
+        "iteration": len(refinement["iterations"]) + 1,
+        "issues": issues,
+        "points": len((critique or {}).get("critique_points") or []),
+        "latency_ms": round(latency_ms),
+        **extra,
+    }
+    refinement["iterations"].append(it)
+    return it
+
+
+def stop_reason(refinement: JsonDict, *, llm: bool, remaining_ms: Optional[float], reserve_ms: float) -> Optional[str]:
+    """다음 회차를 돌지 않을 이유 (None이면 계속)."""
+    its = refinement["iterations"]
+    last = its[-1]
+    if not last["issues"]:
+        return "converged"
+    if len(its) >= 2 and len(last["issues"]) >= len(its[-2]["issues"]):
+        return "stalled"
+    if len(its) >= refinement["max_iterations"]:
+        return "max_iterations"
+    if not llm:
+        return "no_llm"
+    # 다음 회차는 직전 회차만큼 걸린다고 보고, Verifier 몫(reserve의 절반)이 남는지 확인
+    if remaining_ms is not None and remaining_ms - last["latency_ms"] < reserve_ms / 2:
+        return "deadline"
+    return None
+
+
+def verifier_agreement(points: List[Any], solutions: List[Any]) -> Optional[float]:
+    """Verifier solution이 대응하는 critique point 비율 (issue 문구 단어 겹침 기준). 품질 지표용."""
+    texts = [(p.get("point") or p.get("issue")) if isinstance(p, dict) else p for p in points or []]
+    texts = [t for t in texts if t]
+    if not texts:
+        return None
+    issues = [_words((s.get("issue") if isinstance(s, dict) else s)) for s in solutions or []]
+    matched = 0
+    for t in texts:
+        w = _words(t)
+        if w and any(s and len(w & s) / min(len(w), len(s)) >= 0.5 for s in issues):
+            matched += 1
+    return round(matched / len(texts), 3)
+
+
+def summarize_refinement(reports: Iterable[Optional[JsonDict]]) -> JsonDict:
+    """케이스별 refinement 기록 → 반복 횟수 대비 품질/지연 요약 (배치 summary.json, 예산 튜닝용)."""
+    reports = [r for r in reports if isinstance(r, dict) and r.get("iterations")]
+    if not reports:
+        return {"cases": 0}
+    by_count: Dict[int, List[JsonDict]] = {}
+    latency_by_iter: Dict[int, List[float]] = {}
+    for r in reports:
+        by_count.setdefault(len(r["iterations"]), []).append(r)
+        for it in r["iterations"]:
+            latency_by_iter.setdefault(it["iteration"], []).append(it["latency_ms"])
+
+    def avg(xs: List[float]) -> Optional[float]:
+        xs = [x for x in xs if x is not None]
+        return round(mean(xs), 3) if xs else None
+
+    return {
+        "cases": len(reports),
+        "converged_rate": round(sum(1 for r in reports if r.get("converged")) / len(reports), 3),
+        "stop_reasons": dict(Counter(r.get("stop_reason") for r in reports)),
+        "avg_issues_first": avg([len(r["iterations"][0]["issues"]) for r in reports]),
+        "avg_issues_final": avg([len(r.get("final_issues", r["iterations"][-1]["issues"])) for r in reports]),
+        "avg_latency_ms_by_iteration": {k: avg(v) for k, v in sorted(latency_by_iter.items())},
+        "by_iterations": {
+            n: {
+                "cases": len(rs),
+                "avg_total_latency_ms": avg([sum(it["latency_ms"] for it in r["iterations"]) for r in rs]),
+                "avg_final_issues": avg([len(r.get("final_issues", r["iterations"][-1]["issues"])) for r in rs]),
+                "avg_verifier_agreement": avg([r.get("verifier_agreement") for r in rs]),
+            }
+            for n, rs in sorted(by_count.items())
+        },
+    }
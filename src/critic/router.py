@@ -1,11 +1,18 @@
 from __future__ import annotations
 
 import os
+import threading
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
+from .runner import AgentConfig, ToolBudget, fit_tool_budget
 from .types import AgentState, ToolCard, ToolSelection
+from ..llm.backend import llm_available
+from ..llm.model_router import routed_call, router_stats
 from ..llm.openai_chat import OpenAIChatConfig, call_openai_chat_completions, safe_json_loads
+from ..llm.prompt_budget import get_token_budget
+from ..agents.evidence_agent import compress_clinical_text
 
 
 def _text_len_bucket(text: str) -> str:
@@ -19,9 +26,66 @@ def _text_len_bucket(text: str) -> str:
     return "long"
 
 
-def _contains_any(text: str, keywords: List[str]) -> bool:
-    t = (text or "").lower()
-    return any(k.lower() in t for k in keywords)
+SEVERE_KEYWORDS = [
+    "shock",
+    "hypotension",
+    "intub",
+    "vent",
+    "respiratory failure",
+    "sepsis",
+    "lactate",
+    "pressors",
+    "icu",
+    "rapid response",
+    "code blue",
+]
+DX_KEYWORDS = ["diagnosis", "impression", "assessment", "a/p", "ddx", "differential"]
+# short ↔ medium 경계(1500자)는 dx lens / top-k 비교 선택을 바꿈 → 경계 ±15%는 애매한 길이로 봄
+_BOUNDARY_CHARS = 1500
+_BOUNDARY_MARGIN = 0.15
+
+
+def heuristic_features(state: AgentState) -> Dict[str, Any]:
+    """HeuristicRouter / HybridRouter 공통 특징 (로컬 계산, LLM 호출 없음)."""
+    text = str(state.patient.get("text", "") or "")
+    t = text.lower()
+    return {
+        "bucket": _text_len_bucket(text),
+        "severe_hits": sum(1 for k in SEVERE_KEYWORDS if k in t),
+        "dx_hits": sum(1 for k in DX_KEYWORDS if k in t),
+        "status": state.patient.get("status"),
+        "near_boundary": abs(len(text) - _BOUNDARY_CHARS) <= _BOUNDARY_CHARS * _BOUNDARY_MARGIN,
+    }
+
+
+def ambiguity(features: Dict[str, Any]) -> Optional[str]:
+    """휴리스틱 선택이 신호 한 개/길이 경계에 걸려 있으면 그 이유, 확실하면 None."""
+    if features["status"] not in ("dead", "alive") and features["severe_hits"] == 1:
+        return "single_severity_keyword"
+    if features["bucket"] in ("very_short", "short") and features["dx_hits"] == 1:
+        return "single_dx_keyword"
+    if features["near_boundary"]:
+        return "length_near_boundary"
+    return None
+
+
+def _feature_key(features: Dict[str, Any], available_tools: List[str]) -> Tuple:
+    # 키워드 수는 3 이상을 같은 값으로 (캐시 적중률)
+    return (
+        features["bucket"], min(features["severe_hits"], 3), min(features["dx_hits"], 3),
+        features["status"], features["near_boundary"], tuple(available_tools),
+    )
+
+
+def _apply_budget(selection: ToolSelection, tool_cards: Optional[List[ToolCard]], budget: Optional[ToolBudget]) -> ToolSelection:
+    if not tool_cards or budget is None or not budget.limited:
+        return selection
+    kept, dropped = fit_tool_budget(selection.tools, tool_cards, budget)
+    if dropped:
+        print(f"  [Critic Router] budget {budget.to_dict()} → dropped {dropped}")
+    selection.tools = kept
+    selection.dropped = dropped
+    return selection
 
 
 @dataclass
@@ -29,34 +93,28 @@ class HeuristicRouter:
     """
     Router v1: no extra LLM calls.
     Picks lens/tools based on simple triggers.
+    budget(ms / tokens)이 있으면 tool_cards의 비용 추정으로 초과분을 value 낮고 비싼 도구부터 제외.
     """
 
-    def select(self, state: AgentState, available_tools: List[str]) -> ToolSelection:
-        text = str(state.patient.get("text", "") or "")
-        bucket = _text_len_bucket(text)
-
-        severe_kw = [
-            "shock",
-            "hypotension",
-            "intub",
-            "vent",
-            "respiratory failure",
-            "sepsis",
-            "lactate",
-            "pressors",
-            "icu",
-            "rapid response",
-            "code blue",
-        ]
-        dx_kw = ["diagnosis", "impression", "assessment", "a/p", "ddx", "differential"]
-
-        has_severe = _contains_any(text, severe_kw)
-        has_dx_claim = _contains_any(text, dx_kw)
+    def select(
+        self,
+        state: AgentState,
+        available_tools: List[str],
+        tool_cards: Optional[List[ToolCard]] = None,
+        budget: Optional[ToolBudget] = None,
+    ) -> ToolSelection:
+        selection = self.select_from_features(heuristic_features(state), available_tools)
+        return _apply_budget(selection, tool_cards, budget)
+
+    def select_from_features(self, features: Dict[str, Any], available_tools: List[str]) -> ToolSelection:
+        bucket = features["bucket"]
+        has_severe = features["severe_hits"] > 0
+        has_dx_claim = features["dx_hits"] > 0
 
         tools: List[str] = []
 
         # Lens selection (V1 minimal set)
-        if has_severe or state.patient.get("status") in ("dead", "alive"):
+        if has_severe or features["status"] in ("dead", "alive"):
             tools += ["lens_severity_risk", "lens_monitoring_response"]
         if has_dx_claim or bucket in ("medium", "long"):
             tools += ["lens_diagnostic_consistency"]
@@ -73,7 +131,7 @@ class HeuristicRouter:
                 uniq.append(t)
 
         reason = f"heuristic_router bucket={bucket} severe={has_severe} dx_claim={has_dx_claim}"
-        return ToolSelection(tools=uniq, reason=reason, retrieved_cards=[])
+        return ToolSelection(tools=uniq, reason=reason, retrieved_cards=[], decision="heuristic")
 
 
 @dataclass
@@ -81,47 +139,182 @@ class LLMRouter:
     """
     Router that uses LLM (agent-style): reads tool cards (documents) and current
     context, then selects which agents/tools to run next. Fallback to HeuristicRouter
-    when OPENAI_API_KEY is not set.
+    when no LLM backend is available (OPENAI_API_KEY not set and LLM_BACKEND != local).
+
+    model: None이면 model_router의 "routing" 티어 모델. 유효한 도구를 하나도 못 고르면 large 모델로 승격.
+    budget이 있으면 프롬프트에 도구별 비용 추정 + 예산을 넣고, 응답 후에도 초과분을 제외.
     """
 
-    model: str = "gpt-4o-mini"
+    model: Optional[str] = None
 
     def _llm_available(self) -> bool:
-        return bool(os.environ.get("OPENAI_API_KEY", "").strip())
+        return llm_available()
 
     def select(
         self,
         state: AgentState,
         available_tools: List[str],
         tool_cards: List[ToolCard],
+        budget: Optional[ToolBudget] = None,
     ) -> ToolSelection:
         if not self._llm_available():
-            return HeuristicRouter().select(state, available_tools)
+            return HeuristicRouter().select(state, available_tools, tool_cards, budget)
 
         text = str(state.patient.get("text", "") or "")
-        card_text = "\n\n".join([c.to_text() for c in tool_cards]) if tool_cards else ""
+        limited = budget is not None and budget.limited
+        # 비용 줄은 예산이 있을 때만 (추정치가 바뀌어도 예산 없는 실행의 프롬프트/캐시는 그대로)
+        card_text = "\n\n".join(
+            [c.to_text() + (f"\nCost: {c.cost_text()}" if limited else "") for c in tool_cards]
+        ) if tool_cards else ""
+        budget_text = ""
+        if limited:
+            parts = []
+            if budget.ms is not None:
+                parts.append(f"~{budget.ms / 1000:.0f}s wall time (tools run concurrently)")
+            if budget.tokens is not None:
+                parts.append(f"~{budget.tokens} tokens")
+            budget_text = f"\nBUDGET: {' and '.join(parts)}. Prefer cheaper tools; skip expensive low-value ones if the budget is tight.\n"
 
         prompt = f"""You are a tool router for a clinical critique agent. Read the tool cards below and the patient context, then select the MINIMAL set of tools (1~6) whose triggers or description fit the case.
 
 AVAILABLE_TOOLS: {available_tools}
-
+{budget_text}
 Tool cards:
 {card_text}
 
 Patient context (truncated):
-{text[:2500]}
+{compress_clinical_text(text, get_token_budget("critic_router_text"))}
 
 Output JSON only:
 {{"tools": ["tool_name", "..."], "reason": "one short sentence"}}
 """
 
-        cfg = OpenAIChatConfig(model=self.model, temperature=0.1, max_tokens=400)
-        content = call_openai_chat_completions(messages=[{"role": "user", "content": prompt}], config=cfg)
-        obj = safe_json_loads(content) or {}
-        tools = obj.get("tools") if isinstance(obj.get("tools"), list) else []
-        tools = [t for t in tools if isinstance(t, str) and t in available_tools]
+        def call(model: str) -> tuple:
+            cfg = OpenAIChatConfig(model=model, temperature=0.1, max_tokens=400)
+            content = call_openai_chat_completions(messages=[{"role": "user", "content": prompt}], config=cfg)
+            obj = safe_json_loads(content) or {}
+            picked = obj.get("tools") if isinstance(obj.get("tools"), list) else []
+            picked = [t for t in picked if isinstance(t, str) and t in available_tools]
+            return picked, str(obj.get("reason", "") or "")
+
+        tools, reason = routed_call(
+            "routing", call, validate=lambda res: bool(res[0]), call_site="critic.router", model=self.model
+        )
         if not tools:
-            return HeuristicRouter().select(state, available_tools)
-        reason = str(obj.get("reason", "") or "")
-        return ToolSelection(tools=tools, reason=reason, retrieved_cards=tools)
+            return HeuristicRouter().select(state, available_tools, tool_cards, budget)
+        return _apply_budget(
+            ToolSelection(tools=tools, reason=reason, retrieved_cards=tools, decision="llm"), tool_cards, budget
+        )
+
+
+# ---------------------------------------------------------------------------
+# Hybrid: 휴리스틱 특징이 확실하면 LLM 호출 생략, 애매하면 LLM (특징 벡터 키로 캐시)
+# ---------------------------------------------------------------------------
+
+ROUTER_CACHE_SIZE = int(os.getenv("CRITIC_ROUTER_CACHE_SIZE", "256"))
+
+
+@dataclass
+class HybridRouterStats:
+    heuristic: int = 0
+    llm: int = 0
+    cache: int = 0
+    compared: int = 0
+    agreed: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        total = self.heuristic + self.llm + self.cache
+        # 생략한 LLM 호출 × critic.router 평균 지연 = 절약 추정
+        avg_llm_s = (router_stats().get("critic.router") or {}).get("avg_latency_s", 0.0)
+        saved_s = (self.heuristic + self.cache) * avg_llm_s
+        return {
+            "decisions": total,
+            "heuristic": self.heuristic,
+            "llm": self.llm,
+            "cache": self.cache,
+            "llm_rate": round(self.llm / total, 4) if total else 0.0,
+            # LLM을 부른 경우 휴리스틱 선택과 같은 도구 집합이었던 비율 (낮으면 ambiguity 기준을 넓혀야 함)
+            "agreement_rate": round(self.agreed / self.compared, 4) if self.compared else None,
+            "avg_llm_latency_s": avg_llm_s,
+            "est_saved_s": round(saved_s, 3),
+            "est_saved_s_per_case": round(saved_s / total, 3) if total else 0.0,
+        }
+
+
+_hybrid_stats = HybridRouterStats()
+_decision_cache: "OrderedDict[Tuple, Tuple[List[str], str]]" = OrderedDict()
+_hybrid_lock = threading.Lock()
+
+
+def hybrid_router_stats() -> Dict[str, Any]:
+    with _hybrid_lock:
+        snapshot = HybridRouterStats(**{k: getattr(_hybrid_stats, k) for k in HybridRouterStats.__dataclass_fields__})
+    return snapshot.to_dict()
+
+
+def reset_hybrid_router() -> None:
+    global _hybrid_stats
+    with _hybrid_lock:
+        _hybrid_stats = HybridRouterStats()
+        _decision_cache.clear()
+
+
+@dataclass
+class HybridRouter:
+    """
+    heuristic_features()가 확실하면 HeuristicRouter 결과를 그대로 사용 (LLM 호출 없음).
+    애매하면(ambiguity) 같은 특징 벡터의 이전 LLM 결정을 재사용, 없으면 LLMRouter 호출 후 캐시.
+    """
+
+    model: Optional[str] = None
+
+    def select(
+        self,
+        state: AgentState,
+        available_tools: List[str],
+        tool_cards: List[ToolCard],
+        budget: Optional[ToolBudget] = None,
+    ) -> ToolSelection:
+        features = heuristic_features(state)
+        heuristic = HeuristicRouter().select_from_features(features, available_tools)
+        reason_ambiguous = ambiguity(features)
+        if reason_ambiguous is None or not llm_available():
+            with _hybrid_lock:
+                _hybrid_stats.heuristic += 1
+            heuristic.reason = f"hybrid(confident): {heuristic.reason}"
+            return _apply_budget(heuristic, tool_cards, budget)
+
+        key = _feature_key(features, available_tools)
+        with _hybrid_lock:
+            cached = _decision_cache.get(key)
+            if cached is not None:
+                _decision_cache.move_to_end(key)
+                _hybrid_stats.cache += 1
+        if cached is not None:
+            tools, reason = cached
+            selection = ToolSelection(tools=list(tools), reason=f"hybrid(cached, {reason_ambiguous}): {reason}",
+                                      retrieved_cards=list(tools), decision="cache")
+            return _apply_budget(selection, tool_cards, budget)
+
+        # 예산은 캐시된 결정에도 매번 적용해야 하므로 LLM 선택은 예산 없이 받아 둠
+        selection = LLMRouter(model=self.model).select(state, available_tools, tool_cards)
+        with _hybrid_lock:
+            _hybrid_stats.llm += 1
+            if selection.decision == "llm":
+                _hybrid_stats.compared += 1
+                _hybrid_stats.agreed += int(set(selection.tools) == set(heuristic.tools))
+                _decision_cache[key] = (list(selection.tools), selection.reason)
+                while len(_decision_cache) > ROUTER_CACHE_SIZE:
+                    _decision_cache.popitem(last=False)
+        selection.reason = f"hybrid(llm, {reason_ambiguous}): {selection.reason}"
+        return _apply_budget(selection, tool_cards, budget)
+
+
+def make_router(config: AgentConfig):
+    """AgentConfig.router_mode → 라우터 ("llm" | "heuristic" | "hybrid")."""
+    if config.router_mode == "heuristic":
+        return HeuristicRouter()
+    if config.router_mode == "llm":
+        return LLMRouter(model=config.router_llm_model)
+    return HybridRouter(model=config.router_llm_model)
 
@@ -1,10 +1,48 @@
 from __future__ import annotations
 
+import contextvars
+import copy
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from dataclasses import dataclass
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 
-from .types import ToolCard
+from .types import AgentState, JsonDict, ToolCard
+from .memo import get_critic_memo, memoizable_output
 from .tool_base import Tool
+from .tool_costs import record_tool_costs
+from ..llm.rate_limit import deadline_remaining_s, job_deadline
+from ..llm.usage import UsageTracker, current_tracker, track_usage
+
+
+DEFAULT_TOOL_TIMEOUT_S = float(os.getenv("CRITIC_TOOL_TIMEOUT_S", "90"))
+# 토큰 0 + 이 지연 이하인 도구(휴리스틱 lens, 전처리)는 예산 때문에 제외하지 않음
+FREE_TOOL_LATENCY_MS = 50.0
+
+
+def _env_number(name: str) -> Optional[float]:
+    value = os.getenv(name)
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+@dataclass
+class ToolBudget:
+    """도구 선택 예산. ms는 예상 wall time (동시 실행 wave 기준), None이면 제한 없음."""
+
+    max_tools: int
+    ms: Optional[float] = None
+    tokens: Optional[int] = None
+
+    @property
+    def limited(self) -> bool:
+        return self.ms is not None or self.tokens is not None
+
+    def to_dict(self) -> JsonDict:
+        return {"max_tools": self.max_tools, "ms": self.ms, "tokens": self.tokens}
 
 
 @dataclass
@@ -12,8 +50,31 @@ class AgentConfig:
     """Critic 에이전트 공통 설정 (LangGraph 서브그래프에서도 공유)."""
 
     max_tools: int = 8
-    router_llm_model: str = "gpt-4o-mini"
-    critique_model: str = "gpt-4o-mini"
+    # run_tools 노드의 도구별 timeout (wave 시작 기준). 초과 시 결과는 {"error": ...}, trace에 "timeout"
+    tool_timeout_s: float = DEFAULT_TOOL_TIMEOUT_S
+    # False면 선택 순서대로 한 개씩 실행 (디버깅/재현용)
+    parallel_tools: bool = os.getenv("CRITIC_PARALLEL_TOOLS", "1") != "0"
+    # 도구 단계 시간/토큰 예산 (None = 제한 없음). 잡 마감(job_deadline)이 있으면 남은 시간 - reserve로 더 줄어듦
+    budget_ms: Optional[float] = _env_number("CRITIC_TOOL_BUDGET_MS")
+    budget_tokens: Optional[float] = _env_number("CRITIC_TOOL_BUDGET_TOKENS")
+    # 마감 전에 남겨 둘 시간 (CritiqueBuilder + Verifier)
+    deadline_reserve_ms: float = _env_number("CRITIC_DEADLINE_RESERVE_MS") or 20000.0
+    # 도구 라우터: "hybrid"(휴리스틱이 확실하면 LLM 생략) / "llm" / "heuristic"
+    router_mode: str = os.getenv("CRITIC_ROUTER_MODE", "hybrid")
+    # None이면 model_router 티어 모델 ("routing" / "critique" 작업, small → 필요 시 large 승격)
+    router_llm_model: Optional[str] = None
+    critique_model: Optional[str] = None
+    # CritiqueBuilder 최대 회차 (첫 생성 포함, refine.py). 그래프 입력 max_iterations가 있으면 그 값 사용
+    max_iterations: int = int(os.getenv("CRITIC_MAX_ITERATIONS", "3"))
+
+    def tool_budget(self) -> ToolBudget:
+        ms = self.budget_ms
+        remaining = deadline_remaining_s()
+        if remaining is not None:
+            deadline_ms = max(0.0, remaining * 1000 - self.deadline_reserve_ms)
+            ms = deadline_ms if ms is None else min(ms, deadline_ms)
+        tokens = int(self.budget_tokens) if self.budget_tokens is not None else None
+        return ToolBudget(max_tools=self.max_tools, ms=ms, tokens=tokens)
 
 
 @dataclass
@@ -33,3 +94,186 @@ class ToolRegistry:
     def get(self, name: str) -> Tool:
         return self.tools[name]
 
+
+
+# ---------------------------------------------------------------------------
+# 도구 실행: ToolCard.reads / writes 기반 wave 동시 실행
+# ---------------------------------------------------------------------------
+
+def plan_tool_waves(tools: List[Tool]) -> List[List[Tool]]:
+    """
+    reads에 앞 도구의 writes 키가 있으면 그 도구 뒤 wave에 배치 (같은 키를 쓰는 도구끼리도 순서 유지).
+    같은 wave의 도구는 서로 독립 → 동시 실행. wave 안 순서는 입력 순서 그대로.
+    """
+    waves: List[List[Tool]] = []
+    for tool, wave_idx in zip(tools, _wave_indices([t.card for t in tools])):
+        while len(waves) <= wave_idx:
+            waves.append([])
+        waves[wave_idx].append(tool)
+    return waves
+
+
+def _wave_indices(cards: List[ToolCard]) -> List[int]:
+    placed: List[int] = []
+    for i, card in enumerate(cards):
+        wave_idx = 0
+        for j, prev in enumerate(cards[:i]):
+            conflict = (set(card.reads) | set(card.writes)) & set(prev.writes)
+            conflict |= set(card.writes) & set(prev.reads)
+            if conflict:
+                wave_idx = max(wave_idx, placed[j] + 1)
+        placed.append(wave_idx)
+    return placed
+
+
+def estimate_cost(cards: List[ToolCard], parallel: bool = True) -> Tuple[float, int]:
+    """선택된 도구들의 (예상 wall ms, 예상 토큰). 동시 실행이면 wave별 최대 지연의 합."""
+    tokens = sum(int(c.est_tokens) for c in cards)
+    if not parallel:
+        return sum(c.est_latency_ms for c in cards), tokens
+    per_wave: Dict[int, float] = {}
+    for card, idx in zip(cards, _wave_indices(cards)):
+        per_wave[idx] = max(per_wave.get(idx, 0.0), card.est_latency_ms)
+    return sum(per_wave.values()), tokens
+
+
+def fit_tool_budget(
+    names: List[str],
+    cards: List[ToolCard],
+    budget: Optional[ToolBudget],
+    parallel: bool = True,
+) -> Tuple[List[str], List[str]]:
+    """
+    예산(ms / tokens)을 넘으면 value 대비 비용이 큰 도구부터 제외 → (유지, 제외).
+    사실상 무료인 도구(FREE_TOOL_LATENCY_MS 이하, 토큰 0)는 제외하지 않음. 개수 상한(max_tools)은 runner가 선택 순서대로 적용.
+    """
+    if budget is None or not budget.limited:
+        return list(names), []
+    by_name = {c.name: c for c in cards}
+    kept = list(names)
+    dropped: List[str] = []
+
+    def over(selected: List[str]) -> bool:
+        ms, tokens = estimate_cost([by_name[n] for n in selected if n in by_name], parallel)
+        return (budget.ms is not None and ms > budget.ms) or (budget.tokens is not None and tokens > budget.tokens)
+
+    def pressure(name: str) -> float:
+        card = by_name[name]
+        share = 0.0
+        if budget.ms is not None:
+            share = max(share, card.est_latency_ms / budget.ms if budget.ms > 0 else float("inf"))
+        if budget.tokens is not None:
+            share = max(share, card.est_tokens / budget.tokens if budget.tokens > 0 else float("inf"))
+        return share / max(card.value, 1e-6)
+
+    while kept and over(kept):
+        costly = [
+            n for n in kept
+            if n in by_name and (by_name[n].est_tokens > 0 or by_name[n].est_latency_ms > FREE_TOOL_LATENCY_MS)
+        ]
+        if not costly:
+            break
+        # 동률이면 선택 순서상 뒤쪽 도구부터
+        victim = max(costly, key=lambda n: (pressure(n), kept.index(n)))
+        kept.remove(victim)
+        dropped.append(victim)
+    return kept, dropped
+
+
+def store_tool_result(state: AgentState, tool: Tool, out: JsonDict) -> None:
+    """도구 출력 저장 위치: writes 키가 있으면 preprocessing, lens_* 는 lens_results, 나머지 behavior_results."""
+    if tool.card.writes:
+        for key in tool.card.writes:
+            state.preprocessing[key] = out
+    elif tool.name.startswith("lens_"):
+        state.lens_results[tool.name] = out
+    else:
+        state.behavior_results[tool.name] = out
+
+
+def _tool_state(state: AgentState) -> AgentState:
+    # 도구별 사본: preprocessing/trace만 분리 (도구는 결과를 반환만 하고 나머지는 읽기 전용)
+    local = copy.copy(state)
+    local.preprocessing = dict(state.preprocessing)
+    local.trace = []
+    return local
+
+
+def _timed_safe_run(tool: Tool, state: AgentState, timeout_s: float) -> tuple:
+    # 도구별 토큰 집계 후 케이스 tracker에 합산 (비용 추정 갱신용)
+    # timeout은 job_deadline으로도 걸어 초과 후 새 LLM 호출/재시도를 시작하지 않게 함 (스레드 강제 종료 불가)
+    outer = current_tracker()
+    usage = UsageTracker()
+    started = time.monotonic()
+    with track_usage(usage), job_deadline(timeout_s):
+        out = tool.safe_run(state)
+    elapsed = time.monotonic() - started
+    if outer is not None:
+        outer.merge(usage)
+    return out, elapsed, usage.prompt_tokens + usage.completion_tokens
+
+
+def _run_tool_wave(wave: List[Tool], state: AgentState, timeout_s: float) -> None:
+    """한 wave를 동시 실행 후 입력 순서대로 병합 (완료 순서와 무관하게 trace/결과 순서 고정)."""
+    # 메모 hit인 도구는 실행하지 않음 (preprocessing을 쓰는 전처리 도구는 메모 대상 아님)
+    memo = get_critic_memo()
+    keys = [memo.tool_key(tool, state) if memo.enabled and not tool.card.writes else None for tool in wave]
+    cached = [memo.get(key) if key else None for key in keys]
+    pending = [i for i, hit in enumerate(cached) if hit is None]
+    locals_ = {i: _tool_state(state) for i in pending}
+    executor = ThreadPoolExecutor(max_workers=max(1, len(pending)), thread_name_prefix="critic-tool")
+    try:
+        started = time.monotonic()
+        # 컨텍스트(케이스별 LLM 사용량 tracker, 배치 세션 등)는 도구마다 복사해 전달
+        futures = {
+            i: executor.submit(contextvars.copy_context().run, _timed_safe_run, wave[i], locals_[i], timeout_s)
+            for i in pending
+        }
+        for i, tool in enumerate(wave):
+            if cached[i] is not None:
+                print(f"  [Critic Tools] {tool.name} → memo hit")
+                state.add_trace(tool=tool.name, status="cached", detail={"memo_key": keys[i]})
+                store_tool_result(state, tool, cached[i])
+                continue
+            local, future = locals_[i], futures[i]
+            # timeout은 wave 시작 기준 (앞 도구 대기 시간만큼 늘어나지 않도록)
+            remaining = max(0.0, timeout_s - (time.monotonic() - started))
+            try:
+                out, elapsed, tokens = future.result(timeout=remaining)
+            except FutureTimeoutError:
+                print(f"  [Critic Tools] {tool.name} timed out after {timeout_s:g}s (result discarded)")
+                state.add_trace(tool=tool.name, status="timeout", detail={"timeout_s": timeout_s, "result_discarded": True})
+                store_tool_result(state, tool, {"error": f"timeout after {timeout_s:g}s"})
+                continue
+            ok = False
+            for entry in local.trace:
+                if entry.get("tool") == tool.name:
+                    entry.setdefault("detail", {}).update(elapsed_ms=round(elapsed * 1000), tokens=tokens)
+                    ok = entry.get("status") == "ok"
+            state.trace.extend(local.trace)
+            store_tool_result(state, tool, out)
+            if keys[i] and ok and memoizable_output(out):
+                memo.put(keys[i], out)
+    finally:
+        # timeout으로 남은 스레드를 기다리지 않음 (결과는 폐기됨)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def run_tools(registry: ToolRegistry, state: AgentState, tool_names: List[str], config: AgentConfig) -> None:
+    """
+    선택된 도구 실행. 독립 도구(서로의 writes를 읽지 않음)는 wave 단위로 동시 실행,
+    결과는 선택 순서대로 lens_results / behavior_results / preprocessing에 병합.
+    실행 후 trace의 elapsed_ms / tokens로 도구 비용 추정치 갱신 (tool_costs.py).
+    같은 입력으로 이전에 실행한 lens/behavior 도구는 디스크 메모 결과 사용 (memo.py, trace status "cached").
+    """
+    tools = [registry.get(name) for name in tool_names]
+    trace_start = len(state.trace)
+    if not config.parallel_tools:
+        waves = [[tool] for tool in tools]
+    else:
+        waves = plan_tool_waves(tools)
+        if any(len(w) > 1 for w in waves):
+            print(f"  [Critic Tools] running concurrently: {[[t.name for t in w] for w in waves]}")
+    for wave in waves:
+        _run_tool_wave(wave, state, config.tool_timeout_s)
+    record_tool_costs(state.trace[trace_start:], registry.cards)
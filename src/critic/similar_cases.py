@@ -0,0 +1,68 @@
+"""
+유사 케이스(top-k) 공통 프롬프트 블록
+
+behavior_topk_direct_compare(critic 도구)와 Verifier가 같은 top-3 유사 케이스 원문을 각자 포맷해 보내던 것을
+바이트 단위로 동일한 블록 1개로 통일 → system 메시지로 [SHARED EVIDENCE CONTEXT] 다음에 두면
+provider prompt caching이 두 호출에 걸쳐 적용된다.
+
+- 케이스 원문은 compress_clinical_text로 케이스당 PROMPT_BUDGET_SIMILAR_CASE_TEXT 토큰 (기본 650)
+- 같은 케이스 목록이면 같은 문자열 (내용 해시별 memoize)
+"""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+from ..agents.evidence_agent import compress_clinical_text, evidence_version
+from ..llm.prompt_budget import get_token_budget
+
+SHARED_CASES_REF = "See the [SHARED SIMILAR CASES] block at the beginning."
+MAX_CASES = 3
+
+_cache: "OrderedDict[tuple, str]" = OrderedDict()
+_CACHE_MAX = 32
+_lock = threading.Lock()
+
+
+def _outcome(c: Dict[str, Any]) -> str:
+    status = str(c.get("status", "")).lower()
+    if not status and c.get("hospital_expire_flag") == 1:
+        return "DIED"
+    return "DIED" if status == "dead" else "SURVIVED"
+
+
+def _render(cases: List[Dict[str, Any]], budget: int, version: str) -> str:
+    parts = [f"[SHARED SIMILAR CASES v={version}]"]
+    for i, c in enumerate(cases, 1):
+        age = c.get("age", c.get("anchor_age", "N/A"))
+        sex = c.get("sex", c.get("gender", "N/A"))
+        parts.append(
+            f"[Similar Case {i}] case_id={c.get('id')} similarity={c.get('similarity')}\n"
+            f"- Age/Sex: {age}/{sex}\n"
+            f"- Admission: {c.get('admission_type')} / {c.get('admission_location')}\n"
+            f"- Outcome: {_outcome(c)}\n"
+            f"- Clinical Note:\n{compress_clinical_text(str(c.get('text', '') or ''), budget)}"
+        )
+    parts.append("[/SHARED SIMILAR CASES]")
+    return "\n\n".join(parts)
+
+
+def build_similar_cases_prefix(similar_cases: List[Dict[str, Any]]) -> str:
+    """top-3 유사 케이스 공통 블록 (없으면 ""). Verifier / top-k 비교 도구 공용."""
+    cases = [c for c in (similar_cases or [])[:MAX_CASES] if isinstance(c, dict)]
+    if not cases:
+        return ""
+    budget = get_token_budget("similar_case_text")
+    version = evidence_version({"cases": cases})
+    key = (version, budget)
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    text = _render(cases, budget, version)
+    with _lock:
+        _cache[key] = text
+        while len(_cache) > _CACHE_MAX:
+            _cache.popitem(last=False)
+    return text
@@ -1,8 +1,9 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
+from .doc_analysis import analyze_document, build_keyword_index
 from .types import AgentState, JsonDict, ToolCard
 
 
@@ -37,3 +38,12 @@ def ensure_preprocessing(state: AgentState, key: str) -> Optional[Dict[str, Any]
     obj = state.preprocessing.get(key)
     return obj if isinstance(obj, dict) else None
 
+
+
+def get_keyword_index(state: AgentState) -> Dict[str, List[str]]:
+    """evidence 전처리의 keyword → span_id 인덱스. 없으면(이전 형식 state 등) evidence_spans로 즉석 생성."""
+    evidence = ensure_preprocessing(state, "evidence") or {}
+    index = evidence.get("keyword_index")
+    if isinstance(index, dict):
+        return index
+    return build_keyword_index(evidence.get("evidence_spans") or {}, analyze_document(get_patient_text(state)))
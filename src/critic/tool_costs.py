@@ -0,0 +1,119 @@
+"""
+Critic 도구 비용/지연 추정 (trace 기록으로 갱신)
+
+- ToolCard.est_latency_ms / est_tokens: 도구 정의의 초기값 → 실행 trace의 elapsed_ms / tokens로 EWMA 갱신
+- ToolCostStore: 프로세스 전역 1개 (get_tool_costs). CRITIC_TOOL_COSTS_PATH를 지정하면 JSON으로 저장/로드
+  → 새 프로세스(배치 잡, 백엔드 워커)도 측정값으로 시작
+- 실패/timeout 기록은 반영하지 않음 (timeout 값으로 추정이 부풀지 않도록)
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from .types import JsonDict, ToolCard
+
+EWMA_ALPHA = 0.3
+
+
+@dataclass
+class ToolCostStore:
+    """도구별 지연(ms) / 토큰 EWMA."""
+
+    path: Optional[Path] = None
+    alpha: float = EWMA_ALPHA
+    stats: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def load(self) -> None:
+        if not self.path or not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            with self._lock:
+                self.stats.update({k: dict(v) for k, v in data.items() if isinstance(v, dict)})
+        except Exception as e:
+            print(f"  [ToolCosts] load failed ({self.path}): {e}")
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        try:
+            with self._lock:
+                payload = json.dumps(self.stats, ensure_ascii=False, indent=2)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            tmp.write_text(payload, encoding="utf-8")
+            tmp.replace(self.path)
+        except Exception as e:
+            print(f"  [ToolCosts] save failed ({self.path}): {e}")
+
+    def observe(self, tool: str, latency_ms: float, tokens: int) -> None:
+        with self._lock:
+            cur = self.stats.get(tool)
+            if cur is None:
+                self.stats[tool] = {"latency_ms": float(latency_ms), "tokens": float(tokens), "n": 1}
+                return
+            a = self.alpha
+            cur["latency_ms"] = (1 - a) * cur["latency_ms"] + a * float(latency_ms)
+            cur["tokens"] = (1 - a) * cur["tokens"] + a * float(tokens)
+            cur["n"] = cur.get("n", 0) + 1
+
+    def observe_trace(self, trace: Iterable[JsonDict]) -> int:
+        """trace의 성공 실행 기록(detail.elapsed_ms) 반영. 반영한 건수 반환."""
+        n = 0
+        for entry in trace:
+            detail = entry.get("detail") or {}
+            if entry.get("status") != "ok" or "elapsed_ms" not in detail:
+                continue
+            self.observe(entry.get("tool", ""), detail["elapsed_ms"], int(detail.get("tokens", 0) or 0))
+            n += 1
+        if n:
+            self.save()
+        return n
+
+    def apply(self, cards: Iterable[ToolCard]) -> None:
+        """측정값이 있는 도구는 카드의 추정치를 갱신."""
+        with self._lock:
+            for card in cards:
+                cur = self.stats.get(card.name)
+                if cur:
+                    card.est_latency_ms = round(cur["latency_ms"], 1)
+                    card.est_tokens = int(round(cur["tokens"]))
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {k: dict(v) for k, v in self.stats.items()}
+
+
+_store: Optional[ToolCostStore] = None
+_store_lock = threading.Lock()
+
+
+def get_tool_costs() -> ToolCostStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                path = os.getenv("CRITIC_TOOL_COSTS_PATH")
+                store = ToolCostStore(path=Path(path) if path else None)
+                store.load()
+                _store = store
+    return _store
+
+
+def set_tool_costs(store: Optional[ToolCostStore]) -> None:
+    global _store
+    with _store_lock:
+        _store = store
+
+
+def record_tool_costs(trace: List[JsonDict], cards: Iterable[ToolCard]) -> None:
+    """run_tools 이후 호출: trace 반영 + 카드 추정치 갱신."""
+    store = get_tool_costs()
+    store.observe_trace(trace)
+    store.apply(cards)
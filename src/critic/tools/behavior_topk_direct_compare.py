@@ -1,12 +1,15 @@
 from __future__ import annotations
 
-import os
 from dataclasses import dataclass
 from typing import Any, Dict, List
 
+from ..similar_cases import SHARED_CASES_REF, build_similar_cases_prefix
 from ..tool_base import Tool
 from ..types import AgentState, JsonDict, ToolCard
-from ...llm.openai_chat import OpenAIChatConfig, call_openai_chat_completions, safe_json_loads
+from ...llm.backend import llm_available
+from ...llm.model_router import routed_chat_json
+from ...llm.prompt_budget import get_token_budget
+from ...agents.evidence_agent import build_evidence_prefix, compress_clinical_text
 
 
 def _tokenize_light(text: str) -> List[str]:
@@ -40,6 +43,11 @@ class BehaviorTopKDirectCompareTool(Tool):
                 triggers=["텍스트가 짧음", "근거 강화 필요", "유사 케이스가 존재"],
                 input_contract={"cohort_data.similar_cases": "List[Dict[text,...]]", "preprocessing.evidence": "Dict"},
                 output_contract={"comparisons": "List", "summary": "str"},
+                reads=["evidence"],
+                # 유사 케이스 3건 원문(각 ~2500자) + max_tokens 1200
+                est_latency_ms=8000,
+                est_tokens=4500,
+                value=0.6,
             ),
         )
 
@@ -49,7 +57,7 @@ class BehaviorTopKDirectCompareTool(Tool):
         evidence_spans = (evidence.get("evidence_spans") or {}) if isinstance(evidence, dict) else {}
         if not similar_cases:
             out = {"comparisons": [], "summary": "similar_cases가 없어 비교를 수행하지 않았습니다."}
-        elif os.environ.get("OPENAI_API_KEY", ""):
+        elif llm_available():
             out = self._run_llm(state=state, similar_cases=similar_cases, evidence_spans=evidence_spans)
         else:
             out = self._run_heuristic(similar_cases=similar_cases, evidence_spans=evidence_spans)
@@ -76,23 +84,32 @@ class BehaviorTopKDirectCompareTool(Tool):
         return {"comparisons": comps, "summary": "Top-K 케이스와 patient 근거 span에서 공통 토큰을 비교했습니다(키 없음)."}
 
     def _run_llm(self, *, state: AgentState, similar_cases: List[Dict[str, Any]], evidence_spans: Dict[str, Dict[str, Any]]) -> JsonDict:
-        cases_block = [{"rank": i, "case_id": c.get("id"), "similarity": c.get("similarity"), "status": c.get("status"), "age": c.get("age"), "sex": c.get("sex"), "text": str(c.get("text", "") or "")[:2500]} for i, c in enumerate(similar_cases[:3], 1)]
-        payload = {"patient": {"id": state.patient.get("id"), "age": state.patient.get("age"), "sex": state.patient.get("sex"), "text": str(state.patient.get("text", "") or "")[:2500]}, "patient_evidence_spans": evidence_spans, "similar_cases": cases_block}
+        budget = get_token_budget("topk_compare_text")
+        quotes = [str(sp.get("quote", "")) for sp in evidence_spans.values() if isinstance(sp, dict)]
+        # 유사 케이스 원문은 Verifier와 같은 공통 블록 (system 메시지, prompt caching)
+        cases_prefix = build_similar_cases_prefix(similar_cases)
+        cases_block = [{"rank": i, "case_id": c.get("id"), "similarity": c.get("similarity"), "status": c.get("status"), "age": c.get("age"), "sex": c.get("sex")} for i, c in enumerate(similar_cases[:3], 1)]
+        payload = {"patient": {"id": state.patient.get("id"), "age": state.patient.get("age"), "sex": state.patient.get("sex"), "text": compress_clinical_text(str(state.patient.get("text", "") or ""), budget, quotes)}, "patient_evidence_spans": evidence_spans, "similar_cases": cases_block, "similar_case_notes": SHARED_CASES_REF}
+        evidence_prefix = ""
         cohort = getattr(state, "cohort_data", None)
         if isinstance(cohort, dict):
             if cohort.get("diagnosis_analysis") is not None:
                 payload["reference_only_prior_diagnosis_analysis"] = cohort.get("diagnosis_analysis")
             if cohort.get("treatment_analysis") is not None:
                 payload["reference_only_prior_treatment_analysis"] = cohort.get("treatment_analysis")
-            if cohort.get("evidence") is not None:
-                payload["reference_only_prior_evidence"] = cohort.get("evidence")
+            if cohort.get("evidence"):
+                # 근거 본문은 에이전트 공통 prefix 블록 (CritiqueBuilder / Verifier와 동일)
+                evidence_prefix = build_evidence_prefix(cohort.get("evidence"))
+                payload["reference_only_prior_evidence"] = "See the [SHARED EVIDENCE CONTEXT] block at the beginning."
         prompt = f"""You are a contrastive comparator for clinical process review. Compare the patient to each similar case (problems, workup, therapies, monitoring/response).
 Input JSON: {payload}
 If reference_only_prior_* keys are present, use them only as reference; do not depend on them. Base comparison on patient_evidence_spans and similar_cases.
 Return JSON only: {{ "comparisons": [{{ "case_id":"...", "key_similarities":["..."], "key_differences":["..."], "evidence_links":[{{"span_id":"E1","why":"..."}}] }}], "summary": "1-3 sentences" }}
 Rules: evidence_links must use existing span_id or record_uncertainty."""
-        cfg = OpenAIChatConfig(model="gpt-4o-mini", temperature=0.2, max_tokens=1200)
-        content = call_openai_chat_completions(messages=[{"role": "user", "content": prompt}], config=cfg)
-        obj = safe_json_loads(content) or {"summary": content, "comparisons": []}
+        content, obj = routed_chat_json(
+            "critic_tool", "critic.behavior_topk_direct_compare", prompt, temperature=0.2, max_tokens=1200,
+            required=("comparisons",), prefix_blocks=(evidence_prefix, cases_prefix),
+        )
+        obj = obj or {"summary": content, "comparisons": []}
         obj["raw"] = content
         return obj
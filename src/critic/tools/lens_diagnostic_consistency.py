@@ -1,13 +1,13 @@
 from __future__ import annotations
 
-import os
 import re
 from dataclasses import dataclass
 from typing import Any, Dict, List
 
 from ..tool_base import Tool
 from ..types import AgentState, JsonDict, ToolCard
-from ...llm.openai_chat import OpenAIChatConfig, call_openai_chat_completions, safe_json_loads
+from ...llm.backend import llm_available
+from ...llm.model_router import routed_chat_json
 
 
 def _pick_assessment_spans(evidence_spans: Dict[str, Dict[str, Any]]) -> List[str]:
@@ -25,6 +25,10 @@ class LensDiagnosticConsistencyTool(Tool):
                 triggers=["진단이 강하게 주장됨", "근거가 빈약", "대안진단 배제 근거 필요"],
                 input_contract={"preprocessing.evidence": "Dict[evidence_spans]", "preprocessing.timeline": "Dict[events]"},
                 output_contract={"diagnosis_claims": "List[str]", "supporting_evidence": "List[span_id]", "gaps": "List[str]", "contradictions": "List[str]"},
+                reads=["evidence", "timeline"],
+                est_latency_ms=4000,
+                est_tokens=3000,
+                value=0.9,
             ),
         )
 
@@ -33,7 +37,7 @@ class LensDiagnosticConsistencyTool(Tool):
         evidence_spans = (evidence.get("evidence_spans") or {}) if isinstance(evidence, dict) else {}
         timeline = state.preprocessing.get("timeline") or {}
         out: JsonDict
-        if os.environ.get("OPENAI_API_KEY", ""):
+        if llm_available():
             out = self._run_llm(evidence_spans=evidence_spans, timeline=timeline, patient=state.patient, state=state)
         else:
             out = self._run_heuristic(evidence_spans=evidence_spans)
@@ -70,8 +74,9 @@ Input JSON: {payload}
 If "reference_only_prior_diagnosis_analysis" is present, use it only as reference; do not depend on it. Base your output on evidence_spans and timeline.
 Return JSON only: {{ "diagnosis_claims": ["..."], "supporting_evidence": ["E1","E2"], "gaps": ["..."], "contradictions": ["..."] }}
 Rules: Only cite span_ids that exist. If record is insufficient, say so in gaps."""
-        cfg = OpenAIChatConfig(model="gpt-4o-mini", temperature=0.2, max_tokens=900)
-        content = call_openai_chat_completions(messages=[{"role": "user", "content": prompt}], config=cfg)
-        obj = safe_json_loads(content) or {}
+        content, obj = routed_chat_json(
+            "critic_tool", "critic.lens_diagnostic_consistency", prompt, temperature=0.2, max_tokens=900,
+            required=("diagnosis_claims",),
+        )
         return {"diagnosis_claims": obj.get("diagnosis_claims", []), "supporting_evidence": obj.get("supporting_evidence", []), "gaps": obj.get("gaps", []), "contradictions": obj.get("contradictions", []), "raw": content}
 
@@ -1,29 +1,25 @@
 from __future__ import annotations
 
-import os
 from dataclasses import dataclass
 from typing import Any, Dict, List, Optional
 
-from ..tool_base import Tool
+from ..doc_analysis import KEYWORD_GROUPS, DocumentAnalysis, analyze_document, build_keyword_index, first_span
+from ..tool_base import Tool, get_keyword_index, get_patient_text
 from ..types import AgentState, JsonDict, ToolCard
-from ...llm.openai_chat import OpenAIChatConfig, call_openai_chat_completions, safe_json_loads
+from ...llm.backend import llm_available
+from ...llm.model_router import routed_chat_json
 
 
-DETERIORATION_KW = ["worsen", "deterior", "declin", "hypotens", "desat", "arrest", "code blue", "rapid response"]
-RESPONSE_KW = ["intub", "vent", "pressor", "vasopress", "fluid", "antibi", "icu", "transfer", "dialysis"]
+DETERIORATION_KW = KEYWORD_GROUPS["monitoring.deterioration"]
+RESPONSE_KW = KEYWORD_GROUPS["monitoring.response"]
 
 
-def _match_kw(text: str, kws: List[str]) -> bool:
-    return any(k in (text or "").lower() for k in kws)
+def _match_kw(doc: DocumentAnalysis, item: Dict[str, Any], text: str, kws: List[str]) -> bool:
+    return bool(doc.found_in(item.get("start"), text, kws))
 
 
-def _find_span_by_kw(evidence_spans: Dict[str, Dict[str, Any]], kws: List[str]) -> Optional[str]:
-    for sid, sp in evidence_spans.items():
-        q = str(sp.get("quote", "")).lower()
-        for k in kws:
-            if k in q:
-                return sid
-    return None
+def _find_span_by_kw(keyword_index: Dict[str, List[str]], evidence_spans: Dict[str, Dict[str, Any]], kws: List[str]) -> Optional[str]:
+    return first_span(keyword_index, kws, evidence_spans)
 
 
 @dataclass
@@ -37,6 +33,10 @@ class LensMonitoringResponseTool(Tool):
                 triggers=["악화 단서", "중증도 플래그", "반응/에스컬레이션 평가 필요"],
                 input_contract={"preprocessing.timeline": "Dict[events]", "preprocessing.evidence": "Dict[evidence_spans]"},
                 output_contract={"deterioration_points": "List", "response_actions": "List", "lags": "List"},
+                reads=["timeline", "evidence"],
+                est_latency_ms=4000,
+                est_tokens=3000,
+                value=0.8,
             ),
         )
 
@@ -45,24 +45,32 @@ class LensMonitoringResponseTool(Tool):
         events = timeline.get("events", []) if isinstance(timeline, dict) else []
         evidence = state.preprocessing.get("evidence") or {}
         evidence_spans = (evidence.get("evidence_spans") or {}) if isinstance(evidence, dict) else {}
-        if os.environ.get("OPENAI_API_KEY", ""):
+        if llm_available():
             out = self._run_llm(events=events, evidence_spans=evidence_spans, state=state)
         else:
-            out = self._run_heuristic(events=events, evidence_spans=evidence_spans)
+            out = self._run_heuristic(events=events, evidence_spans=evidence_spans,
+                                       doc=analyze_document(get_patient_text(state)),
+                                       keyword_index=get_keyword_index(state))
         if isinstance(getattr(state, "cohort_data", None), dict) and state.cohort_data.get("process_contributor_analysis"):
             out["reference_process_contributor_analysis"] = state.cohort_data.get("process_contributor_analysis")
         return out
 
-    def _run_heuristic(self, *, events: List[Dict], evidence_spans: Dict[str, Dict[str, Any]]) -> JsonDict:
+    def _run_heuristic(self, *, events: List[Dict], evidence_spans: Dict[str, Dict[str, Any]],
+                       doc: Optional[DocumentAnalysis] = None,
+                       keyword_index: Optional[Dict[str, List[str]]] = None) -> JsonDict:
+        doc = doc or analyze_document("")
+        if keyword_index is None:
+            keyword_index = build_keyword_index(evidence_spans, doc)
         det = []
         resp = []
         for ev in events[:80]:
             txt = str(ev.get("text", ""))
-            if _match_kw(txt, DETERIORATION_KW):
+            if _match_kw(doc, ev, txt, DETERIORATION_KW):
                 det.append({"event_id": ev.get("event_id"), "time_hint": ev.get("time_hint"), "text": txt[:280]})
-            if _match_kw(txt, RESPONSE_KW):
+            if _match_kw(doc, ev, txt, RESPONSE_KW):
                 resp.append({"event_id": ev.get("event_id"), "time_hint": ev.get("time_hint"), "text": txt[:280]})
         lags = []
+        det_span = _find_span_by_kw(keyword_index, evidence_spans, DETERIORATION_KW) or "record_uncertainty"
         if det and resp:
             idx_map = {ev.get("event_id"): i for i, ev in enumerate(events)}
             for d in det[:3]:
@@ -75,7 +83,7 @@ class LensMonitoringResponseTool(Tool):
                         "deterioration_event_id": d["event_id"],
                         "response_event_id": None,
                         "lag_events": None,
-                        "span_id": _find_span_by_kw(evidence_spans, DETERIORATION_KW) or "record_uncertainty",
+                        "span_id": det_span,
                         "note": "악화 후 반응 이벤트를 텍스트에서 확실히 찾지 못함(기록 공백 가능)",
                     })
                     continue
@@ -85,7 +93,7 @@ class LensMonitoringResponseTool(Tool):
                     "deterioration_event_id": d["event_id"],
                     "response_event_id": r0["event_id"],
                     "lag_events": lag,
-                    "span_id": _find_span_by_kw(evidence_spans, DETERIORATION_KW) or "record_uncertainty",
+                    "span_id": det_span,
                 })
         return {"deterioration_points": det[:10], "response_actions": resp[:12], "lags": lags, "note": "LLM 미사용(키 없음)으로 키워드 기반 추정입니다."}
 
@@ -98,8 +106,9 @@ Input JSON: {payload}
 If "reference_only_prior_process_contributor_analysis" is present, use it only as reference; do not depend on it.
 Return JSON only: {{ "deterioration_points": [{{"event_id":"T1","summary":"...","span_id":"E1"}}], "response_actions": [{{"event_id":"T2","summary":"...","span_id":"E2"}}], "lags": [{{"deterioration_event_id":"T1","response_event_id":"T2","lag_events":3,"span_id":"E1"}}] }}
 Rules: span_id must exist in evidence_spans or use record_uncertainty. Be conservative if documentation is unclear."""
-        cfg = OpenAIChatConfig(model="gpt-4o-mini", temperature=0.2, max_tokens=900)
-        content = call_openai_chat_completions(messages=[{"role": "user", "content": prompt}], config=cfg)
-        obj = safe_json_loads(content) or {}
+        content, obj = routed_chat_json(
+            "critic_tool", "critic.lens_monitoring_response", prompt, temperature=0.2, max_tokens=900,
+            required=("deterioration_points",),
+        )
         obj["raw"] = content
         return obj
@@ -3,24 +3,20 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Dict, List, Optional, Tuple
 
-from ..tool_base import Tool
+from ..doc_analysis import KEYWORD_GROUPS
+from ..tool_base import Tool, get_keyword_index
 from ..types import AgentState, JsonDict, ToolCard
 
 
 SEVERITY_SIGNALS: List[Tuple[str, List[str]]] = [
-    ("shock_or_hypotension", ["shock", "hypotension", "map", "pressors", "vasopress"]),
-    ("resp_failure", ["intub", "vent", "respiratory failure", "bipap", "cpap", "desat", "spo2"]),
-    ("sepsis", ["sepsis", "septic", "lactate", "broad spectrum", "abx", "antibiotic"]),
-    ("cardiac_instability", ["vtach", "vfib", "arrest", "troponin", "stemi", "nstemi"]),
+    (signal, KEYWORD_GROUPS[f"severity.{signal}"])
+    for signal in ["shock_or_hypotension", "resp_failure", "sepsis", "cardiac_instability"]
 ]
 
 
-def _find_span_for_keyword(evidence_spans: Dict[str, Dict], kw: str) -> Optional[str]:
-    kw_l = kw.lower()
-    for sid, sp in evidence_spans.items():
-        if kw_l in str(sp.get("quote", "")).lower():
-            return sid
-    return None
+def _find_span_for_keyword(keyword_index: Dict[str, List[str]], kw: str) -> Optional[str]:
+    ids = keyword_index.get(kw)
+    return ids[0] if ids else None
 
 
 @dataclass
@@ -34,18 +30,19 @@ class LensSeverityRiskTool(Tool):
                 triggers=["악화/쇼크/호흡부전 단서", "레벨오브케어 판단 필요"],
                 input_contract={"preprocessing.evidence": "Dict", "patient.metadata": "Dict"},
                 output_contract={"severity_flags": "List", "missing_severity_assessment": "List[str]"},
+                reads=["evidence", "record_gaps"],
+                est_latency_ms=5,
             ),
         )
 
     def run(self, state: AgentState) -> JsonDict:
-        evidence = state.preprocessing.get("evidence") or {}
-        evidence_spans = (evidence.get("evidence_spans") or {}) if isinstance(evidence, dict) else {}
+        keyword_index = get_keyword_index(state)
         record_gaps = state.preprocessing.get("record_gaps") or {}
         missing = record_gaps.get("missing", []) if isinstance(record_gaps, dict) else []
         flags: List[Dict] = []
         for signal, kws in SEVERITY_SIGNALS:
             for kw in kws:
-                span_id = _find_span_for_keyword(evidence_spans, kw)
+                span_id = _find_span_for_keyword(keyword_index, kw)
                 if span_id:
                     flags.append({"signal": signal, "kw": kw, "span_id": span_id, "confidence": "medium"})
                     break
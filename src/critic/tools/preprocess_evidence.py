@@ -1,64 +1,37 @@
 from __future__ import annotations
 
+import os
 import re
 from dataclasses import dataclass
-from typing import Dict, List, Tuple
+from typing import Dict, List
 
+from ..doc_analysis import KEYWORD_GROUPS, Sentence, analyze_document
 from ..tool_base import Tool, get_patient_text
 from ..types import AgentState, JsonDict, ToolCard
 
 
-def _iter_sentence_offsets(text: str) -> List[Tuple[int, int, str]]:
-    if not text:
-        return []
-    out: List[Tuple[int, int, str]] = []
-    cursor = 0
-    for chunk in re.split(r"\n+", text):
-        if not chunk.strip():
-            cursor += len(chunk) + 1
-            continue
-        start = text.find(chunk, cursor)
-        if start == -1:
-            continue
-        end = start + len(chunk)
-        cursor = end
-        parts = re.split(r"(?<=[\.\?!])\s+", chunk.strip())
-        local_cursor = start
-        for p in parts:
-            if not p.strip():
-                continue
-            ps = p.strip()
-            ps_start = text.find(ps, local_cursor)
-            if ps_start == -1:
-                continue
-            ps_end = ps_start + len(ps)
-            local_cursor = ps_end
-            out.append((ps_start, ps_end, ps))
-    return out
+_DIGIT_RE = re.compile(r"\d")
+
+# span 상한. lens 도구는 keyword_index로 조회하므로 늘려도 lens 비용은 거의 그대로 (CritiqueBuilder/LLM lens 입력은 커짐)
+EVIDENCE_MAX_SPANS = int(os.getenv("CRITIC_EVIDENCE_MAX_SPANS", "60"))
+
+# 우선순위 순 (앞에서 걸리면 그 카테고리)
+EVIDENCE_CATEGORIES = ["vital_signs", "labs", "imaging", "assessment", "therapy"]
 
 
-def _category(sentence: str) -> str:
-    s = sentence.lower()
-    if re.search(r"\b(bp|hr|rr|spo2|sat|temp)\b", s):
-        return "vital_signs"
-    if re.search(r"\b(wbc|hgb|plt|cr|creatin|bun|lactate|na|k|ast|alt|bilir|abg)\b", s):
-        return "labs"
-    if any(k in s for k in ["ct", "x-ray", "mri", "ultrasound", "echo"]):
-        return "imaging"
-    if any(k in s for k in ["diagnosis", "impression", "assessment", "a/p", "problem", "plan"]):
-        return "assessment"
-    if any(k in s for k in ["antibi", "heparin", "warfarin", "insulin", "steroid", "vasopress", "fluid"]):
-        return "therapy"
+def _category(sent: Sentence) -> str:
+    for c in EVIDENCE_CATEGORIES:
+        if sent.has_any(KEYWORD_GROUPS[f"evidence.{c}"]):
+            return c
     return "other"
 
 
-def _is_claimable(sentence: str) -> bool:
-    s = sentence.lower()
-    if len(s) < 20:
+def _is_claimable(sent: Sentence) -> bool:
+    if len(sent.text) < 20:
         return False
-    if re.search(r"\d", s):
+    if _DIGIT_RE.search(sent.text):
         return True
-    return any(k in s for k in ["diagnosis", "impression", "assessment", "plan", "started", "given", "administered", "intub", "icu", "transfer", "worsen", "deterior"])
+    return sent.has_any(KEYWORD_GROUPS["evidence.claimable"])
 
 
 @dataclass
@@ -71,20 +44,27 @@ class PreprocessEvidenceTool(Tool):
                 description="clinical text에서 근거 문장을 span으로 구조화.",
                 triggers=["근거 인용 필요", "비판 포인트에 span_id 부여"],
                 input_contract={"patient.text": "str"},
-                output_contract={"evidence_spans": "Dict[Eid->{category,quote,start,end}]"},
+                output_contract={"evidence_spans": "Dict[Eid->{category,quote,start,end}]", "keyword_index": "Dict[keyword->List[Eid]]"},
+                writes=["evidence"],
+                est_latency_ms=5,
             ),
         )
 
     def run(self, state: AgentState) -> JsonDict:
-        text = get_patient_text(state)
+        doc = analyze_document(get_patient_text(state))
         spans: Dict[str, Dict] = {}
-        sent_offsets = _iter_sentence_offsets(text)
+        # keyword → span_id (lens 도구가 span마다 quote를 다시 훑지 않도록 여기서 1번)
+        keyword_index: Dict[str, List[str]] = {}
         eid = 1
-        for start, end, sent in sent_offsets:
+        for sent in doc.iter_sentences():
             if not _is_claimable(sent):
                 continue
-            spans[f"E{eid}"] = {"category": _category(sent), "quote": sent[:600], "start": start, "end": end}
+            sid = f"E{eid}"
+            quote = sent.text[:600]
+            spans[sid] = {"category": _category(sent), "quote": quote, "start": sent.start, "end": sent.end}
+            for kw in sent.found_all(limit=len(quote)):
+                keyword_index.setdefault(kw, []).append(sid)
             eid += 1
-            if eid > 60:
+            if eid > EVIDENCE_MAX_SPANS:
                 break
-        return {"evidence_spans": spans, "span_count": len(spans)}
+        return {"evidence_spans": spans, "span_count": len(spans), "keyword_index": keyword_index}
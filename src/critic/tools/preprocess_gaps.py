@@ -1,37 +1,18 @@
 from __future__ import annotations
 
-import re
 from dataclasses import dataclass
-from typing import Dict, List
+from typing import List
 
+from ..doc_analysis import KEYWORD_GROUPS, DocumentAnalysis, analyze_document
 from ..tool_base import Tool, get_patient_text
 from ..types import AgentState, JsonDict, ToolCard
 
 
-def _missing_vitals(text: str) -> List[str]:
-    t = (text or "").lower()
-    vitals = {
-        "bp": [r"\bbp\b", "blood pressure", "mmhg", "hypotension"],
-        "hr": [r"\bhr\b", "heart rate", "tachy", "brady"],
-        "rr": [r"\brr\b", "resp rate", "respiratory rate"],
-        "spo2": ["spo2", "o2 sat", "sat%"],
-        "temp": ["temp", "temperature", "febrile"],
-    }
-    missing = []
-    for k, pats in vitals.items():
-        ok = False
-        for p in pats:
-            if p.startswith("\\b") or p.startswith("(") or "[" in p or "\\" in p:
-                if re.search(p, t):
-                    ok = True
-                    break
-            else:
-                if p in t:
-                    ok = True
-                    break
-        if not ok:
-            missing.append(k)
-    return missing
+VITALS = ["bp", "hr", "rr", "spo2", "temp"]
+
+
+def _missing_vitals(doc: DocumentAnalysis) -> List[str]:
+    return [k for k in VITALS if not doc.contains(KEYWORD_GROUPS[f"gaps.vitals.{k}"])]
 
 
 @dataclass
@@ -45,17 +26,16 @@ class PreprocessRecordGapTool(Tool):
                 triggers=["텍스트가 짧음", "근거 부족", "불확실성 표기 필요"],
                 input_contract={"patient.text": "str"},
                 output_contract={"missing": "List[str]", "uncertainty_markers": "List[str]"},
+                writes=["record_gaps"],
+                est_latency_ms=5,
             ),
         )
 
     def run(self, state: AgentState) -> JsonDict:
         text = get_patient_text(state)
-        t = (text or "").lower()
-        uncertainty_markers: List[str] = []
-        for phrase in ["not documented", "unknown", "unable to", "limited history", "poor historian", "unclear", "cannot confirm"]:
-            if phrase in t:
-                uncertainty_markers.append(phrase)
-        missing_vitals = _missing_vitals(text)
+        doc = analyze_document(text)
+        uncertainty_markers = doc.contains(KEYWORD_GROUPS["gaps.uncertainty"])
+        missing_vitals = _missing_vitals(doc)
         missing: List[str] = []
         if missing_vitals:
             missing.append(f"vitals_missing: {', '.join(missing_vitals)} (텍스트 상 명시 부족)")
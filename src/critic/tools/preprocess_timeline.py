@@ -4,70 +4,36 @@ import re
 from dataclasses import dataclass
 from typing import Dict, List, Optional
 
+from ..doc_analysis import KEYWORD_GROUPS, Sentence, analyze_document
 from ..tool_base import Tool, get_patient_text
 from ..types import AgentState, JsonDict, ToolCard
 
 
-def _sentence_spans(text: str) -> List[Dict]:
-    """
-    Very lightweight sentence splitter that preserves offsets.
-    """
-    if not text:
-        return []
-    spans: List[Dict] = []
-    # split on newline or period followed by whitespace
-    pattern = re.compile(r"(.+?)(?:\n+|(?<=\.)\s+|$)", flags=re.DOTALL)
-    cursor = 0
-    for m in pattern.finditer(text):
-        s = m.group(1)
-        if not s:
-            continue
-        start = text.find(s, cursor)
-        if start == -1:
-            continue
-        end = start + len(s)
-        cursor = end
-        s_clean = s.strip()
-        if not s_clean:
-            continue
-        spans.append({"start": start, "end": end, "text": s_clean})
-    return spans
+_TIME_HINT_PATTERNS = [
+    re.compile(r"\b\d{1,2}:\d{2}\b"),
+    re.compile(r"\b(?:day|hd|hospital day)\s*\d+\b", flags=re.IGNORECASE),
+    re.compile(r"\b\d{4}-\d{2}-\d{2}\b"),
+    re.compile(r"\b\d{1,2}/\d{1,2}/\d{2,4}\b"),
+]
+
+# 우선순위 순 (앞에서 걸리면 그 타입)
+TIMELINE_TYPES = ["respiratory", "hemodynamic", "imaging", "lab", "medication", "procedure", "level_of_care", "deterioration"]
 
 
 def _extract_time_hint(s: str) -> Optional[str]:
     if not s:
         return None
-    patterns = [
-        r"\b\d{1,2}:\d{2}\b",
-        r"\b(?:day|hd|hospital day)\s*\d+\b",
-        r"\b\d{4}-\d{2}-\d{2}\b",
-        r"\b\d{1,2}/\d{1,2}/\d{2,4}\b",
-    ]
-    for p in patterns:
-        m = re.search(p, s, flags=re.IGNORECASE)
+    for p in _TIME_HINT_PATTERNS:
+        m = p.search(s)
         if m:
             return m.group(0)
     return None
 
 
-def _tag_event_type(s: str) -> str:
-    t = s.lower()
-    if any(k in t for k in ["intub", "vent", "cpap", "bipap", "o2", "oxygen", "desat", "spo2"]):
-        return "respiratory"
-    if any(k in t for k in ["bp", "hypotens", "press", "shock", "tachy", "brady", "hr "]):
-        return "hemodynamic"
-    if any(k in t for k in ["ct", "x-ray", "mri", "ultrasound", "imaging"]):
-        return "imaging"
-    if any(k in t for k in ["lab", "wbc", "cr", "creatin", "lactate", "troponin", "abg"]):
-        return "lab"
-    if any(k in t for k in ["antibi", "heparin", "warfarin", "insulin", "steroid", "vasopress"]):
-        return "medication"
-    if any(k in t for k in ["procedure", "line", "catheter", "dialysis", "surgery"]):
-        return "procedure"
-    if any(k in t for k in ["icu", "ward", "transfer", "stepdown", "discharge"]):
-        return "level_of_care"
-    if any(k in t for k in ["worsen", "deterior", "declin", "arrest", "code blue", "rapid response"]):
-        return "deterioration"
+def _tag_event_type(sent: Sentence) -> str:
+    for t in TIMELINE_TYPES:
+        if sent.has_any(KEYWORD_GROUPS[f"timeline.{t}"]):
+            return t
     return "other"
 
 
@@ -82,23 +48,24 @@ class PreprocessTimelineTool(Tool):
                 triggers=["긴 텍스트", "시간 순 사건 파악 필요", "악화/반응 분석 전처리"],
                 input_contract={"patient.text": "str"},
                 output_contract={"events": "List[{event_id,type,time_hint,text,start,end}]"},
+                writes=["timeline"],
+                est_latency_ms=5,
             ),
         )
 
     def run(self, state: AgentState) -> JsonDict:
-        text = get_patient_text(state)
-        spans = _sentence_spans(text)
+        doc = analyze_document(get_patient_text(state))
         events: List[Dict] = []
-        for i, sp in enumerate(spans, 1):
-            s = sp["text"]
+        for i, sent in enumerate(doc.iter_sentences(), 1):
+            s = sent.text
             events.append(
                 {
                     "event_id": f"T{i}",
-                    "type": _tag_event_type(s),
+                    "type": _tag_event_type(sent),
                     "time_hint": _extract_time_hint(s),
                     "text": s[:4000],
-                    "start": sp["start"],
-                    "end": sp["end"],
+                    "start": sent.start,
+                    "end": sent.end,
                 }
             )
             if len(events) >= 120:
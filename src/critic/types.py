@@ -15,6 +15,16 @@ class ToolCard:
     anti_triggers: List[str] = field(default_factory=list)
     input_contract: JsonDict = field(default_factory=dict)
     output_contract: JsonDict = field(default_factory=dict)
+    # 읽는/쓰는 preprocessing 키. 쓰는 키가 겹치지 않는 도구끼리는 동시 실행 (runner.plan_tool_waves)
+    reads: List[str] = field(default_factory=list)
+    writes: List[str] = field(default_factory=list)
+    # 비용 추정 (초기값 → tool_costs.py가 trace 측정값으로 갱신). value: 예산 초과 시 낮은 것부터 제외
+    est_latency_ms: float = 0.0
+    est_tokens: int = 0
+    value: float = 1.0
+
+    def cost_text(self) -> str:
+        return f"~{self.est_latency_ms / 1000:.1f}s, ~{self.est_tokens} tokens"
 
     def to_text(self) -> str:
         return "\n".join(
@@ -32,6 +42,10 @@ class ToolSelection:
     tools: List[str]
     reason: str = ""
     retrieved_cards: List[str] = field(default_factory=list)
+    # 시간/토큰 예산 때문에 제외된 도구
+    dropped: List[str] = field(default_factory=list)
+    # 선택 경로: "heuristic" | "llm" | "cache" (HybridRouter 통계)
+    decision: str = ""
 
 
 @dataclass
@@ -6,10 +6,13 @@ LGBM critique_engine.verifier 이식, openai_chat 사용.
 from __future__ import annotations
 
 import json
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
-from ..llm.openai_chat import OpenAIChatConfig, call_openai_chat_completions, safe_json_loads
-from ..agents.evidence_agent import format_evidence_summary
+from ..llm.openai_chat import OpenAIChatConfig, call_openai_chat_completions
+from ..llm.model_router import routed_call
+from ..llm.streaming import IncrementalJSONParser, preview
+from ..agents.evidence_agent import build_evidence_prefix
+from .similar_cases import SHARED_CASES_REF, build_similar_cases_prefix
 
 
 def _bullets(xs: List[Any]) -> str:
@@ -20,10 +23,16 @@ def _bullets(xs: List[Any]) -> str:
     )
 
 
+def _log_solution(key: str, item: Any) -> None:
+    if isinstance(item, dict):
+        print(f"  [Verifier] solution ({item.get('priority', '?')}): {preview(item)}")
+
+
 class Verifier:
     """Critique + 유사 케이스 top-k → 구체적 solutions (action, evidence, priority)."""
 
-    def __init__(self, model: str = "gpt-4o-mini"):
+    def __init__(self, model: Optional[str] = None):
+        # None이면 model_router "verification" 티어 모델, solutions가 비면 large 모델로 승격
         self.model = model
 
     def verify(
@@ -42,10 +51,25 @@ class Verifier:
             { "patient_id": ..., "solutions": [ { "issue", "solution", "evidence", "priority" } ], "raw": ... }
         """
         prompt = self._build_prompt(critique, similar_cases_topk, evidence=evidence)
-        cfg = OpenAIChatConfig(model=self.model, temperature=0.3, max_tokens=4000)
-        content = call_openai_chat_completions(
-            messages=[{"role": "user", "content": prompt}],
-            config=cfg,
+        # 근거 → 유사 케이스 순서로 공통 prefix 블록 배치 (prompt caching: 앞은 전 에이전트, 뒤는 top-k 비교 도구와 공유)
+        evidence_prefix = build_evidence_prefix(evidence) if evidence else ""
+        cases_prefix = build_similar_cases_prefix(similar_cases_topk)
+        messages = [{"role": "system", "content": b} for b in (evidence_prefix, cases_prefix) if b]
+        messages.append({"role": "user", "content": prompt})
+
+        def call(model: str):
+            cfg = OpenAIChatConfig(model=model, temperature=0.3, max_tokens=4000)
+            # 스트리밍: solution이 완결되는 즉시 로그로 출력 (백엔드 로그 / Streamlit Live Logs)
+            parser = IncrementalJSONParser(("solutions",), on_item=_log_solution)
+            content = call_openai_chat_completions(messages=messages, config=cfg, on_delta=parser.feed)
+            # 잘린 꼬리는 마지막 완결 solution까지 복구
+            return content, parser.result() or {}
+
+        content, obj = routed_call(
+            "verification", call,
+            validate=lambda res: isinstance(res[1].get("solutions"), list) and bool(res[1]["solutions"]),
+            call_site="critic.verifier",
+            model=self.model,
         )
         if not content:
             return {
@@ -53,7 +77,6 @@ class Verifier:
                 "solutions": [],
                 "raw": "",
             }
-        obj = safe_json_loads(content) or {}
         solutions = obj.get("solutions", [])
         if not isinstance(solutions, list):
             solutions = []
@@ -81,31 +104,15 @@ Recommendations:
 {_bullets(critique.get("recommendations", []))}
 """
 
-        case_block = ""
-        for i, c in enumerate(similar_cases[:3], 1):
-            age = c.get("age", c.get("anchor_age", "N/A"))
-            sex = c.get("sex", c.get("gender", "N/A"))
-            status = str(c.get("status", "")).lower()
-            outcome = "DIED" if status == "dead" else "SURVIVED"
-            if not status and c.get("hospital_expire_flag") == 1:
-                outcome = "DIED"
-            case_block += f"""
-[Similar Case {i}]
-- Age/Sex: {age}/{sex}
-- Admission: {c.get("admission_type")} / {c.get("admission_location")}
-- Outcome: {outcome}
-- Clinical Note:
-{(c.get("text") or "")}
-"""
+        # 유사 케이스 원문은 verify()에서 공통 블록 (top-k 비교 도구와 같은 문자열, similar_cases.py)
+        case_block = SHARED_CASES_REF if similar_cases else "None"
 
-        # 문헌 근거 블록 (1차 + 2차 검색 결과)
+        # 문헌 근거 (1차 + 2차 검색 결과)는 verify()에서 공통 prefix 블록으로 전달
         evidence_block = ""
         if evidence:
-            formatted = format_evidence_summary(evidence)
-            if formatted and formatted != "검색된 근거 없음":
-                evidence_block = f"""
+            evidence_block = """
 [LITERATURE EVIDENCE]
-{formatted}
+See the [SHARED EVIDENCE CONTEXT] block at the beginning.
 """
 
         return f"""
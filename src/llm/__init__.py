@@ -4,4 +4,12 @@ LLM clients and utilities.
 - openai_chat: Critic Agent 전용 (Router, CritiqueBuilder, Feedback, Verifier, tools).
   OpenAIChatConfig, call_openai_chat_completions, safe_json_loads 사용.
 - 그래프 노드(Chart Structurer, Diagnosis/Treatment 등)는 src.agents.llm.get_llm() 사용.
+- gateway: 두 경로 모두 ChatRequest → complete()를 거침 (온라인 즉시 호출 / 오프라인 배치 세션).
+- batch: Batch API 방식 코호트 실행 (BatchBackend, LocalFileBatchBackend, OpenAIBatchBackend, run_offline_rounds).
+- streaming: on_delta 스트리밍용 증분 JSON 파서(IncrementalJSONParser), 잘린/깨진 JSON 복구(salvage_json, repair_json_text).
+- model_router: 작업 유형별 모델 티어 (routed_call, small → large 승격, 호출 지점별 통계).
+- backend: base URL/키/모델명/JSON 모드 처리 (OpenAI 또는 로컬 OpenAI 호환 서버, LLM_BACKEND).
+- structured: dataclass 출력 스키마 (json_schema response_format, 로컬 repair, 누락 필드만 re-ask).
+- cassette: 외부 호출(LLM, PubMed, 임베딩/리랭커) record/replay → 오프라인 재현 벤치마크.
+- usage: 토큰/비용 집계 (track_usage).
 """
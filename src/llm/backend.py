@@ -0,0 +1,208 @@
+"""
+LLM 백엔드 설정 (OpenAI / 로컬 OpenAI 호환 서버)
+
+모든 온라인 호출(openai_chat REST, LLMWrapper SDK, DiagnosisExtractor, 배치 live responder)이 여기서
+base URL / API 키 / 모델명 / JSON 모드 처리 방식을 가져온다.
+
+- openai (기본): https://api.openai.com/v1, OPENAI_API_KEY 필수, response_format=json_object
+- local: llama.cpp server, vLLM, Ollama 등 OpenAI 호환 /v1/chat/completions 서버
+  · API 키 불필요 (서버가 요구하면 LLM_API_KEY)
+  · gpt-4o / gpt-4o-mini 등 논리 모델명은 LLM_LOCAL_MODEL로 매핑 (배치 custom_id/통계는 논리 모델명 유지)
+  · RPM/TPM 리미터 대신 동시 요청 슬롯(LLM_LOCAL_CONCURRENCY, llama.cpp --parallel 값과 맞춤)으로 제한
+  · JSON 모드: LLM_JSON_STRATEGY
+      response_format  서버가 json_object를 지원 (vLLM, 최신 llama.cpp)
+      grammar          llama.cpp GBNF grammar로 JSON 객체만 생성하도록 제약 (스키마가 있으면 json_schema 제약)
+      repair (기본)    JSON만 출력하라는 system 지시 + 응답을 파싱/잘린 꼬리 복구 후 정규 JSON 문자열로 변환
+    response_format 외 방식은 응답을 항상 repair 단계에 통과시킨다.
+
+환경변수:
+  LLM_BACKEND=openai|local, LLM_BASE_URL (local 기본 http://localhost:8080/v1), LLM_API_KEY (기본 OPENAI_API_KEY),
+  LLM_LOCAL_MODEL, LLM_LOCAL_CONCURRENCY (기본 4), LLM_LOCAL_TIMEOUT_S (기본 300), LLM_JSON_STRATEGY
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+OPENAI_BASE_URL = "https://api.openai.com/v1"
+LOCAL_BASE_URL = "http://localhost:8080/v1"
+JSON_STRATEGIES = ("response_format", "grammar", "repair")
+
+# llama.cpp grammars/json.gbnf (최상위는 객체로 제한)
+JSON_OBJECT_GBNF = r'''root   ::= object
+value  ::= object | array | string | number | ("true" | "false" | "null") ws
+object ::= "{" ws ( string ":" ws value ("," ws string ":" ws value)* )? "}" ws
+array  ::= "[" ws ( value ("," ws value)* )? "]" ws
+string ::= "\"" ( [^"\\\x7F\x00-\x1F] | "\\" (["\\bfnrt] | "u" [0-9a-fA-F]{4}) )* "\"" ws
+number ::= ("-"? ([0-9] | [1-9] [0-9]{0,15})) ("." [0-9]+)? ([eE] [-+]? [0-9] [1-9]{0,15})? ws
+ws     ::= | " " | "\n" [ \t]{0,20}
+'''
+
+JSON_ONLY_INSTRUCTION = (
+    "Respond with a single valid JSON object only. "
+    "No markdown code fences, no explanation before or after the JSON."
+)
+
+
+@dataclass
+class LLMBackend:
+    kind: str = "openai"
+    base_url: str = OPENAI_BASE_URL
+    api_key: str = ""
+    model_override: Optional[str] = None
+    concurrency: int = 0
+    min_timeout_s: float = 0.0
+    json_strategy: str = "response_format"
+    _slots: Optional[threading.BoundedSemaphore] = field(default=None, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self.base_url = self.base_url.rstrip("/")
+        if self.json_strategy not in JSON_STRATEGIES:
+            print(f"[LLMBackend] unknown LLM_JSON_STRATEGY={self.json_strategy!r} → repair")
+            self.json_strategy = "repair"
+        if self.concurrency > 0:
+            self._slots = threading.BoundedSemaphore(self.concurrency)
+
+    @property
+    def is_local(self) -> bool:
+        return self.kind == "local"
+
+    @property
+    def chat_url(self) -> str:
+        return f"{self.base_url}/chat/completions"
+
+    @property
+    def rate_limited(self) -> bool:
+        """OpenAI 계정 RPM/TPM 리미터 적용 여부 (로컬 서버는 슬롯으로만 제한)."""
+        return not self.is_local
+
+    @property
+    def needs_repair(self) -> bool:
+        return self.json_strategy != "response_format"
+
+    def key(self) -> str:
+        """API 키. 지정값이 없으면 호출 시점 환경변수 (LLM_API_KEY → OPENAI_API_KEY, 로컬은 더미 키)."""
+        key = self.api_key or os.getenv("LLM_API_KEY", "")
+        if self.is_local:
+            return key or "local"
+        return key or os.environ.get("OPENAI_API_KEY", "") or ""
+
+    def available(self) -> bool:
+        """LLM 호출 가능 여부 (에이전트의 휴리스틱 폴백 판단용)."""
+        return bool(self.key().strip())
+
+    def model_name(self, model: str) -> str:
+        return self.model_override or model
+
+    def timeout(self, timeout_s: float) -> float:
+        """요청 HTTP timeout. 로컬 하한(min_timeout_s)보다 잡 마감(job_deadline)이 우선 (timeout 후 남은 스레드가 오래 붙잡지 않도록)."""
+        from .rate_limit import deadline_remaining_s
+
+        timeout = max(timeout_s, self.min_timeout_s)
+        remaining = deadline_remaining_s()
+        return timeout if remaining is None else max(1.0, min(timeout, remaining))
+
+    def json_extras(self, json_mode: bool, schema: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        JSON 모드 요청에 붙일 파라미터 (SDK에서는 response_format / extra_body로 나눠 전달).
+        schema: structured.response_schema() → Structured Outputs / llama.cpp json_schema 제약
+        """
+        if not (json_mode or schema):
+            return {}
+        if self.json_strategy == "response_format":
+            if schema:
+                return {"response_format": {"type": "json_schema", "json_schema": schema}}
+            return {"response_format": {"type": "json_object"}}
+        if self.json_strategy == "grammar":
+            return {"json_schema": schema["schema"]} if schema else {"grammar": JSON_OBJECT_GBNF}
+        return {}
+
+    def messages(self, messages: List[Dict[str, str]], json_mode: bool) -> List[Dict[str, str]]:
+        if json_mode and self.needs_repair:
+            return [{"role": "system", "content": JSON_ONLY_INSTRUCTION}] + list(messages)
+        return messages
+
+    def payload(self, body: Dict[str, Any], json_mode: bool) -> Dict[str, Any]:
+        """ChatRequest.body() → 이 백엔드로 보낼 본문 (모델명 매핑, JSON 모드 방식 적용)."""
+        response_format = body.get("response_format") or {}
+        schema = response_format.get("json_schema") if response_format.get("type") == "json_schema" else None
+        payload = {k: v for k, v in body.items() if k != "response_format"}
+        payload["model"] = self.model_name(body["model"])
+        payload["messages"] = self.messages(body["messages"], json_mode or bool(schema))
+        payload.update(self.json_extras(json_mode, schema))
+        return payload
+
+    def finalize(self, content: str, json_mode: bool) -> str:
+        """JSON 모드 응답 후처리: repair 방식이면 파싱/복구해 정규 JSON 문자열로 (실패 시 원문)."""
+        if not (json_mode and self.needs_repair and content):
+            return content
+        from .streaming import parse_json_object
+
+        obj = parse_json_object(content)
+        return json.dumps(obj, ensure_ascii=False) if obj is not None else content
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """로컬 서버 동시 요청 슬롯 (concurrency=0이면 제한 없음). 잡 마감까지 못 얻으면 DeadlineExceededError."""
+        if self._slots is None:
+            yield
+            return
+        from .rate_limit import DeadlineExceededError, deadline_remaining_s
+
+        remaining = deadline_remaining_s()
+        if not self._slots.acquire(timeout=remaining):
+            raise DeadlineExceededError(f"local slot wait exceeded job deadline ({remaining:.1f}s)")
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+
+_backend: Optional[LLMBackend] = None
+_backend_lock = threading.Lock()
+
+
+def backend_from_env() -> LLMBackend:
+    kind = os.getenv("LLM_BACKEND", "openai").strip().lower() or "openai"
+    if kind == "local":
+        return LLMBackend(
+            kind="local",
+            base_url=os.getenv("LLM_BASE_URL", LOCAL_BASE_URL),
+            model_override=os.getenv("LLM_LOCAL_MODEL") or None,
+            concurrency=int(os.getenv("LLM_LOCAL_CONCURRENCY", "4")),
+            min_timeout_s=float(os.getenv("LLM_LOCAL_TIMEOUT_S", "300")),
+            json_strategy=os.getenv("LLM_JSON_STRATEGY", "repair").strip().lower(),
+        )
+    return LLMBackend(
+        kind="openai",
+        base_url=os.getenv("LLM_BASE_URL", OPENAI_BASE_URL),
+        json_strategy=os.getenv("LLM_JSON_STRATEGY", "response_format").strip().lower(),
+    )
+
+
+def get_backend() -> LLMBackend:
+    """프로세스 전역 백엔드 (환경변수로 1회 구성)."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = backend_from_env()
+    return _backend
+
+
+def set_backend(backend: Optional[LLMBackend]) -> None:
+    """백엔드 교체 (None이면 다음 get_backend()에서 환경변수로 재구성)."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+def llm_available() -> bool:
+    # 카세트 재생 중에는 키 없이도 기록된 응답으로 LLM 경로 그대로 실행
+    from .cassette import replaying
+
+    return get_backend().available() or replaying()
@@ -0,0 +1,381 @@
+"""
+오프라인 배치 모드 (OpenAI Batch API 방식)
+
+코호트 전체를 라운드 단위로 실행한다.
+  1. 라운드 시작: 지금까지 받은 응답(ResponseStore)으로 BatchSession을 만들고 남은 케이스를 replay
+  2. 각 케이스는 응답이 없는 첫 LLM 요청(병렬 노드/prefetch면 여러 개)에서 BatchPending으로 멈춤
+  3. 라운드에서 적재된 요청을 BatchBackend로 제출 → 완료까지 polling → 응답을 ResponseStore에 저장
+  4. 다음 라운드에서 같은 요청(custom_id = 본문 해시)은 저장된 응답을 쓰고 다음 노드로 진행
+모든 LLM 요청이 응답을 가진 케이스는 그 라운드에서 끝까지 실행되어 완료된다.
+
+백엔드:
+- LocalFileBatchBackend: <root>/<batch_id>/input.jsonl → output.jsonl (오프라인 테스트용, responder로 응답 생성)
+- OpenAIBatchBackend: /v1/files + /v1/batches (completion_window 24h, 토큰 단가 50% 할인)
+"""
+from __future__ import annotations
+
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import requests
+
+from .gateway import BatchPending, BatchSession, ChatRequest, batch_session
+from .usage import usage_from_response
+
+# Batch API 단가 = 동기 호출의 50%
+BATCH_PRICE_MULTIPLIER = 0.5
+MAX_REQUESTS_PER_BATCH = 50_000
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+
+def request_to_batch_line(request: ChatRequest) -> Dict[str, Any]:
+    return {"custom_id": request.custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": request.body()}
+
+
+def request_from_body(body: Dict[str, Any]) -> ChatRequest:
+    return ChatRequest(
+        model=body.get("model", ""),
+        messages=body.get("messages") or [],
+        temperature=body.get("temperature", 0.0),
+        max_tokens=body.get("max_tokens"),
+        json_mode=(body.get("response_format") or {}).get("type") == "json_object",
+    )
+
+
+def parse_output_line(obj: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """Batch 출력 한 줄 → (custom_id, {"content", "usage"} 또는 {"error"})"""
+    cid = obj.get("custom_id", "")
+    resp = obj.get("response") or {}
+    if obj.get("error") or int(resp.get("status_code", 200)) >= 400:
+        return cid, {"error": str(obj.get("error") or resp.get("body"))}
+    body = resp.get("body") or {}
+    try:
+        content = body["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        return cid, {"error": "malformed batch response body"}
+    return cid, {"content": (content or "").strip(), "usage": usage_from_response(body)}
+
+
+def _read_jsonl(text: str) -> Iterable[Dict[str, Any]]:
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            continue
+
+
+# ──────────────────────────────────────────────
+# 백엔드
+# ──────────────────────────────────────────────
+
+class BatchBackend:
+    """배치 제출 백엔드. poll()은 "in_progress" | "completed" | "failed" 반환."""
+
+    name = "base"
+
+    def submit(self, batch_requests: List[ChatRequest]) -> str:
+        raise NotImplementedError
+
+    def poll(self, batch_id: str) -> str:
+        raise NotImplementedError
+
+    def fetch_results(self, batch_id: str) -> Dict[str, Dict[str, Any]]:
+        raise NotImplementedError
+
+
+Responder = Callable[[ChatRequest], Tuple[str, Optional[Dict[str, Any]]]]
+
+
+class LocalFileBatchBackend(BatchBackend):
+    """
+    파일 기반 백엔드: submit은 <root>/<batch_id>/input.jsonl(OpenAI Batch 입력 형식)을 쓰고,
+    output.jsonl(OpenAI Batch 출력 형식)이 생기면 완료로 본다.
+
+    responder가 있으면 poll 시 그 자리에서 응답을 만들어 output.jsonl을 쓴다 (오프라인 테스트/재현).
+    없으면 외부 프로세스가 output.jsonl을 채울 때까지 in_progress.
+    """
+
+    name = "local"
+
+    def __init__(self, root: str, responder: Optional[Responder] = None):
+        self.root = Path(root)
+        self.responder = responder
+
+    def submit(self, batch_requests: List[ChatRequest]) -> str:
+        batch_id = f"batch_local_{uuid.uuid4().hex[:12]}"
+        batch_dir = self.root / batch_id
+        batch_dir.mkdir(parents=True, exist_ok=True)
+        with open(batch_dir / "input.jsonl", "w", encoding="utf-8") as f:
+            for req in batch_requests:
+                f.write(json.dumps(request_to_batch_line(req), ensure_ascii=False) + "\n")
+        return batch_id
+
+    def poll(self, batch_id: str) -> str:
+        batch_dir = self.root / batch_id
+        if (batch_dir / "output.jsonl").exists():
+            return "completed"
+        if not (batch_dir / "input.jsonl").exists():
+            return "failed"
+        if self.responder is None:
+            return "in_progress"
+        self._respond(batch_dir)
+        return "completed"
+
+    def _respond(self, batch_dir: Path) -> None:
+        lines = []
+        for obj in _read_jsonl((batch_dir / "input.jsonl").read_text(encoding="utf-8")):
+            req = request_from_body(obj.get("body") or {})
+            try:
+                content, usage = self.responder(req)
+                body = {
+                    "model": req.model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content}}],
+                    "usage": usage or {},
+                }
+                lines.append({"custom_id": obj.get("custom_id"), "response": {"status_code": 200, "body": body}, "error": None})
+            except Exception as e:
+                lines.append({"custom_id": obj.get("custom_id"), "response": None,
+                              "error": {"message": f"{type(e).__name__}: {e}"}})
+        tmp = batch_dir / "output.jsonl.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for line in lines:
+                f.write(json.dumps(line, ensure_ascii=False) + "\n")
+        tmp.replace(batch_dir / "output.jsonl")
+
+    def fetch_results(self, batch_id: str) -> Dict[str, Dict[str, Any]]:
+        path = self.root / batch_id / "output.jsonl"
+        if not path.exists():
+            return {}
+        return dict(parse_output_line(obj) for obj in _read_jsonl(path.read_text(encoding="utf-8")))
+
+
+def live_responder(request: ChatRequest) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """LocalFileBatchBackend용 responder: 적재된 요청을 동기 API로 처리 (배치 흐름을 실제 응답으로 점검)."""
+    from .openai_chat import _post_chat_completions
+    from .rate_limit import call_with_limits
+    # URL/키/모델명은 LLM 백엔드 설정 (LLM_BACKEND=local이면 로컬 서버가 배치 파일을 처리)
+    return call_with_limits(request, lambda req: _post_chat_completions(req, None, None))
+
+
+class OpenAIBatchBackend(BatchBackend):
+    """OpenAI Batch API (/v1/files 업로드 → /v1/batches 생성 → 완료 후 output/error 파일 다운로드)."""
+
+    name = "openai"
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: str = "https://api.openai.com/v1",
+        completion_window: str = "24h",
+        timeout_s: int = 120,
+    ):
+        self.api_key = api_key if api_key is not None else os.environ.get("OPENAI_API_KEY", "")
+        self.base_url = base_url.rstrip("/")
+        self.completion_window = completion_window
+        self.timeout_s = timeout_s
+        self._files: Dict[str, Dict[str, Optional[str]]] = {}
+
+    def _headers(self) -> Dict[str, str]:
+        if not self.api_key:
+            raise RuntimeError("OPENAI_API_KEY가 설정되지 않았습니다.")
+        return {"Authorization": f"Bearer {self.api_key}"}
+
+    def submit(self, batch_requests: List[ChatRequest]) -> str:
+        data = "".join(json.dumps(request_to_batch_line(r), ensure_ascii=False) + "\n" for r in batch_requests)
+        up = requests.post(
+            f"{self.base_url}/files",
+            headers=self._headers(),
+            files={"file": ("batch_input.jsonl", data.encode("utf-8"), "application/jsonl")},
+            data={"purpose": "batch"},
+            timeout=self.timeout_s,
+        )
+        up.raise_for_status()
+        resp = requests.post(
+            f"{self.base_url}/batches",
+            headers={**self._headers(), "Content-Type": "application/json"},
+            json={
+                "input_file_id": up.json()["id"],
+                "endpoint": BATCH_ENDPOINT,
+                "completion_window": self.completion_window,
+            },
+            timeout=self.timeout_s,
+        )
+        resp.raise_for_status()
+        return resp.json()["id"]
+
+    def poll(self, batch_id: str) -> str:
+        resp = requests.get(f"{self.base_url}/batches/{batch_id}", headers=self._headers(), timeout=self.timeout_s)
+        resp.raise_for_status()
+        info = resp.json()
+        self._files[batch_id] = {"output": info.get("output_file_id"), "error": info.get("error_file_id")}
+        status = info.get("status")
+        if status == "completed":
+            return "completed"
+        if status in ("failed", "expired", "cancelled"):
+            return "failed"
+        return "in_progress"
+
+    def fetch_results(self, batch_id: str) -> Dict[str, Dict[str, Any]]:
+        if batch_id not in self._files:
+            self.poll(batch_id)
+        results: Dict[str, Dict[str, Any]] = {}
+        for file_id in (self._files[batch_id].get("error"), self._files[batch_id].get("output")):
+            if not file_id:
+                continue
+            resp = requests.get(f"{self.base_url}/files/{file_id}/content", headers=self._headers(), timeout=self.timeout_s)
+            resp.raise_for_status()
+            results.update(parse_output_line(obj) for obj in _read_jsonl(resp.text))
+        return results
+
+
+# ──────────────────────────────────────────────
+# 응답 저장소 (재시작 후 이어서 replay)
+# ──────────────────────────────────────────────
+
+class ResponseStore:
+    """
+    custom_id → 응답. <root>/responses.jsonl에 추가 기록.
+    제출 후 아직 받지 못한 배치 id는 <root>/open_batches.json에 기록 → 프로세스 재시작 시 이어서 polling.
+    """
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.path = self.root / "responses.jsonl"
+        self.open_batches_path = self.root / "open_batches.json"
+        self._lock = threading.Lock()
+        self.responses: Dict[str, Dict[str, Any]] = {}
+        if self.path.exists():
+            for obj in _read_jsonl(self.path.read_text(encoding="utf-8")):
+                self.responses[obj.get("custom_id", "")] = obj.get("item") or {}
+
+    def add(self, items: Dict[str, Dict[str, Any]]) -> None:
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                for cid, item in items.items():
+                    f.write(json.dumps({"custom_id": cid, "item": item}, ensure_ascii=False) + "\n")
+            self.responses.update(items)
+
+    def open_batches(self) -> List[str]:
+        if not self.open_batches_path.exists():
+            return []
+        try:
+            return list(json.loads(self.open_batches_path.read_text(encoding="utf-8")))
+        except (json.JSONDecodeError, TypeError):
+            return []
+
+    def set_open_batches(self, batch_ids: List[str]) -> None:
+        self.open_batches_path.write_text(json.dumps(batch_ids), encoding="utf-8")
+
+
+# ──────────────────────────────────────────────
+# 라운드 실행
+# ──────────────────────────────────────────────
+
+def wait_for_batches(
+    backend: BatchBackend,
+    store: ResponseStore,
+    batch_ids: List[str],
+    poll_interval_s: float = 30.0,
+) -> None:
+    """제출된 배치가 모두 끝날 때까지 polling → 응답을 store에 저장."""
+    remaining = list(batch_ids)
+    store.set_open_batches(remaining)
+    while remaining:
+        still = []
+        for batch_id in remaining:
+            status = backend.poll(batch_id)
+            if status == "in_progress":
+                still.append(batch_id)
+                continue
+            results = backend.fetch_results(batch_id) if status == "completed" else {}
+            store.add(results)
+            print(f"  [Batch API] {batch_id} {status}: {len(results)} responses")
+        remaining = still
+        store.set_open_batches(remaining)
+        if remaining:
+            time.sleep(poll_interval_s)
+
+
+def run_offline_rounds(
+    case_ids: List[str],
+    run_case: Callable[[str], Any],
+    backend: BatchBackend,
+    store: ResponseStore,
+    on_done: Callable[[str, Any], None],
+    concurrency: int = 4,
+    poll_interval_s: float = 30.0,
+    max_rounds: int = 50,
+) -> Dict[str, Any]:
+    """
+    모든 케이스가 끝나거나 max_rounds에 도달할 때까지 replay → 배치 제출 → 대기를 반복.
+
+    Args:
+        run_case: case_id → 결과. 응답 없는 요청을 만나면 BatchPending이 전파됨 (일반 예외는 run_case가 처리)
+        on_done: 케이스 완료 시 호출 (체크포인트 기록)
+
+    Returns:
+        {"rounds", "requests_submitted", "batches", "unfinished_case_ids"}
+    """
+    # 이전 프로세스가 제출만 하고 받지 못한 배치부터 회수
+    leftover = store.open_batches()
+    if leftover:
+        print(f"  [Batch API] resuming {len(leftover)} open batches")
+        wait_for_batches(backend, store, leftover, poll_interval_s)
+
+    pending = list(case_ids)
+    stats: Dict[str, Any] = {"rounds": 0, "requests_submitted": 0, "batches": []}
+    while pending and stats["rounds"] < max_rounds:
+        stats["rounds"] += 1
+        session = BatchSession(responses=dict(store.responses))
+
+        def attempt(cid: str):
+            with batch_session(session):
+                try:
+                    return cid, True, run_case(cid)
+                except BatchPending:
+                    return cid, False, None
+
+        blocked: List[str] = []
+        with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="batch-replay") as pool:
+            futures = [pool.submit(contextvars.copy_context().run, attempt, cid) for cid in pending]
+            for future in futures:
+                cid, finished, result = future.result()
+                if finished:
+                    on_done(cid, result)
+                else:
+                    blocked.append(cid)
+
+        staged = list(session.staged.values())
+        print(f"  [Batch API] round {stats['rounds']}: done={len(pending) - len(blocked)} "
+              f"blocked={len(blocked)} staged_requests={len(staged)}")
+        pending = blocked
+        if not pending:
+            break
+        if not staged:
+            # 응답이 있는데도 진행하지 못함 (비결정적 프롬프트 등) → 무한 반복 방지
+            print("  [Batch API] no new requests staged → stopping")
+            break
+
+        batch_ids = [
+            backend.submit(staged[i : i + MAX_REQUESTS_PER_BATCH])
+            for i in range(0, len(staged), MAX_REQUESTS_PER_BATCH)
+        ]
+        stats["requests_submitted"] += len(staged)
+        stats["batches"].extend(batch_ids)
+        print(f"  [Batch API] submitted {len(staged)} requests → {batch_ids}")
+        wait_for_batches(backend, store, batch_ids, poll_interval_s)
+
+    stats["unfinished_case_ids"] = pending
+    return stats
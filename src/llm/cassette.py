@@ -0,0 +1,232 @@
+"""
+외부 호출 record/replay (카세트)
+
+파이프라인 1회 실행의 외부 상호작용을 파일 1개에 기록하고, 같은 입력으로 재실행할 때 그대로 돌려준다.
+→ OpenAI / NCBI 지연·출력 변동 없이 오케스트레이션, 검색, critic 코드 경로를 오프라인에서 반복 측정
+
+기록 대상 (kind):
+  llm        gateway.complete() 요청 1건 (키: ChatRequest.custom_id, 응답 content + usage)
+  pubmed     evidence_agent.search_pubmed() 결과 (Entrez esearch/efetch 묶음)
+  embedding  MedCPT 쿼리 임베딩 (VectorDBManager.embed_text, EpisodicMemoryStore._embed_text)
+  rerank     cross-encoder 점수 (VectorDBManager._rerank)
+
+모드:
+  record  실제 호출 후 결과와 소요 시간 기록, close() 시 저장
+  replay  기록된 결과 반환. 같은 키가 여러 번 기록됐으면 순서대로, 다 쓰면 마지막 것 재사용
+          기록에 없는 호출은 CassetteMiss (LLM_CASSETTE_STRICT=0이면 실제 호출로 폴백)
+  지연: 기록된 소요 시간 × latency_scale 만큼 sleep (0이면 지연 없음, 1이면 기록 당시와 동일)
+
+환경변수 (스크립트 --cassette 옵션과 동일):
+  LLM_CASSETTE=path.json, LLM_CASSETTE_MODE=record|replay, LLM_CASSETTE_LATENCY=1.0, LLM_CASSETTE_STRICT=1
+"""
+from __future__ import annotations
+
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+CASSETTE_VERSION = 1
+MODES = ("record", "replay")
+
+
+class CassetteMiss(RuntimeError):
+    """replay 중 기록에 없는 외부 호출 (입력이 기록 당시와 달라짐)."""
+
+
+def interaction_key(kind: str, request: Any) -> str:
+    raw = json.dumps(request, ensure_ascii=False, sort_keys=True, default=str)
+    return f"{kind}-" + hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+@dataclass
+class Cassette:
+    path: Path
+    mode: str = "replay"
+    latency_scale: float = 0.0
+    strict: bool = True
+    interactions: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)
+    stats: Dict[str, Dict[str, int]] = field(default_factory=dict)
+    _cursor: Dict[str, int] = field(default_factory=dict, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+    _dirty: bool = field(default=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self.path = Path(self.path)
+        if self.mode not in MODES:
+            raise ValueError(f"cassette mode must be one of {MODES}, got {self.mode!r}")
+        if self.mode == "replay":
+            self.load()
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def load(self) -> None:
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self.interactions = {}
+        for item in data.get("interactions", []):
+            self.interactions.setdefault(item["key"], []).append(item)
+        print(f"[Cassette] replay {self.path} ({len(data.get('interactions', []))} interactions, "
+              f"latency x{self.latency_scale})")
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            items = [item for entries in self.interactions.values() for item in entries]
+            self._dirty = False
+        items.sort(key=lambda item: item.get("seq", 0))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": CASSETTE_VERSION, "interactions": items}, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+        print(f"[Cassette] saved {len(items)} interactions → {self.path}")
+
+    def _count(self, kind: str, outcome: str) -> None:
+        kind_stats = self.stats.setdefault(kind, {})
+        kind_stats[outcome] = kind_stats.get(outcome, 0) + 1
+
+    def _next(self, key: str) -> Optional[Dict[str, Any]]:
+        entries = self.interactions.get(key)
+        if not entries:
+            return None
+        idx = self._cursor.get(key, 0)
+        self._cursor[key] = idx + 1
+        return entries[min(idx, len(entries) - 1)]
+
+    def _record(self, kind: str, key: str, request: Any, response: Any, elapsed_s: float) -> None:
+        with self._lock:
+            seq = sum(len(v) for v in self.interactions.values())
+            self.interactions.setdefault(key, []).append({
+                "seq": seq,
+                "kind": kind,
+                "key": key,
+                "request": request,
+                "response": response,
+                "elapsed_s": round(elapsed_s, 4),
+            })
+            self._count(kind, "recorded")
+            self._dirty = True
+
+    def call(
+        self,
+        kind: str,
+        request: Any,
+        live: Callable[[], T],
+        encode: Callable[[T], Any] = lambda x: x,
+        decode: Callable[[Any], T] = lambda x: x,
+        key: Optional[str] = None,
+    ) -> T:
+        """
+        외부 호출 1건을 기록/재생.
+
+        Args:
+            request: 키 계산 + 기록용 입력 (JSON 직렬화 가능)
+            live: 실제 호출
+            encode/decode: 결과 ↔ JSON 변환 (numpy 배열 등)
+            key: 키 직접 지정 (LLM은 custom_id)
+        """
+        key = key or interaction_key(kind, request)
+        if self.replaying:
+            with self._lock:
+                item = self._next(key)
+                self._count(kind, "hit" if item is not None else "miss")
+            if item is None:
+                if self.strict:
+                    raise CassetteMiss(f"no recorded {kind} interaction for {key}")
+                print(f"  [Cassette] miss {kind} {key} → live call")
+                return live()
+            if self.latency_scale > 0:
+                time.sleep(item.get("elapsed_s", 0.0) * self.latency_scale)
+            return decode(item["response"])
+
+        started = time.monotonic()
+        result = live()
+        self._record(kind, key, request, encode(result), time.monotonic() - started)
+        return result
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"path": str(self.path), "mode": self.mode, "latency_scale": self.latency_scale,
+                    "stats": {k: dict(v) for k, v in self.stats.items()}}
+
+
+_cassette: Optional[Cassette] = None
+_env_checked = False
+_cassette_lock = threading.Lock()
+
+
+def cassette_from_env() -> Optional[Cassette]:
+    path = os.getenv("LLM_CASSETTE")
+    if not path:
+        return None
+    return Cassette(
+        path=Path(path),
+        mode=os.getenv("LLM_CASSETTE_MODE", "replay").strip().lower(),
+        latency_scale=float(os.getenv("LLM_CASSETTE_LATENCY", "0")),
+        strict=os.getenv("LLM_CASSETTE_STRICT", "1").strip().lower() not in ("0", "false", "no", "off"),
+    )
+
+
+def get_cassette() -> Optional[Cassette]:
+    """프로세스 전역 카세트 (없으면 None → 모든 호출이 그대로 실행)."""
+    global _cassette, _env_checked
+    if not _env_checked:
+        with _cassette_lock:
+            if not _env_checked:
+                _cassette = cassette_from_env()
+                _env_checked = True
+                if _cassette is not None and not _cassette.replaying:
+                    atexit.register(_cassette.save)
+    return _cassette
+
+
+def set_cassette(cassette: Optional[Cassette]) -> None:
+    global _cassette, _env_checked
+    with _cassette_lock:
+        _cassette = cassette
+        _env_checked = True
+
+
+@contextmanager
+def use_cassette(path: str, mode: str = "replay", latency_scale: float = 0.0, strict: bool = True) -> Iterator[Cassette]:
+    """with 블록 동안 전역 카세트 사용 (record면 종료 시 저장)."""
+    previous = get_cassette()
+    cassette = Cassette(path=Path(path), mode=mode, latency_scale=latency_scale, strict=strict)
+    set_cassette(cassette)
+    try:
+        yield cassette
+    finally:
+        if not cassette.replaying:
+            cassette.save()
+        set_cassette(previous)
+
+
+def replaying() -> bool:
+    cassette = get_cassette()
+    return cassette is not None and cassette.replaying
+
+
+def cassette_call(
+    kind: str,
+    request: Any,
+    live: Callable[[], T],
+    encode: Callable[[T], Any] = lambda x: x,
+    decode: Callable[[Any], T] = lambda x: x,
+) -> T:
+    """카세트가 있으면 기록/재생, 없으면 live() 그대로."""
+    cassette = get_cassette()
+    if cassette is None:
+        return live()
+    return cassette.call(kind, request, live, encode=encode, decode=decode)
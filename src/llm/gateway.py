@@ -0,0 +1,153 @@
+"""
+LLM 요청 공통 추상화
+
+src/agents, src/critic의 모든 chat completion 호출은 ChatRequest로 만들어 complete()를 거친다.
+- 기본(온라인): 호출 측이 넘긴 live 함수로 즉시 호출 (LLMWrapper = OpenAI SDK, openai_chat = REST)
+  전역 RPM/TPM 리미터 + 재시도(backoff, 잡 예산)는 rate_limit.call_with_limits가 공통 처리
+- 배치 세션 활성화 시(오프라인 코호트 모드): 이미 받은 응답이면 바로 반환, 없으면 요청을 세션에 적재하고
+  BatchPending을 던져 해당 케이스 실행을 중단 → 배치 제출/완료 후 재실행(replay)하면 같은 요청은
+  custom_id(요청 본문 해시)로 응답을 찾아 다음 노드로 진행
+- 카세트(cassette.py) 활성화 시: 온라인 호출을 기록하거나 기록된 응답을 재생 (벤치마크/회귀 측정용)
+
+BatchPending은 BaseException이라 에이전트의 `except Exception` 폴백에 잡히지 않는다.
+"""
+from __future__ import annotations
+
+import contextvars
+import hashlib
+import json
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .cassette import get_cassette
+from .rate_limit import call_with_limits
+from .usage import record_usage
+
+
+@dataclass
+class ChatRequest:
+    """Chat Completions 요청 1건. custom_id는 본문(모델/메시지/파라미터) 해시 → replay 시 동일."""
+
+    model: str
+    messages: List[Dict[str, str]]
+    temperature: float = 0.0
+    max_tokens: Optional[int] = None
+    json_mode: bool = False
+    # Structured Outputs json_schema (structured.response_schema). 지정 시 json_object 대신 사용
+    response_schema: Optional[Dict[str, Any]] = None
+    timeout_s: float = 60.0
+    # 재시도 가능 오류(429/5xx/네트워크) 포함 최대 시도 횟수 (본문/custom_id에는 포함 안 됨)
+    max_attempts: int = 3
+
+    @property
+    def wants_json(self) -> bool:
+        return self.json_mode or bool(self.response_schema)
+
+    def body(self) -> Dict[str, Any]:
+        body: Dict[str, Any] = {
+            "model": self.model,
+            "messages": self.messages,
+            "temperature": self.temperature,
+        }
+        if self.max_tokens is not None:
+            body["max_tokens"] = self.max_tokens
+        if self.response_schema:
+            body["response_format"] = {"type": "json_schema", "json_schema": self.response_schema}
+        elif self.json_mode:
+            body["response_format"] = {"type": "json_object"}
+        return body
+
+    @property
+    def custom_id(self) -> str:
+        raw = json.dumps(self.body(), ensure_ascii=False, sort_keys=True)
+        return "req-" + hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+class LLMRequestError(RuntimeError):
+    """배치 응답이 에러로 끝난 요청 (온라인 호출 실패와 같은 방식으로 호출 측 폴백이 처리)."""
+
+
+class BatchPending(BaseException):
+    """응답이 아직 없는 요청을 배치에 적재함 → 현재 케이스 실행 중단 (다음 라운드에 replay)."""
+
+    def __init__(self, custom_id: str):
+        super().__init__(custom_id)
+        self.custom_id = custom_id
+
+
+@dataclass
+class BatchSession:
+    """
+    한 라운드의 배치 세션.
+
+    responses: custom_id → {"content": str, "usage": {...}} 또는 {"error": str} (이전 라운드까지 받은 응답)
+    staged: 이번 라운드에 새로 적재된 요청 (여러 케이스/스레드에서 동시에 적재)
+    """
+
+    responses: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    staged: Dict[str, ChatRequest] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def resolve(self, request: ChatRequest) -> Tuple[str, Optional[Dict[str, Any]]]:
+        cid = request.custom_id
+        item = self.responses.get(cid)
+        if item is None:
+            with self._lock:
+                self.staged.setdefault(cid, request)
+            raise BatchPending(cid)
+        if item.get("error"):
+            raise LLMRequestError(f"batch request {cid} failed: {item['error']}")
+        return item.get("content") or "", item.get("usage")
+
+
+_session: contextvars.ContextVar[Optional[BatchSession]] = contextvars.ContextVar("llm_batch_session", default=None)
+
+
+@contextmanager
+def batch_session(session: BatchSession) -> Iterator[BatchSession]:
+    """with 블록 안의 complete() 호출을 배치 세션으로 처리."""
+    token = _session.set(session)
+    try:
+        yield session
+    finally:
+        _session.reset(token)
+
+
+def current_batch_session() -> Optional[BatchSession]:
+    return _session.get()
+
+
+LiveCall = Callable[[ChatRequest], Tuple[str, Optional[Dict[str, Any]]]]
+
+
+def complete(request: ChatRequest, live: LiveCall, on_delta: Optional[Callable[[str], None]] = None) -> str:
+    """
+    요청 실행 (공통 진입점).
+
+    Args:
+        live: 온라인 호출 함수 1회 시도. (content, usage dict 또는 None) 반환,
+            재시도할 오류는 rate_limit.RetryableLLMError로 던짐. 스트리밍이면 live가 조각마다 on_delta 호출
+        on_delta: 스트리밍 콜백. 배치 세션에서는 받은 응답 전체를 한 번에 전달
+    """
+    session = _session.get()
+    if session is not None:
+        content, usage = session.resolve(request)
+        if on_delta and content:
+            on_delta(content)
+    else:
+        cassette = get_cassette()
+        if cassette is None:
+            content, usage = call_with_limits(request, live)
+        else:
+            # record/replay: 재생 시 스트리밍 콜백에는 기록된 응답 전체를 한 번에 전달
+            content, usage = cassette.call(
+                "llm", request.body(), lambda: call_with_limits(request, live),
+                encode=list, decode=tuple, key=request.custom_id,
+            )
+            if cassette.replaying and on_delta and content:
+                on_delta(content)
+    if usage:
+        record_usage(request.model, usage.get("prompt_tokens"), usage.get("completion_tokens"))
+    return content
@@ -0,0 +1,223 @@
+"""
+모델 티어 라우팅: 작은 모델 먼저, 필요할 때만 큰 모델로 승격
+
+호출 측은 작업 유형(task)만 선언하고 모델은 여기서 결정한다.
+- small 티어 (기본 gpt-4o-mini): 검색 쿼리 생성, 라우터 결정, 요약, 근거 검증, critic 렌즈 도구
+- large 티어 (기본 LLM_MODEL 또는 gpt-4o): 차트 구조화, 임상 분석, 진단/치료 평가
+- routed_call(): small 티어 결과가 validate를 통과하지 못하거나(검증 실패/낮은 confidence) 예외가 나면
+  large 모델로 1회 재호출 (LLM_ESCALATION=0이면 끔)
+- 호출 지점(call_site)별 호출 수 / 승격률 / 지연 / 토큰 / 비용 집계 → router_stats() (배치 summary.json)
+
+환경변수:
+  LLM_MODEL_SMALL (기본 gpt-4o-mini), LLM_MODEL_LARGE (기본 LLM_MODEL 또는 gpt-4o)
+  LLM_TIER_<TASK>=small|large  작업별 티어 변경 (예: LLM_TIER_QUERY_GENERATION=large)
+  LLM_MODEL_<TASK>=<model>     작업별 모델 고정 (승격 대상은 여전히 large 티어)
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+
+from .openai_chat import OpenAIChatConfig, call_openai_chat_completions, safe_json_loads
+from .usage import UsageTracker, current_tracker, track_usage
+
+T = TypeVar("T")
+
+TIER_SMALL = "small"
+TIER_LARGE = "large"
+
+TASK_TIERS: Dict[str, str] = {
+    "query_generation": TIER_SMALL,
+    "routing": TIER_SMALL,
+    "summarization": TIER_SMALL,
+    "validation": TIER_SMALL,
+    "critic_tool": TIER_SMALL,
+    "critique": TIER_SMALL,
+    "verification": TIER_SMALL,
+    "chart_structuring": TIER_LARGE,
+    "clinical_analysis": TIER_LARGE,
+    "diagnosis": TIER_LARGE,
+    "treatment": TIER_LARGE,
+}
+
+
+def _env_key(task: str) -> str:
+    return task.upper().replace("-", "_").replace(".", "_")
+
+
+def tier_for(task: str) -> str:
+    tier = (os.getenv(f"LLM_TIER_{_env_key(task)}") or TASK_TIERS.get(task, TIER_LARGE)).lower()
+    return tier if tier in (TIER_SMALL, TIER_LARGE) else TIER_LARGE
+
+
+def tier_model(tier: str) -> str:
+    if tier == TIER_SMALL:
+        return os.getenv("LLM_MODEL_SMALL", "gpt-4o-mini")
+    return os.getenv("LLM_MODEL_LARGE") or os.getenv("LLM_MODEL", "gpt-4o")
+
+
+def model_for(task: str) -> str:
+    """작업 유형 → 첫 시도 모델."""
+    return os.getenv(f"LLM_MODEL_{_env_key(task)}") or tier_model(tier_for(task))
+
+
+def escalation_enabled() -> bool:
+    return os.getenv("LLM_ESCALATION", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+# ──────────────────────────────────────────────
+# 호출 지점별 통계
+# ──────────────────────────────────────────────
+
+@dataclass
+class CallSiteStats:
+    task: str
+    calls: int = 0
+    escalations: int = 0
+    failures: int = 0
+    latency_s: float = 0.0
+    usage: UsageTracker = field(default_factory=UsageTracker)
+
+    def to_dict(self) -> Dict[str, Any]:
+        usage = self.usage.to_dict()
+        return {
+            "task": self.task,
+            "calls": self.calls,
+            "escalations": self.escalations,
+            "escalation_rate": round(self.escalations / self.calls, 4) if self.calls else 0.0,
+            "failures": self.failures,
+            "avg_latency_s": round(self.latency_s / self.calls, 3) if self.calls else 0.0,
+            "prompt_tokens": usage["prompt_tokens"],
+            "completion_tokens": usage["completion_tokens"],
+            "cost_usd": usage["cost_usd"],
+            "by_model": usage["by_model"],
+        }
+
+
+_stats: Dict[str, CallSiteStats] = {}
+_stats_lock = threading.Lock()
+
+
+def _site(call_site: str, task: str) -> CallSiteStats:
+    with _stats_lock:
+        stats = _stats.get(call_site)
+        if stats is None:
+            stats = _stats[call_site] = CallSiteStats(task=task)
+        return stats
+
+
+def router_stats() -> Dict[str, Dict[str, Any]]:
+    with _stats_lock:
+        items = list(_stats.items())
+    return {site: stats.to_dict() for site, stats in sorted(items)}
+
+
+def reset_router_stats() -> None:
+    with _stats_lock:
+        _stats.clear()
+
+
+# ──────────────────────────────────────────────
+# 라우팅 호출
+# ──────────────────────────────────────────────
+
+def _attempt(call: Callable[[str], T], model: str, stats: CallSiteStats) -> T:
+    # 호출 지점 usage를 따로 모은 뒤 케이스 tracker에도 합산
+    parent = current_tracker()
+    with track_usage() as tracker:
+        try:
+            return call(model)
+        finally:
+            stats.usage.merge(tracker)
+            if parent is not None:
+                parent.merge(tracker)
+
+
+def routed_call(
+    task: str,
+    call: Callable[[str], T],
+    validate: Optional[Callable[[T], bool]] = None,
+    call_site: Optional[str] = None,
+    model: Optional[str] = None,
+) -> T:
+    """
+    task 티어 모델로 call(model) 실행, small 티어 결과가 부적합하면 large 모델로 승격.
+
+    Args:
+        call: 모델명을 받아 호출하고 결과를 반환 (파싱까지 포함해도 됨, 실패 시 예외)
+        validate: 결과가 쓸 만한지 판단 (False → 승격). None이면 예외만 승격 사유
+        call_site: 통계 키 (기본 task)
+        model: 첫 시도 모델 고정 (설정값으로 모델을 받는 호출 측)
+    """
+    stats = _site(call_site or task, task)
+    first = model or model_for(task)
+    large = tier_model(TIER_LARGE)
+    can_escalate = escalation_enabled() and first != large
+    started = time.monotonic()
+    escalated = failed = False
+    try:
+        try:
+            result = _attempt(call, first, stats)
+        except Exception as e:
+            if not can_escalate:
+                raise
+            reason = f"{type(e).__name__}: {str(e)[:80]}"
+        else:
+            try:
+                ok = validate is None or bool(validate(result))
+            except Exception:
+                ok = False
+            if ok or not can_escalate:
+                _count(stats, started, escalated, failed)
+                return result
+            reason = "validation failed / low confidence"
+        escalated = True
+        print(f"  [ModelRouter] {call_site or task}: {first} → {large} ({reason})")
+        result = _attempt(call, large, stats)
+    except Exception:
+        failed = True
+        _count(stats, started, escalated, failed)
+        raise
+    # BatchPending(BaseException) 등으로 중단된 replay는 집계하지 않음
+    _count(stats, started, escalated, failed)
+    return result
+
+
+def _count(stats: CallSiteStats, started: float, escalated: bool, failed: bool) -> None:
+    with _stats_lock:
+        stats.calls += 1
+        stats.escalations += int(escalated)
+        stats.failures += int(failed)
+        stats.latency_s += time.monotonic() - started
+
+
+def routed_chat_json(
+    task: str,
+    call_site: str,
+    prompt: str,
+    temperature: float = 0.0,
+    max_tokens: Optional[int] = None,
+    required: Tuple[str, ...] = (),
+    prefix_blocks: Tuple[str, ...] = (),
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    단일 user 프롬프트 → (content, JSON dict). JSON 파싱 실패 또는 required 키 누락이면 승격.
+    critic 도구처럼 "프롬프트 1개 → JSON" 형태의 호출 지점용.
+    prefix_blocks: user 프롬프트 앞에 system 메시지로 둘 공통 블록 (prompt caching용, 빈 문자열은 생략)
+    """
+    messages = [{"role": "system", "content": b} for b in prefix_blocks if b]
+    messages.append({"role": "user", "content": prompt})
+
+    def call(model: str) -> Tuple[str, Dict[str, Any]]:
+        cfg = OpenAIChatConfig(model=model, temperature=temperature, max_tokens=max_tokens)
+        content = call_openai_chat_completions(messages=messages, config=cfg)
+        return content, safe_json_loads(content) or {}
+
+    return routed_call(
+        task, call,
+        validate=lambda res: bool(res[1]) and all(k in res[1] for k in required),
+        call_site=call_site,
+    )
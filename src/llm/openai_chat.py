@@ -1,29 +1,35 @@
 from __future__ import annotations
 
 import json
-import os
-import time
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional
 
 import requests
 
+from .backend import get_backend
+from .gateway import ChatRequest, LLMRequestError, complete
+from .rate_limit import RetryableLLMError, parse_retry_after
+from .usage import usage_from_response
+
 
 @dataclass
 class OpenAIChatConfig:
     model: str = "gpt-4o-mini"
     temperature: float = 0.2
-    max_tokens: int = 2000
+    max_tokens: Optional[int] = 2000
     timeout_s: int = 120
     max_retries: int = 4
+    json_mode: bool = False
+    # Structured Outputs 스키마 (structured.response_schema)
+    response_schema: Optional[Dict[str, Any]] = None
 
 
-class OpenAIChatError(RuntimeError):
+class OpenAIChatError(LLMRequestError):
     pass
 
 
 def _default_api_key() -> str:
-    return os.environ.get("OPENAI_API_KEY", "") or ""
+    return get_backend().key()
 
 
 def call_openai_chat_completions(
@@ -31,62 +37,139 @@ def call_openai_chat_completions(
     messages: List[Dict[str, str]],
     config: OpenAIChatConfig,
     api_key: Optional[str] = None,
-    api_url: str = "https://api.openai.com/v1/chat/completions",
+    api_url: Optional[str] = None,
+    on_delta: Optional[Callable[[str], None]] = None,
 ) -> str:
+    """
+    Args:
+        api_key / api_url: 지정하지 않으면 LLM 백엔드 설정 (backend.get_backend: OpenAI 또는 로컬 호환 서버)
+        on_delta: 지정하면 스트리밍(stream=True)으로 호출하고 content 조각마다 호출
+            (예: streaming.IncrementalJSONParser.feed). 스트림이 중간에 끊기면 받은 부분까지 반환
+    """
+    request = ChatRequest(
+        model=config.model,
+        messages=messages,
+        temperature=config.temperature,
+        max_tokens=config.max_tokens,
+        json_mode=config.json_mode,
+        response_schema=config.response_schema,
+        timeout_s=config.timeout_s,
+        max_attempts=config.max_retries,
+    )
+    # 공통 요청 경로 (레이트 리밋/재시도, 오프라인 배치 모드에서는 배치로 적재/응답 재사용)
+    try:
+        if on_delta is not None:
+            return complete(request, lambda req: _stream_chat_completions(req, api_key, api_url, on_delta), on_delta)
+        return complete(request, lambda req: _post_chat_completions(req, api_key, api_url))
+    except RetryableLLMError as e:
+        raise OpenAIChatError(f"OpenAI 호출 최종 실패: {e}") from e
+
+
+def _post_chat_completions(request: ChatRequest, api_key: Optional[str], api_url: Optional[str]):
+    """1회 시도. 429/5xx/네트워크 오류는 RetryableLLMError (재시도는 rate_limit.call_with_limits)."""
+    backend = get_backend()
+    key = api_key if api_key is not None else _default_api_key()
+    if not key:
+        raise OpenAIChatError("OPENAI_API_KEY가 설정되지 않았습니다.")
+
+    payload: Dict[str, Any] = backend.payload(request.body(), request.wants_json)
+    headers = {"Authorization": f"Bearer {key}", "Content-Type": "application/json"}
+
+    try:
+        resp = requests.post(
+            api_url or backend.chat_url,
+            headers=headers,
+            json=payload,
+            timeout=backend.timeout(request.timeout_s),
+        )
+    except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+        raise RetryableLLMError(f"네트워크/타임아웃 오류: {type(e).__name__}: {e}") from e
+    if resp.status_code in (429, 500, 502, 503, 504):
+        raise RetryableLLMError(
+            f"HTTP {resp.status_code}",
+            retry_after=parse_retry_after(resp.headers),
+            status_code=resp.status_code,
+        )
+    if resp.status_code == 401:
+        raise OpenAIChatError("API 키가 유효하지 않습니다. OPENAI_API_KEY를 확인하세요.")
+    if resp.status_code == 404:
+        raise OpenAIChatError(f"모델을 찾을 수 없습니다: {request.model}")
+    try:
+        resp.raise_for_status()
+        data = resp.json()
+    except requests.exceptions.HTTPError as e:
+        raise OpenAIChatError(f"HTTP 오류: {e}") from e
+    except json.JSONDecodeError as e:
+        raise OpenAIChatError(f"응답 JSON 파싱 실패: {e}") from e
+    content = (data.get("choices") or [{}])[0].get("message", {}).get("content")
+    if not content:
+        raise OpenAIChatError("OpenAI 응답 content가 비어있습니다.")
+    return backend.finalize(str(content).strip(), request.wants_json), usage_from_response(data)
+
+
+def _stream_chat_completions(
+    request: ChatRequest,
+    api_key: Optional[str],
+    api_url: Optional[str],
+    on_delta: Callable[[str], None],
+):
+    """
+    SSE 스트리밍 1회 시도. 첫 조각 전 오류는 재시도 대상(RetryableLLMError),
+    일부를 받은 뒤 끊기면 재요청하지 않고 받은 부분을 반환 (호출 측이 salvage).
+    """
+    backend = get_backend()
     key = api_key if api_key is not None else _default_api_key()
     if not key:
         raise OpenAIChatError("OPENAI_API_KEY가 설정되지 않았습니다.")
 
     payload: Dict[str, Any] = {
-        "model": config.model,
-        "messages": messages,
-        "temperature": config.temperature,
-        "max_tokens": config.max_tokens,
+        **backend.payload(request.body(), request.wants_json),
+        "stream": True,
+        "stream_options": {"include_usage": True},
     }
     headers = {"Authorization": f"Bearer {key}", "Content-Type": "application/json"}
+    try:
+        resp = requests.post(
+            api_url or backend.chat_url, headers=headers, json=payload,
+            timeout=backend.timeout(request.timeout_s), stream=True,
+        )
+    except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+        raise RetryableLLMError(f"네트워크/타임아웃 오류: {type(e).__name__}: {e}") from e
+    if resp.status_code in (429, 500, 502, 503, 504):
+        raise RetryableLLMError(
+            f"HTTP {resp.status_code}",
+            retry_after=parse_retry_after(resp.headers),
+            status_code=resp.status_code,
+        )
+    if resp.status_code >= 400:
+        raise OpenAIChatError(f"HTTP 오류: {resp.status_code}")
 
-    for attempt in range(1, config.max_retries + 1):
-        try:
-            resp = requests.post(
-                api_url,
-                headers=headers,
-                json=payload,
-                timeout=config.timeout_s,
-            )
-            if resp.status_code in (429, 500, 502, 503, 504):
-                if attempt < config.max_retries:
-                    time.sleep(min(2**attempt, 20))
-                    continue
-            if resp.status_code == 401:
-                raise OpenAIChatError("API 키가 유효하지 않습니다. OPENAI_API_KEY를 확인하세요.")
-            if resp.status_code == 404:
-                raise OpenAIChatError(f"모델을 찾을 수 없습니다: {config.model}")
-            resp.raise_for_status()
-            data = resp.json()
-            content = (data.get("choices") or [{}])[0].get("message", {}).get("content")
-            if not content:
-                raise OpenAIChatError("OpenAI 응답 content가 비어있습니다.")
-            return str(content).strip()
-        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
-            if attempt < config.max_retries:
-                time.sleep(min(attempt * 2, 10))
-                continue
-            raise OpenAIChatError(f"네트워크/타임아웃 오류: {type(e).__name__}: {e}") from e
-        except requests.exceptions.HTTPError as e:
-            if attempt < config.max_retries:
-                time.sleep(min(attempt * 2, 10))
-                continue
-            raise OpenAIChatError(f"HTTP 오류: {e}") from e
-        except json.JSONDecodeError as e:
-            raise OpenAIChatError(f"응답 JSON 파싱 실패: {e}") from e
-        except OpenAIChatError:
-            raise
-        except Exception as e:
-            if attempt < config.max_retries:
-                time.sleep(min(attempt * 2, 10))
+    parts: List[str] = []
+    usage = None
+    try:
+        for raw in resp.iter_lines(decode_unicode=True):
+            if not raw or not raw.startswith("data:"):
                 continue
-            raise OpenAIChatError(f"OpenAI 호출 실패: {type(e).__name__}: {e}") from e
-    raise OpenAIChatError("OpenAI 호출 최종 실패")
+            data = raw[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            event = json.loads(data)
+            usage = usage_from_response(event) or usage
+            for choice in event.get("choices") or []:
+                delta = (choice.get("delta") or {}).get("content")
+                if delta:
+                    parts.append(delta)
+                    on_delta(delta)
+                if choice.get("finish_reason") == "length":
+                    print(f"  [Streaming] {request.model} hit max_tokens={request.max_tokens} → truncated output")
+    except (requests.exceptions.RequestException, json.JSONDecodeError) as e:
+        if not parts:
+            raise RetryableLLMError(f"스트림 오류: {type(e).__name__}: {e}") from e
+        print(f"  [Streaming] stream interrupted after {sum(map(len, parts))} chars ({type(e).__name__}) → partial")
+    content = "".join(parts)
+    if not content:
+        raise OpenAIChatError("OpenAI 응답 content가 비어있습니다.")
+    return backend.finalize(content.strip(), request.wants_json), usage
 
 
 def safe_json_loads(text: str) -> Optional[Dict[str, Any]]:
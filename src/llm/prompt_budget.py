@@ -0,0 +1,226 @@
+"""
+프롬프트 토큰 예산 (하드 슬라이스 대체)
+
+- count_tokens: tiktoken이 설치돼 있으면 모델 인코딩으로, 없으면 문자수/4 근사
+- compress_text: 문장 단위 추출 압축 (우선 문장 + 앞/뒤 문맥, 원문 순서 유지)
+  (도메인 키워드는 호출 측이 전달: 임상 텍스트는 agents.evidence_agent.compress_clinical_text)
+- PromptSection / fit_sections: 섹션 우선순위대로 전체 예산에 맞춤 (덜 중요한 섹션부터 축소)
+- get_token_budget: 에이전트별 상한 (환경변수 PROMPT_BUDGET_<NAME>으로 조정)
+"""
+from __future__ import annotations
+
+import math
+import os
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+# 에이전트/섹션별 기본 상한 (토큰). *_prompt는 프롬프트 전체, 나머지는 해당 텍스트 섹션.
+# 텍스트 섹션 기본값은 기존 하드 슬라이스(문자수)/4 수준으로 맞춤.
+DEFAULT_TOKEN_BUDGETS: Dict[str, int] = {
+    "diagnosis_prompt": 6000,
+    "diagnosis_text": 1500,
+    "diagnosis_text_min": 600,
+    "treatment_prompt": 6000,
+    "evidence_item": 300,
+    "evidence_prefix": 2500,
+    "clinical_analysis_text": 500,
+    "critic_router_text": 650,
+    "topk_compare_text": 650,
+    "similar_case_text": 650,
+    "risk_factor_text": 1000,
+    "process_contributor_text": 1000,
+    "alternative_explanation_text": 750,
+}
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    """tiktoken 인코딩 (선택 의존성). 없으면 None."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            model = os.getenv("LLM_MODEL", "gpt-4o")
+            try:
+                _encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _encoding = None
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    enc = _get_encoding()
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / 4)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if not text or max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    enc = _get_encoding()
+    if enc is not None:
+        return enc.decode(enc.encode(text, disallowed_special=())[:max_tokens])
+    return text[: max_tokens * 4]
+
+
+def get_token_budget(name: str, default: Optional[int] = None) -> int:
+    """PROMPT_BUDGET_<NAME> 환경변수 > DEFAULT_TOKEN_BUDGETS > default."""
+    env = os.getenv(f"PROMPT_BUDGET_{name.upper()}")
+    if env:
+        try:
+            return int(env)
+        except ValueError:
+            pass
+    if name in DEFAULT_TOKEN_BUDGETS:
+        return DEFAULT_TOKEN_BUDGETS[name]
+    if default is None:
+        raise KeyError(f"Unknown prompt budget: {name}")
+    return default
+
+
+# ---------------------------------------------------------------------------
+# 추출 압축
+# ---------------------------------------------------------------------------
+
+_SENT_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+_GAP = " [...] "
+
+
+def _split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENT_SPLIT.split(text) if s and s.strip()]
+
+
+def _keyword_pattern(keywords: Iterable[str]) -> Optional[re.Pattern]:
+    parts = []
+    for kw in keywords:
+        kw = (kw or "").strip().lower()
+        if not kw:
+            continue
+        # 짧은 약어(pe, mi, ams)는 단어 경계로만 매칭
+        parts.append(rf"\b{re.escape(kw)}\b" if len(kw) <= 3 else re.escape(kw))
+    return re.compile("|".join(parts), re.IGNORECASE) if parts else None
+
+
+def compress_text(
+    text: str,
+    max_tokens: int,
+    keywords: Sequence[str] = (),
+    priority_snippets: Sequence[str] = (),
+    head_sentences: int = 3,
+    tail_sentences: int = 2,
+) -> str:
+    """
+    예산을 넘는 텍스트를 문장 단위로 추출 압축.
+
+    우선순위: priority_snippets를 포함한 문장 > 앞/뒤 문맥(주소/경과·퇴원) > 키워드 많은 문장.
+    선택된 문장은 원문 순서로 이어 붙이고, 빠진 구간은 [...]로 표시.
+    """
+    if not text or count_tokens(text) <= max_tokens:
+        return text or ""
+    sentences = _split_sentences(text)
+    if len(sentences) <= 1:
+        return truncate_to_tokens(text, max_tokens)
+
+    kw_pattern = _keyword_pattern(keywords)
+    snippets = [s.strip().lower()[:80] for s in priority_snippets if s and s.strip()]
+    n = len(sentences)
+
+    scored = []
+    for i, sent in enumerate(sentences):
+        lower = sent.lower()
+        score = 0.0
+        if any(sn in lower or lower in sn for sn in snippets):
+            score += 10
+        if i < head_sentences or i >= n - tail_sentences:
+            score += 5
+        if kw_pattern is not None:
+            score += len(kw_pattern.findall(sent))
+        scored.append((score, i))
+
+    gap_cost = count_tokens(_GAP)
+    chosen: List[int] = []
+    used = 0
+    # 점수 순으로 채우고, 남는 예산은 점수 0 문장(앞쪽부터)으로 채움
+    for score, i in sorted(scored, key=lambda x: (-x[0], x[1])):
+        cost = count_tokens(sentences[i]) + gap_cost
+        if used + cost > max_tokens:
+            continue
+        chosen.append(i)
+        used += cost
+    if not chosen:
+        return truncate_to_tokens(text, max_tokens)
+
+    chosen.sort()
+    out = sentences[chosen[0]]
+    for prev, cur in zip(chosen, chosen[1:]):
+        out += (" " if cur == prev + 1 else _GAP) + sentences[cur]
+    if chosen[-1] != n - 1:
+        out += _GAP.rstrip()
+    return out
+
+
+# ---------------------------------------------------------------------------
+# 섹션 우선순위 기반 조립
+# ---------------------------------------------------------------------------
+
+@dataclass
+class PromptSection:
+    """프롬프트 섹션. priority가 작을수록 중요 (예산 초과 시 가장 나중에 축소)."""
+
+    name: str
+    text: str
+    priority: int = 1
+    max_tokens: Optional[int] = None
+    min_tokens: int = 0
+    compress: Optional[Callable[[str, int], str]] = None
+
+    def shrink(self, max_tokens: int) -> str:
+        fn = self.compress or truncate_to_tokens
+        return fn(self.text, max_tokens)
+
+
+def fit_sections(
+    sections: List[PromptSection],
+    budget: int,
+    overhead_tokens: int = 0,
+    label: str = "",
+) -> Dict[str, str]:
+    """
+    섹션별 상한 적용 후, 전체(overhead + 섹션 합)가 budget을 넘으면 priority가 낮은 섹션부터 축소.
+
+    Returns:
+        {section.name: 조정된 텍스트}
+    """
+    before = overhead_tokens + sum(count_tokens(sec.text) for sec in sections)
+    for sec in sections:
+        if sec.max_tokens is not None and count_tokens(sec.text) > sec.max_tokens:
+            sec.text = sec.shrink(sec.max_tokens)
+
+    counts = {sec.name: count_tokens(sec.text) for sec in sections}
+    overflow = overhead_tokens + sum(counts.values()) - budget
+    for sec in sorted(sections, key=lambda s: -s.priority):
+        if overflow <= 0:
+            break
+        cur = counts[sec.name]
+        target = max(sec.min_tokens, cur - overflow)
+        if target >= cur:
+            continue
+        sec.text = sec.shrink(target)
+        counts[sec.name] = count_tokens(sec.text)
+        overflow -= cur - counts[sec.name]
+
+    after = overhead_tokens + sum(counts.values())
+    if label and after < before:
+        print(f"  [Prompt Budget] {label}: {before} → {after} tokens (budget {budget})")
+    return {sec.name: sec.text for sec in sections}
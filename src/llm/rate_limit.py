@@ -0,0 +1,366 @@
+"""
+LLM 호출 레이트 리밋 + 재시도 (모든 온라인 호출이 gateway.complete()에서 공유)
+
+- RateLimiter: RPM / TPM 토큰 버킷. 프로세스 전역 1개 (get_rate_limiter)
+  LLM_RATE_LIMIT_DB를 지정하면 SQLite 파일 버킷으로 여러 프로세스(배치 잡, 백엔드 워커)가 한도를 공유
+- 요청 전 예상 토큰(프롬프트 + max_tokens)만큼 TPM을 차감, 응답 후 실제 usage로 정산
+- 재시도: 429/5xx/네트워크 오류만 (RetryableLLMError). full-jitter 지수 backoff, Retry-After가 있으면 그 이상 대기
+- retry_budget(): 잡(케이스) 단위 재시도 상한 (contextvars). 소진되면 재시도 없이 실패 → 폭주 방지
+- job_deadline(): 잡(케이스) 단위 마감 시각 (contextvars). critic 도구 선택이 남은 시간 안에 맞춤
+  중첩 가능 (에이전트/도구 timeout → 더 이른 마감 적용). 마감이 지나면 새 호출/재시도를 시작하지 않고
+  (DeadlineExceededError), 리미터/로컬 슬롯 대기도 마감까지만, 진행 중 요청의 HTTP timeout도 남은 시간으로 줄임
+  (로컬 LLM_LOCAL_TIMEOUT_S 하한보다 우선) → timeout 후 남은 스레드가 계속 과금하거나 슬롯을 붙잡지 않음
+- 대기 시간은 UsageTracker에 throttle_s(버킷 대기) / backoff_s(재시도 대기) / request_s(실제 호출)로 기록
+
+환경변수: LLM_RPM (기본 500), LLM_TPM (기본 450000), LLM_RATE_LIMIT_DB (기본 없음 = 프로세스 내)
+로컬 백엔드(LLM_BACKEND=local)는 RPM/TPM 대신 backend.slot() 동시 요청 제한만 적용
+"""
+from __future__ import annotations
+
+import contextvars
+import dataclasses
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, Optional, Tuple
+
+from .backend import get_backend
+from .prompt_budget import count_tokens
+from .usage import record_timing
+
+if TYPE_CHECKING:
+    from .gateway import ChatRequest
+
+DEFAULT_RPM = 500
+DEFAULT_TPM = 450_000
+DEFAULT_COMPLETION_TOKENS = 1000
+BACKOFF_BASE_S = 1.0
+BACKOFF_CAP_S = 30.0
+
+
+class RetryableLLMError(RuntimeError):
+    """429 / 5xx / 타임아웃 / 연결 오류. retry_after: 서버가 준 Retry-After(초)."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
+class DeadlineExceededError(RuntimeError):
+    """job_deadline()이 지나 LLM 호출/재시도를 시작하지 않음 (재시도 대상 아님)."""
+
+
+def parse_retry_after(headers: Any) -> Optional[float]:
+    """Retry-After(초) 또는 OpenAI의 retry-after-ms 헤더."""
+    if not headers:
+        return None
+    try:
+        ms = headers.get("retry-after-ms")
+        if ms:
+            return float(ms) / 1000
+        value = headers.get("retry-after")
+        return float(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+# ──────────────────────────────────────────────
+# 토큰 버킷
+# ──────────────────────────────────────────────
+
+class TokenBucket:
+    """프로세스 내 토큰 버킷. take()는 성공 시 0, 부족하면 기다려야 할 초를 반환."""
+
+    def __init__(self, capacity: float, refill_per_s: float):
+        self.capacity = float(capacity)
+        self.refill_per_s = float(refill_per_s)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.refill_per_s)
+        self._updated = now
+
+    def take(self, amount: float) -> float:
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill()
+            if self._tokens >= amount:
+                self._tokens -= amount
+                return 0.0
+            return (amount - self._tokens) / self.refill_per_s
+
+    def adjust(self, delta: float) -> None:
+        """정산: 양수면 반환, 음수면 추가 차감 (잔량이 음수가 될 수 있음 → 다음 요청이 기다림)."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + delta)
+
+
+class SQLiteTokenBucket:
+    """여러 프로세스가 공유하는 토큰 버킷 (SQLite 파일, BEGIN IMMEDIATE로 직렬화)."""
+
+    def __init__(self, path: str, name: str, capacity: float, refill_per_s: float):
+        self.path = path
+        self.name = name
+        self.capacity = float(capacity)
+        self.refill_per_s = float(refill_per_s)
+        # sqlite3 connection의 with는 commit/rollback만 함 → closing으로 닫기까지
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL, updated REAL)"
+            )
+            conn.execute(
+                "INSERT OR IGNORE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                (name, self.capacity, time.time()),
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _update(self, fn: Callable[[float], Tuple[float, float]]) -> float:
+        conn = self._connect()
+        try:
+            conn.isolation_level = None
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (self.name,)).fetchone()
+            now = time.time()
+            tokens = self.capacity if row is None else min(self.capacity, row[0] + (now - row[1]) * self.refill_per_s)
+            tokens, result = fn(tokens)
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)", (self.name, tokens, now)
+            )
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def take(self, amount: float) -> float:
+        amount = min(amount, self.capacity)
+
+        def fn(tokens: float) -> Tuple[float, float]:
+            if tokens >= amount:
+                return tokens - amount, 0.0
+            return tokens, (amount - tokens) / self.refill_per_s
+
+        return self._update(fn)
+
+    def adjust(self, delta: float) -> None:
+        self._update(lambda tokens: (min(self.capacity, tokens + delta), 0.0))
+
+
+# ──────────────────────────────────────────────
+# 리미터
+# ──────────────────────────────────────────────
+
+class RateLimiter:
+    """RPM + TPM 버킷. acquire()는 두 버킷 모두 확보될 때까지 기다리고 대기 시간(초)을 반환."""
+
+    def __init__(self, rpm: int = DEFAULT_RPM, tpm: int = DEFAULT_TPM, db_path: Optional[str] = None):
+        self.rpm = rpm
+        self.tpm = tpm
+        if db_path:
+            self.requests = SQLiteTokenBucket(db_path, "rpm", rpm, rpm / 60.0)
+            self.tokens = SQLiteTokenBucket(db_path, "tpm", tpm, tpm / 60.0)
+        else:
+            self.requests = TokenBucket(rpm, rpm / 60.0)
+            self.tokens = TokenBucket(tpm, tpm / 60.0)
+        self._lock = threading.Lock()
+        self.metrics: Dict[str, float] = {
+            "requests": 0, "retries": 0, "rate_limited": 0, "budget_exhausted": 0,
+            "throttle_s": 0.0, "backoff_s": 0.0, "request_s": 0.0,
+        }
+
+    def acquire(self, estimated_tokens: int) -> float:
+        waited = 0.0
+        while True:
+            wait = self.requests.take(1)
+            if wait == 0.0:
+                wait = self.tokens.take(estimated_tokens)
+                if wait == 0.0:
+                    return waited
+                # TPM 부족 → 가져간 요청 슬롯 반환 후 대기
+                self.requests.adjust(1)
+            # 동시에 깨어난 스레드가 같은 순간 재시도하지 않도록 약간의 jitter
+            wait = min(wait, BACKOFF_CAP_S) + random.uniform(0, 0.05)
+            remaining = deadline_remaining_s()
+            if remaining is not None and wait >= remaining:
+                raise DeadlineExceededError(f"rate limiter wait {wait:.1f}s exceeds job deadline ({remaining:.1f}s)")
+            time.sleep(wait)
+            waited += wait
+
+    def settle(self, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        if actual_tokens is not None:
+            self.tokens.adjust(estimated_tokens - actual_tokens)
+
+    def add_metrics(self, **values: float) -> None:
+        with self._lock:
+            for k, v in values.items():
+                self.metrics[k] = self.metrics.get(k, 0) + v
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            out = dict(self.metrics)
+        waited = out["throttle_s"] + out["backoff_s"]
+        total = waited + out["request_s"]
+        out["throttle_ratio"] = round(waited / total, 4) if total else 0.0
+        return out
+
+
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """프로세스 전역 리미터 (환경변수로 1회 구성)."""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter(
+                    rpm=int(os.getenv("LLM_RPM", str(DEFAULT_RPM))),
+                    tpm=int(os.getenv("LLM_TPM", str(DEFAULT_TPM))),
+                    db_path=os.getenv("LLM_RATE_LIMIT_DB") or None,
+                )
+    return _limiter
+
+
+# ──────────────────────────────────────────────
+# 잡 단위 재시도 예산
+# ──────────────────────────────────────────────
+
+class RetryBudget:
+    def __init__(self, max_retries: int):
+        self.remaining = max_retries
+        self._lock = threading.Lock()
+
+    def consume(self) -> bool:
+        with self._lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+
+_budget: contextvars.ContextVar[Optional[RetryBudget]] = contextvars.ContextVar("llm_retry_budget", default=None)
+
+
+@contextmanager
+def retry_budget(max_retries: int) -> Iterator[RetryBudget]:
+    """with 블록(한 잡/케이스) 안의 모든 LLM 재시도 합계를 max_retries로 제한."""
+    budget = RetryBudget(max_retries)
+    token = _budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _budget.reset(token)
+
+
+# ──────────────────────────────────────────────
+# 잡 단위 마감 시간 (critic 도구 예산이 남은 시간에 맞춰 줄어듦)
+# ──────────────────────────────────────────────
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("job_deadline", default=None)
+
+
+@contextmanager
+def job_deadline(seconds: Optional[float]) -> Iterator[None]:
+    """with 블록(한 잡/케이스/에이전트)의 마감 시각을 지금 + seconds로 설정 (바깥 마감이 더 이르면 그것 유지). None이면 바깥 마감 그대로."""
+    outer = _deadline.get()
+    deadline = time.monotonic() + seconds if seconds else None
+    if outer is not None:
+        deadline = outer if deadline is None else min(outer, deadline)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def deadline_remaining_s() -> Optional[float]:
+    """현재 잡의 남은 시간 (초). 마감이 없으면 None."""
+    deadline = _deadline.get()
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """full jitter: U(0, min(cap, base * 2^attempt)). Retry-After가 있으면 그 값 이상."""
+    delay = random.uniform(0, min(BACKOFF_CAP_S, BACKOFF_BASE_S * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after * (1 + random.uniform(0, 0.25)))
+    return delay
+
+
+def estimate_tokens(request: "ChatRequest") -> int:
+    prompt = sum(count_tokens(m.get("content") or "") for m in request.messages)
+    return prompt + (request.max_tokens or DEFAULT_COMPLETION_TOKENS)
+
+
+def call_with_limits(
+    request: "ChatRequest",
+    live: Callable[["ChatRequest"], Tuple[str, Optional[Dict[str, Any]]]],
+) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    리미터 대기 → 호출 → 재시도 가능 오류면 backoff 후 재시도 (request.max_attempts, 잡 예산 내).
+    로컬 백엔드는 RPM/TPM 대신 동시 요청 슬롯만 기다림 (슬롯 대기도 throttle_s로 기록).
+    """
+    limiter = get_rate_limiter()
+    backend = get_backend()
+    budget = _budget.get()
+    estimated = estimate_tokens(request) if backend.rate_limited else 0
+    attempt = 0
+    while True:
+        attempt += 1
+        remaining = deadline_remaining_s()
+        if remaining is not None:
+            if remaining <= 0:
+                raise DeadlineExceededError(f"{request.model}: job deadline passed before attempt {attempt}")
+            if remaining < request.timeout_s:
+                request = dataclasses.replace(request, timeout_s=max(1.0, remaining))
+        throttle = limiter.acquire(estimated) if backend.rate_limited else 0.0
+        started = time.monotonic()
+        try:
+            with backend.slot():
+                slot_wait = time.monotonic() - started
+                throttle += slot_wait
+                started += slot_wait
+                content, usage = live(request)
+        except RetryableLLMError as e:
+            elapsed = time.monotonic() - started
+            limiter.settle(estimated, 0)
+            rate_limited = 1 if e.status_code == 429 else 0
+            if attempt >= request.max_attempts or (budget is not None and not budget.consume()):
+                exhausted = 1 if attempt < request.max_attempts else 0
+                limiter.add_metrics(throttle_s=throttle, request_s=elapsed, rate_limited=rate_limited,
+                                    budget_exhausted=exhausted, requests=1)
+                record_timing(throttle_s=throttle, request_s=elapsed)
+                raise
+            delay = backoff_delay(attempt, e.retry_after)
+            remaining = deadline_remaining_s()
+            if remaining is not None and delay >= remaining:
+                limiter.add_metrics(throttle_s=throttle, request_s=elapsed, rate_limited=rate_limited, requests=1)
+                record_timing(throttle_s=throttle, request_s=elapsed)
+                raise DeadlineExceededError(f"{request.model}: {e} (no time left to retry)") from e
+            limiter.add_metrics(throttle_s=throttle, backoff_s=delay, request_s=elapsed,
+                                rate_limited=rate_limited, retries=1, requests=1)
+            record_timing(throttle_s=throttle, backoff_s=delay, request_s=elapsed, retries=1)
+            print(f"  [RateLimit] {request.model} {e} → retry {attempt}/{request.max_attempts - 1} in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+        elapsed = time.monotonic() - started
+        actual = (usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0)) if usage else None
+        if backend.rate_limited:
+            limiter.settle(estimated, actual)
+        limiter.add_metrics(throttle_s=throttle, request_s=elapsed, requests=1)
+        record_timing(throttle_s=throttle, request_s=elapsed)
+        return content, usage
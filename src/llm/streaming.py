@@ -0,0 +1,254 @@
+"""
+스트리밍 응답용 JSON 처리
+
+- IncrementalJSONParser: 스트리밍 조각을 feed()하면 지정한 최상위 배열 키
+  (예: "solutions", "critique_points")의 원소(객체/문자열)가 닫히는 즉시 반환 (on_item 콜백)
+  feed를 그대로 call_openai_chat_completions / LLMWrapper.gpt4o의 on_delta로 넘기면 됨
+- salvage_json: max_tokens 도달/스트림 중단으로 꼬리가 잘린 JSON을 마지막으로 완결된 원소까지 살려 닫음
+- repair_json_text: 로컬 모델/느슨한 출력 보정 (코드 펜스, 앞뒤 설명문, trailing comma, Python 리터럴)
+- parse_json_object: 그대로 파싱 → repair 후 파싱 → 잘린 꼬리 salvage 순으로 시도 (재요청 없이)
+
+둘 다 같은 문자 단위 스캐너(문자열/escape/중첩 깊이 추적)를 사용하며, ```json 펜스 등
+첫 '{' 이전 텍스트는 무시한다.
+"""
+from __future__ import annotations
+
+import json
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+class IncrementalJSONParser:
+    """
+    최상위 객체의 배열 키 원소를 완결 즉시 방출.
+
+        parser = IncrementalJSONParser(keys=("solutions",), on_item=lambda key, item: print(item))
+        content = call_openai_chat_completions(messages, config, on_delta=parser.feed)
+        obj = parser.result()
+    """
+
+    def __init__(self, keys: Iterable[str], on_item: Optional[Callable[[str, Any], None]] = None):
+        self.keys = set(keys)
+        self.on_item = on_item
+        self.buffer = ""
+        self.items: Dict[str, List[Any]] = {k: [] for k in self.keys}
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = -1
+        self._last_key: Optional[str] = None
+        self._candidate_key: Optional[str] = None
+        self._array_key: Optional[str] = None
+        self._item_start = -1
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """새 조각을 추가하고, 이번에 완결된 (key, item) 목록을 반환."""
+        self.buffer += chunk or ""
+        emitted: List[Tuple[str, Any]] = []
+        buf = self.buffer
+        for i in range(self._pos, len(buf)):
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1:
+                        # 최상위 객체의 문자열 → 뒤에 ':'가 오면 키
+                        self._candidate_key = buf[self._string_start + 1 : i]
+                    elif len(self._stack) == 2 and self._array_key:
+                        # 문자열 배열 원소 (예: "medication_issues": ["..."])
+                        self._emit(_loads_or_none(buf[self._string_start : i + 1]), emitted)
+                continue
+            if ch == '"':
+                if self._stack:
+                    self._in_string = True
+                    self._string_start = i
+            elif ch == ":" and len(self._stack) == 1:
+                self._last_key = self._candidate_key
+            elif ch in "{[":
+                if not self._stack and ch != "{":
+                    continue
+                self._stack.append(ch)
+                depth = len(self._stack)
+                if depth == 2 and ch == "[":
+                    self._array_key = self._last_key if self._last_key in self.keys else None
+                elif depth == 3 and self._array_key and self._stack[1] == "[":
+                    self._item_start = i
+            elif ch in "}]":
+                if not self._stack:
+                    continue
+                self._stack.pop()
+                depth = len(self._stack)
+                if depth == 2 and ch == "}" and self._item_start >= 0:
+                    self._emit(_loads_or_none(buf[self._item_start : i + 1]), emitted)
+                    self._item_start = -1
+                elif depth == 1 and ch == "]":
+                    self._array_key = None
+        self._pos = len(buf)
+        return emitted
+
+    def _emit(self, item: Any, emitted: List[Tuple[str, Any]]) -> None:
+        if item is None:
+            return
+        self.items[self._array_key].append(item)
+        emitted.append((self._array_key, item))
+        if self.on_item is not None:
+            try:
+                self.on_item(self._array_key, item)
+            except Exception as e:
+                print(f"  [Streaming] on_item callback failed: {e}")
+
+    def result(self) -> Optional[Dict[str, Any]]:
+        """전체 파싱 → 실패 시 salvage → 그래도 실패면 방출된 원소만으로 구성."""
+        obj = parse_json_object(self.buffer)
+        if obj is not None:
+            return obj
+        if any(self.items.values()):
+            return {k: list(v) for k, v in self.items.items()}
+        return None
+
+
+def _loads_or_none(text: str) -> Optional[Any]:
+    try:
+        return json.loads(text)
+    except (json.JSONDecodeError, ValueError):
+        return None
+
+
+def salvage_json(text: str) -> Optional[Dict[str, Any]]:
+    """
+    꼬리가 잘린 JSON 객체 복구.
+
+    마지막으로 값이 완결된 지점(',' 직전 또는 컨테이너가 닫힌 직후)에서 자르고 열린 괄호를 닫는다.
+    가장 늦은 지점부터 시도해 처음 파싱에 성공한 결과를 반환.
+    """
+    if not text:
+        return None
+    start = text.find("{")
+    if start < 0:
+        return None
+    stack: List[str] = []
+    in_string = escape = False
+    # (자를 위치, 그 시점의 열린 괄호 스택)
+    cut_points: List[Tuple[int, Tuple[str, ...]]] = []
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append(ch)
+        elif ch in "}]":
+            if not stack:
+                break
+            stack.pop()
+            if not stack:
+                return _loads_or_none(text[start : i + 1])
+            cut_points.append((i + 1, tuple(stack)))
+        elif ch == ",":
+            cut_points.append((i, tuple(stack)))
+
+    for cut, open_stack in reversed(cut_points[-50:]):
+        candidate = text[start:cut].rstrip().rstrip(",") + "".join(_CLOSERS[c] for c in reversed(open_stack))
+        obj = _loads_or_none(candidate)
+        if isinstance(obj, dict):
+            return obj
+    return None
+
+
+_PREVIEW_FIELDS = ("point", "issue", "solution", "condition")
+
+
+def preview(item: Any, limit: int = 120) -> str:
+    """로그용 한 줄 요약. dict면 대표 필드(point/issue/solution/condition) 값을 사용."""
+    if isinstance(item, dict):
+        item = next((item[k] for k in _PREVIEW_FIELDS if item.get(k)), None) or json.dumps(item, ensure_ascii=False)
+    s = " ".join(str(item or "").split())
+    return s if len(s) <= limit else s[: limit - 3] + "..."
+
+
+_PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+def repair_json_text(text: str) -> str:
+    """
+    흔한 형식 오류 보정 (문자열 밖에서만): 첫 '{' 이전/코드 펜스 제거, 닫는 괄호 앞 trailing comma 제거,
+    True/False/None → true/false/null. 잘린 꼬리는 salvage_json이 처리.
+    """
+    if not text:
+        return ""
+    start = text.find("{")
+    if start < 0:
+        return text
+    out: List[str] = []
+    in_string = escape = False
+    depth = 0
+    i, n = start, len(text)
+    while i < n:
+        ch = text[i]
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            i += 1
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            # trailing comma: ", }" / ",]"
+            j = len(out) - 1
+            while j >= 0 and out[j].isspace():
+                j -= 1
+            if j >= 0 and out[j] == ",":
+                del out[j]
+            depth -= 1
+            if depth == 0:
+                out.append(ch)
+                break  # 최상위 객체 뒤의 설명문/펜스는 버림
+        elif ch.isalpha():
+            j = i
+            while j < n and text[j].isalnum():
+                j += 1
+            word = text[i:j]
+            out.append(_PY_LITERALS.get(word, word))
+            i = j
+            continue
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def parse_json_object(text: str) -> Optional[Dict[str, Any]]:
+    """safe_json_loads와 같은 규칙으로 파싱, 실패하면 repair_json_text → 잘린 꼬리 복구(salvage_json) 시도."""
+    from .openai_chat import safe_json_loads
+
+    obj = safe_json_loads(text)
+    if obj is not None:
+        return obj
+    repaired = repair_json_text(text)
+    obj = _loads_or_none(repaired)
+    if isinstance(obj, dict):
+        print(f"  [Streaming] repaired malformed JSON ({len(text)} chars)")
+        return obj
+    obj = salvage_json(repaired)
+    if obj is not None:
+        print(f"  [Streaming] salvaged truncated JSON ({len(text)} chars, keys={list(obj)})")
+    return obj
@@ -0,0 +1,229 @@
+"""
+스키마 기반 LLM 출력 (dataclass로 출력 형식 선언)
+
+- 에이전트는 출력 스키마를 dataclass로 선언 (src/agents/schemas.py). 필수 필드는 required()로 표시
+- response_schema(cls): Structured Outputs(json_schema) response_format. 백엔드가 지원하면 사용
+  (OpenAI / vLLM, llama.cpp는 json_schema 제약), 아니면 json_object 또는 repair 방식 (backend.py)
+- parse_structured(): 응답 → 로컬 repair(코드 펜스, trailing comma, 잘린 괄호) → 타입 보정 → 누락 필드 목록
+- complete_structured(): 필수 필드가 빠졌을 때만 그 필드만 다시 묻는다 (전체 프롬프트 재요청 없음)
+  reask 콜백은 호출 측이 제공 (같은 모델/공통 prefix 사용 → prompt caching)
+
+result.data는 dict (에이전트 state에 그대로 넣는 형태), 스키마에 없는 키도 보존한다.
+"""
+from __future__ import annotations
+
+import json
+import typing
+from dataclasses import MISSING, asdict, dataclass, field, fields, is_dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type, TypeVar
+
+from .streaming import parse_json_object
+
+T = TypeVar("T")
+
+REASK_MAX_TOKENS = 800
+PARTIAL_PREVIEW_CHARS = 3000
+
+
+def required(default: Any = MISSING, default_factory: Any = MISSING, description: str = "") -> Any:
+    """필수 필드. 누락되면 re-ask 대상, re-ask도 실패하면 default로 채움."""
+    return field(default=default, default_factory=default_factory,
+                 metadata={"required": True, "description": description})
+
+
+def optional(default: Any = MISSING, default_factory: Any = MISSING, description: str = "") -> Any:
+    return field(default=default, default_factory=default_factory, metadata={"description": description})
+
+
+def _is_required(f) -> bool:
+    if f.metadata.get("required"):
+        return True
+    return f.default is MISSING and f.default_factory is MISSING
+
+
+def _default_of(f) -> Any:
+    if f.default is not MISSING:
+        return f.default
+    if f.default_factory is not MISSING:
+        return f.default_factory()
+    return None
+
+
+# ──────────────────────────────────────────────
+# JSON Schema
+# ──────────────────────────────────────────────
+
+def _type_schema(tp: Any) -> Dict[str, Any]:
+    origin = typing.get_origin(tp)
+    args = typing.get_args(tp)
+    if origin is typing.Union:
+        non_none = [a for a in args if a is not type(None)]
+        return _type_schema(non_none[0]) if len(non_none) == 1 else {}
+    if origin in (list, List):
+        return {"type": "array", "items": _type_schema(args[0]) if args else {}}
+    if origin in (dict, Dict) or tp is dict:
+        return {"type": "object"}
+    if is_dataclass(tp):
+        return json_schema(tp)
+    return {str: {"type": "string"}, bool: {"type": "boolean"}, int: {"type": "integer"},
+            float: {"type": "number"}}.get(tp, {})
+
+
+def json_schema(cls: Type) -> Dict[str, Any]:
+    hints = typing.get_type_hints(cls)
+    props: Dict[str, Any] = {}
+    for f in fields(cls):
+        prop = dict(_type_schema(hints[f.name]))
+        if f.metadata.get("description"):
+            prop["description"] = f.metadata["description"]
+        props[f.name] = prop
+    return {
+        "type": "object",
+        "properties": props,
+        "required": [f.name for f in fields(cls) if _is_required(f)],
+    }
+
+
+def response_schema(cls: Type) -> Dict[str, Any]:
+    """OpenAI response_format의 json_schema 항목 (strict=False: 추가 키/부분 응답 허용)."""
+    return {"name": cls.__name__, "schema": json_schema(cls), "strict": False}
+
+
+# ──────────────────────────────────────────────
+# 타입 보정
+# ──────────────────────────────────────────────
+
+_INVALID = object()
+
+
+def _coerce(tp: Any, value: Any) -> Any:
+    if value is None:
+        return _INVALID
+    origin = typing.get_origin(tp)
+    args = typing.get_args(tp)
+    if origin is typing.Union:
+        non_none = [a for a in args if a is not type(None)]
+        return _coerce(non_none[0], value) if len(non_none) == 1 else value
+    if tp is Any:
+        return value
+    if origin in (list, List):
+        items = value if isinstance(value, list) else [value]
+        item_tp = args[0] if args else Any
+        out = [_coerce(item_tp, v) for v in items]
+        return [v for v in out if v is not _INVALID]
+    if origin in (dict, Dict) or tp is dict:
+        return value if isinstance(value, dict) else _INVALID
+    if is_dataclass(tp):
+        if not isinstance(value, dict):
+            return _INVALID
+        inst, _, _ = coerce(tp, value)
+        return inst
+    if tp is str:
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, ensure_ascii=False)
+        return str(value)
+    if tp is bool:
+        if isinstance(value, bool):
+            return value
+        text = str(value).strip().lower()
+        return {"true": True, "yes": True, "false": False, "no": False}.get(text, _INVALID)
+    if tp in (int, float):
+        try:
+            return tp(value)
+        except (TypeError, ValueError):
+            return _INVALID
+    return value
+
+
+def _empty(value: Any) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def coerce(cls: Type[T], obj: Dict[str, Any]) -> Tuple[T, List[str], Dict[str, Any]]:
+    """dict → (dataclass 인스턴스, 누락/무효 필수 필드, 스키마 밖 키)."""
+    hints = typing.get_type_hints(cls)
+    values: Dict[str, Any] = {}
+    missing: List[str] = []
+    for f in fields(cls):
+        raw = obj.get(f.name)
+        value = _INVALID if _empty(raw) else _coerce(hints[f.name], raw)
+        if value is _INVALID:
+            if _is_required(f):
+                missing.append(f.name)
+            value = _default_of(f)
+        values[f.name] = value
+    names = {f.name for f in fields(cls)}
+    extras = {k: v for k, v in obj.items() if k not in names}
+    return cls(**values), missing, extras
+
+
+# ──────────────────────────────────────────────
+# 파싱 / 누락 필드 re-ask
+# ──────────────────────────────────────────────
+
+@dataclass
+class StructuredResult:
+    value: Any
+    data: Dict[str, Any]
+    missing: List[str] = field(default_factory=list)
+    parse_failed: bool = False
+    reasked: List[str] = field(default_factory=list)
+
+
+def parse_structured(cls: Type[T], text: str) -> StructuredResult:
+    obj = parse_json_object(text or "")
+    if obj is None:
+        value, missing, _ = coerce(cls, {})
+        return StructuredResult(value=value, data=asdict(value), missing=missing, parse_failed=True)
+    value, missing, extras = coerce(cls, obj)
+    return StructuredResult(value=value, data={**extras, **asdict(value)}, missing=missing)
+
+
+def missing_fields_prompt(cls: Type, missing: List[str], partial: Dict[str, Any]) -> str:
+    """누락 필드만 묻는 짧은 후속 프롬프트 (부분 응답을 근거로 제시)."""
+    schema = json_schema(cls)
+    subset = {k: schema["properties"].get(k, {}) for k in missing}
+    partial_text = json.dumps(partial, ensure_ascii=False)[:PARTIAL_PREVIEW_CHARS]
+    return f"""Your previous JSON answer for this case was incomplete. These required fields were missing or invalid: {missing}
+
+Previous answer (partial):
+{partial_text}
+
+Return a JSON object containing ONLY these keys, consistent with the previous answer:
+{json.dumps(subset, ensure_ascii=False)}"""
+
+
+def complete_structured(
+    cls: Type[T],
+    text: str,
+    reask: Optional[Callable[[str], str]] = None,
+    label: str = "Structured",
+) -> StructuredResult:
+    """
+    응답 파싱 + 필수 필드 누락 시 해당 필드만 re-ask (1회).
+
+    Args:
+        reask: 후속 프롬프트 → 응답 텍스트. 부분 파싱조차 실패한 경우에는 호출하지 않음
+            (전체 재요청은 호출 측 정책)
+    """
+    result = parse_structured(cls, text)
+    if not result.missing or reask is None or result.parse_failed:
+        if result.missing:
+            print(f"  [{label}] missing fields {result.missing} → defaults")
+        return result
+
+    partial = {k: v for k, v in result.data.items() if k not in result.missing}
+    print(f"  [{label}] missing fields {result.missing} → targeted re-ask")
+    try:
+        patch = parse_json_object(reask(missing_fields_prompt(cls, result.missing, partial)) or "") or {}
+    except Exception as e:
+        print(f"  [{label}] re-ask failed: {e} → defaults")
+        return result
+    merged = {**partial, **{k: v for k, v in patch.items() if k in result.missing}}
+    value, missing, extras = coerce(cls, merged)
+    return StructuredResult(
+        value=value,
+        data={**extras, **asdict(value)},
+        missing=missing,
+        reasked=[k for k in result.missing if k not in missing],
+    )
@@ -0,0 +1,155 @@
+"""
+LLM 사용량(토큰/비용) 집계
+
+- UsageTracker: 호출 수, prompt/completion 토큰, 모델별 집계, 추정 비용
+- track_usage(): with 블록 안의 LLM 호출을 해당 tracker에 기록 (contextvars 기반 → 스레드별 케이스 분리)
+- record_usage(): 응답의 usage를 기록 (활성 tracker 없으면 무시). 호출은 gateway.complete()가 담당
+- record_timing(): 레이트 리밋 대기(throttle_s) / 재시도 대기(backoff_s) / 실제 호출(request_s) 시간 (rate_limit.py)
+
+스레드 풀에서 실행되는 작업은 contextvars.copy_context().run으로 제출해야 호출 측 tracker가 이어진다
+(PrefetchHandle, 조건부 에이전트 풀은 이미 그렇게 제출함. LangGraph 노드 실행은 컨텍스트를 복사함).
+"""
+from __future__ import annotations
+
+import contextvars
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+# USD / 1M tokens (input, output). 환경변수 LLM_PRICE_<MODEL>="in,out"으로 덮어쓰기 가능.
+DEFAULT_PRICING: Dict[str, Tuple[float, float]] = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+
+
+def _price_for(model: str) -> Tuple[float, float]:
+    env = os.getenv(f"LLM_PRICE_{(model or '').upper().replace('-', '_').replace('.', '_')}")
+    if env:
+        try:
+            p_in, p_out = (float(x) for x in env.split(","))
+            return p_in, p_out
+        except ValueError:
+            pass
+    # 날짜 접미사 모델명(gpt-4o-2024-08-06 등)은 가장 긴 접두 일치로 가격 결정
+    for name in sorted(DEFAULT_PRICING, key=len, reverse=True):
+        if (model or "").startswith(name):
+            return DEFAULT_PRICING[name]
+    return (0.0, 0.0)
+
+
+@dataclass
+class UsageTracker:
+    """한 케이스(또는 배치 전체)의 LLM 사용량. 여러 스레드에서 동시에 기록 가능."""
+
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    by_model: Dict[str, Dict[str, int]] = field(default_factory=dict)
+    timing: Dict[str, float] = field(
+        default_factory=lambda: {"throttle_s": 0.0, "backoff_s": 0.0, "request_s": 0.0, "retries": 0}
+    )
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def record(self, model: str, prompt_tokens: int, completion_tokens: int) -> None:
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            m = self.by_model.setdefault(model or "unknown", {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+            m["calls"] += 1
+            m["prompt_tokens"] += prompt_tokens
+            m["completion_tokens"] += completion_tokens
+
+    def add_timing(self, **values: float) -> None:
+        with self._lock:
+            for k, v in values.items():
+                self.timing[k] = self.timing.get(k, 0) + v
+
+    def merge(self, other: "UsageTracker") -> None:
+        other_dict = other.to_dict()
+        self.add_timing(**other_dict["timing"])
+        for model, m in other_dict["by_model"].items():
+            with self._lock:
+                self.calls += m["calls"]
+                self.prompt_tokens += m["prompt_tokens"]
+                self.completion_tokens += m["completion_tokens"]
+                cur = self.by_model.setdefault(model, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+                for k in cur:
+                    cur[k] += m[k]
+
+    @property
+    def cost_usd(self) -> float:
+        with self._lock:
+            items = list(self.by_model.items())
+        total = 0.0
+        for model, m in items:
+            p_in, p_out = _price_for(model)
+            total += (m["prompt_tokens"] * p_in + m["completion_tokens"] * p_out) / 1_000_000
+        return total
+
+    def to_dict(self) -> Dict[str, Any]:
+        cost = self.cost_usd
+        with self._lock:
+            timing = {k: round(v, 3) for k, v in self.timing.items()}
+            waited = timing["throttle_s"] + timing["backoff_s"]
+            total = waited + timing["request_s"]
+            return {
+                "calls": self.calls,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "cost_usd": round(cost, 6),
+                "by_model": {k: dict(v) for k, v in self.by_model.items()},
+                "timing": timing,
+                # 대기(레이트 리밋 + 재시도) / (대기 + 실제 호출)
+                "throttle_ratio": round(waited / total, 4) if total else 0.0,
+            }
+
+
+_current: contextvars.ContextVar[Optional[UsageTracker]] = contextvars.ContextVar("llm_usage_tracker", default=None)
+
+
+def current_tracker() -> Optional[UsageTracker]:
+    return _current.get()
+
+
+@contextmanager
+def track_usage(tracker: Optional[UsageTracker] = None) -> Iterator[UsageTracker]:
+    """with 블록 안에서 발생한 LLM 호출 사용량을 tracker에 기록."""
+    tracker = tracker or UsageTracker()
+    token = _current.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _current.reset(token)
+
+
+def record_usage(model: str, prompt_tokens: Any, completion_tokens: Any) -> None:
+    tracker = _current.get()
+    if tracker is None:
+        return
+    try:
+        tracker.record(model, int(prompt_tokens or 0), int(completion_tokens or 0))
+    except (TypeError, ValueError):
+        pass
+
+
+def record_timing(**values: float) -> None:
+    tracker = _current.get()
+    if tracker is not None:
+        tracker.add_timing(**values)
+
+
+def usage_from_response(response: Any) -> Optional[Dict[str, int]]:
+    """OpenAI SDK 응답 객체(response.usage) 또는 REST JSON(dict["usage"])에서 토큰 수 추출."""
+    usage = response.get("usage") if isinstance(response, dict) else getattr(response, "usage", None)
+    if not usage:
+        return None
+    if isinstance(usage, dict):
+        return {"prompt_tokens": usage.get("prompt_tokens") or 0, "completion_tokens": usage.get("completion_tokens") or 0}
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+    }
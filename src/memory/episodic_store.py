@@ -16,15 +16,19 @@ Episodic Memory Store - 에피소딕 메모리 저장소
   - 검색: 진단명 필터 → FAISS 유사도 순위
 """
 
+from __future__ import annotations
+
 import json
-import os
-import numpy as np
-import faiss
-import torch
+import threading
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import TYPE_CHECKING, List, Dict, Optional
 from datetime import datetime
-from transformers import AutoTokenizer, AutoModel
+
+from ..llm.cassette import cassette_call, replaying
+
+# numpy / faiss / torch / transformers는 첫 사용 시 import
+if TYPE_CHECKING:
+    import numpy as np
 
 
 BASE_DIR = Path(__file__).resolve().parents[2]  # project root
@@ -43,28 +47,48 @@ class EpisodicMemoryStore:
     EMBEDDING_MODEL = "ncbi/MedCPT-Query-Encoder"
     EMBEDDING_DIM = 768  # MedCPT output dimension
     
-    def __init__(self, db_path: str = None, shared_embedder=None):
+    def __init__(self, db_path: str = None, shared_embedder=None, autosave: bool = True):
         """
         Args:
             db_path: 에피소딕 DB 저장 경로
             shared_embedder: RAGRetriever의 VectorDBManager를 공유하여
                              모델 중복 로딩 방지 (embed_text 메서드 필요)
+            autosave: add_episode마다 디스크 저장. 배치 실행은 False로 두고
+                      체크포인트 시점에 save()를 직접 호출 (매 케이스 전체 JSON 재기록 방지)
         """
         self.db_path = Path(db_path) if db_path else DEFAULT_EPISODIC_PATH
         self.shared_embedder = shared_embedder
+        self.autosave = autosave
+        # 배치 모드에서 여러 케이스가 같은 store를 공유 → 인덱스/메타데이터 접근 직렬화
+        self._lock = threading.RLock()
         
         # 자체 임베딩 모델 (shared_embedder 없을 때)
         self.tokenizer = None
         self.model = None
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self._device = None
         
         # FAISS 인덱스 + 메타데이터
         self.index = None
         self.episodes: List[Dict] = []
         self.is_loaded = False
+        # 검색 대상 에피소드 수 상한 (None = 전체). freeze_search() 참고
+        self._search_limit: Optional[int] = None
+    
+    @property
+    def device(self):
+        if self._device is None:
+            import torch
+            self._device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        return self._device
     
     def load(self):
         """에피소딕 DB 로드 (없으면 새로 생성)"""
+        with self._lock:
+            self._load_locked()
+    
+    def _load_locked(self):
+        import faiss
+        
         self.db_path.mkdir(parents=True, exist_ok=True)
         
         index_path = self.db_path / "episodic_faiss.idx"
@@ -88,13 +112,15 @@ class EpisodicMemoryStore:
             print("  [EpisodicMemory] 새 메타데이터 생성")
         
         # 임베딩 모델 로드 (shared_embedder 없을 때만)
-        if self.shared_embedder is None:
+        if self.shared_embedder is None and not replaying():
             self._load_embedding_model()
         
         self.is_loaded = True
     
     def _load_embedding_model(self):
         """MedCPT 임베딩 모델 로드"""
+        from transformers import AutoTokenizer, AutoModel
+        
         print(f"  [EpisodicMemory] 임베딩 모델 로드: {self.EMBEDDING_MODEL}")
         self.tokenizer = AutoTokenizer.from_pretrained(self.EMBEDDING_MODEL)
         self.model = AutoModel.from_pretrained(self.EMBEDDING_MODEL).to(self.device)
@@ -109,7 +135,22 @@ class EpisodicMemoryStore:
         if self.shared_embedder is not None:
             return self.shared_embedder.embed_text(text)
         
+        import numpy as np
+        
         processed_text = text if text and text.strip() else " "
+        # 카세트 재생 시 기록된 임베딩 사용 (모델 미로드)
+        return cassette_call(
+            "embedding",
+            {"model": self.EMBEDDING_MODEL, "text": processed_text, "max_length": 512},
+            lambda: self._encode(processed_text),
+            encode=lambda arr: arr.tolist(),
+            decode=lambda rows: np.asarray(rows, dtype=np.float32),
+        )
+    
+    def _encode(self, processed_text: str) -> np.ndarray:
+        import numpy as np
+        import torch
+        
         inputs = self.tokenizer(
             processed_text,
             return_tensors="pt",
@@ -124,6 +165,16 @@ class EpisodicMemoryStore:
         
         return embedding.astype(np.float32)
     
+    def freeze_search(self):
+        """
+        현재까지의 에피소드만 검색 대상으로 고정 (이후 추가분은 저장되지만 검색에는 안 보임).
+        오프라인 배치 모드에서 다른 케이스 완료에 따라 프롬프트가 바뀌어 replay가 어긋나는 것을 막음.
+        """
+        with self._lock:
+            if not self.is_loaded:
+                self._load_locked()
+            self._search_limit = len(self.episodes)
+    
     def save(self):
         """에피소딕 DB를 디스크에 저장"""
         self.db_path.mkdir(parents=True, exist_ok=True)
@@ -131,11 +182,15 @@ class EpisodicMemoryStore:
         index_path = self.db_path / "episodic_faiss.idx"
         meta_path = self.db_path / "episodic_meta.json"
         
-        faiss.write_index(self.index, str(index_path))
-        with open(meta_path, "w", encoding="utf-8") as f:
-            json.dump(self.episodes, f, ensure_ascii=False, indent=2)
+        import faiss
+        
+        with self._lock:
+            faiss.write_index(self.index, str(index_path))
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump(self.episodes, f, ensure_ascii=False, indent=2)
+            count = len(self.episodes)
         
-        print(f"  [EpisodicMemory] 저장 완료: {len(self.episodes)}건 -> {self.db_path}")
+        print(f"  [EpisodicMemory] 저장 완료: {count}건 -> {self.db_path}")
     
     # ──────────────────────────────────────────────
     # LLM 임상 요약 (저장 시 1회)
@@ -147,12 +202,14 @@ class EpisodicMemoryStore:
         저장 시 1회만 호출. 요약문을 임베딩하여 FAISS에 저장.
         API 키 없으면 앞부분 발췌로 fallback.
         """
-        api_key = os.environ.get("OPENAI_API_KEY", "")
-        if not api_key:
+        from ..llm.backend import llm_available
+
+        if not llm_available():
             print("  [EpisodicMemory] API 키 없음 -> 텍스트 발췌 fallback")
             return clinical_text
         
         try:
+            from ..llm.model_router import routed_call
             from ..llm.openai_chat import OpenAIChatConfig, call_openai_chat_completions
             
             prompt = f"""Summarize this clinical case in 150-200 words for case similarity matching.
@@ -165,10 +222,18 @@ Clinical text:
 
 Summary:"""
             
-            cfg = OpenAIChatConfig(model="gpt-4o-mini", temperature=0.0, max_tokens=400)
-            summary = call_openai_chat_completions(
-                messages=[{"role": "user", "content": prompt}],
-                config=cfg,
+            def call(model: str) -> str:
+                cfg = OpenAIChatConfig(model=model, temperature=0.0, max_tokens=400)
+                return call_openai_chat_completions(
+                    messages=[{"role": "user", "content": prompt}],
+                    config=cfg,
+                )
+
+            # 요약은 small 티어, 너무 짧으면(요약 실패) large 모델로 승격
+            summary = routed_call(
+                "summarization", call,
+                validate=lambda text: len((text or "").split()) >= 40,
+                call_site="episodic.summary",
             )
             print(f"  [EpisodicMemory] LLM 요약 생성: {len(summary)} chars")
             return summary
@@ -205,7 +270,7 @@ Summary:"""
         
         # 에피소드 구성
         episode = {
-            "episode_id": f"EP-{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+            "episode_id": f"EP-{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}",
             "timestamp": datetime.now().isoformat(),
             "patient_id": patient_case.get("patient_id") or patient_case.get("id"),
             "diagnosis": patient_case.get("diagnosis", "Unknown"),
@@ -219,15 +284,19 @@ Summary:"""
         }
         
         # 임베딩 생성 (LLM 요약문 기반)
+        import faiss
+        
         embedding = self._embed_text(clinical_summary)
         faiss.normalize_L2(embedding)
         
-        # FAISS에 추가
-        self.index.add(embedding)
-        self.episodes.append(episode)
+        # FAISS에 추가 (인덱스 위치 = episodes 위치가 어긋나지 않도록 함께 잠금)
+        with self._lock:
+            self.index.add(embedding)
+            self.episodes.append(episode)
         
         # 자동 저장
-        self.save()
+        if self.autosave:
+            self.save()
         
         print(f"  [EpisodicMemory] 에피소드 저장: {episode['episode_id']} "
               f"(진단: {episode['diagnosis']}, confidence: {confidence:.2f})")
@@ -349,12 +418,16 @@ Summary:"""
             return []
         
         # 쿼리 임베딩 (chunk mean pooling으로 전체 텍스트 반영)
+        import faiss
+        
         query_vec = self._embed_text(clinical_text)
         faiss.normalize_L2(query_vec)
         
         # 전체 FAISS 검색 (넉넉히 가져옴)
-        search_k = min(self.index.ntotal, max(top_k * 3, 10))
-        similarities, indices = self.index.search(query_vec, search_k)
+        with self._lock:
+            search_k = min(self.index.ntotal, max(top_k * 3, 10))
+            similarities, indices = self.index.search(query_vec, search_k)
+            episodes = list(self.episodes[: self._search_limit])
         
         # 진단명 목록 구성
         all_diagnoses = [diagnosis] + (secondary_diagnoses or [])
@@ -364,12 +437,12 @@ Summary:"""
         dx_unmatched = []
         
         for sim, idx in zip(similarities[0], indices[0]):
-            if idx < 0 or idx >= len(self.episodes):
+            if idx < 0 or idx >= len(episodes):
                 continue
             if float(sim) < min_similarity:
                 continue
             
-            episode = self.episodes[idx].copy()
+            episode = episodes[idx].copy()
             episode["similarity"] = round(float(sim), 4)
             
             # 진단명 매칭 여부
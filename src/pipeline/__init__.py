@@ -6,7 +6,16 @@ from .adapter import (
     clean_state_to_agent_state,
     agent_state_to_clean_updates,
 )
-from .graph import MedicalCritiqueGraph
+
+
+def __getattr__(name):
+    # MedicalCritiqueGraph는 langgraph + 전체 에이전트를 끌어오므로 처음 접근할 때 import
+    # (state/adapter만 쓰는 코드·헬스체크가 그래프 의존성 비용을 내지 않도록)
+    if name == "MedicalCritiqueGraph":
+        from .graph import MedicalCritiqueGraph
+        return MedicalCritiqueGraph
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __all__ = [
     "MedicalCritiqueGraph",
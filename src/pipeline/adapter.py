@@ -48,6 +48,19 @@ def dict_to_critic_agent_state(d: Dict[str, Any]) -> CriticAgentState:
     )
 
 
+def critic_patient(pc: Dict[str, Any]) -> Dict[str, Any]:
+    """patient_case → Critic patient dict (router 휴리스틱이 status를 읽으므로 prefetch도 같은 함수 사용)."""
+    return {
+        "id": pc.get("patient_id") or pc.get("id"),
+        "text": pc.get("clinical_text") or pc.get("text", ""),
+        "age": pc.get("age"),
+        "sex": pc.get("sex"),
+        "status": pc.get("outcome") or pc.get("status"),
+        "admission_type": pc.get("admission_type"),
+        "admission_location": pc.get("admission_location"),
+    }
+
+
 def clean_state_to_agent_state(clean_state: Dict[str, Any]) -> CriticAgentState:
     """메인 그래프 state → Critic용 state. 앞단 결과는 cohort_data에 넣어 참고용으로 전달(의존 금지)."""
     pc = clean_state.get("patient_case") or {}
@@ -64,15 +77,7 @@ def clean_state_to_agent_state(clean_state: Dict[str, Any]) -> CriticAgentState:
     cohort["process_contributor_analysis"] = clean_state.get("process_contributor_analysis")
 
     return CriticAgentState(
-        patient={
-            "id": pc.get("patient_id") or pc.get("id"),
-            "text": pc.get("clinical_text") or pc.get("text", ""),
-            "age": pc.get("age"),
-            "sex": pc.get("sex"),
-            "status": pc.get("outcome") or pc.get("status"),
-            "admission_type": pc.get("admission_type"),
-            "admission_location": pc.get("admission_location"),
-        },
+        patient=critic_patient(pc),
         cohort_data=cohort,
         similar_case_patterns=clean_state.get("similar_case_patterns") or {},
         preprocessing=clean_state.get("preprocessing") or {},
@@ -1,6 +1,5 @@
 """LangGraph 기반 Medical Critique Multi-Agent System"""
 
-import os
 from typing import Dict, Any, Optional
 from langgraph.graph import StateGraph, END
 
@@ -24,6 +23,8 @@ from src.agents import (
 )
 from src.critic.critic_graph import get_critic_graph
 from src.critic.verifier import Verifier
+from src.critic.refine import verifier_agreement
+from src.llm.backend import llm_available
 
 
 class MedicalCritiqueGraph:
@@ -57,11 +58,11 @@ class MedicalCritiqueGraph:
               │
         CritiqueBuilder (LLM) → critique_points (span_id, severity, cohort_comparison)
               │
-        CritiqueBuilder → critique_points
+        (일관성 문제가 남으면) patch 프롬프트로 수정 ⟲ max_iterations 회차까지
               ↓
-        (유사 케이스 있으면) Verifier → solutions (유사 케이스 근거)
+        (유사 케이스 있으면) Verifier → solutions  ‖  Alternative Explanation (parallel 모드에서 동시 실행)
               ↓
-        → graph state에 critique / solutions 반영
+        join_critique → graph state에 critique / solutions 반영
     ─────────────────────────────────────────────────────────────────
               ↓
              END
@@ -69,9 +70,28 @@ class MedicalCritiqueGraph:
         └─ 에피소딕 메모리에 저장 (critique, solutions, 교훈)
     """
 
-    def __init__(self, rag_retriever=None, episodic_store=None):
+    EXECUTION_MODES = ("sequential", "parallel")
+
+    def __init__(
+        self,
+        rag_retriever=None,
+        episodic_store=None,
+        execution_mode: str = "sequential",
+        max_workers: int = 4,
+    ):
+        """
+        Args:
+            rag_retriever: 내부 RAG 검색기
+            episodic_store: 에피소딕 메모리 저장소
+            execution_mode: "sequential" (기존 직렬 배선) | "parallel" (의존성 기반 DAG 배선)
+            max_workers: parallel 모드에서 한 superstep에 동시에 실행할 노드 수 상한 (스레드 풀 크기)
+        """
+        if execution_mode not in self.EXECUTION_MODES:
+            raise ValueError(f"execution_mode must be one of {self.EXECUTION_MODES}: {execution_mode}")
         self.rag_retriever = rag_retriever
         self.episodic_store = episodic_store
+        self.execution_mode = execution_mode
+        self.max_workers = max(1, int(max_workers))
         self.graph = self._build_graph()
 
     def _build_graph(self) -> StateGraph:
@@ -79,7 +99,9 @@ class MedicalCritiqueGraph:
         LangGraph 구성 (2-Pass CRAG):
 
         chart_structurer → evidence_1st → diagnosis/treatment (병렬)
-        → evidence_2nd (비판 기반) → intervention_checker → critic → END
+        → evidence_2nd (비판 기반) → intervention_checker → critic → verifier / 대안 해석 → join_critique → END
+
+        parallel 모드에서는 입력 의존성이 없는 노드를 같은 superstep에 배치한다.
         """
         graph = StateGraph(AgentState)
 
@@ -93,9 +115,20 @@ class MedicalCritiqueGraph:
         graph.add_node("run_conditional_agents", self._run_conditional_agents_node)
         graph.add_node("critic", self._critic_node)
         graph.add_node("run_alternative_explanation", self._run_alternative_explanation_node)
+        graph.add_node("verifier", self._verifier_node)
+        graph.add_node("join_critique", self._join_critique_node)
 
         graph.set_entry_point("chart_structurer")
 
+        if self.execution_mode == "parallel":
+            self._add_parallel_edges(graph)
+        else:
+            self._add_sequential_edges(graph)
+
+        return graph.compile()
+
+    @staticmethod
+    def _add_sequential_edges(graph: StateGraph) -> None:
         graph.add_edge("chart_structurer", "evidence")
         graph.add_edge("evidence", "diagnosis")
         graph.add_edge("evidence", "treatment")
@@ -105,16 +138,60 @@ class MedicalCritiqueGraph:
         graph.add_edge("intervention_checker", "agent_router")
         graph.add_edge("agent_router", "run_conditional_agents")
         graph.add_edge("run_conditional_agents", "critic")
+        graph.add_edge("critic", "verifier")
+        graph.add_edge("verifier", "run_alternative_explanation")
+        graph.add_edge("run_alternative_explanation", "join_critique")
+        graph.add_edge("join_critique", END)
+
+    @staticmethod
+    def _add_parallel_edges(graph: StateGraph) -> None:
+        """
+        의존성 기반 배선 (각 노드가 실제로 읽는 state 키 기준):
+
+            chart_structurer → evidence → diagnosis / treatment (병렬)
+            diagnosis + treatment → evidence_2nd                       (evidence 갱신)
+            diagnosis + treatment → intervention_checker → agent_router → run_conditional_agents
+            evidence_2nd + run_conditional_agents → critic → verifier / run_alternative_explanation (병렬) → join_critique
+
+        - intervention_checker는 structured_chart + diagnosis/treatment 분석만 읽으므로
+          evidence_2nd(PubMed/RAG I/O)와 겹쳐서 실행된다.
+        - process_contributor가 intervention_coverage를 읽으므로 조건부 에이전트는 checker 뒤에 둔다.
+        - critic은 2차 evidence와 조건부 에이전트 결과를 모두 기다린다 (join).
+        - verifier와 대안 해석은 critique만 읽으므로 동시에 실행, join_critique에서 합류.
+        """
+        graph.add_edge("chart_structurer", "evidence")
+        graph.add_edge("evidence", "diagnosis")
+        graph.add_edge("evidence", "treatment")
+        graph.add_edge(["diagnosis", "treatment"], "evidence_2nd")
+        graph.add_edge(["diagnosis", "treatment"], "intervention_checker")
+        graph.add_edge("intervention_checker", "agent_router")
+        graph.add_edge("agent_router", "run_conditional_agents")
+        graph.add_edge(["evidence_2nd", "run_conditional_agents"], "critic")
+        graph.add_edge("critic", "verifier")
         graph.add_edge("critic", "run_alternative_explanation")
-        graph.add_edge("run_alternative_explanation", END)
+        graph.add_edge(["verifier", "run_alternative_explanation"], "join_critique")
+        graph.add_edge("join_critique", END)
 
-        return graph.compile()
+    @staticmethod
+    def _prefetched(state: AgentState, name: str) -> Any:
+        prefetch = state.get("prefetch")
+        if prefetch is None or not prefetch.has(name):
+            return None
+        return prefetch.get(name)
 
     def _chart_structurer_node(self, state: AgentState) -> Dict:
+        structured_chart = self._prefetched(state, "structured_chart")
+        if structured_chart is not None:
+            print("  [Chart Structurer] [OK] Using prefetched result")
+            return {"structured_chart": structured_chart}
         return run_chart_structurer(state)
 
     def _evidence_node(self, state: AgentState) -> Dict:
-        return run_evidence_agent(state, rag_retriever=self.rag_retriever)
+        return run_evidence_agent(
+            state,
+            rag_retriever=self.rag_retriever,
+            clinical_analysis=self._prefetched(state, "clinical_analysis"),
+        )
 
     def _diagnosis_node(self, state: AgentState) -> Dict:
         return run_diagnosis_agent(state)
@@ -153,32 +230,23 @@ class MedicalCritiqueGraph:
             "executed_tools": [],
             "executed_budget": 0,
         }
+        if state.get("max_iterations"):
+            initial_critic_dict["max_iterations"] = state["max_iterations"]
+        prefetched_router = self._prefetched(state, "critic_router")
+        if prefetched_router:
+            initial_critic_dict["prefetched_router"] = prefetched_router
         result_state = get_critic_graph().invoke(initial_critic_dict)
         critique_result = result_state.get("critique") or {}
+        refinement = dict(result_state.get("refinement") or {})
         critic_state = dict_to_critic_agent_state(result_state)
         updates = agent_state_to_clean_updates(critic_state, critique_result)
 
-        similar_cases = state.get("similar_cases") or []
-        if similar_cases and os.environ.get("OPENAI_API_KEY"):
-            try:
-                verifier = Verifier()
-                critique_for_verifier = {
-                    "patient_id": critic_state.patient.get("id"),
-                    "critique_points": [
-                        c.get("point") or c.get("issue", "") for c in (updates.get("critique") or [])
-                    ],
-                    "risk_factors": critique_result.get("risk_factors", []),
-                    "recommendations": critique_result.get("recommendations", []),
-                }
-                verifier_result = verifier.verify(
-                    critique_for_verifier,
-                    similar_cases,
-                    evidence=state.get("evidence"),
-                )
-                if verifier_result.get("solutions"):
-                    updates["solutions"] = normalize_solutions(verifier_result["solutions"])
-            except Exception:
-                pass
+        # Verifier 입력 (critique 목록 외): verifier 노드가 읽음
+        updates["critique_report"] = {
+            "patient_id": critic_state.patient.get("id"),
+            "risk_factors": critique_result.get("risk_factors", []),
+            "recommendations": critique_result.get("recommendations", []),
+        }
 
         critique_list = updates.get("critique", [])
         normalized = []
@@ -195,10 +263,52 @@ class MedicalCritiqueGraph:
         updates["critique"] = normalized
 
         confidence = 0.8 if (normalized and len(normalized) > 0) else 0.5
-        updates["iteration"] = 1
+        updates["iteration"] = len(refinement.get("iterations") or []) or 1
         updates["confidence"] = confidence
+        updates["critic_refinement"] = refinement or None
         return updates
 
+    def _verifier_node(self, state: AgentState) -> Dict:
+        """critique → (유사 케이스 있으면) Verifier solutions. 대안 해석 에이전트와 같은 superstep에서 실행."""
+        similar_cases = state.get("similar_cases") or []
+        if not similar_cases or not llm_available():
+            return {"verification": None}
+        report = state.get("critique_report") or {}
+        try:
+            critique_for_verifier = {
+                "patient_id": report.get("patient_id"),
+                "critique_points": [
+                    c.get("point") or c.get("issue", "") for c in (state.get("critique") or []) if isinstance(c, dict)
+                ],
+                "risk_factors": report.get("risk_factors", []),
+                "recommendations": report.get("recommendations", []),
+            }
+            return {"verification": Verifier().verify(critique_for_verifier, similar_cases, evidence=state.get("evidence"))}
+        except Exception as e:
+            print(f"  [Verifier] failed: {e}")
+            return {"verification": None}
+
+    def _join_critique_node(self, state: AgentState) -> Dict:
+        """verifier + 대안 해석 합류: Verifier solutions 반영, critique와의 일치율을 반복 개선 리포트에 기록."""
+        verification = state.get("verification") or {}
+        updates: Dict[str, Any] = {}
+        solutions = verification.get("solutions") or []
+        if solutions:
+            updates["solutions"] = normalize_solutions(solutions)
+        refinement = state.get("critic_refinement")
+        if refinement and verification:
+            updates["critic_refinement"] = {
+                **refinement,
+                "verifier_agreement": verifier_agreement(state.get("critique") or [], solutions),
+            }
+        return updates
+
+    def _invoke_config(self) -> Dict[str, Any]:
+        """parallel 모드: 동시 실행 노드 수를 스레드 풀 크기로 제한."""
+        if self.execution_mode == "parallel":
+            return {"max_concurrency": self.max_workers}
+        return {}
+
     def _search_episodic_memory(self, patient_case: Dict) -> str:
         if self.episodic_store is None:
             return ""
@@ -232,7 +342,14 @@ class MedicalCritiqueGraph:
         except Exception as e:
             print(f"  [EpisodicMemory] 저장 실패: {e}")
 
-    def run(self, patient_case: Dict, similar_cases: list = None) -> Dict:
+    def run(self, patient_case: Dict, similar_cases: list = None, prefetch=None,
+            max_iterations: Optional[int] = None) -> Dict:
+        """
+        Args:
+            prefetch: start_prefetch()가 반환한 PrefetchHandle (선택). 있으면 chart_structurer,
+                evidence 1st 임상 분석, critic router가 미리 시작된 결과를 기다려 사용
+            max_iterations: CritiqueBuilder 최대 회차 (첫 생성 포함). None이면 CRITIC_MAX_ITERATIONS
+        """
         episodic_lessons = self._search_episodic_memory(patient_case)
 
         if episodic_lessons:
@@ -243,6 +360,7 @@ class MedicalCritiqueGraph:
         initial_state = {
             "patient_case": patient_case,
             "similar_cases": similar_cases or [],
+            "prefetch": prefetch,
             "episodic_lessons": episodic_lessons,
             "structured_chart": None,
             "diagnosis_analysis": None,
@@ -262,10 +380,14 @@ class MedicalCritiqueGraph:
             "critique": None,
             "solutions": None,
             "iteration": 0,
+            "max_iterations": max_iterations,
+            "critic_refinement": None,
+            "critique_report": None,
+            "verification": None,
             "confidence": None,
         }
 
-        final_state = self.graph.invoke(initial_state)
+        final_state = self.graph.invoke(initial_state, config=self._invoke_config())
 
         result = {
             "patient_id": patient_case.get("patient_id") or patient_case.get("id"),
@@ -281,6 +403,8 @@ class MedicalCritiqueGraph:
             "risk_factor_analysis": final_state.get("risk_factor_analysis"),
             "process_contributor_analysis": final_state.get("process_contributor_analysis"),
             "alternative_explanations": final_state.get("alternative_explanations"),
+            "iteration": final_state.get("iteration", 0),
+            "critic_refinement": final_state.get("critic_refinement"),
         }
 
         self._save_episodic_memory(patient_case, result)
@@ -0,0 +1,105 @@
+"""
+Prefetch: 원문 텍스트만 있으면 되는 LLM 호출을 케이스 로드 직후 동시에 시작.
+
+- start_prefetch()가 chart_structurer, critic router 선택을 스레드 풀에 던지고 PrefetchHandle 반환
+- 호출 측(run_agent_critique_pipeline)은 진단 추출 등 추가 작업을 handle.submit()으로 얹음
+- 그래프 노드는 state["prefetch"]에서 결과를 기다려 쓰고, 없거나 실패하면 기존대로 직접 실행
+
+의존 작업(예: clinical_analysis가 structured_chart를 읽음)은 선행 작업보다 나중에 submit하고
+작업 안에서 handle.get()으로 기다린다. 풀은 FIFO이므로 선행 작업은 이미 실행 중이어서 교착되지 않는다.
+"""
+
+from __future__ import annotations
+
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+class PrefetchHandle:
+    """이름 → Future. get()은 실패/미등록 시 default 반환 (노드가 직접 실행으로 폴백)."""
+
+    def __init__(self, max_workers: int = 4):
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix="prefetch")
+        self._futures: Dict[str, Future] = {}
+
+    def submit(self, name: str, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        # 호출 측 컨텍스트(케이스별 LLM 사용량 tracker 등)를 작업 스레드로 전달
+        ctx = contextvars.copy_context()
+        future = self._executor.submit(ctx.run, fn, *args, **kwargs)
+        self._futures[name] = future
+        return future
+
+    def has(self, name: str) -> bool:
+        return name in self._futures
+
+    def get(self, name: str, timeout: Optional[float] = None, default: Any = None) -> Any:
+        future = self._futures.get(name)
+        if future is None:
+            return default
+        try:
+            return future.result(timeout=timeout)
+        except Exception as e:
+            print(f"  [Prefetch] {name} unavailable ({type(e).__name__}: {e}) → fallback")
+            return default
+
+    def close(self) -> None:
+        """남은 작업은 기다리지 않음 (결과는 폐기)."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _prefetch_structured_chart(patient_case: Dict) -> Optional[Dict]:
+    from src.agents import run_chart_structurer
+    return run_chart_structurer({"patient_case": patient_case}).get("structured_chart")
+
+
+def _prefetch_critic_router(patient_case: Dict) -> Dict:
+    """critic router는 환자 원문/메타데이터 + tool card만 읽음 → 그래프 진입 전에 선택 가능."""
+    from src.critic.registry import build_default_registry
+    from src.critic.router import heuristic_features, make_router
+    from src.critic.runner import AgentConfig
+    from src.critic.types import AgentState as CriticState
+
+    from src.pipeline.adapter import critic_patient
+
+    registry = build_default_registry()
+    # 그래프 안 router와 같은 patient (status 등 휴리스틱 feature가 달라지면 선택도 달라짐)
+    state = CriticState(patient=critic_patient(patient_case), cohort_data={})
+    selection = make_router(AgentConfig()).select(
+        state=state,
+        available_tools=registry.available_tool_names,
+        tool_cards=registry.cards,
+    )
+    return {
+        "selected_tools": selection.tools,
+        "reason": selection.reason,
+        "retrieved_cards": selection.retrieved_cards,
+        "decision": selection.decision,
+        # router_node가 그래프 안 state와 비교 → 다르면 prefetch 선택을 버리고 다시 선택
+        "features": heuristic_features(state),
+    }
+
+
+def _prefetch_clinical_analysis(handle: PrefetchHandle, patient_case: Dict) -> Dict:
+    from src.agents.evidence_agent import analyze_clinical_context_with_llm
+    # 기존과 같은 프롬프트가 되도록 structured_chart(vitals)를 기다려 함께 전달
+    return analyze_clinical_context_with_llm(patient_case, handle.get("structured_chart"))
+
+
+def start_prefetch(patient_case: Dict, max_workers: int = 4) -> PrefetchHandle:
+    """
+    텍스트만 필요한 호출을 즉시 시작.
+
+    Returns:
+        PrefetchHandle (키: "structured_chart", "critic_router")
+    """
+    handle = PrefetchHandle(max_workers=max_workers)
+    handle.submit("structured_chart", _prefetch_structured_chart, patient_case)
+    handle.submit("critic_router", _prefetch_critic_router, patient_case)
+    print("  [Prefetch] started: structured_chart, critic_router")
+    return handle
+
+
+def submit_clinical_analysis(handle: PrefetchHandle, patient_case: Dict) -> Future:
+    """진단 추출이 끝난 patient_case로 evidence 1st의 임상 맥락 분석을 미리 시작."""
+    return handle.submit("clinical_analysis", _prefetch_clinical_analysis, handle, patient_case)
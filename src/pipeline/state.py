@@ -1,4 +1,4 @@
-from typing import TypedDict, List, Dict, Optional
+from typing import Any, TypedDict, List, Dict, Optional
 
 
 class AgentState(TypedDict, total=False):
@@ -7,6 +7,7 @@ class AgentState(TypedDict, total=False):
     # 입력
     patient_case: Dict
     similar_cases: List[Dict]
+    prefetch: Optional[Any]  # PrefetchHandle: 텍스트만 필요한 LLM 호출의 선행 결과 (없으면 노드가 직접 실행)
 
     # 에피소딕 메모리 (크로스런 학습: 과거 분석 경험)
     episodic_lessons: Optional[str]  # format_for_prompt() 결과 → 각 노드 프롬프트에 주입
@@ -40,4 +41,8 @@ class AgentState(TypedDict, total=False):
     critique: Optional[List[Dict]]  # Critic의 critique_points 리스트
     solutions: Optional[List[Dict]]
     iteration: int
+    max_iterations: int  # CritiqueBuilder 최대 회차 (critic 서브그래프 반복 개선)
+    critic_refinement: Optional[Dict]  # 회차별 문제 수/지연, 종료 이유, Verifier 일치율
+    critique_report: Optional[Dict]  # Verifier 입력 (patient_id, risk_factors, recommendations)
+    verification: Optional[Dict]  # Verifier 노드 원 결과 → join_critique에서 solutions로 반영
     confidence: Optional[float]
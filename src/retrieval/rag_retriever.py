@@ -12,17 +12,20 @@ RAG Retriever - FAISS 기반 유사 케이스 검색 + LLM 진단 필터링 + Re
   - BioLORD: 단일 인코더, UMLS 기반 임상 개념 유사성
 """
 
-import numpy as np
+from __future__ import annotations
+
 import pickle
-import faiss
-import torch
-import requests
 import json
-import os
 from pathlib import Path
-from typing import List, Dict, Optional, Set
-from transformers import AutoTokenizer, AutoModel
+from typing import TYPE_CHECKING, List, Dict, Optional, Set
 from dotenv import load_dotenv
+from ..llm.backend import get_backend, llm_available
+from ..llm.cassette import cassette_call, replaying
+from ..llm.openai_chat import OpenAIChatConfig, call_openai_chat_completions
+
+# numpy / faiss / torch / transformers는 첫 사용 시 import (패키지 import만으로 수 초 걸리지 않도록)
+if TYPE_CHECKING:
+    import numpy as np
 
 # .env 로드
 env_path = Path(__file__).resolve().parents[2] / ".env"
@@ -71,13 +74,42 @@ def get_reranker():
     return _reranker if _reranker != "disabled" else None
 
 
+def _score_pairs(pairs: List[List[str]]) -> Optional[List[float]]:
+    """Reranker 점수 산출 (Reranker 사용 불가 시 None)"""
+    reranker = get_reranker()
+    if reranker is None:
+        return None
+    
+    # Reranker 타입에 따른 점수 산출
+    print(f"[Reranker] Scoring {len(pairs)} candidates...")
+    
+    if isinstance(reranker, tuple) and reranker[0] == "crossencoder":
+        # Fallback: CrossEncoder (instruction 미지원)
+        print("[Reranker] Using CrossEncoder fallback (no instruction)")
+        scores = reranker[1].predict(pairs)
+    else:
+        # FlagReranker with instruction
+        print(f"[Reranker] Instruction: '{RERANKER_INSTRUCTION}'")
+        scores = reranker.compute_score(
+            pairs,
+            normalize=False  # Raw logit 사용 (순서만 중요, 절댓값 무의미)
+        )
+        # compute_score는 단일 쌍이면 float, 여러 쌍이면 list 반환
+        if not isinstance(scores, list):
+            scores = [scores]
+    # 카세트 기록 가능하도록 float 리스트로
+    return [float(x) for x in scores]
+
+
 class DiagnosisExtractor:
     """LLM 기반 진단 추출기 - 입원 주 원인 vs 동반 질환 구분"""
     
     def __init__(self, model: str = "gpt-4o-mini"):
         self.model = model
-        self.api_url = "https://api.openai.com/v1/chat/completions"
-        self.api_key = os.environ.get("OPENAI_API_KEY", "")
+        # URL/키는 LLM 백엔드 설정 (LLM_BACKEND / LLM_BASE_URL, 기본 OpenAI)
+        backend = get_backend()
+        self.api_url = backend.chat_url
+        self.api_key = backend.key()
         self._cache = {}  # 캐싱으로 중복 호출 방지
     
     def extract(self, text: str, use_cache: bool = True) -> Dict[str, List[str]]:
@@ -100,7 +132,7 @@ class DiagnosisExtractor:
         if use_cache and cache_key in self._cache:
             return self._cache[cache_key]
         
-        if not self.api_key:
+        if not llm_available():
             print("[DiagnosisExtractor] API key not found")
             return {'chief_complaint': [], 'primary_diagnosis': [], 'comorbidities': []}
         
@@ -118,23 +150,13 @@ Text:
 {text}"""
 
         try:
-            response = requests.post(
-                self.api_url,
-                headers={
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": self.model,
-                    "messages": [{"role": "user", "content": prompt}],
-                    "temperature": 0.1,
-                    "max_tokens": 500
-                },
-                timeout=60
+            # 공통 요청 경로 (오프라인 배치 모드에서도 동일하게 동작)
+            content = call_openai_chat_completions(
+                messages=[{"role": "user", "content": prompt}],
+                config=OpenAIChatConfig(model=self.model, temperature=0.1, max_tokens=500, timeout_s=60, max_retries=3),
+                api_key=self.api_key,
+                api_url=self.api_url,
             )
-            response.raise_for_status()
-            result = response.json()
-            content = result["choices"][0]["message"]["content"].strip()
             
             # JSON 파싱
             extracted = self._parse_structured_diagnoses(content)
@@ -268,7 +290,7 @@ class VectorDBManager:
         """
         self.embedding_model = embedding_model or self.EMBEDDING_MODEL
         self.db_path = Path(DEFAULT_DB_PATH)
-        self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        self._device = None
         # 쿼리 임베딩용
         self.tokenizer = None
         self.model = None
@@ -276,14 +298,28 @@ class VectorDBManager:
         self.index = None
         self.metadata = []
         
+    @property
+    def device(self):
+        if self._device is None:
+            import torch
+            self._device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        return self._device
+
     def load(self):
         """기존 벡터 DB 및 임베딩 모델 로드"""
+        import faiss
+
         print(f"\n[VectorDBManager]")
         print(f"  - 임베딩 모델: {self.embedding_model}")
         
-        self.tokenizer = AutoTokenizer.from_pretrained(self.embedding_model)
-        self.model = AutoModel.from_pretrained(self.embedding_model).to(self.device)
-        self.model.eval()
+        if replaying():
+            # 카세트 재생: 쿼리 임베딩은 기록값 사용 → 모델 다운로드/로드 생략
+            print("  - 카세트 재생: 임베딩 모델 로드 생략")
+        else:
+            from transformers import AutoTokenizer, AutoModel
+            self.tokenizer = AutoTokenizer.from_pretrained(self.embedding_model)
+            self.model = AutoModel.from_pretrained(self.embedding_model).to(self.device)
+            self.model.eval()
         index_path = self.db_path / "faiss_index.idx"
         self.index = faiss.read_index(str(index_path))
         
@@ -300,8 +336,21 @@ class VectorDBManager:
     def embed_text(self, text: str, max_length: int = 512) -> np.ndarray:
         """텍스트를 BioBERT로 임베딩 (쿼리용)"""
         # 빈 텍스트 처리
+        import numpy as np
+
         processed_text = text if text and text.strip() else ' '
-        
+        return cassette_call(
+            "embedding",
+            {"model": self.embedding_model, "text": processed_text, "max_length": max_length},
+            lambda: self._encode(processed_text, max_length),
+            encode=lambda arr: arr.tolist(),
+            decode=lambda rows: np.asarray(rows, dtype=np.float32),
+        )
+    
+    def _encode(self, processed_text: str, max_length: int) -> np.ndarray:
+        import numpy as np
+        import torch
+
         # 토큰화
         inputs = self.tokenizer(
             processed_text,
@@ -342,6 +391,8 @@ class VectorDBManager:
             유사 케이스 리스트 (text + 전체 metadata + similarity 포함)
         """
         
+        import faiss
+
         print(f"\n[Stage 1] FAISS 검색: top-{rerank_top_n} 후보")
         
         # 자기 자신이 포함될 수 있으므로 여유있게 가져옴
@@ -399,7 +450,8 @@ class VectorDBManager:
         extractor = DiagnosisExtractor()
         
         # 쿼리 환자의 진단 추출 (구조화된 형태)
-        query_extracted = extractor.extract(query_text)
+        # 파이프라인에서 같은 텍스트로 case profile을 이미 뽑았으면 재사용 (LLM 호출 생략)
+        query_extracted = self._cached_profile_diagnoses(query_text) or extractor.extract(query_text)
         print(f"  쿼리 환자:")
         print(f"    - Primary Diagnosis: {query_extracted.get('primary_diagnosis', [])} (검색 사용 ✅)")
         print(f"    - Chief Complaint: {query_extracted.get('chief_complaint', [])} (참고용)")
@@ -433,6 +485,19 @@ class VectorDBManager:
         
         return filtered
     
+    @staticmethod
+    def _cached_profile_diagnoses(query_text: str) -> Optional[Dict[str, List[str]]]:
+        """case_profile 캐시 → DiagnosisExtractor 형식. 캐시 없으면 None."""
+        try:
+            from src.agents.case_profile import get_cached_case_profile, profile_to_extracted_diagnoses
+        except Exception:
+            return None
+        profile = get_cached_case_profile(query_text)
+        if not profile:
+            return None
+        extracted = profile_to_extracted_diagnoses(profile)
+        return extracted if extracted.get('primary_diagnosis') else None
+    
     def _rerank(self, query_text: str, candidates: List[Dict], top_k: int) -> List[Dict]:
         """
         Instruction-tuned Cross-encoder로 후보 reranking
@@ -448,36 +513,21 @@ class VectorDBManager:
         Returns:
             Reranking된 상위 top_k 케이스
         """
-        reranker = get_reranker()
-        
-        if reranker is None:
-            # Reranker 사용 불가 시 원래 순서 유지
-            print("[Reranker] Disabled, using original order")
-            return candidates[:top_k]
-        
         # Query-Candidate 쌍 생성
         pairs = []
         for c in candidates:
             candidate_text = c.get('text', '')
             pairs.append([query_text, candidate_text])
         
-        # Reranker 타입에 따른 점수 산출
-        print(f"[Reranker] Scoring {len(pairs)} candidates...")
-        
-        if isinstance(reranker, tuple) and reranker[0] == "crossencoder":
-            # Fallback: CrossEncoder (instruction 미지원)
-            print("[Reranker] Using CrossEncoder fallback (no instruction)")
-            scores = reranker[1].predict(pairs)
-        else:
-            # FlagReranker with instruction
-            print(f"[Reranker] Instruction: '{RERANKER_INSTRUCTION}'")
-            scores = reranker.compute_score(
-                pairs,
-                normalize=False  # Raw logit 사용 (순서만 중요, 절댓값 무의미)
-            )
-            # compute_score는 단일 쌍이면 float, 여러 쌍이면 list 반환
-            if not isinstance(scores, list):
-                scores = [scores]
+        scores = cassette_call(
+            "rerank",
+            {"model": _reranker_model_name, "instruction": RERANKER_INSTRUCTION, "pairs": pairs},
+            lambda: _score_pairs(pairs),
+        )
+        if scores is None:
+            # Reranker 사용 불가 시 원래 순서 유지
+            print("[Reranker] Disabled, using original order")
+            return candidates[:top_k]
         
         # 점수로 재정렬 (순서만 바꾸고 similarity는 FAISS 원본 유지)
         for i, c in enumerate(candidates):